@@ -0,0 +1,25 @@
+-- 为 memory_nodes.content_embedding 创建 ANN 向量索引
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 默认使用 HNSW 索引（PgVector >= 0.5.0），召回率高、无需训练，适合持续写入
+-- 2. 查询必须写成 ORDER BY content_embedding <=> :q LIMIT k 才能命中索引
+-- 3. 查询时可通过 hnsw.ef_search / ivfflat.probes 调节召回率与延迟
+-- 4. 线上大表建议使用 CREATE INDEX CONCURRENTLY 单独执行，避免长时间锁表
+
+-- HNSW 索引（余弦距离）
+CREATE INDEX IF NOT EXISTS idx_memory_nodes_embedding_hnsw
+ON memory_nodes
+USING hnsw (content_embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- IVFFlat 索引（备选方案，需在已有数据后创建，lists 约为 行数/1000）
+-- CREATE INDEX IF NOT EXISTS idx_memory_nodes_embedding_ivfflat
+-- ON memory_nodes
+-- USING ivfflat (content_embedding vector_cosine_ops)
+-- WITH (lists = 100);
+
+-- 更新统计信息，便于查询规划器选择索引
+ANALYZE memory_nodes;
+
+COMMENT ON INDEX idx_memory_nodes_embedding_hnsw IS '记忆节点向量 HNSW 索引（余弦距离）';
@@ -0,0 +1,28 @@
+-- 向量嵌入回填检查点表
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 批量回填按节点 id 顺序进行，每个批次写入后在同一事务中推进检查点
+-- 2. 回填中断后再次执行会从 last_node_id 之后继续，restart 时重置
+-- 3. scope 为知识图谱 ID，全库回填时为 'all'
+
+CREATE TABLE IF NOT EXISTS embedding_backfill_checkpoints (
+    scope VARCHAR(64) PRIMARY KEY,
+    last_node_id UUID,
+    processed_count INTEGER NOT NULL DEFAULT 0,
+    updated_count INTEGER NOT NULL DEFAULT 0,
+    failed_count INTEGER NOT NULL DEFAULT 0,
+    token_count BIGINT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- 回填读取按 id 顺序扫描缺少向量的节点
+CREATE INDEX IF NOT EXISTS idx_memory_nodes_missing_embedding
+ON memory_nodes(id)
+WHERE content_embedding IS NULL AND deleted_at IS NULL;
+
+COMMENT ON TABLE embedding_backfill_checkpoints IS '向量嵌入回填检查点表';
+COMMENT ON COLUMN embedding_backfill_checkpoints.scope IS '回填范围: 知识图谱ID 或 all';
+COMMENT ON COLUMN embedding_backfill_checkpoints.last_node_id IS '已连续完成的最后一个节点ID';
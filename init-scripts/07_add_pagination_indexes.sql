@@ -0,0 +1,24 @@
+-- 游标分页复合索引
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 列表接口的 pagination=cursor 模式按 (排序时间列, id) 行比较翻页：
+--    WHERE (updated_at, id) < (:updated_at, :id) ORDER BY updated_at DESC, id DESC LIMIT n
+-- 2. B-tree 可以反向扫描，升序复合索引同样满足倒序翻页，每页只读取 n + 1 行
+-- 3. 线上大表建议使用 CREATE INDEX CONCURRENTLY 单独执行，避免长时间锁表
+
+-- 图谱内的记忆节点列表
+CREATE INDEX IF NOT EXISTS idx_memory_nodes_graph_updated
+ON memory_nodes(graph_id, updated_at, id);
+
+-- 用户的知识图谱列表
+CREATE INDEX IF NOT EXISTS idx_knowledge_graphs_user_updated
+ON knowledge_graphs(user_id, updated_at, id);
+
+-- 用户的文件上传列表
+CREATE INDEX IF NOT EXISTS idx_file_uploads_user_created
+ON file_uploads(user_id, created_at, id);
+
+COMMENT ON INDEX idx_memory_nodes_graph_updated IS '记忆节点游标分页索引';
+COMMENT ON INDEX idx_knowledge_graphs_user_updated IS '知识图谱游标分页索引';
+COMMENT ON INDEX idx_file_uploads_user_created IS '文件上传游标分页索引';
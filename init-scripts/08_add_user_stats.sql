@@ -0,0 +1,73 @@
+-- 用户学习统计快照表
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 成就系统（/achievements/*）按主键读取该表，不再扫描节点和复习记录
+-- 2. 创建/删除节点和图谱、提交复习时由应用在同一事务中增量更新
+-- 3. 日期和小时统一按 UTC 计算；review_hours[1] 对应 0 点
+-- 4. 缺少快照的用户在首次访问时由应用重建，下面的回填可在升级时一次性执行
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    total_nodes INTEGER NOT NULL DEFAULT 0,
+    mastered_nodes INTEGER NOT NULL DEFAULT 0,
+    total_reviews INTEGER NOT NULL DEFAULT 0,
+    total_graphs INTEGER NOT NULL DEFAULT 0,
+    current_streak INTEGER NOT NULL DEFAULT 0,
+    longest_streak INTEGER NOT NULL DEFAULT 0,
+    last_review_date DATE,
+    review_hours INTEGER[] NOT NULL DEFAULT array_fill(0, ARRAY[24]),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 回填已有用户
+INSERT INTO user_stats (
+    user_id, total_nodes, mastered_nodes, total_reviews, total_graphs,
+    current_streak, longest_streak, last_review_date, review_hours
+)
+SELECT
+    u.id,
+    (SELECT count(*) FROM memory_nodes n WHERE n.user_id = u.id),
+    (SELECT count(*) FROM memory_nodes n WHERE n.user_id = u.id AND lower(n.mastery_level) = 'mastered'),
+    (SELECT count(*) FROM review_logs r WHERE r.user_id = u.id),
+    (SELECT count(*) FROM knowledge_graphs g WHERE g.user_id = u.id),
+    -- 连续天数：日期减去序号相同的日期属于同一段连续区间
+    COALESCE((
+        SELECT count(*) FROM (
+            SELECT d, d - (row_number() OVER (ORDER BY d))::int AS grp
+            FROM (SELECT DISTINCT (r.created_at AT TIME ZONE 'UTC')::date AS d
+                  FROM review_logs r WHERE r.user_id = u.id) days
+        ) islands
+        GROUP BY grp ORDER BY max(d) DESC LIMIT 1
+    ), 0),
+    COALESCE((
+        SELECT max(cnt) FROM (
+            SELECT count(*) AS cnt FROM (
+                SELECT d, d - (row_number() OVER (ORDER BY d))::int AS grp
+                FROM (SELECT DISTINCT (r.created_at AT TIME ZONE 'UTC')::date AS d
+                      FROM review_logs r WHERE r.user_id = u.id) days
+            ) islands
+            GROUP BY grp
+        ) streaks
+    ), 0),
+    (SELECT max((r.created_at AT TIME ZONE 'UTC')::date) FROM review_logs r WHERE r.user_id = u.id),
+    ARRAY(
+        SELECT count(r.id)::int
+        FROM generate_series(0, 23) AS h
+        LEFT JOIN review_logs r
+            ON r.user_id = u.id AND extract(hour FROM r.created_at AT TIME ZONE 'UTC') = h
+        GROUP BY h ORDER BY h
+    )
+FROM users u
+ON CONFLICT (user_id) DO NOTHING;
+
+DROP TRIGGER IF EXISTS update_user_stats_updated_at ON user_stats;
+CREATE TRIGGER update_user_stats_updated_at
+    BEFORE UPDATE ON user_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+COMMENT ON TABLE user_stats IS '用户学习统计快照表';
+COMMENT ON COLUMN user_stats.current_streak IS '截至最后复习日的连续学习天数';
+COMMENT ON COLUMN user_stats.last_review_date IS '最后复习日期（UTC）';
+COMMENT ON COLUMN user_stats.review_hours IS '各小时复习次数（UTC 0-23）';
@@ -0,0 +1,14 @@
+-- 复习记录客户端 ID（批量复习幂等提交）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 离线复习同步时客户端为每条复习生成唯一 ID，POST /reviews/batch 据此跳过已提交的复习
+-- 2. 唯一索引按用户划分，只约束提供了客户端 ID 的记录（单条提交接口不使用）
+
+ALTER TABLE review_logs ADD COLUMN IF NOT EXISTS client_review_id VARCHAR(64);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_review_logs_user_client_review
+ON review_logs(user_id, client_review_id)
+WHERE client_review_id IS NOT NULL;
+
+COMMENT ON COLUMN review_logs.client_review_id IS '客户端复习ID';
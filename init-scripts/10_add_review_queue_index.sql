@@ -0,0 +1,27 @@
+-- 复习队列部分复合索引
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 间隔重复队列按遗忘指数取前 k 个：同一掌握程度的到期节点遗忘指数随超期时间单调不减，
+--    服务端按 (user_id, mastery_level) 分支沿 next_review_at 各取 k 个候选后再排序
+-- 2. 没有复习时间（遗忘指数固定 0.8）或掌握程度无法识别的节点单独建部分索引，
+--    这两类候选也只需沿 next_review_at 读取 k 行
+-- 3. 掌握程度条件写成 array_position(...) IS NULL（而不是 NOT IN），
+--    与服务端查询写法完全一致，规划器才能证明查询条件满足索引谓词
+-- 4. 已软删除的节点不进入复习队列，索引只包含 deleted_at IS NULL 的行
+-- 5. 线上大表建议使用 CREATE INDEX CONCURRENTLY 单独执行，避免长时间锁表
+
+CREATE INDEX IF NOT EXISTS idx_memory_nodes_user_mastery_next_review
+ON memory_nodes(user_id, mastery_level, next_review_at)
+WHERE deleted_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_memory_nodes_user_irregular_review
+ON memory_nodes(user_id, next_review_at)
+WHERE deleted_at IS NULL
+  AND (last_review_at IS NULL OR next_review_at IS NULL
+       OR array_position('{not_started,learning,familiar,proficient,mastered}'::text[], mastery_level::text) IS NULL);
+
+ANALYZE memory_nodes;
+
+COMMENT ON INDEX idx_memory_nodes_user_mastery_next_review IS '间隔重复复习队列索引（未删除节点）';
+COMMENT ON INDEX idx_memory_nodes_user_irregular_review IS '复习队列索引（没有复习时间或掌握程度无法识别的未删除节点）';
@@ -0,0 +1,11 @@
+-- 知识图谱关联版本号（图谱遍历邻接表缓存失效）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 图谱遍历复习模式把图谱的全部关联加载为进程内邻接表（CSR），按图谱缓存
+-- 2. 创建/删除关联或删除节点（级联删除关联）时应用在同一事务中递增版本号，
+--    各进程读取版本号发现变化后重建邻接表
+
+ALTER TABLE knowledge_graphs ADD COLUMN IF NOT EXISTS relation_version INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN knowledge_graphs.relation_version IS '关联版本号';
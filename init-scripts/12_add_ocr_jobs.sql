@@ -0,0 +1,46 @@
+-- OCR 任务表（异步 OCR 队列）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 提交 OCR 后立即返回任务 ID，由各进程的工作协程按引擎领取（FOR UPDATE SKIP LOCKED）
+-- 2. 失败的任务推迟 available_at 后重新排队，超过 max_attempts 后标记为 failed
+-- 3. running 状态超过租约（locked_at）未完成的任务视为进程中断，重新领取
+
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    file_id UUID NOT NULL REFERENCES file_uploads(id) ON DELETE CASCADE,
+    mode VARCHAR(20) NOT NULL DEFAULT 'text',
+    engine VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_by VARCHAR(64),
+    locked_at TIMESTAMP WITH TIME ZONE,
+    result JSONB,
+    error_message TEXT,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_user_id ON ocr_jobs(user_id);
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_file_id ON ocr_jobs(file_id);
+
+-- 领取任务：按引擎取到期的排队任务
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_queued
+ON ocr_jobs(engine, available_at)
+WHERE status = 'queued';
+
+-- 租约过期检查：处理中的任务
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_running
+ON ocr_jobs(engine, locked_at)
+WHERE status = 'running';
+
+COMMENT ON TABLE ocr_jobs IS 'OCR 任务表';
+COMMENT ON COLUMN ocr_jobs.engine IS 'OCR引擎（提交时确定）: baidu, fake';
+COMMENT ON COLUMN ocr_jobs.status IS '任务状态: queued, running, completed, failed';
+COMMENT ON COLUMN ocr_jobs.available_at IS '可领取时间（重试时推迟）';
+COMMENT ON COLUMN ocr_jobs.locked_at IS '领取时间（超过租约未完成的任务重新排队）';
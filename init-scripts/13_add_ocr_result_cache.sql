@@ -0,0 +1,34 @@
+-- OCR 结果缓存（按图片内容寻址）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. file_uploads.content_hash 记录文件内容的 SHA-256，首次识别时计算
+-- 2. 识别结果按 (内容哈希, 引擎, 识别模式) 缓存，重复上传的图片不再调用 OCR 服务
+-- 3. 结果总字节数超过 OCR_CACHE_MAX_BYTES 时淘汰最久未命中的条目
+
+ALTER TABLE file_uploads ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_file_uploads_content_hash ON file_uploads(content_hash);
+
+COMMENT ON COLUMN file_uploads.content_hash IS '文件内容 SHA-256（十六进制）';
+
+CREATE TABLE IF NOT EXISTS ocr_result_cache (
+    content_hash VARCHAR(64) NOT NULL,
+    engine VARCHAR(20) NOT NULL,
+    mode VARCHAR(20) NOT NULL,
+    result JSONB NOT NULL,
+    result_bytes INTEGER NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0,
+    last_hit_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (content_hash, engine, mode)
+);
+
+-- 按容量淘汰时从最久未命中的条目开始
+CREATE INDEX IF NOT EXISTS idx_ocr_result_cache_last_hit ON ocr_result_cache(last_hit_at);
+
+COMMENT ON TABLE ocr_result_cache IS 'OCR 结果缓存表';
+COMMENT ON COLUMN ocr_result_cache.content_hash IS '图片内容 SHA-256（十六进制）';
+COMMENT ON COLUMN ocr_result_cache.result_bytes IS '识别结果的 JSON 字节数（用于容量淘汰）';
+COMMENT ON COLUMN ocr_result_cache.last_hit_at IS '最近命中或写入时间';
@@ -0,0 +1,25 @@
+-- 内容寻址的文件存储（相同内容的上传只存储一份）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 上传的文件按内容 SHA-256 存储为 <SHA-256><扩展名>，file_uploads 中内容相同的记录共用一个存储文件
+-- 2. ref_count 为引用该文件的上传记录数，删除最后一条记录时删除文件
+-- 3. 已有文件使用 scripts/backfill_file_blobs.py 迁移
+
+CREATE TABLE IF NOT EXISTS file_blobs (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    stored_filename VARCHAR(255) NOT NULL UNIQUE,
+    file_url VARCHAR(500) NOT NULL,
+    file_size BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- 存储统计和迁移时按存储文件名查找上传记录
+CREATE INDEX IF NOT EXISTS idx_file_uploads_stored_filename ON file_uploads(stored_filename);
+
+COMMENT ON TABLE file_blobs IS '存储文件表（内容寻址）';
+COMMENT ON COLUMN file_blobs.content_hash IS '文件内容 SHA-256（十六进制）';
+COMMENT ON COLUMN file_blobs.stored_filename IS '存储文件名: <SHA-256><扩展名>';
+COMMENT ON COLUMN file_blobs.ref_count IS '引用计数';
@@ -0,0 +1,11 @@
+-- 上传图片的预处理结果（OCR 用图和 WebP 缩略图）
+-- 执行时间：2026-10-18
+--
+-- 说明：
+-- 1. 上传时在进程池中按 EXIF 方向旋转原图，生成最长边不超过 2048 的灰度 JPEG（OCR 用）和多种尺寸的 WebP 缩略图
+-- 2. 生成的图片与原图存储在同一目录，文件名为 <原图文件名（不含扩展名）>.<变体名称><扩展名>，删除原图时一起删除
+-- 3. variants 记录各图片的文件名、URL、尺寸和字节数，为空时 OCR 使用原图
+
+ALTER TABLE file_uploads ADD COLUMN IF NOT EXISTS variants JSONB;
+
+COMMENT ON COLUMN file_uploads.variants IS '预处理生成的图片（OCR 用图、WebP 缩略图）';
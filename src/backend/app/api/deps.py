@@ -81,3 +81,29 @@ async def get_current_user(
     
     return user
 
+
+
+async def get_current_admin_user(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    """
+    获取当前管理员用户
+    
+    管理员由配置项 ADMIN_EMAILS 指定
+    
+    Args:
+        current_user: 当前用户
+        
+    Returns:
+        User: 当前管理员用户对象
+        
+    Raises:
+        HTTPException: 非管理员用户
+    """
+    if (current_user.email or "").lower() not in settings.admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="需要管理员权限",
+        )
+    
+    return current_user
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_admin_user, get_current_user
 from app.core.database import get_db
 from app.models import User, FileUpload, MemoryNode, KnowledgeGraph
 from app.schemas.ai_analysis import (
@@ -18,10 +18,14 @@ from app.schemas.ai_analysis import (
     KnowledgePointsResponse,
     EmbeddingRequest,
     EmbeddingResponse,
+    EmbeddingCacheStats,
     QuestionAnalysisRequest,
     QuestionAnalysisResponse,
 )
 from app.services.ai_service import ai_service
+from app.services.review_due_index import review_due_index
+from app.services.review_service import review_statistics_cache
+from app.services.user_stats_service import user_stats_service
 
 
 router = APIRouter()
@@ -109,6 +113,21 @@ async def generate_embedding(
     )
 
 
+@router.get("/embedding-cache/stats", response_model=EmbeddingCacheStats)
+async def get_embedding_cache_stats(
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    获取向量嵌入缓存统计（仅管理员）
+    
+    返回当前进程的命中、未命中、淘汰计数和容量，用于调整缓存大小
+    """
+    if ai_service.embedding_cache is None:
+        raise HTTPException(status_code=404, detail="向量嵌入缓存未启用")
+    
+    return EmbeddingCacheStats(**ai_service.embedding_cache.stats())
+
+
 @router.post("/analyze-question", response_model=QuestionAnalysisResponse)
 async def analyze_question_from_file(
     request: QuestionAnalysisRequest,
@@ -195,8 +214,11 @@ async def analyze_question_from_file(
         )
         
         db.add(memory_node)
+        await user_stats_service.record_nodes_created(db, current_user.id)
         await db.commit()
         await db.refresh(memory_node)
+        await review_due_index.add_nodes([memory_node])
+        review_statistics_cache.invalidate(current_user.id)
         
         node_id = memory_node.id
     
@@ -2,23 +2,25 @@
 文件上传相关的 API 端点
 """
 
-from typing import List, Optional
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_admin_user, get_current_user
 from app.core.database import get_db
+from app.core.pagination import count_rows, paginate_by_cursor
 from app.models import User, FileUpload, KnowledgeGraph
 from app.schemas.file_upload import (
     FileUploadResponse,
     FileUploadInfo,
     UploadResponse,
     FileUploadUpdate,
+    StorageReport,
 )
-from app.schemas.common import PaginatedResponse
+from app.schemas.common import CursorPaginatedResponse, PaginatedResponse
 from app.services.file_storage import file_storage_service
 
 
@@ -39,7 +41,9 @@ async def upload_file(
     - **file**: 上传的文件（支持 JPEG, PNG）
     - **graph_id**: 可选，关联到特定知识图谱
     
-    返回文件信息和访问 URL
+    返回文件信息和访问 URL；内容相同的文件只存储一份，多条记录共用同一个 URL。
+    文件分块流式保存，超过大小限制或文件内容不是 JPEG/PNG 时立即停止并返回 400。
+    记录提交后在进程池中生成 OCR 用的缩小灰度图和 WebP 缩略图（variants），OCR 使用缩小后的图片
     """
     # 验证知识图谱是否存在（如果提供了）
     if graph_id:
@@ -53,10 +57,8 @@ async def upload_file(
         if not graph:
             raise HTTPException(status_code=404, detail="知识图谱不存在")
     
-    # 保存文件
-    stored_filename, file_url, file_size = await file_storage_service.save_file(
-        file, current_user.id
-    )
+    # 保存文件（内容寻址，引用计数随上传记录一起提交）
+    stored_filename, file_url, file_size, content_hash = await file_storage_service.store_file(db, file)
     
     # 获取客户端 IP
     client_ip = None
@@ -72,12 +74,20 @@ async def upload_file(
         file_url=file_url,
         file_size=file_size,
         mime_type=file.content_type or "application/octet-stream",
+        content_hash=content_hash,
         status="pending",
         uploaded_ip=client_ip,
     )
     
     db.add(file_upload)
     await db.commit()
+    
+    # 提交后再生成 OCR 用图和缩略图，预处理期间不持有 file_blobs 的行锁
+    # （预处理失败时 variants 为空，OCR 使用原图）
+    variants = await file_storage_service.preprocess_image(stored_filename)
+    if variants is not None:
+        file_upload.variants = variants
+        await db.commit()
     await db.refresh(file_upload)
     
     return UploadResponse(
@@ -86,16 +96,23 @@ async def upload_file(
         original_filename=file_upload.original_filename,
         file_size=file_upload.file_size,
         mime_type=file_upload.mime_type,
+        variants=file_upload.variants,
         message="文件上传成功"
     )
 
 
-@router.get("/", response_model=PaginatedResponse[FileUploadInfo])
+@router.get(
+    "/",
+    response_model=Union[PaginatedResponse[FileUploadInfo], CursorPaginatedResponse[FileUploadInfo]]
+)
 async def list_files(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     graph_id: Optional[UUID] = Query(None, description="筛选：知识图谱ID"),
     status: Optional[str] = Query(None, description="筛选：处理状态"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="分页模式: offset 或 cursor"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor"),
+    total: str = Query("none", pattern="^(none|estimate|exact)$", description="游标分页的总数: none, estimate, exact"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -106,6 +123,9 @@ async def list_files(
     - **page_size**: 每页数量（1-100）
     - **graph_id**: 可选，筛选特定图谱的文件
     - **status**: 可选，筛选特定状态的文件
+    - **pagination**: 分页模式，cursor 按 (created_at, id) 翻页（传入 cursor 时自动使用）
+    - **cursor**: 游标分页的下一页游标
+    - **total**: 游标分页是否返回总数（none 不返回、estimate 估算、exact 精确）
     """
     # 构建查询
     query = select(FileUpload).where(FileUpload.user_id == current_user.id)
@@ -116,6 +136,22 @@ async def list_files(
     if status:
         query = query.where(FileUpload.status == status)
     
+    # 游标分页
+    if pagination == "cursor" or cursor:
+        try:
+            files, next_cursor = await paginate_by_cursor(
+                db, query, FileUpload.created_at, FileUpload.id, cursor, page_size
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return CursorPaginatedResponse.create(
+            items=[FileUploadInfo.model_validate(f) for f in files],
+            next_cursor=next_cursor,
+            page_size=page_size,
+            total=await count_rows(db, query, total),
+            total_is_estimate=total == "estimate"
+        )
+    
     # 排序
     query = query.order_by(FileUpload.created_at.desc())
     
@@ -141,6 +177,19 @@ async def list_files(
     )
 
 
+@router.get("/storage/report", response_model=StorageReport)
+async def get_storage_report(
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    获取文件存储统计（仅管理员）
+    
+    返回上传记录的总大小、去重后实际存储的大小和节省的空间
+    """
+    return StorageReport(**await file_storage_service.storage_report(db))
+
+
 @router.get("/{file_id}", response_model=FileUploadResponse)
 async def get_file(
     file_id: UUID,
@@ -212,7 +261,7 @@ async def delete_file(
     
     - **file_id**: 文件ID
     
-    会同时删除数据库记录和存储的文件
+    会同时删除数据库记录；存储的文件在没有其他记录引用时删除
     """
     result = await db.execute(
         select(FileUpload).where(
@@ -225,12 +274,10 @@ async def delete_file(
     if not file_upload:
         raise HTTPException(status_code=404, detail="文件不存在")
     
-    # 删除存储的文件
-    file_storage_service.delete_file(file_upload.stored_filename)
-    
-    # 删除数据库记录
-    await db.delete(file_upload)
-    await db.commit()
+    # 删除数据库记录，最后一个引用删除后删除存储的文件
+    async with file_storage_service.release_file(db, file_upload):
+        await db.delete(file_upload)
+        await db.commit()
     
     return None
 
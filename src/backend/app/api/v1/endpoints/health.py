@@ -6,8 +6,11 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.deps import get_current_admin_user
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.http_clients import http_clients
+from app.models import User
 
 router = APIRouter()
 
@@ -82,3 +85,13 @@ async def redis_check():
             "error": str(e),
         }
 
+
+@router.get("/http-clients")
+async def http_clients_check(
+    current_user: User = Depends(get_current_admin_user),
+):
+    """外部 HTTP 连接池指标（使用中、排队等待、握手耗时，仅管理员）"""
+    return {
+        "status": "ok",
+        "providers": http_clients.stats(),
+    }
@@ -2,28 +2,56 @@
 知识图谱相关的 API 端点
 """
 
-from typing import List
+from typing import List, Optional, Union
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.pagination import count_rows, paginate_by_cursor
 from app.core.deps import get_current_user
 from app.models.knowledge_graph import KnowledgeGraph
-from app.models.memory_node import MemoryNode
+from app.models.memory_node import MasteryLevel, MemoryNode
 from app.models.node_relation import NodeRelation
 from app.models.user import User
-from app.schemas.common import PaginatedResponse
+from app.models.view_config import ViewConfig
+from app.schemas.common import CursorPaginatedResponse, PaginatedResponse
 from app.schemas.knowledge_graph import (
+    ForgettingMapResponse,
+    GraphLayoutRequest,
+    GraphLayoutResponse,
+    GraphSnapshotResponse,
     KnowledgeGraphCreate,
     KnowledgeGraphDetailResponse,
     KnowledgeGraphListItem,
     KnowledgeGraphResponse,
     KnowledgeGraphStats,
     KnowledgeGraphUpdate,
+    NodeImportResponse,
+    NodePositionsUpdate,
+    NodePositionsUpdateResponse,
 )
+from app.services.graph_adjacency_service import graph_adjacency_cache
+from app.services.graph_export_service import (
+    EMBEDDING_MODES,
+    EXPORT_FORMATS,
+    NDJSON_MEDIA_TYPE,
+    PARQUET_ARCHIVE_MEDIA_TYPE,
+    PARQUET_AVAILABLE,
+    GraphExportService,
+)
+from app.services.graph_layout_service import FORCE_DIRECTED_ENGINE, GraphLayoutService
+from app.services.graph_snapshot_service import GraphSnapshotService
+from app.services.node_import_service import IMPORT_FORMATS, detect_format, node_import_service
+from app.services.node_position_service import node_position_coalescer
+from app.services.review_due_index import review_due_index
+from app.services.review_service import ReviewService, review_statistics_cache
+from app.services.user_stats_service import user_stats_service
 
 router = APIRouter()
 
@@ -58,8 +86,10 @@ async def create_knowledge_graph(
         )
         
         db.add(new_graph)
+        await user_stats_service.record_graph_created(db, current_user.id)
         await db.commit()
         await db.refresh(new_graph)
+        review_statistics_cache.invalidate(current_user.id)
         
         return new_graph
         
@@ -71,11 +101,17 @@ async def create_knowledge_graph(
         )
 
 
-@router.get("/", response_model=PaginatedResponse[KnowledgeGraphListItem])
+@router.get(
+    "/",
+    response_model=Union[PaginatedResponse[KnowledgeGraphListItem], CursorPaginatedResponse[KnowledgeGraphListItem]]
+)
 async def list_knowledge_graphs(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     include_archived: bool = Query(False, description="是否包含已归档的图谱"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="分页模式: offset 或 cursor"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor"),
+    total: str = Query("none", pattern="^(none|estimate|exact)$", description="游标分页的总数: none, estimate, exact"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -85,6 +121,9 @@ async def list_knowledge_graphs(
     - **page**: 页码（默认 1）
     - **page_size**: 每页数量（默认 20，最大 100）
     - **include_archived**: 是否包含已归档的图谱（默认 false）
+    - **pagination**: 分页模式，cursor 按 (updated_at, id) 翻页（传入 cursor 时自动使用）
+    - **cursor**: 游标分页的下一页游标
+    - **total**: 游标分页是否返回总数（none 不返回、estimate 估算、exact 精确）
     """
     try:
         # 构建查询
@@ -95,6 +134,19 @@ async def list_knowledge_graphs(
         # 不显示预设图谱（除非是自己的）
         # query = query.where(KnowledgeGraph.is_preset == False)
         
+        # 游标分页
+        if pagination == "cursor" or cursor:
+            graphs, next_cursor = await paginate_by_cursor(
+                db, query, KnowledgeGraph.updated_at, KnowledgeGraph.id, cursor, page_size
+            )
+            return CursorPaginatedResponse.create(
+                items=graphs,
+                next_cursor=next_cursor,
+                page_size=page_size,
+                total=await count_rows(db, query, total),
+                total_is_estimate=total == "estimate"
+            )
+        
         # 按更新时间倒序排列
         query = query.order_by(KnowledgeGraph.updated_at.desc())
         
@@ -117,6 +169,11 @@ async def list_knowledge_graphs(
             page_size=page_size
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -235,9 +292,25 @@ async def delete_knowledge_graph(
                 detail="知识图谱不存在"
             )
         
+        # 图谱内的节点会级联删除，先统计节点数用于更新统计快照
+        node_counts = (await db.execute(
+            select(
+                func.count(MemoryNode.id),
+                func.count(MemoryNode.id).filter(
+                    func.lower(MemoryNode.mastery_level) == MasteryLevel.MASTERED.value
+                ),
+            ).where(MemoryNode.graph_id == graph.id)
+        )).one()
+        
         # 删除图谱（级联删除相关数据）
         await db.delete(graph)
+        await user_stats_service.record_graph_deleted(
+            db, current_user.id, node_count=node_counts[0], mastered=node_counts[1]
+        )
         await db.commit()
+        await review_due_index.remove_graph(current_user.id, graph_id)
+        graph_adjacency_cache.invalidate(graph_id)
+        review_statistics_cache.invalidate(current_user.id)
         
         return None
         
@@ -328,3 +401,428 @@ async def get_knowledge_graph_stats(
             detail=f"获取统计信息失败: {str(e)}"
         )
 
+
+@router.get("/{graph_id}/forgetting-map", response_model=ForgettingMapResponse)
+async def get_forgetting_map(
+    graph_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取整个图谱的遗忘热力图
+    
+    - **graph_id**: 图谱ID
+    
+    一次返回图谱内所有节点的遗忘指数和颜色（列式、base64 编码），
+    代替逐个节点调用 /reviews/forgetting-index/{node_id}
+    """
+    try:
+        # 验证图谱所有权
+        result = await db.execute(
+            select(KnowledgeGraph.id).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == current_user.id
+            )
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+        
+        return await ReviewService.get_forgetting_map(db, graph_id)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取遗忘热力图失败: {str(e)}"
+        )
+
+
+@router.get("/{graph_id}/snapshot", response_model=GraphSnapshotResponse)
+async def get_graph_snapshot(
+    graph_id: UUID,
+    accept: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取图谱快照（渲染整个图谱）
+    
+    - **graph_id**: 图谱ID
+    
+    一次返回所有节点（ID、类型、标题、坐标、掌握程度）和关联（两端节点下标、类型、强度），
+    代替分页拉取节点后逐个节点获取关联。
+    
+    - Accept 为 application/msgpack 时返回 MessagePack，否则返回 JSON
+    - 按 Accept-Encoding 使用 brotli 或 gzip 压缩
+    - 响应带 ETag，图谱未变化时携带 If-None-Match 请求返回 304
+    """
+    try:
+        version = await GraphSnapshotService.get_version(db, graph_id, current_user.id)
+        if version is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+        
+        media_type = GraphSnapshotService.negotiate_media_type(accept)
+        etag = GraphSnapshotService.etag(version, media_type)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Vary": "Accept, Accept-Encoding",
+        }
+        if GraphSnapshotService.etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        snapshot = await GraphSnapshotService.build(db, graph_id, version)
+        # 序列化和压缩在线程池中执行，避免阻塞事件循环
+        body, encoding = await run_in_threadpool(
+            GraphSnapshotService.encode,
+            snapshot,
+            media_type,
+            GraphSnapshotService.negotiate_encoding(accept_encoding)
+        )
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=media_type, headers=headers)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取图谱快照失败: {str(e)}"
+        )
+
+
+@router.post("/{graph_id}/layout", response_model=GraphLayoutResponse)
+async def compute_graph_layout(
+    graph_id: UUID,
+    layout_request: GraphLayoutRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    在服务端计算图谱布局并写回节点坐标
+    
+    - **graph_id**: 图谱ID
+    - **view_config_id**: 视图配置ID（可选，使用其布局引擎和布局参数）
+    - **dimensions**: 布局维度 2 或 3（可选）
+    - **iterations**: 迭代次数（可选）
+    - **ideal_edge_length**: 理想边长（可选）
+    - **gravity**: 向中心的引力系数（可选）
+    - **seed**: 随机种子（可选）
+    
+    以节点当前坐标为起点做力导向布局（重复调用逐步收敛），计算在独立进程中执行，
+    完成后一次性更新所有节点坐标；之后通过 /snapshot 获取新坐标。
+    """
+    try:
+        # 验证图谱所有权
+        result = await db.execute(
+            select(KnowledgeGraph.id).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == current_user.id
+            )
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+        
+        layout_engine, layout_params = FORCE_DIRECTED_ENGINE, None
+        if layout_request.view_config_id:
+            result = await db.execute(
+                select(ViewConfig.layout_engine, ViewConfig.layout_params).where(
+                    ViewConfig.id == layout_request.view_config_id,
+                    ViewConfig.graph_id == graph_id,
+                    ViewConfig.user_id == current_user.id
+                )
+            )
+            view_config = result.one_or_none()
+            if view_config is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="视图配置不存在"
+                )
+            layout_engine, layout_params = view_config
+        
+        if layout_engine != FORCE_DIRECTED_ENGINE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的布局引擎: {layout_engine}"
+            )
+        
+        try:
+            params = GraphLayoutService.resolve_params(
+                layout_params, layout_request.model_dump(exclude={"view_config_id"}, exclude_none=True)
+            )
+            stats = await GraphLayoutService.compute(db, graph_id, params)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        
+        await db.commit()
+        
+        return {"graph_id": graph_id, "layout_engine": layout_engine, **stats}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"计算图谱布局失败: {str(e)}"
+        )
+
+
+@router.patch("/{graph_id}/positions", response_model=NodePositionsUpdateResponse)
+async def update_node_positions(
+    graph_id: UUID,
+    positions: NodePositionsUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量更新节点坐标
+    
+    - **graph_id**: 图谱ID
+    - **node_ids**: 节点ID列表
+    - **position_x** / **position_y**: 坐标（与 node_ids 一一对应）
+    - **position_z**: Z坐标（可选）
+    - **client_id**: 客户端标识（可选）
+    - **sequence**: 客户端递增序号（可选）
+    
+    代替拖动或自动排列时逐个节点调用 PUT /nodes/{id}：只验证一次图谱所有权，
+    所有坐标用一条 UPDATE 写入。同一客户端连续发送的请求会合并写入，
+    同一节点只写入最新的坐标；不在该图谱中或已删除的节点计入 rejected。
+    """
+    if len(positions.node_ids) > settings.NODE_POSITIONS_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多更新 {settings.NODE_POSITIONS_MAX_BATCH} 个节点"
+        )
+    
+    try:
+        # 验证图谱所有权
+        result = await db.execute(
+            select(KnowledgeGraph.id).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == current_user.id
+            )
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+        
+        return await node_position_coalescer.submit(
+            db,
+            graph_id,
+            positions.node_ids,
+            positions.position_x,
+            positions.position_y,
+            positions.position_z,
+            client_id=positions.client_id,
+            sequence=positions.sequence
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量更新节点坐标失败: {str(e)}"
+        )
+
+
+@router.post("/{graph_id}/imports", response_model=NodeImportResponse, status_code=status.HTTP_201_CREATED)
+async def import_nodes(
+    graph_id: UUID,
+    file: UploadFile = File(..., description="导入文件（JSONL、CSV 或 Anki 牌组 .apkg）"),
+    format: Optional[str] = Query(
+        None, pattern=f"^({'|'.join(IMPORT_FORMATS)})$", description="文件格式（默认按扩展名推断）"
+    ),
+    node_type: str = Query("QUESTION", min_length=1, max_length=20, description="记录未指定类型时的节点类型"),
+    import_id: Optional[str] = Query(
+        None, min_length=1, max_length=64, description="导入ID（可选，用于在导入过程中查询进度）"
+    ),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量导入节点
+    
+    - **graph_id**: 图谱ID
+    - **file**: 导入文件
+    - **format**: jsonl, csv 或 apkg（可选，默认按扩展名推断）
+    - **node_type**: 默认节点类型（默认 QUESTION）
+    - **import_id**: 导入ID（可选）
+    
+    JSONL 每行一个对象，CSV 首行为列名：title 必填，可选 key, node_type, summary, content_data,
+    tags, relations（目标记录的 key，CSV 中用分号分隔，写作 "类型:key"）和 position_x/y/z；
+    Anki 牌组的每条笔记导入为一个问答节点，笔记标签导入为知识点标签。
+    
+    代替逐个调用 POST /nodes：文件增量解析，节点、标签和关联按块用 COPY 写入，
+    图谱节点数等计数在最后一次更新；整个导入在一个事务中完成，不合法的记录跳过并在结果中报告。
+    """
+    import_format = format or detect_format(file.filename)
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"无法识别文件格式，请指定 format: {', '.join(IMPORT_FORMATS)}"
+        )
+    if file.size is not None and file.size > settings.NODE_IMPORT_MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"导入文件不能超过 {settings.NODE_IMPORT_MAX_FILE_SIZE // (1024 * 1024)}MB"
+        )
+    
+    try:
+        # 验证图谱所有权
+        result = await db.execute(
+            select(KnowledgeGraph.id).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == current_user.id
+            )
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+        
+        return await node_import_service.import_file(
+            db,
+            graph_id,
+            current_user.id,
+            file.file,
+            import_format,
+            default_node_type=node_type.upper(),
+            import_id=import_id
+        )
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量导入节点失败: {str(e)}"
+        )
+
+
+@router.get("/{graph_id}/imports/{import_id}", response_model=NodeImportResponse)
+async def get_import_progress(
+    graph_id: UUID,
+    import_id: str,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    查询批量导入的进度
+    
+    - **graph_id**: 图谱ID
+    - **import_id**: 导入时指定的导入ID
+    
+    进度保存在处理导入的服务进程内，只保留最近的导入。
+    """
+    result = await db.execute(
+        select(KnowledgeGraph.id).where(
+            KnowledgeGraph.id == graph_id,
+            KnowledgeGraph.user_id == current_user.id
+        )
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="知识图谱不存在"
+        )
+    
+    progress = node_import_service.get_progress(graph_id, import_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="导入记录不存在"
+        )
+    return progress
+
+
+@router.get("/{graph_id}/export")
+async def export_graph(
+    graph_id: UUID,
+    format: str = Query("ndjson", pattern=f"^({'|'.join(EXPORT_FORMATS)})$", description="导出格式"),
+    embeddings: str = Query(
+        "exclude", pattern=f"^({'|'.join(EMBEDDING_MODES)})$", description="向量列的导出方式"
+    ),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    导出图谱
+    
+    - **graph_id**: 图谱ID
+    - **format**: ndjson 或 parquet（默认 ndjson）
+    - **embeddings**: exclude 不导出向量，binary 导出为 float32 小端字节（默认 exclude）
+    
+    导出未删除的节点、标签、节点标签、关联和复习记录，各表来自同一数据库快照：
+    
+    - ndjson：每行一条记录，type 字段为 graph, node, tag, node_tag, relation, review_log，
+      最后一行 type 为 end，带各表的行数；向量为 base64 编码
+    - parquet：ZIP 压缩包，每张表一个 Parquet 文件（按行组写入），graph.json 为图谱信息和行数
+    
+    数据用服务端游标分批读取、边读边发送，图谱再大也不会一次加载到内存。
+    """
+    if format == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="服务端未安装 pyarrow，不支持 Parquet 导出"
+        )
+    
+    try:
+        # 验证图谱所有权
+        result = await db.execute(
+            select(KnowledgeGraph.id).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == current_user.id
+            )
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="知识图谱不存在"
+            )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"导出图谱失败: {str(e)}"
+        )
+    
+    if format == "parquet":
+        media_type, filename = PARQUET_ARCHIVE_MEDIA_TYPE, f"graph-{graph_id}.zip"
+    else:
+        media_type, filename = NDJSON_MEDIA_TYPE, f"graph-{graph_id}.ndjson"
+    # 导出使用独立的数据库连接，响应发送期间不依赖请求的会话
+    return StreamingResponse(
+        GraphExportService.stream(db.bind, graph_id, format, embeddings),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -2,7 +2,7 @@
 记忆节点相关的 API 端点
 """
 
-from typing import List, Optional
+from typing import List, Optional, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
@@ -10,12 +10,13 @@ from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.database import get_db
+from app.core.pagination import count_rows, paginate_by_cursor
 from app.core.deps import get_current_user
 from app.models.knowledge_graph import KnowledgeGraph
-from app.models.memory_node import MemoryNode
+from app.models.memory_node import MasteryLevel, MemoryNode, node_load_options
 from app.models.node_relation import NodeRelation
 from app.models.user import User
-from app.schemas.common import PaginatedResponse
+from app.schemas.common import CursorPaginatedResponse, PaginatedResponse
 from app.schemas.memory_node import (
     MemoryNodeCreate,
     MemoryNodeDetailResponse,
@@ -25,6 +26,10 @@ from app.schemas.memory_node import (
     NodeRelationCreate,
     NodeRelationResponse,
 )
+from app.services.graph_adjacency_service import graph_adjacency_cache
+from app.services.review_due_index import review_due_index
+from app.services.review_service import review_statistics_cache
+from app.services.user_stats_service import user_stats_service
 
 router = APIRouter()
 
@@ -95,9 +100,12 @@ async def create_memory_node(
         
         # 更新图谱节点计数
         graph.node_count += 1
+        await user_stats_service.record_nodes_created(db, current_user.id)
         
         await db.commit()
         await db.refresh(new_node)
+        await review_due_index.add_nodes([new_node])
+        review_statistics_cache.invalidate(current_user.id)
         
         return new_node
         
@@ -111,12 +119,18 @@ async def create_memory_node(
         )
 
 
-@router.get("/", response_model=PaginatedResponse[MemoryNodeListItem])
+@router.get(
+    "/",
+    response_model=Union[PaginatedResponse[MemoryNodeListItem], CursorPaginatedResponse[MemoryNodeListItem]]
+)
 async def list_memory_nodes(
     graph_id: Optional[UUID] = Query(None, description="知识图谱ID"),
     node_type: Optional[str] = Query(None, description="节点类型"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$", description="分页模式: offset 或 cursor"),
+    cursor: Optional[str] = Query(None, description="游标分页：上一页返回的 next_cursor"),
+    total: str = Query("none", pattern="^(none|estimate|exact)$", description="游标分页的总数: none, estimate, exact"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -127,10 +141,13 @@ async def list_memory_nodes(
     - **node_type**: 节点类型过滤（可选）
     - **page**: 页码（默认 1）
     - **page_size**: 每页数量（默认 20，最大 100）
+    - **pagination**: 分页模式，cursor 按 (updated_at, id) 翻页，深分页不变慢（传入 cursor 时自动使用）
+    - **cursor**: 游标分页的下一页游标
+    - **total**: 游标分页是否返回总数（none 不返回、estimate 估算、exact 精确）
     """
     try:
-        # 构建查询
-        query = select(MemoryNode).join(
+        # 构建查询（列表只加载摘要列，不加载内容和向量）
+        query = select(MemoryNode).options(node_load_options("list")).join(
             KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
         ).where(
             KnowledgeGraph.user_id == current_user.id
@@ -144,11 +161,24 @@ async def list_memory_nodes(
         if node_type:
             query = query.where(MemoryNode.node_type == node_type)
         
+        # 游标分页
+        if pagination == "cursor" or cursor:
+            nodes, next_cursor = await paginate_by_cursor(
+                db, query, MemoryNode.updated_at, MemoryNode.id, cursor, page_size
+            )
+            return CursorPaginatedResponse.create(
+                items=nodes,
+                next_cursor=next_cursor,
+                page_size=page_size,
+                total=await count_rows(db, query, total),
+                total_is_estimate=total == "estimate"
+            )
+        
         # 按更新时间倒序排列
         query = query.order_by(MemoryNode.updated_at.desc())
         
         # 获取总数
-        count_query = select(func.count()).select_from(query.subquery())
+        count_query = query.with_only_columns(func.count(MemoryNode.id)).order_by(None)
         total_result = await db.execute(count_query)
         total = total_result.scalar()
         
@@ -166,6 +196,11 @@ async def list_memory_nodes(
             page_size=page_size
         )
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -186,7 +221,7 @@ async def get_memory_node(
     """
     # 查询节点
     result = await db.execute(
-        select(MemoryNode).join(
+        select(MemoryNode).options(node_load_options("full")).join(
             KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
         ).where(
             MemoryNode.id == node_id,
@@ -224,7 +259,7 @@ async def update_memory_node(
     try:
         # 查询节点
         result = await db.execute(
-            select(MemoryNode).join(
+            select(MemoryNode).options(node_load_options("full")).join(
                 KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
             ).where(
                 MemoryNode.id == node_id,
@@ -287,9 +322,9 @@ async def delete_memory_node(
     注意：删除节点会级联删除所有相关的关联和复习记录
     """
     try:
-        # 查询节点
+        # 查询节点（ORM 删除需要外键列，掌握程度用于更新统计快照）
         result = await db.execute(
-            select(MemoryNode).join(
+            select(MemoryNode).options(node_load_options("full")).join(
                 KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
             ).where(
                 MemoryNode.id == node_id,
@@ -306,6 +341,8 @@ async def delete_memory_node(
         
         # 获取图谱ID用于更新计数
         graph_id = node.graph_id
+        node_user_id = node.user_id
+        is_mastered = (node.mastery_level or "").lower() == MasteryLevel.MASTERED.value
         
         # 删除节点（级联删除相关数据）
         await db.delete(node)
@@ -317,8 +354,13 @@ async def delete_memory_node(
         graph = graph_result.scalar_one_or_none()
         if graph:
             graph.node_count = max(0, graph.node_count - 1)
+        await user_stats_service.record_nodes_deleted(db, node_user_id, mastered=int(is_mastered))
+        # 节点的关联随节点级联删除
+        await graph_adjacency_cache.bump_version(db, graph_id)
         
         await db.commit()
+        await review_due_index.remove_node(node_id, node_user_id, graph_id)
+        review_statistics_cache.invalidate(node_user_id)
         
         return None
         
@@ -361,7 +403,7 @@ async def create_node_relation(
         
         # 验证源节点
         source_result = await db.execute(
-            select(MemoryNode).join(
+            select(MemoryNode).options(node_load_options("list")).join(
                 KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
             ).where(
                 MemoryNode.id == relation_data.source_node_id,
@@ -378,7 +420,7 @@ async def create_node_relation(
         
         # 验证目标节点
         target_result = await db.execute(
-            select(MemoryNode).join(
+            select(MemoryNode).options(node_load_options("list")).join(
                 KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
             ).where(
                 MemoryNode.id == relation_data.target_node_id,
@@ -419,6 +461,7 @@ async def create_node_relation(
         )
         
         db.add(new_relation)
+        await graph_adjacency_cache.bump_version(db, source_node.graph_id)
         await db.commit()
         await db.refresh(new_relation)
         
@@ -450,7 +493,7 @@ async def get_node_relations(
     try:
         # 验证节点所有权
         node_result = await db.execute(
-            select(MemoryNode).join(
+            select(MemoryNode).options(node_load_options("list")).join(
                 KnowledgeGraph, MemoryNode.graph_id == KnowledgeGraph.id
             ).where(
                 MemoryNode.id == node_id,
@@ -516,6 +559,7 @@ async def delete_node_relation(
         
         # 删除关联
         await db.delete(relation)
+        await graph_adjacency_cache.bump_version(db, relation.graph_id)
         await db.commit()
         
         return None
@@ -2,42 +2,42 @@
 OCR 识别相关的 API 端点
 """
 
-import time
-from pathlib import Path
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_admin_user
+from app.core.deps import get_current_user
+from app.core.config import settings
 from app.core.database import get_db
 from app.models import User, FileUpload
-from app.schemas.file_upload import OCRRequest, OCRResponse
-from app.services.ocr_service import ocr_service
+from app.schemas.file_upload import OCRCacheStats, OCRJobCreate, OCRJobResponse, OCRRequest, OCRResponse
+from app.services.ocr_cache_service import ocr_result_cache
+from app.services.ocr_job_service import TERMINAL_STATUSES, local_file_path, ocr_job_queue
 
 
 router = APIRouter()
 
 
-@router.post("/ocr", response_model=OCRResponse)
-async def recognize_text(
-    ocr_request: OCRRequest,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
-):
+async def get_image_file(db: AsyncSession, file_id: UUID, current_user: User) -> FileUpload:
     """
-    对上传的图片进行 OCR 识别
+    查询要识别的图片文件并检查是否可以识别
     
-    - **file_id**: 文件ID
-    - **ocr_engine**: OCR引擎选择 (baidu, tencent, auto)
+    Args:
+        db: 数据库会话
+        file_id: 文件ID
+        current_user: 当前用户
     
-    返回识别的文本和置信度
+    Returns:
+        文件记录
     """
     # 查询文件记录
     result = await db.execute(
         select(FileUpload).where(
-            FileUpload.id == ocr_request.file_id,
+            FileUpload.id == file_id,
             FileUpload.user_id == current_user.id
         )
     )
@@ -52,9 +52,8 @@ async def recognize_text(
     
     # 获取文件路径
     # 如果使用本地存储，从 file_url 解析路径
-    if file_upload.file_url.startswith("/uploads/"):
-        file_path = Path("uploads") / file_upload.file_url.replace("/uploads/", "")
-    else:
+    file_path = local_file_path(file_upload.file_url)
+    if file_path is None:
         # 如果使用 OSS，需要先下载文件
         # TODO: 实现从 OSS 下载文件的逻辑
         raise HTTPException(status_code=501, detail="暂不支持 OSS 文件的 OCR 识别")
@@ -63,48 +62,72 @@ async def recognize_text(
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在于服务器")
     
-    # 更新文件状态为处理中
-    file_upload.status = "processing"
-    await db.commit()
+    return file_upload
+
+
+async def recognize_and_wait(db: AsyncSession, ocr_request: OCRRequest, current_user: User, mode: str) -> OCRResponse:
+    """
+    提交 OCR 任务并等待结果（/ocr 和 /ocr/math 共用）
+    
+    结果缓存命中时直接返回；否则本进程启动了工作协程时等待任务完成，
+    没有工作协程时在当前请求中处理任务，两种方式都经过任务队列的限速和重试。
+    """
+    file_upload = await get_image_file(db, ocr_request.file_id, current_user)
+    file_id = file_upload.id
+    job = await ocr_job_queue.submit(
+        db, file_upload, mode=mode, engine=ocr_request.ocr_engine, bypass_cache=ocr_request.bypass_cache
+    )
+    job_id = job.id
     
-    try:
-        # 执行 OCR 识别
-        start_time = time.time()
-        text, confidence, raw_result = await ocr_service.ocr_image(
-            file_path,
-            engine=ocr_request.ocr_engine
-        )
-        processing_time = time.time() - start_time
-        
-        # 更新文件记录
-        file_upload.status = "completed"
-        file_upload.processing_result = {
-            "ocr_text": text,
-            "confidence": confidence,
-            "engine": raw_result.get("engine", ocr_request.ocr_engine),
-            "processing_time": processing_time
-        }
-        await db.commit()
-        
-        return OCRResponse(
-            file_id=file_upload.id,
-            text=text,
-            confidence=confidence,
-            engine=raw_result.get("engine", ocr_request.ocr_engine),
-            raw_result=raw_result.get("raw_result"),
-            processing_time=processing_time
-        )
+    if job.status not in TERMINAL_STATUSES:
+        if ocr_job_queue.running:
+            job = await ocr_job_queue.wait(db.bind, job_id, settings.OCR_JOB_SYNC_TIMEOUT)
+        else:
+            await ocr_job_queue.run_until_done(db.bind, job_id, settings.OCR_JOB_SYNC_TIMEOUT)
+            job = await ocr_job_queue.get_job(db, job_id)
     
-    except Exception as e:
-        # 更新文件状态为失败
-        file_upload.status = "failed"
-        file_upload.error_message = str(e)
-        await db.commit()
-        
+    if job is None:
+        # 等待期间文件被删除（任务级联删除）
+        raise HTTPException(status_code=404, detail="文件不存在")
+    if job.status == "failed":
         raise HTTPException(
             status_code=500,
-            detail=f"OCR 识别失败: {str(e)}"
+            detail=f"OCR 识别失败: {job.error_message}"
         )
+    if job.status != "completed":
+        raise HTTPException(
+            status_code=504,
+            detail=f"OCR 识别超时，可通过 /ocr/jobs/{job_id} 查询结果"
+        )
+    
+    return OCRResponse(
+        file_id=file_id,
+        text=job.result["ocr_text"],
+        confidence=job.result["confidence"],
+        engine=job.result["engine"],
+        raw_result=job.result.get("raw_result"),
+        processing_time=job.result["processing_time"],
+        cached=job.result.get("cached", False)
+    )
+
+
+@router.post("/ocr", response_model=OCRResponse)
+async def recognize_text(
+    ocr_request: OCRRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    对上传的图片进行 OCR 识别
+    
+    - **file_id**: 文件ID
+    - **ocr_engine**: OCR引擎选择 (baidu, tencent, auto, fake)
+    - **bypass_cache**: 跳过结果缓存，强制重新识别
+    
+    相同内容的图片直接返回缓存的结果（cached 为 true）；识别通过任务队列进行，超过 OCR_JOB_SYNC_TIMEOUT 未完成时返回 504，
+    之后可通过 /ocr/jobs/{job_id} 查询。不需要等待结果时使用 POST /ocr/jobs。
+    """
+    return await recognize_and_wait(db, ocr_request, current_user, "text")
 
 
 @router.post("/ocr/math", response_model=OCRResponse)
@@ -121,73 +144,93 @@ async def recognize_math(
     
     返回识别的文本（包含 LaTeX 格式的数学公式）
     """
-    # 查询文件记录
-    result = await db.execute(
-        select(FileUpload).where(
-            FileUpload.id == ocr_request.file_id,
-            FileUpload.user_id == current_user.id
-        )
-    )
-    file_upload = result.scalar_one_or_none()
+    return await recognize_and_wait(db, ocr_request, current_user, "math")
+
+
+@router.post("/jobs", response_model=OCRJobResponse, status_code=202)
+async def submit_ocr_job(
+    job_request: OCRJobCreate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    提交 OCR 任务（立即返回）
     
-    if not file_upload:
-        raise HTTPException(status_code=404, detail="文件不存在")
+    - **file_id**: 文件ID
+    - **ocr_engine**: OCR引擎选择 (baidu, tencent, auto, fake)
+    - **mode**: 识别模式 text 或 math
+    - **bypass_cache**: 跳过结果缓存，强制重新识别
     
-    # 检查文件类型
-    if not file_upload.mime_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="只支持图片文件的 OCR 识别")
+    结果缓存命中时返回的任务已完成；否则任务由后台工作协程按引擎限速处理，失败时自动重试；
+    通过 GET /ocr/jobs/{job_id} 查询状态和结果，或订阅 GET /ocr/jobs/{job_id}/events。
+    """
+    file_upload = await get_image_file(db, job_request.file_id, current_user)
+    return await ocr_job_queue.submit(
+        db, file_upload, mode=job_request.mode, engine=job_request.ocr_engine, bypass_cache=job_request.bypass_cache
+    )
+
+
+@router.get("/cache/stats", response_model=OCRCacheStats)
+async def get_ocr_cache_stats(
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    获取 OCR 结果缓存统计（仅管理员）
     
-    # 获取文件路径
-    if file_upload.file_url.startswith("/uploads/"):
-        file_path = Path("uploads") / file_upload.file_url.replace("/uploads/", "")
-    else:
-        raise HTTPException(status_code=501, detail="暂不支持 OSS 文件的 OCR 识别")
+    返回当前进程的命中率、命中、未命中、跳过和淘汰计数，用于调整缓存容量
+    """
+    if not settings.OCR_CACHE_ENABLED:
+        raise HTTPException(status_code=404, detail="OCR 结果缓存未启用")
     
-    # 检查文件是否存在
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="文件不存在于服务器")
+    return OCRCacheStats(**ocr_result_cache.stats())
+
+
+@router.get("/jobs/{job_id}", response_model=OCRJobResponse)
+async def get_ocr_job(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    查询 OCR 任务的状态和结果
     
-    # 更新文件状态为处理中
-    file_upload.status = "processing"
-    await db.commit()
+    - **job_id**: 任务ID
+    """
+    job = await ocr_job_queue.get_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR 任务不存在")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_ocr_job_events(
+    job_id: UUID,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    订阅 OCR 任务的状态变化（Server-Sent Events）
     
-    try:
-        # 执行数学公式 OCR 识别
-        start_time = time.time()
-        text, confidence, raw_result = await ocr_service.ocr_with_math(
-            file_path,
-            engine=ocr_request.ocr_engine
-        )
-        processing_time = time.time() - start_time
-        
-        # 更新文件记录
-        file_upload.status = "completed"
-        file_upload.processing_result = {
-            "ocr_text": text,
-            "confidence": confidence,
-            "engine": raw_result.get("engine", ocr_request.ocr_engine),
-            "processing_time": processing_time,
-            "has_math": True
-        }
-        await db.commit()
-        
-        return OCRResponse(
-            file_id=file_upload.id,
-            text=text,
-            confidence=confidence,
-            engine=raw_result.get("engine", ocr_request.ocr_engine),
-            raw_result=raw_result.get("raw_result"),
-            processing_time=processing_time
-        )
+    - **job_id**: 任务ID
     
-    except Exception as e:
-        # 更新文件状态为失败
-        file_upload.status = "failed"
-        file_upload.error_message = str(e)
-        await db.commit()
-        
-        raise HTTPException(
-            status_code=500,
-            detail=f"OCR 识别失败: {str(e)}"
-        )
-
+    每次状态变化发送一条事件（事件名为任务状态，数据与 GET /ocr/jobs/{job_id} 相同），
+    任务完成或失败后关闭连接。
+    """
+    job = await ocr_job_queue.get_job(db, job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR 任务不存在")
+    
+    async def events():
+        async for snapshot in ocr_job_queue.watch(db.bind, job_id):
+            if snapshot is None:
+                yield b": keep-alive\n\n"
+                continue
+            data = OCRJobResponse.model_validate(snapshot).model_dump_json()
+            yield f"event: {snapshot.status}\ndata: {data}\n\n".encode("utf-8")
+    
+    # 状态查询使用独立的会话，响应发送期间不依赖请求的会话
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -10,18 +10,52 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
 from app.schemas.review import (
+    BatchReviewRequest,
+    BatchReviewResponse,
     ReviewRequest,
     ReviewResponse,
     ReviewQueueRequest,
     ReviewQueueResponse,
     ReviewStatistics,
+    ReviewForecastResponse,
     ReviewNodeInfo
 )
+from app.services.review_forecast_service import DEFAULT_RUNS, review_forecast_service
 from app.services.review_service import ReviewService, ReviewMode
 
 router = APIRouter()
 
 
+@router.post("/batch", response_model=BatchReviewResponse)
+async def submit_review_batch(
+    batch: BatchReviewRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    批量提交复习记录（离线复习同步）
+    
+    - **items**: 按复习发生顺序排列的复习列表（最多 500 条）
+      - **client_review_id**: 客户端生成的唯一 ID，重复提交的复习会被跳过（状态 duplicate）
+      - **node_id**: 节点 ID
+      - **quality**: 复习质量评分 (0-5)
+      - **review_duration**: 复习时长（秒）
+      - **reviewed_at**: 实际复习时间（可选）
+    
+    同一节点的多次复习按顺序累积计算；不存在或无权访问的节点返回 not_found，不影响其他复习。
+    整批在一个事务中提交。
+    """
+    try:
+        return await ReviewService.submit_review_batch(
+            db=db,
+            user_id=str(current_user.id),
+            items=[item.model_dump() for item in batch.items]
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量提交复习记录失败: {str(e)}")
+
+
 @router.post("/{node_id}", response_model=ReviewResponse)
 async def submit_review(
     node_id: str,
@@ -71,7 +105,7 @@ async def get_review_queue(
     - **spaced**: 间隔重复模式（基于遗忘曲线，推荐）
     - **focused**: 集中攻克模式（针对薄弱知识点）
     - **random**: 随机抽查模式
-    - **graph_traversal**: 图谱遍历模式（按创建时间顺序）
+    - **graph_traversal**: 图谱遍历模式（从到期或薄弱的节点出发，前置知识优先，沿节点关联遍历）
     """
     try:
         # 验证复习模式
@@ -130,6 +164,35 @@ async def get_review_statistics(
         raise HTTPException(status_code=500, detail=f"获取复习统计失败: {str(e)}")
 
 
+@router.get("/forecast", response_model=ReviewForecastResponse)
+async def get_review_forecast(
+    days: int = Query(30, ge=1, le=365, description="预测天数"),
+    runs: int = Query(DEFAULT_RUNS, ge=1, le=128, description="蒙特卡洛模拟轮次"),
+    graph_id: Optional[str] = Query(None, description="知识图谱 ID（可选）"),
+    seed: Optional[int] = Query(None, description="随机种子（固定后结果可复现）"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    预测未来每天的复习负载
+    
+    以每张卡片当前的 SM-2 状态为起点，按用户历史复习质量分布模拟复习，
+    返回每天到期复习数的平均值和 p10/p50/p90 分位数（用于容量规划和新卡片限流）。
+    假设每张卡片都在到期当天复习，已逾期的卡片计入今天。
+    """
+    try:
+        return await review_forecast_service.forecast(
+            db=db,
+            user_id=current_user.id,
+            graph_id=graph_id,
+            days=days,
+            runs=runs,
+            seed=seed
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"预测复习负载失败: {str(e)}")
+
+
 @router.get("/forgetting-index/{node_id}")
 async def get_forgetting_index(
     node_id: str,
@@ -147,12 +210,12 @@ async def get_forgetting_index(
     - 0.8-1.0: 红色 - 即将遗忘
     """
     from sqlalchemy import select
-    from app.models.memory_node import MemoryNode
+    from app.models.memory_node import MemoryNode, node_load_options
     
     try:
         # 查询节点
         result = await db.execute(
-            select(MemoryNode).where(MemoryNode.id == node_id)
+            select(MemoryNode).options(node_load_options("review")).where(MemoryNode.id == node_id)
         )
         node = result.scalar_one_or_none()
         
@@ -2,13 +2,15 @@
 向量搜索 API 端点
 """
 
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user, get_db
+from app.api.deps import get_current_admin_user, get_current_user, get_db
+from app.core.config import settings
 from app.models.user import User
 from app.schemas.vector_search import (
     VectorSearchRequest,
@@ -20,7 +22,14 @@ from app.schemas.vector_search import (
     NodeClusterResult,
     EmbeddingUpdateRequest,
     EmbeddingUpdateResponse,
+    EmbeddingBackfillReport,
+    VectorIndexStatusResponse,
+    VectorIndexBuildResponse,
+    VectorIndexRecallResponse,
 )
+from app.services.clustering_service import ClusterMode, ClusteringEngine
+from app.services.embedding_backfill_service import embedding_backfill_service
+from app.services.vector_index_service import vector_index_service
 from app.services.vector_search_service import vector_search_service
 
 
@@ -41,6 +50,8 @@ async def search_similar_nodes(
     - **node_type**: 限制节点类型（可选）
     - **limit**: 返回结果数量（1-50）
     - **similarity_threshold**: 相似度阈值（0-1）
+    - **ef_search**: HNSW 查询候选集大小（可选，越大召回越高、越慢）
+    - **probes**: IVFFlat 探测聚类数（可选，越大召回越高、越慢）
     """
     try:
         results = await vector_search_service.search_similar_nodes(
@@ -50,6 +61,8 @@ async def search_similar_nodes(
             node_type=request.node_type,
             limit=request.limit,
             similarity_threshold=request.similarity_threshold,
+            ef_search=request.ef_search,
+            probes=request.probes,
         )
         
         # 转换为响应格式
@@ -83,6 +96,8 @@ async def find_similar_nodes(
     node_type: str = Query(None, description="限制节点类型"),
     limit: int = Query(10, ge=1, le=50, description="返回结果数量"),
     similarity_threshold: float = Query(0.7, ge=0.0, le=1.0, description="相似度阈值"),
+    ef_search: int = Query(None, ge=1, le=1000, description="HNSW 查询候选集大小"),
+    probes: int = Query(None, ge=1, le=1000, description="IVFFlat 探测聚类数"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -94,6 +109,8 @@ async def find_similar_nodes(
     - **node_type**: 限制节点类型（可选）
     - **limit**: 返回结果数量（1-50）
     - **similarity_threshold**: 相似度阈值（0-1）
+    - **ef_search**: HNSW 查询候选集大小（可选）
+    - **probes**: IVFFlat 探测聚类数（可选）
     """
     try:
         results = await vector_search_service.find_similar_nodes_by_id(
@@ -103,6 +120,8 @@ async def find_similar_nodes(
             node_type=node_type,
             limit=limit,
             similarity_threshold=similarity_threshold,
+            ef_search=ef_search,
+            probes=probes,
         )
         
         return [
@@ -126,6 +145,8 @@ async def find_similar_nodes(
 async def recommend_related_nodes(
     node_id: UUID,
     limit: int = Query(5, ge=1, le=20, description="推荐数量"),
+    ef_search: int = Query(None, ge=1, le=1000, description="HNSW 查询候选集大小"),
+    probes: int = Query(None, ge=1, le=1000, description="IVFFlat 探测聚类数"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -134,12 +155,16 @@ async def recommend_related_nodes(
     
     - **node_id**: 节点ID
     - **limit**: 推荐数量（1-20）
+    - **ef_search**: HNSW 查询候选集大小（可选）
+    - **probes**: IVFFlat 探测聚类数（可选）
     """
     try:
         results = await vector_search_service.recommend_related_nodes(
             db=db,
             node_id=node_id,
             limit=limit,
+            ef_search=ef_search,
+            probes=probes,
         )
         
         return [
@@ -163,6 +188,10 @@ async def recommend_related_nodes(
 async def cluster_nodes(
     graph_id: UUID,
     similarity_threshold: float = Query(0.8, ge=0.0, le=1.0, description="相似度阈值"),
+    mode: str = Query("greedy", description="聚类模式：greedy, connected, agglomerative, kmeans"),
+    n_clusters: Optional[int] = Query(None, ge=1, le=1000, description="簇数（仅 kmeans 模式，默认 sqrt(N/2)）"),
+    tile_size: Optional[int] = Query(None, ge=64, le=8192, description="相似度分块大小（控制内存占用）"),
+    stream: bool = Query(False, description="是否以 NDJSON 流式返回，每行一个簇"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -170,13 +199,53 @@ async def cluster_nodes(
     基于相似度对知识图谱中的节点进行聚类
     
     - **graph_id**: 知识图谱ID
-    - **similarity_threshold**: 相似度阈值（0-1）
+    - **similarity_threshold**: 相似度阈值（0-1，kmeans 模式不使用）
+    - **mode**: 聚类模式
+        - **greedy**: 贪心聚类（默认，以未访问节点为种子吸收相似节点）
+        - **connected**: 连通分量（相似关系传递）
+        - **agglomerative**: 平均链接层次聚类
+        - **kmeans**: 球面 K-Means
+    - **stream**: 为 true 时返回 application/x-ndjson，簇在计算出来后逐行输出
     """
     try:
+        try:
+            cluster_mode = ClusterMode(mode)
+        except ValueError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的聚类模式: {mode}。支持的模式: greedy, connected, agglomerative, kmeans"
+            )
+        
+        if stream:
+            node_ids, matrix = await vector_search_service.load_graph_embeddings(db, graph_id)
+            try:
+                ClusteringEngine.validate(cluster_mode, len(node_ids))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            def generate_lines():
+                clusters = vector_search_service.iter_clusters(
+                    node_ids,
+                    matrix,
+                    similarity_threshold=similarity_threshold,
+                    mode=cluster_mode,
+                    n_clusters=n_clusters,
+                    tile_size=tile_size,
+                )
+                for idx, cluster in enumerate(clusters):
+                    result = NodeClusterResult(cluster_id=idx, node_ids=cluster, size=len(cluster))
+                    yield result.model_dump_json() + "\n"
+            
+            # 同步生成器由 Starlette 在线程池中迭代，不阻塞事件循环
+            return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
+        
         clusters = await vector_search_service.cluster_nodes_by_similarity(
             db=db,
             graph_id=graph_id,
             similarity_threshold=similarity_threshold,
+            mode=cluster_mode,
+            n_clusters=n_clusters,
+            tile_size=tile_size,
         )
         
         cluster_results = [
@@ -190,6 +259,7 @@ async def cluster_nodes(
         
         return ClusterResponse(
             graph_id=graph_id,
+            mode=cluster_mode.value,
             total_clusters=len(cluster_results),
             clusters=cluster_results,
         )
@@ -250,6 +320,7 @@ async def update_node_embedding(
 @router.post("/batch-update-embedding", response_model=EmbeddingUpdateResponse)
 async def batch_update_embeddings(
     graph_id: UUID = Query(None, description="知识图谱ID（可选，不提供则更新所有）"),
+    restart: bool = Query(False, description="忽略上次中断的检查点，从头开始"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
@@ -257,26 +328,120 @@ async def batch_update_embeddings(
     批量更新节点的向量嵌入
     
     - **graph_id**: 知识图谱ID（可选，不提供则更新所有未生成向量的节点）
+    - **restart**: 是否忽略检查点从头开始（默认从上次中断处继续）
     
-    注意：此操作可能耗时较长，建议在后台任务中执行
+    节点按 token 预算打包成多输入嵌入请求并发执行，结果批量写回；
+    响应中的 report 包含吞吐量（nodes/s、tokens/s）。
     """
     try:
-        updated_count = await vector_search_service.batch_update_embeddings(
+        report = await embedding_backfill_service.run(
             db=db,
             graph_id=graph_id,
+            restart=restart,
         )
+        updated_count = report["updated_count"]
         
         message = f"成功更新 {updated_count} 个节点的向量嵌入"
         if graph_id:
             message += f"（知识图谱: {graph_id}）"
+        if report["failed_count"]:
+            message += f"，{report['failed_count']} 个节点失败"
         
         return EmbeddingUpdateResponse(
             success=True,
             updated_count=updated_count,
             message=message,
+            report=EmbeddingBackfillReport(**report),
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量更新失败: {str(e)}")
 
+
+
+# ==================== 向量索引管理（管理员） ====================
+
+@router.get("/index/status", response_model=VectorIndexStatusResponse)
+async def get_vector_index_status(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    获取向量 ANN 索引状态（管理员）
+    
+    返回现有 HNSW / IVFFlat 索引、正在进行的构建进度以及向量覆盖情况
+    """
+    try:
+        return await vector_index_service.get_index_status(db)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取索引状态失败: {str(e)}")
+
+
+@router.post("/index/build", response_model=VectorIndexBuildResponse, status_code=202)
+async def build_vector_index(
+    background_tasks: BackgroundTasks,
+    index_type: str = Query(None, description="索引类型: hnsw, ivfflat（默认取配置）"),
+    replace: bool = Query(False, description="是否删除另一种类型的索引"),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    在后台并发构建向量 ANN 索引（管理员）
+    
+    - **index_type**: 索引类型（hnsw 或 ivfflat）
+    - **replace**: 构建完成后删除另一种类型的索引
+    
+    构建进度可通过 /index/status 查询
+    """
+    index_type = vector_index_service.validate_index_type(
+        index_type or settings.VECTOR_INDEX_TYPE
+    )
+    background_tasks.add_task(
+        vector_index_service.create_index,
+        index_type=index_type,
+        replace=replace,
+    )
+    
+    return VectorIndexBuildResponse(
+        index_name=vector_index_service.INDEX_NAMES[index_type],
+        index_type=index_type,
+        message="索引构建任务已提交",
+    )
+
+
+@router.get("/index/recall", response_model=VectorIndexRecallResponse)
+async def measure_vector_index_recall(
+    graph_id: UUID = Query(None, description="限制在特定知识图谱"),
+    sample_size: int = Query(20, ge=1, le=200, description="抽样查询数量"),
+    k: int = Query(10, ge=1, le=100, description="Top-K"),
+    ef_search: int = Query(None, ge=1, le=1000, description="HNSW 查询候选集大小"),
+    probes: int = Query(None, ge=1, le=1000, description="IVFFlat 探测聚类数"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_admin_user),
+):
+    """
+    评估 ANN 索引相对精确搜索的召回率（管理员）
+    
+    - **graph_id**: 限制在特定知识图谱（可选）
+    - **sample_size**: 抽样查询数量
+    - **k**: Top-K
+    - **ef_search** / **probes**: 待评估的查询参数
+    
+    注意：精确搜索为全表扫描，数据量大时耗时较长
+    """
+    try:
+        return await vector_index_service.measure_recall(
+            db=db,
+            user_id=current_user.id,
+            graph_id=graph_id,
+            sample_size=sample_size,
+            k=k,
+            ef_search=ef_search,
+            probes=probes,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"评估召回率失败: {str(e)}")
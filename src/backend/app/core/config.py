@@ -36,6 +36,14 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
 
+    # 管理员配置（逗号分隔的邮箱列表，用于运维类接口）
+    ADMIN_EMAILS: str = ""
+
+    @property
+    def admin_emails(self) -> list[str]:
+        """获取管理员邮箱列表"""
+        return [email.strip().lower() for email in self.ADMIN_EMAILS.split(",") if email.strip()]
+
     # CORS 配置
     BACKEND_CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000,http://localhost:3001,http://127.0.0.1:5173,http://127.0.0.1:3000,http://127.0.0.1:3001"
     
@@ -48,6 +56,14 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_IMAGE_TYPES: list[str] = ["image/jpeg", "image/png", "image/jpg"]
 
+    # 图片预处理（在独立进程池中生成 OCR 用的缩小灰度图和 WebP 缩略图，存储在原图旁边）
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_PREPROCESS_WORKERS: int = 2
+    IMAGE_OCR_MAX_SIDE: int = 2048  # OCR 用图的最长边（像素）
+    IMAGE_OCR_JPEG_QUALITY: int = 85
+    IMAGE_THUMBNAIL_SIZES: list[int] = [1024, 512, 256]  # 缩略图的最长边（像素）
+    IMAGE_THUMBNAIL_WEBP_QUALITY: int = 80
+
     # OSS 配置（阿里云对象存储）
     OSS_ACCESS_KEY_ID: Optional[str] = None
     OSS_ACCESS_KEY_SECRET: Optional[str] = None
@@ -57,6 +73,7 @@ class Settings(BaseSettings):
     # AI 服务配置
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4"
+    OPENAI_BASE_URL: str = "https://api.openai.com/v1"  # 可指向兼容 OpenAI 的代理或本地桩服务
     DEEPSEEK_API_KEY: Optional[str] = None
 
     # OCR 服务配置
@@ -64,9 +81,101 @@ class Settings(BaseSettings):
     BAIDU_OCR_API_KEY: Optional[str] = None
     BAIDU_OCR_SECRET_KEY: Optional[str] = None
 
+    # OCR 任务队列（ocr_jobs 表，每个进程按引擎启动工作协程）
+    OCR_JOB_WORKERS_ENABLED: bool = True  # 应用启动时是否启动工作协程
+    OCR_JOB_MAX_ATTEMPTS: int = 3
+    OCR_JOB_RETRY_BASE_DELAY: float = 1.0  # 重试延迟 = [0, base * 2^(n-1)] 内随机（不超过上限）
+    OCR_JOB_RETRY_MAX_DELAY: float = 60.0
+    OCR_JOB_LEASE_SECONDS: int = 300  # 处理中超过该时间的任务视为进程中断，重新领取
+    OCR_JOB_POLL_INTERVAL: float = 1.0  # 空闲工作协程查询队列、SSE 查询状态的间隔（秒）
+    OCR_JOB_SYNC_TIMEOUT: float = 60.0  # /ocr 和 /ocr/math 等待任务完成的最长时间（秒）
+    # 各引擎的并发数（每个进程的工作协程数）和速率上限（每个进程的令牌桶，每秒请求数）
+    BAIDU_OCR_WORKERS: int = 2
+    BAIDU_OCR_QPS: float = 2.0  # 百度 OCR 免费额度 QPS 为 2
+    BAIDU_OCR_BURST: int = 2
+    # 本地模拟 OCR（负载测试用，不调用外部服务）
+    OCR_FAKE_ENABLED: bool = False
+    OCR_FAKE_LATENCY: float = 0.2  # 模拟识别耗时（秒）
+    OCR_FAKE_FAILURE_RATE: float = 0.0  # 随机失败的比例（测试重试）
+    OCR_FAKE_WORKERS: int = 8
+    OCR_FAKE_QPS: float = 50.0
+    OCR_FAKE_BURST: int = 10
+    # OCR 结果缓存（按图片内容 SHA-256 + 引擎 + 识别模式，重复上传的图片不再调用 OCR 服务）
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_LOCAL_MAX_BYTES: int = 8 * 1024 * 1024  # 进程内 LRU 容量
+    OCR_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # ocr_result_cache 表中识别结果的总字节数上限
+    OCR_CACHE_EVICT_INTERVAL: int = 100  # 本进程每写入多少条检查一次表容量
+
+    # 外部 HTTP 客户端配置（按服务商复用连接池）
+    OPENAI_TIMEOUT: float = 60.0
+    DEEPSEEK_TIMEOUT: float = 60.0
+    BAIDU_OCR_TIMEOUT: float = 30.0
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP2_ENABLED: bool = True  # 需要安装 httpx[http2]，未安装时自动回退 HTTP/1.1
+    HTTP_POOL_MAX_CONNECTIONS: int = 20  # 每个服务商的最大连接数
+    HTTP_POOL_MAX_KEEPALIVE: int = 10  # 每个服务商保持的空闲长连接数
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0  # 空闲长连接保留时间（秒）
+    HTTP_SHUTDOWN_TIMEOUT: float = 10.0  # 关闭时等待在途请求的最长时间（秒）
+
     # 向量搜索配置
     EMBEDDING_MODEL: str = "text-embedding-ada-002"
     EMBEDDING_DIMENSION: int = 1536
+    EMBEDDING_MAX_INPUT_TOKENS: int = 8000  # 单条输入的 token 上限，超出截断
+
+    # 向量嵌入缓存配置（键为 模型 + 归一化文本哈希）
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 进程内 LRU 容量，1536 维 float32 约 6KB/条
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    EMBEDDING_CACHE_REDIS_ENABLED: bool = False  # 是否启用 Redis 二级缓存（多进程/多实例共享）
+    EMBEDDING_CACHE_REDIS_DTYPE: str = "float32"  # float16 体积减半，精度约 1e-3
+
+    # 向量回填配置（批量生成缺失的向量嵌入）
+    EMBEDDING_BATCH_MAX_TOKENS: int = 100000  # 单次嵌入请求的 token 预算
+    EMBEDDING_BATCH_MAX_INPUTS: int = 256  # 单次嵌入请求的最大输入条数
+    EMBEDDING_BACKFILL_CONCURRENCY: int = 4  # 同时进行的嵌入请求数
+    EMBEDDING_BACKFILL_FETCH_SIZE: int = 500  # 服务端游标每次读取的行数
+
+    # 向量索引配置（PgVector ANN 索引）
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw 或 ivfflat
+    VECTOR_HNSW_M: int = 16
+    VECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    VECTOR_HNSW_EF_SEARCH: int = 40  # 查询时候选集大小，越大召回越高、越慢
+    VECTOR_IVFFLAT_LISTS: int = 100
+    VECTOR_IVFFLAT_PROBES: int = 10  # 查询时探测的聚类数，越大召回越高、越慢
+
+    # 向量聚类配置
+    CLUSTER_TILE_SIZE: int = 1024  # 相似度分块大小，单块内存约 tile_size^2 * 4 字节
+    CLUSTER_AGGLOMERATIVE_MAX_NODES: int = 5000  # 层次聚类需要 N x N 矩阵，限制节点数
+
+    # 复习统计缓存
+    REVIEW_STATS_CACHE_TTL_SECONDS: float = 0.0  # 统计结果缓存时间（秒），0 表示不缓存
+    REVIEW_STATS_CACHE_MAX_USERS: int = 10000  # 缓存的用户数上限（最近使用的）
+
+    # 复习到期索引（Redis 有序集合，启用后需运行 scripts/rebuild_review_due_index.py 建立索引）
+    REVIEW_DUE_INDEX_ENABLED: bool = False
+
+    # 图谱遍历邻接表缓存（进程内，按图谱）
+    GRAPH_ADJACENCY_CACHE_MAX_GRAPHS: int = 64
+
+    # 服务端图谱布局（力导向，在独立进程池中计算）
+    GRAPH_LAYOUT_WORKERS: int = 2
+    GRAPH_LAYOUT_MAX_NODES: int = 100000
+    GRAPH_LAYOUT_MAX_ITERATIONS: int = 500
+
+    # 批量更新节点坐标（单次请求的节点数上限）
+    NODE_POSITIONS_MAX_BATCH: int = 10000
+    NODE_POSITIONS_SEQUENCE_CLIENTS: int = 1024  # 保留已写入序号的 (图谱, 客户端) 数（最近使用的）
+
+    # 批量导入节点（JSONL/CSV/Anki，按块 COPY 写入）
+    NODE_IMPORT_CHUNK_SIZE: int = 5000  # 每块 COPY 的节点数
+    NODE_IMPORT_MAX_FILE_SIZE: int = 200 * 1024 * 1024  # 200MB
+    NODE_IMPORT_MAX_COLLECTION_SIZE: int = 1024 * 1024 * 1024  # Anki 牌组中集合数据库解压后的上限，1GB
+
+    # 图谱导出（NDJSON/Parquet，服务端游标流式读取）
+    GRAPH_EXPORT_FETCH_SIZE: int = 2000  # 游标每批读取的行数
+    GRAPH_EXPORT_ROW_GROUP_SIZE: int = 10000  # Parquet 每个行组的行数
+    GRAPH_EXPORT_EMBEDDING_FETCH_SIZE: int = 250  # 导出向量时节点表的批大小（每行约 6KB）
+    GRAPH_EXPORT_EMBEDDING_ROW_GROUP_SIZE: int = 2000
 
     # 分页配置
     DEFAULT_PAGE_SIZE: int = 20
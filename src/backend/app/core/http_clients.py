@@ -0,0 +1,203 @@
+"""
+外部 HTTP 客户端管理
+按服务商维护长连接的 httpx.AsyncClient 连接池，由应用生命周期统一创建和关闭
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+try:
+    import h2  # noqa: F401  HTTP/2 需要 httpx[http2]
+    
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """服务商连接池配置"""
+    
+    timeout: float  # 默认读写超时（秒），单次请求可覆盖
+    http2: bool  # 服务商是否支持 HTTP/2
+
+
+# 服务商连接池配置
+PROVIDERS: Dict[str, ProviderConfig] = {
+    "openai": ProviderConfig(timeout=settings.OPENAI_TIMEOUT, http2=True),
+    "deepseek": ProviderConfig(timeout=settings.DEEPSEEK_TIMEOUT, http2=True),
+    "baidu": ProviderConfig(timeout=settings.BAIDU_OCR_TIMEOUT, http2=False),
+}
+
+
+class _PoolMetrics:
+    """单个连接池的计数器"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.handshake_count = 0
+        self.handshake_total_ms = 0.0
+        self.handshake_max_ms = 0.0
+    
+    def record_handshake(self, elapsed_ms: float) -> None:
+        """记录一次新建连接的握手耗时（TCP + TLS）"""
+        self.handshake_count += 1
+        self.handshake_total_ms += elapsed_ms
+        self.handshake_max_ms = max(self.handshake_max_ms, elapsed_ms)
+
+
+class HTTPClientRegistry:
+    """
+    HTTP 客户端注册表
+    
+    每个服务商一个 httpx.AsyncClient，复用 TCP/TLS 连接。
+    应用启动时创建、关闭时等待在途请求结束后释放；
+    没有经过生命周期（脚本、测试）时在首次使用时创建。
+    """
+    
+    def __init__(self):
+        """初始化注册表"""
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._loops: Dict[str, asyncio.AbstractEventLoop] = {}
+        self._metrics: Dict[str, _PoolMetrics] = {name: _PoolMetrics() for name in PROVIDERS}
+    
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        """创建服务商的客户端"""
+        config = PROVIDERS[provider]
+        metrics = self._metrics[provider]
+        
+        async def on_request(request: httpx.Request) -> None:
+            metrics.requests += 1
+            started: Dict[str, float] = {}
+            
+            async def trace(event_name: str, info: dict) -> None:
+                # httpcore 的连接事件：connect_tcp / start_tls 的 started 与 complete
+                if event_name == "connection.connect_tcp.started":
+                    started["handshake"] = time.perf_counter()
+                elif event_name == "connection.connect_tcp.complete":
+                    metrics.connections_opened += 1
+                    if request.url.scheme == "http" and "handshake" in started:
+                        metrics.record_handshake((time.perf_counter() - started.pop("handshake")) * 1000)
+                elif event_name == "connection.start_tls.complete" and "handshake" in started:
+                    metrics.record_handshake((time.perf_counter() - started.pop("handshake")) * 1000)
+            
+            request.extensions["trace"] = trace
+        
+        return httpx.AsyncClient(
+            http2=config.http2 and settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+            timeout=httpx.Timeout(config.timeout, connect=settings.HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [on_request]},
+        )
+    
+    async def start(self) -> None:
+        """创建所有服务商的客户端（应用启动时调用）"""
+        for provider in PROVIDERS:
+            self.get(provider)
+    
+    def get(self, provider: str) -> httpx.AsyncClient:
+        """
+        获取服务商的共享客户端
+        
+        Args:
+            provider: 服务商名称 (openai, deepseek, baidu)
+        
+        Returns:
+            httpx.AsyncClient
+        """
+        if provider not in PROVIDERS:
+            raise KeyError(f"未知的 HTTP 服务商: {provider}")
+        
+        # 连接绑定在事件循环上，循环变化（例如脚本多次 asyncio.run）时重建
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(provider)
+        if client is None or client.is_closed or self._loops.get(provider) is not loop:
+            client = self._create_client(provider)
+            self._clients[provider] = client
+            self._loops[provider] = loop
+        return client
+    
+    @staticmethod
+    def _pool_snapshot(client: httpx.AsyncClient) -> Dict:
+        """读取 httpcore 连接池的当前状态"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        requests = list(getattr(pool, "_requests", []))
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections": len(connections),
+            "in_use": len(connections) - idle,
+            "idle": idle,
+            "waiting": sum(1 for request in requests if request.is_queued()),
+        }
+    
+    def stats(self) -> Dict[str, Dict]:
+        """
+        获取各连接池的指标
+        
+        Returns:
+            服务商 -> 连接数、使用中、空闲、排队等待、握手耗时等指标
+        """
+        result = {}
+        for provider, config in PROVIDERS.items():
+            metrics = self._metrics[provider]
+            client = self._clients.get(provider)
+            pool = (
+                self._pool_snapshot(client)
+                if client is not None and not client.is_closed
+                else {"connections": 0, "in_use": 0, "idle": 0, "waiting": 0}
+            )
+            result[provider] = {
+                **pool,
+                "active": client is not None and not client.is_closed,
+                "http2": config.http2 and settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+                "max_connections": settings.HTTP_POOL_MAX_CONNECTIONS,
+                "requests": metrics.requests,
+                "connections_opened": metrics.connections_opened,
+                "handshake_avg_ms": round(metrics.handshake_total_ms / metrics.handshake_count, 3)
+                if metrics.handshake_count else 0.0,
+                "handshake_max_ms": round(metrics.handshake_max_ms, 3),
+            }
+        return result
+    
+    async def aclose(self, timeout: Optional[float] = None) -> None:
+        """
+        关闭所有客户端（应用关闭时调用）
+        
+        先等待在途请求完成（最多 timeout 秒），再关闭连接。
+        
+        Args:
+            timeout: 等待在途请求的最长时间（默认取配置）
+        """
+        timeout = settings.HTTP_SHUTDOWN_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            busy = any(
+                self._pool_snapshot(client)["in_use"]
+                for client in self._clients.values()
+                if not client.is_closed
+            )
+            if not busy:
+                break
+            await asyncio.sleep(0.05)
+        
+        for client in self._clients.values():
+            if not client.is_closed:
+                await client.aclose()
+        self._clients.clear()
+        self._loops.clear()
+
+
+# 创建全局 HTTP 客户端注册表
+http_clients = HTTPClientRegistry()
@@ -0,0 +1,140 @@
+"""
+游标分页（keyset pagination）
+按 (排序时间列, id) 复合键翻页，避免深分页时 OFFSET 线性变慢；
+游标对客户端不透明，总数可选精确、估算或不返回
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+# 总数模式
+TOTAL_MODES = ("none", "estimate", "exact")
+
+
+def encode_cursor(sort_key: str, sort_value: datetime, row_id: UUID) -> str:
+    """
+    编码游标
+    
+    Args:
+        sort_key: 排序列名（用于校验游标是否属于当前列表）
+        sort_value: 上一页最后一行的排序列值
+        row_id: 上一页最后一行的 ID
+    
+    Returns:
+        URL 安全的游标字符串
+    """
+    payload = json.dumps([sort_key, sort_value.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str) -> Tuple[datetime, UUID]:
+    """
+    解码游标
+    
+    Args:
+        cursor: 游标字符串
+        sort_key: 当前列表的排序列名
+    
+    Returns:
+        (排序列值, ID)
+    
+    Raises:
+        ValueError: 游标格式错误或不属于当前列表
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if key != sort_key:
+            raise ValueError(key)
+        return datetime.fromisoformat(sort_value), UUID(row_id)
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise ValueError("无效的分页游标")
+
+
+async def paginate_by_cursor(
+    db: AsyncSession,
+    query: Select,
+    sort_column: Any,
+    id_column: Any,
+    cursor: Optional[str],
+    page_size: int
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    按 (sort_column, id) 倒序取一页
+    
+    条件写成行比较 (sort_column, id) < (:value, :id)，
+    可以直接使用 (..., sort_column DESC, id DESC) 复合索引，多取一行判断是否还有下一页。
+    
+    Args:
+        db: 数据库会话
+        query: 已加过滤条件、未排序的查询
+        sort_column: 排序时间列
+        id_column: 主键列
+        cursor: 上一页返回的游标（第一页为 None）
+        page_size: 每页数量
+    
+    Returns:
+        (当前页数据, 下一页游标；没有下一页时为 None)
+    
+    Raises:
+        ValueError: 游标无效
+    """
+    sort_key = sort_column.key
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_key)
+        query = query.where(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    
+    query = query.order_by(sort_column.desc(), id_column.desc()).limit(page_size + 1)
+    result = await db.execute(query)
+    items = list(result.scalars().all())
+    
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(sort_key, getattr(last, sort_key), getattr(last, id_column.key))
+    return items, next_cursor
+
+
+async def count_rows(db: AsyncSession, query: Select, mode: str = "exact") -> Optional[int]:
+    """
+    统计查询结果总数
+    
+    - exact: count(*)，大表上较慢
+    - estimate: 取规划器对该查询的行数估计（基于 pg_class.reltuples 和列统计），
+      不扫描数据，适合滚动列表显示“约 N 条”
+    - none: 不统计
+    
+    Args:
+        db: 数据库会话
+        query: 已加过滤条件的查询
+        mode: 总数模式 (none, estimate, exact)
+    
+    Returns:
+        总数；mode 为 none 时返回 None
+    """
+    if mode == "none":
+        return None
+    
+    query = query.order_by(None)
+    if mode == "exact":
+        result = await db.execute(query.with_only_columns(func.count(), maintain_column_froms=True))
+        return result.scalar()
+    
+    # EXPLAIN 不能包装成 SQLAlchemy 语句，按驱动的参数格式直接执行
+    conn = await db.connection()
+    compiled = query.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -4,14 +4,19 @@
 
 from app.core.database import Base
 from app.models.base import TimestampMixin, UUIDMixin, to_dict
+from app.models.embedding_backfill import EmbeddingBackfillCheckpoint
+from app.models.file_blob import FileBlob
 from app.models.file_upload import FileUpload
 from app.models.knowledge_graph import KnowledgeGraph
 from app.models.knowledge_tag import KnowledgeTag
-from app.models.memory_node import MemoryNode
+from app.models.memory_node import NODE_COLUMN_GROUPS, MemoryNode, node_load_options
 from app.models.node_relation import NodeRelation
 from app.models.node_tag import NodeTag
+from app.models.ocr_cache import OCRCacheEntry
+from app.models.ocr_job import OCRJob
 from app.models.review_log import ReviewLog
 from app.models.user import User
+from app.models.user_stats import UserStats
 from app.models.view_config import ViewConfig
 
 __all__ = [
@@ -30,5 +35,13 @@ __all__ = [
     "ViewConfig",
     "ReviewLog",
     "FileUpload",
+    "FileBlob",
+    "OCRJob",
+    "OCRCacheEntry",
+    "EmbeddingBackfillCheckpoint",
+    "UserStats",
+    # 列投影
+    "NODE_COLUMN_GROUPS",
+    "node_load_options",
 ]
 
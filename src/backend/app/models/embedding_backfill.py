@@ -0,0 +1,67 @@
+"""
+向量嵌入回填检查点模型
+"""
+
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.core.database import Base
+from app.models.base import TimestampMixin
+
+
+class EmbeddingBackfillCheckpoint(Base, TimestampMixin):
+    """向量嵌入回填检查点表模型"""
+    
+    __tablename__ = "embedding_backfill_checkpoints"
+    __table_args__ = {"comment": "向量嵌入回填检查点表"}
+    
+    # 回填范围（知识图谱ID 或 all）
+    scope = Column(
+        String(64),
+        primary_key=True,
+        comment="回填范围: 知识图谱ID 或 all",
+    )
+    
+    # 已连续完成的最后一个节点ID（按 id 排序），恢复时从其后继续
+    last_node_id = Column(
+        UUID(as_uuid=True),
+        nullable=True,
+        comment="已完成的最后一个节点ID",
+    )
+    
+    # 进度统计
+    processed_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="已处理节点数",
+    )
+    updated_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="已写入向量的节点数",
+    )
+    failed_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="失败节点数",
+    )
+    token_count = Column(
+        BigInteger,
+        nullable=False,
+        default=0,
+        comment="估算的 token 总数",
+    )
+    
+    # 是否已完成
+    completed = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        comment="是否已完成",
+    )
+    
+    def __repr__(self) -> str:
+        return f"<EmbeddingBackfillCheckpoint(scope={self.scope}, last_node_id={self.last_node_id})>"
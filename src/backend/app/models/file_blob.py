@@ -0,0 +1,51 @@
+"""
+存储文件（内容寻址）模型
+"""
+
+from sqlalchemy import BigInteger, Column, Integer, String
+
+from app.core.database import Base
+from app.models.base import TimestampMixin
+
+
+class FileBlob(Base, TimestampMixin):
+    """存储文件表模型（相同内容的上传只存储一份，按引用计数删除）"""
+
+    __tablename__ = "file_blobs"
+    __table_args__ = {"comment": "存储文件表（内容寻址）"}
+
+    # 文件内容 SHA-256
+    content_hash = Column(
+        String(64),
+        primary_key=True,
+        comment="文件内容 SHA-256（十六进制）",
+    )
+
+    # 存储位置（所有引用该文件的上传记录使用相同的存储文件名和URL）
+    stored_filename = Column(
+        String(255),
+        nullable=False,
+        unique=True,
+        comment="存储文件名: <SHA-256><扩展名>",
+    )
+    file_url = Column(
+        String(500),
+        nullable=False,
+        comment="文件URL",
+    )
+    file_size = Column(
+        BigInteger,
+        nullable=False,
+        comment="文件大小（字节）",
+    )
+
+    # 引用该文件的上传记录数，减到 0 时删除文件
+    ref_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="引用计数",
+    )
+
+    def __repr__(self) -> str:
+        return f"<FileBlob(content_hash={self.content_hash}, ref_count={self.ref_count})>"
@@ -5,7 +5,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, String, Text, func
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, String, Text, func
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
@@ -17,7 +17,11 @@ class FileUpload(Base, UUIDMixin):
     """文件上传记录表模型"""
 
     __tablename__ = "file_uploads"
-    __table_args__ = {"comment": "文件上传记录表"}
+    __table_args__ = (
+        # 游标分页（按 created_at, id 倒序翻页），与 init-scripts/07_add_pagination_indexes.sql 保持一致
+        Index("idx_file_uploads_user_created", "user_id", "created_at", "id"),
+        {"comment": "文件上传记录表"},
+    )
 
     # 所属用户
     user_id = Column(
@@ -45,7 +49,8 @@ class FileUpload(Base, UUIDMixin):
     stored_filename = Column(
         String(255),
         nullable=False,
-        comment="存储文件名",
+        index=True,
+        comment="存储文件名（内容寻址存储时多条记录共用）",
     )
     file_url = Column(
         String(500),
@@ -62,6 +67,17 @@ class FileUpload(Base, UUIDMixin):
         nullable=False,
         comment="MIME类型",
     )
+    content_hash = Column(
+        String(64),
+        nullable=True,
+        index=True,
+        comment="文件内容 SHA-256（十六进制）",
+    )
+    variants = Column(
+        JSONB,
+        nullable=True,
+        comment="预处理生成的图片（OCR 用图、WebP 缩略图）",
+    )
 
     # 处理状态
     status = Column(
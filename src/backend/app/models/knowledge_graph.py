@@ -5,7 +5,7 @@
 from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -17,7 +17,11 @@ class KnowledgeGraph(Base, UUIDMixin, TimestampMixin):
     """知识图谱表模型"""
 
     __tablename__ = "knowledge_graphs"
-    __table_args__ = {"comment": "知识图谱表"}
+    __table_args__ = (
+        # 游标分页（按 updated_at, id 倒序翻页），与 init-scripts/07_add_pagination_indexes.sql 保持一致
+        Index("idx_knowledge_graphs_user_updated", "user_id", "updated_at", "id"),
+        {"comment": "知识图谱表"},
+    )
 
     # 所属用户
     user_id = Column(
@@ -85,6 +89,12 @@ class KnowledgeGraph(Base, UUIDMixin, TimestampMixin):
         default=0,
         comment="总复习次数",
     )
+    relation_version = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="关联版本号（增删关联时递增，用于邻接表缓存失效）",
+    )
 
     # 访问时间
     last_accessed_at = Column(
@@ -4,11 +4,12 @@
 
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, String, Text
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, String, Text, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, load_only, relationship
+from sqlalchemy.orm.interfaces import LoaderOption
 from pgvector.sqlalchemy import Vector
 
 from app.core.database import Base
@@ -24,11 +25,51 @@ class MasteryLevel(str, Enum):
     MASTERED = "mastered"  # 已掌握
 
 
+# 可识别的掌握程度（SQL 数组常量）；复习队列查询与部分索引谓词必须使用同一写法，规划器才能匹配索引
+KNOWN_MASTERY_LEVELS_SQL = "'{%s}'::text[]" % ",".join(level.value for level in MasteryLevel)
+
+
 class MemoryNode(Base, UUIDMixin, TimestampMixin):
     """记忆节点表模型（核心实体）"""
 
     __tablename__ = "memory_nodes"
-    __table_args__ = {"comment": "记忆节点表（核心实体）"}
+    __table_args__ = (
+        # 向量 ANN 索引（HNSW，余弦距离），与 init-scripts/05_add_vector_indexes.sql 保持一致
+        Index(
+            "idx_memory_nodes_embedding_hnsw",
+            "content_embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"content_embedding": "vector_cosine_ops"},
+        ),
+        # 缺少向量的节点（回填按 id 顺序扫描），与 init-scripts/06_add_embedding_backfill_checkpoints.sql 保持一致
+        Index(
+            "idx_memory_nodes_missing_embedding",
+            "id",
+            postgresql_where=text("content_embedding IS NULL AND deleted_at IS NULL"),
+        ),
+        # 游标分页（按 updated_at, id 倒序翻页），与 init-scripts/07_add_pagination_indexes.sql 保持一致
+        Index("idx_memory_nodes_graph_updated", "graph_id", "updated_at", "id"),
+        # 间隔重复复习队列（按用户和掌握程度取超期最久的节点），与 init-scripts/10_add_review_queue_index.sql 保持一致
+        Index(
+            "idx_memory_nodes_user_mastery_next_review",
+            "user_id",
+            "mastery_level",
+            "next_review_at",
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        # 复习队列中没有复习时间或掌握程度无法识别的节点，与 init-scripts/10_add_review_queue_index.sql 保持一致
+        Index(
+            "idx_memory_nodes_user_irregular_review",
+            "user_id",
+            "next_review_at",
+            postgresql_where=text(
+                "deleted_at IS NULL AND (last_review_at IS NULL OR next_review_at IS NULL "
+                f"OR array_position({KNOWN_MASTERY_LEVELS_SQL}, mastery_level::text) IS NULL)"
+            ),
+        ),
+        {"comment": "记忆节点表（核心实体）"},
+    )
 
     # 所属图谱
     graph_id = Column(
@@ -69,10 +110,14 @@ class MemoryNode(Base, UUIDMixin, TimestampMixin):
     )
 
     # 向量嵌入 (用于语义搜索)
-    content_embedding = Column(
-        Vector(1536),
-        nullable=True,
-        comment="1536维向量，用于语义搜索",
+    # 向量列延迟加载：只有向量相关的路径显式查询该列
+    content_embedding = deferred(
+        Column(
+            Vector(1536),
+            nullable=True,
+            comment="1536维向量，用于语义搜索",
+        ),
+        raiseload=True,
     )
 
     # 图谱位置信息
@@ -174,3 +219,36 @@ class MemoryNode(Base, UUIDMixin, TimestampMixin):
     def __repr__(self) -> str:
         return f"<MemoryNode(id={self.id}, title={self.title}, type={self.node_type})>"
 
+
+# 列投影分组：列表、复习、搜索视图只加载需要的列，"full" 加载除向量外的全部列
+NODE_COLUMN_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "list": ("id", "graph_id", "node_type", "title", "summary", "created_at", "updated_at"),
+    "review": (
+        "id", "graph_id", "user_id", "node_type", "title",
+        "mastery_level", "last_review_at", "next_review_at", "review_stats",
+    ),
+    "search": ("id", "graph_id", "node_type", "title", "summary"),
+    "full": tuple(
+        column.key for column in MemoryNode.__table__.columns if column.key != "content_embedding"
+    ),
+}
+
+
+def node_load_options(group: str = "full") -> LoaderOption:
+    """
+    获取节点列投影的加载选项
+
+    未加载的列在访问时直接报错（而不是在异步会话中隐式发起查询）。
+
+    Args:
+        group: 列分组 (list, review, search, full)
+
+    Returns:
+        用于 select(MemoryNode).options(...) 的加载选项
+    """
+    if group not in NODE_COLUMN_GROUPS:
+        raise ValueError(f"未知的列分组: {group}。支持: {', '.join(NODE_COLUMN_GROUPS)}")
+    return load_only(
+        *(getattr(MemoryNode, key) for key in NODE_COLUMN_GROUPS[group]),
+        raiseload=True,
+    )
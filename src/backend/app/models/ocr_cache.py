@@ -0,0 +1,66 @@
+"""
+OCR 结果缓存模型
+"""
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.database import Base
+from app.models.base import TimestampMixin
+
+
+class OCRCacheEntry(Base, TimestampMixin):
+    """OCR 结果缓存表模型（按图片内容、引擎和识别模式缓存识别结果）"""
+
+    __tablename__ = "ocr_result_cache"
+    __table_args__ = (
+        # 按容量淘汰时从最久未命中的条目开始，与 init-scripts/13_add_ocr_result_cache.sql 保持一致
+        Index("idx_ocr_result_cache_last_hit", "last_hit_at"),
+        {"comment": "OCR 结果缓存表"},
+    )
+
+    # 缓存键
+    content_hash = Column(
+        String(64),
+        primary_key=True,
+        comment="图片内容 SHA-256（十六进制）",
+    )
+    engine = Column(
+        String(20),
+        primary_key=True,
+        comment="OCR引擎: baidu, fake",
+    )
+    mode = Column(
+        String(20),
+        primary_key=True,
+        comment="识别模式: text, math",
+    )
+
+    # 识别结果（与 ocr_jobs.result 相同的结构）
+    result = Column(
+        JSONB,
+        nullable=False,
+        comment="识别结果",
+    )
+    result_bytes = Column(
+        Integer,
+        nullable=False,
+        comment="识别结果的 JSON 字节数（用于容量淘汰）",
+    )
+
+    # 命中统计
+    hit_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="命中次数",
+    )
+    last_hit_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        comment="最近命中或写入时间",
+    )
+
+    def __repr__(self) -> str:
+        return f"<OCRCacheEntry(content_hash={self.content_hash}, engine={self.engine}, mode={self.mode})>"
@@ -0,0 +1,126 @@
+"""
+OCR 任务模型
+"""
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+
+from app.core.database import Base
+from app.models.base import TimestampMixin, UUIDMixin
+
+
+class OCRJob(Base, UUIDMixin, TimestampMixin):
+    """OCR 任务表模型（持久化队列，工作协程用 FOR UPDATE SKIP LOCKED 领取）"""
+
+    __tablename__ = "ocr_jobs"
+    __table_args__ = (
+        # 领取任务：按引擎取到期的排队任务，与 init-scripts/12_add_ocr_jobs.sql 保持一致
+        Index(
+            "idx_ocr_jobs_queued",
+            "engine",
+            "available_at",
+            postgresql_where=text("status = 'queued'"),
+        ),
+        # 租约过期检查：处理中的任务
+        Index(
+            "idx_ocr_jobs_running",
+            "engine",
+            "locked_at",
+            postgresql_where=text("status = 'running'"),
+        ),
+        {"comment": "OCR 任务表"},
+    )
+
+    # 所属用户
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        comment="用户ID",
+    )
+
+    # 识别的文件
+    file_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("file_uploads.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+        comment="文件ID",
+    )
+
+    # 识别方式
+    mode = Column(
+        String(20),
+        nullable=False,
+        default="text",
+        comment="识别模式: text, math",
+    )
+    engine = Column(
+        String(20),
+        nullable=False,
+        comment="OCR引擎（提交时确定）: baidu, fake",
+    )
+
+    # 队列状态
+    status = Column(
+        String(20),
+        nullable=False,
+        default="queued",
+        comment="任务状态: queued, running, completed, failed",
+    )
+    attempts = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        comment="已尝试次数",
+    )
+    max_attempts = Column(
+        Integer,
+        nullable=False,
+        default=3,
+        comment="最大尝试次数",
+    )
+    available_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        comment="可领取时间（重试时推迟）",
+    )
+    locked_by = Column(
+        String(64),
+        nullable=True,
+        comment="领取任务的工作协程",
+    )
+    locked_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="领取时间（超过租约未完成的任务重新排队）",
+    )
+
+    # 结果
+    result = Column(
+        JSONB,
+        nullable=True,
+        comment="识别结果",
+    )
+    error_message = Column(
+        Text,
+        nullable=True,
+        comment="错误信息（最近一次失败）",
+    )
+
+    # 时间
+    started_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="首次开始处理时间",
+    )
+    finished_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="完成时间",
+    )
+
+    def __repr__(self) -> str:
+        return f"<OCRJob(id={self.id}, file_id={self.file_id}, status={self.status})>"
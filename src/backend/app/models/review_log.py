@@ -2,7 +2,7 @@
 复习记录模型
 """
 
-from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, String, func, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
 
@@ -14,7 +14,17 @@ class ReviewLog(Base, UUIDMixin):
     """复习记录表模型"""
 
     __tablename__ = "review_logs"
-    __table_args__ = {"comment": "复习记录表"}
+    __table_args__ = (
+        # 客户端复习 ID 按用户唯一（批量提交去重），与 init-scripts/09_add_review_log_client_id.sql 保持一致
+        Index(
+            "idx_review_logs_user_client_review",
+            "user_id",
+            "client_review_id",
+            unique=True,
+            postgresql_where=text("client_review_id IS NOT NULL"),
+        ),
+        {"comment": "复习记录表"},
+    )
 
     # 关联的节点
     node_id = Column(
@@ -72,6 +82,13 @@ class ReviewLog(Base, UUIDMixin):
         comment="应用版本",
     )
 
+    # 客户端生成的复习 ID（离线批量同步时用于幂等去重）
+    client_review_id = Column(
+        String(64),
+        nullable=True,
+        comment="客户端复习ID",
+    )
+
     # 时间戳
     created_at = Column(
         DateTime(timezone=True),
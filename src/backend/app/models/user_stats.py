@@ -0,0 +1,87 @@
+"""
+用户学习统计快照模型
+"""
+
+from sqlalchemy import Column, Date, ForeignKey, Integer, text
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+
+from app.core.database import Base
+from app.models.base import TimestampMixin
+
+
+class UserStats(Base, TimestampMixin):
+    """用户学习统计快照表模型（成就系统读取，写入时增量维护）"""
+
+    __tablename__ = "user_stats"
+    __table_args__ = {"comment": "用户学习统计快照表"}
+
+    # 所属用户（一对一）
+    user_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="用户ID",
+    )
+
+    # 计数
+    total_nodes = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="节点总数",
+    )
+    mastered_nodes = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="已掌握节点数",
+    )
+    total_reviews = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="复习总次数",
+    )
+    total_graphs = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="知识图谱数",
+    )
+
+    # 连续学习状态（按 UTC 日期）
+    current_streak = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="截至最后复习日的连续学习天数",
+    )
+    longest_streak = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        comment="最长连续学习天数",
+    )
+    last_review_date = Column(
+        Date,
+        nullable=True,
+        comment="最后复习日期（UTC）",
+    )
+
+    # 按小时（UTC 0-23）统计的复习次数
+    review_hours = Column(
+        ARRAY(Integer),
+        nullable=False,
+        default=lambda: [0] * 24,
+        server_default=text("array_fill(0, ARRAY[24])"),
+        comment="各小时复习次数（UTC 0-23）",
+    )
+
+    def __repr__(self) -> str:
+        return f"<UserStats(user_id={self.user_id}, total_nodes={self.total_nodes}, total_reviews={self.total_reviews})>"
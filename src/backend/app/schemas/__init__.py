@@ -3,6 +3,7 @@ Schemas 模块
 """
 
 from app.schemas.common import (
+    CursorPaginatedResponse,
     ErrorResponse,
     PaginatedResponse,
     PaginationParams,
@@ -28,6 +29,7 @@ from app.schemas.knowledge_graph import (
     KnowledgeGraphDetailResponse,
     KnowledgeGraphListItem,
     KnowledgeGraphStats,
+    ForgettingMapResponse,
 )
 from app.schemas.memory_node import (
     MemoryNodeCreate,
@@ -50,6 +52,7 @@ __all__ = [
     "ErrorResponse",
     "PaginationParams",
     "PaginatedResponse",
+    "CursorPaginatedResponse",
     # User
     "UserRegister",
     "UserLogin",
@@ -69,6 +72,7 @@ __all__ = [
     "KnowledgeGraphDetailResponse",
     "KnowledgeGraphListItem",
     "KnowledgeGraphStats",
+    "ForgettingMapResponse",
     # Memory Node
     "MemoryNodeCreate",
     "MemoryNodeUpdate",
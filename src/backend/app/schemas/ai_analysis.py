@@ -57,6 +57,24 @@ class EmbeddingResponse(BaseModel):
     dimension: int = Field(..., description="向量维度")
 
 
+class EmbeddingCacheStats(BaseModel):
+    """向量嵌入缓存统计"""
+    
+    hits: int = Field(..., description="本地 LRU 命中次数")
+    redis_hits: int = Field(..., description="Redis 命中次数")
+    misses: int = Field(..., description="未命中次数")
+    evictions: int = Field(..., description="因容量淘汰的条目数")
+    expirations: int = Field(..., description="因过期删除的条目数")
+    redis_errors: int = Field(..., description="Redis 访问失败次数")
+    hit_rate: float = Field(..., description="命中率（含 Redis）")
+    entries: int = Field(..., description="本地条目数")
+    bytes: int = Field(..., description="本地占用字节数")
+    max_bytes: int = Field(..., description="本地容量上限（字节）")
+    ttl_seconds: int = Field(..., description="有效期（秒）")
+    redis_enabled: bool = Field(..., description="是否启用 Redis 二级缓存")
+    redis_dtype: str = Field(..., description="Redis 存储精度")
+
+
 class QuestionAnalysisRequest(BaseModel):
     """题目分析请求（基于文件）"""
     
@@ -59,3 +59,32 @@ class PaginatedResponse(BaseModel, Generic[DataT]):
             total_pages=total_pages
         )
 
+
+class CursorPaginatedResponse(BaseModel, Generic[DataT]):
+    """游标分页响应"""
+    
+    items: list[DataT] = Field(..., description="数据列表")
+    next_cursor: Optional[str] = Field(None, description="下一页游标，没有更多数据时为空")
+    has_more: bool = Field(..., description="是否还有下一页")
+    page_size: int = Field(..., description="每页数量")
+    total: Optional[int] = Field(None, description="总数量（按 total 参数返回精确值、估算值或不返回）")
+    total_is_estimate: bool = Field(default=False, description="总数量是否为估算值")
+    
+    @classmethod
+    def create(
+        cls,
+        items: list[DataT],
+        next_cursor: Optional[str],
+        page_size: int,
+        total: Optional[int] = None,
+        total_is_estimate: bool = False
+    ) -> "CursorPaginatedResponse[DataT]":
+        """创建游标分页响应"""
+        return cls(
+            items=items,
+            next_cursor=next_cursor,
+            has_more=next_cursor is not None,
+            page_size=page_size,
+            total=total,
+            total_is_estimate=total_is_estimate and total is not None
+        )
@@ -44,6 +44,7 @@ class FileUploadResponse(FileUploadBase):
     file_url: str
     file_size: int
     mime_type: str
+    variants: Optional[dict] = None
     status: str
     processing_result: Optional[dict] = None
     error_message: Optional[str] = None
@@ -76,20 +77,37 @@ class UploadResponse(BaseModel):
     original_filename: str = Field(..., description="原始文件名")
     file_size: int = Field(..., description="文件大小（字节）")
     mime_type: str = Field(..., description="文件类型")
+    variants: Optional[dict] = Field(None, description="预处理生成的图片: ocr 为 OCR 用图，thumbnails 为按最长边像素的 WebP 缩略图")
     message: str = Field(default="文件上传成功", description="提示信息")
 
 
+class StorageReport(BaseModel):
+    """文件存储统计（内容寻址去重）"""
+    
+    uploads: int = Field(..., description="上传记录数")
+    logical_bytes: int = Field(..., description="上传记录的文件总大小（字节）")
+    blobs: int = Field(..., description="内容寻址的存储文件数")
+    blob_bytes: int = Field(..., description="内容寻址的存储文件总大小（字节）")
+    blob_references: int = Field(..., description="存储文件的引用总数")
+    legacy_files: int = Field(..., description="尚未迁移的上传记录数")
+    legacy_bytes: int = Field(..., description="尚未迁移的文件总大小（字节）")
+    stored_bytes: int = Field(..., description="实际占用的存储空间（字节）")
+    saved_bytes: int = Field(..., description="去重节省的存储空间（字节）")
+    dedup_ratio: float = Field(..., description="去重比（上传总大小 / 实际占用）")
+
+
 class OCRRequest(BaseModel):
     """OCR 识别请求"""
     
     file_id: UUID = Field(..., description="文件ID")
-    ocr_engine: Optional[str] = Field("baidu", description="OCR引擎: baidu, tencent, auto")
+    ocr_engine: Optional[str] = Field("baidu", description="OCR引擎: baidu, tencent, auto, fake（本地模拟）")
+    bypass_cache: bool = Field(False, description="跳过结果缓存，强制重新识别（新结果覆盖缓存）")
     
     @field_validator("ocr_engine")
     @classmethod
     def validate_ocr_engine(cls, v: str) -> str:
         """验证 OCR 引擎"""
-        allowed = ["baidu", "tencent", "auto"]
+        allowed = ["baidu", "tencent", "auto", "fake"]
         if v not in allowed:
             raise ValueError(f"OCR引擎必须是以下之一: {', '.join(allowed)}")
         return v
@@ -104,4 +122,46 @@ class OCRResponse(BaseModel):
     engine: str = Field(..., description="使用的OCR引擎")
     raw_result: Optional[dict] = Field(None, description="原始识别结果")
     processing_time: float = Field(..., description="处理时间（秒）")
+    cached: bool = Field(False, description="是否来自结果缓存（处理时间为首次识别的耗时）")
+
 
+class OCRJobCreate(OCRRequest):
+    """提交 OCR 任务"""
+    
+    mode: str = Field("text", pattern="^(text|math)$", description="识别模式: text, math（含数学公式）")
+
+
+class OCRJobResponse(BaseModel):
+    """OCR 任务状态"""
+    
+    id: UUID = Field(..., description="任务ID")
+    file_id: UUID = Field(..., description="文件ID")
+    mode: str = Field(..., description="识别模式")
+    engine: str = Field(..., description="使用的OCR引擎")
+    status: str = Field(..., description="任务状态: queued, running, completed, failed")
+    attempts: int = Field(..., description="已尝试次数")
+    max_attempts: int = Field(..., description="最大尝试次数")
+    result: Optional[dict] = Field(None, description="识别结果（完成后）")
+    error_message: Optional[str] = Field(None, description="错误信息（最近一次失败）")
+    created_at: datetime = Field(..., description="提交时间")
+    started_at: Optional[datetime] = Field(None, description="开始处理时间")
+    finished_at: Optional[datetime] = Field(None, description="完成时间")
+    
+    model_config = {"from_attributes": True}
+
+
+class OCRCacheStats(BaseModel):
+    """OCR 结果缓存统计（本进程）"""
+    
+    hits: int = Field(..., description="本地 LRU 命中次数")
+    db_hits: int = Field(..., description="数据库命中次数")
+    misses: int = Field(..., description="未命中次数")
+    bypassed: int = Field(..., description="跳过缓存（强制重新识别）的次数")
+    stores: int = Field(..., description="写入次数")
+    evictions: int = Field(..., description="本地因容量淘汰的条目数")
+    db_evictions: int = Field(..., description="数据库因容量淘汰的条目数")
+    hit_rate: float = Field(..., description="命中率（含数据库命中，不含跳过）")
+    entries: int = Field(..., description="本地条目数")
+    bytes: int = Field(..., description="本地占用字节数")
+    local_max_bytes: int = Field(..., description="本地容量上限（字节）")
+    max_bytes: int = Field(..., description="数据库容量上限（字节）")
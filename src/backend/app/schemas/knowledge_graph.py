@@ -3,10 +3,10 @@
 """
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, FiniteFloat, model_validator
 
 
 # ==================== 知识图谱创建 ====================
@@ -97,3 +97,156 @@ class KnowledgeGraphStats(BaseModel):
     review_due_count: int = Field(..., description="待复习节点数")
     last_review_at: Optional[datetime] = Field(None, description="最后复习时间")
 
+
+class ForgettingMapResponse(BaseModel):
+    """
+    图谱遗忘热力图（列式）
+    
+    ids、forgetting_index、color_index 三列按同一顺序排列，均为 base64 编码的定长二进制：
+    第 i 个节点的 ID 为 ids 的第 i 个 16 字节，遗忘指数为第 i 个 float16（小端），
+    颜色为 palette[color_index 的第 i 个字节]
+    """
+    
+    graph_id: UUID = Field(..., description="图谱ID")
+    count: int = Field(..., description="节点数")
+    computed_at: datetime = Field(..., description="计算时间")
+    palette: List[str] = Field(..., description="颜色表（十六进制，按遗忘风险从低到高）")
+    ids: str = Field(..., description="节点ID（base64，每个 16 字节）")
+    forgetting_index: str = Field(..., description="遗忘指数（base64，float16 小端）")
+    color_index: str = Field(..., description="颜色在 palette 中的下标（base64，uint8）")
+
+
+# ==================== 图谱快照 ====================
+
+class CategoricalColumn(BaseModel):
+    """类别编码的列：第 i 行的取值为 categories[codes[i]]"""
+    
+    categories: List[Optional[str]] = Field(..., description="类别表")
+    codes: List[int] = Field(..., description="每行在类别表中的下标")
+
+
+class GraphSnapshotNodes(BaseModel):
+    """快照中的节点（各列按同一顺序排列）"""
+    
+    id: List[str] = Field(..., description="节点ID")
+    node_type: CategoricalColumn = Field(..., description="节点类型")
+    title: List[str] = Field(..., description="节点标题")
+    position_x: List[float] = Field(..., description="X坐标")
+    position_y: List[float] = Field(..., description="Y坐标")
+    position_z: List[float] = Field(..., description="Z坐标")
+    mastery_level: CategoricalColumn = Field(..., description="掌握程度")
+
+
+class GraphSnapshotRelations(BaseModel):
+    """快照中的关联（各列按同一顺序排列，两端为节点在 nodes 各列中的下标）"""
+    
+    source: List[int] = Field(..., description="源节点下标")
+    target: List[int] = Field(..., description="目标节点下标")
+    relation_type: CategoricalColumn = Field(..., description="关联类型")
+    strength: List[int] = Field(..., description="关联强度")
+
+
+class GraphSnapshotResponse(BaseModel):
+    """
+    图谱快照（列式）
+    
+    渲染整个图谱所需的全部节点和关联；Accept 为 application/msgpack 时以 MessagePack 返回相同结构
+    """
+    
+    graph_id: UUID = Field(..., description="图谱ID")
+    version: str = Field(..., description="图谱版本号（与 ETag 对应）")
+    node_count: int = Field(..., description="节点数")
+    relation_count: int = Field(..., description="关联数")
+    nodes: GraphSnapshotNodes = Field(..., description="节点")
+    relations: GraphSnapshotRelations = Field(..., description="关联")
+
+
+# ==================== 图谱布局 ====================
+
+class GraphLayoutRequest(BaseModel):
+    """
+    计算图谱布局请求
+    
+    未指定的参数依次取视图配置的 layout_params 和默认值
+    """
+    
+    view_config_id: Optional[UUID] = Field(None, description="视图配置ID（使用其布局引擎和布局参数）")
+    dimensions: Optional[int] = Field(None, ge=2, le=3, description="布局维度（2 或 3，默认 2）")
+    iterations: Optional[int] = Field(None, ge=0, description="迭代次数（默认 50）")
+    ideal_edge_length: Optional[float] = Field(None, gt=0, description="理想边长（默认 30）")
+    gravity: Optional[float] = Field(None, ge=0, description="向中心的引力系数（默认 0.05）")
+    seed: Optional[int] = Field(None, description="随机种子（相同输入和种子得到相同布局）")
+
+
+class GraphLayoutResponse(BaseModel):
+    """计算图谱布局结果"""
+    
+    graph_id: UUID = Field(..., description="图谱ID")
+    layout_engine: str = Field(..., description="布局引擎")
+    node_count: int = Field(..., description="更新坐标的节点数")
+    relation_count: int = Field(..., description="参与布局的关联数")
+    dimensions: int = Field(..., description="布局维度")
+    iterations: int = Field(..., description="迭代次数")
+    load_ms: float = Field(..., description="加载耗时（毫秒）")
+    layout_ms: float = Field(..., description="布局计算耗时（毫秒）")
+    save_ms: float = Field(..., description="写回坐标耗时（毫秒）")
+
+
+# ==================== 批量更新节点坐标 ====================
+
+class NodePositionsUpdate(BaseModel):
+    """批量更新节点坐标请求（各列按同一顺序排列）"""
+    
+    node_ids: List[UUID] = Field(..., min_length=1, description="节点ID")
+    position_x: List[FiniteFloat] = Field(..., description="X坐标")
+    position_y: List[FiniteFloat] = Field(..., description="Y坐标")
+    position_z: Optional[List[Optional[FiniteFloat]]] = Field(None, description="Z坐标（可选，省略或为 null 时不修改）")
+    client_id: Optional[str] = Field(None, max_length=64, description="客户端标识（同一客户端的连续请求合并写入）")
+    sequence: Optional[int] = Field(None, ge=0, description="客户端递增序号（乱序到达的旧坐标不会覆盖新坐标）")
+    
+    @model_validator(mode="after")
+    def validate_lengths(self) -> "NodePositionsUpdate":
+        """验证各列长度一致"""
+        columns = [self.position_x, self.position_y]
+        if self.position_z is not None:
+            columns.append(self.position_z)
+        if any(len(column) != len(self.node_ids) for column in columns):
+            raise ValueError("坐标列与节点ID列的长度必须一致")
+        return self
+
+
+class NodePositionsUpdateResponse(BaseModel):
+    """批量更新节点坐标结果"""
+    
+    applied: int = Field(..., description="已写入的节点数")
+    rejected: int = Field(..., description="被拒绝的节点数（不在该图谱中或已删除）")
+    coalesced: int = Field(..., description="被同一客户端更新的坐标取代、未单独写入的节点数")
+    rejected_ids: List[UUID] = Field(..., description="被拒绝的节点ID")
+
+
+# ==================== 节点批量导入 ====================
+
+class NodeImportError(BaseModel):
+    """导入时跳过的记录"""
+    
+    line: int = Field(..., description="行号（Anki 牌组为笔记序号）")
+    message: str = Field(..., description="错误信息")
+
+
+class NodeImportResponse(BaseModel):
+    """节点批量导入结果（进度）"""
+    
+    import_id: str = Field(..., description="导入ID（查询进度）")
+    graph_id: UUID = Field(..., description="图谱ID")
+    format: str = Field(..., description="文件格式: jsonl, csv, apkg")
+    status: str = Field(..., description="状态: running, completed, failed")
+    records: int = Field(..., description="已读取的记录数")
+    nodes: int = Field(..., description="已导入的节点数")
+    tags: int = Field(..., description="新建的标签数")
+    node_tags: int = Field(..., description="节点-标签关联数")
+    relations: int = Field(..., description="已导入的节点关联数")
+    skipped: int = Field(..., description="跳过的不合法记录数")
+    skipped_relations: int = Field(..., description="跳过的关联数（目标记录不存在）")
+    errors: List[NodeImportError] = Field(..., description="跳过的记录（最多 20 条）")
+    error: Optional[str] = Field(None, description="导入失败的原因")
+    elapsed_ms: float = Field(..., description="耗时（毫秒）")
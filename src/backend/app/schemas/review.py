@@ -2,8 +2,9 @@
 复习相关的 Pydantic Schemas
 """
 
-from datetime import datetime
-from typing import Dict, Optional
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, Field
 
@@ -59,3 +60,49 @@ class ReviewStatistics(BaseModel):
     overdue: int
     total_reviews: int
 
+
+class ReviewForecastResponse(BaseModel):
+    """复习负载预测（每个列表的第 i 项对应 start_date 之后第 i 天）"""
+    start_date: date = Field(..., description="预测第 0 天（UTC 日期）")
+    days: int = Field(..., description="预测天数")
+    runs: int = Field(..., description="模拟轮次")
+    total_cards: int = Field(..., description="参与预测的卡片数")
+    quality_distribution: List[float] = Field(..., description="模拟使用的复习质量分布（0-5 分的概率）")
+    mean: List[float] = Field(..., description="每天到期复习数的平均值")
+    percentiles: Dict[str, List[float]] = Field(..., description="每天到期复习数的分位数，键为 p10、p50、p90")
+
+
+
+class BatchReviewItem(BaseModel):
+    """批量复习中的单条复习"""
+    client_review_id: str = Field(..., min_length=1, max_length=64, description="客户端生成的复习 ID（用于幂等去重）")
+    node_id: UUID = Field(..., description="节点 ID")
+    quality: int = Field(..., ge=0, le=5, description="复习质量评分 (0-5)")
+    review_duration: int = Field(60, ge=0, description="复习时长（秒）")
+    reviewed_at: Optional[datetime] = Field(None, description="复习时间（离线复习的实际时间，默认服务器当前时间）")
+
+
+class BatchReviewRequest(BaseModel):
+    """批量复习请求（按复习发生的顺序排列）"""
+    items: List[BatchReviewItem] = Field(..., min_length=1, max_length=500, description="复习列表")
+
+
+class BatchReviewItemResult(BaseModel):
+    """批量复习中单条复习的处理结果"""
+    client_review_id: str
+    node_id: str
+    status: str = Field(..., description="处理状态：applied, duplicate, not_found")
+    mastery_level: Optional[str] = None
+    next_review_at: Optional[str] = None
+    interval_days: Optional[int] = None
+    easiness: Optional[float] = None
+    repetitions: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchReviewResponse(BaseModel):
+    """批量复习响应"""
+    applied: int = Field(..., description="本次应用的复习数")
+    duplicates: int = Field(..., description="已提交过而跳过的复习数")
+    failed: int = Field(..., description="失败的复习数")
+    results: List[BatchReviewItemResult]
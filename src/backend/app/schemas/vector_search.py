@@ -16,6 +16,8 @@ class VectorSearchRequest(BaseModel):
     node_type: Optional[str] = Field(None, description="限制节点类型")
     limit: int = Field(10, description="返回结果数量", ge=1, le=50)
     similarity_threshold: float = Field(0.7, description="相似度阈值", ge=0.0, le=1.0)
+    ef_search: Optional[int] = Field(None, description="HNSW 查询候选集大小（越大召回越高）", ge=1, le=1000)
+    probes: Optional[int] = Field(None, description="IVFFlat 探测聚类数（越大召回越高）", ge=1, le=1000)
 
 
 class SimilarNodeRequest(BaseModel):
@@ -69,6 +71,7 @@ class ClusterResponse(BaseModel):
     """聚类响应"""
     
     graph_id: UUID = Field(..., description="知识图谱ID")
+    mode: str = Field("greedy", description="聚类模式: greedy, connected, agglomerative, kmeans")
     total_clusters: int = Field(..., description="簇总数")
     clusters: List[NodeClusterResult] = Field(..., description="聚类结果")
 
@@ -80,10 +83,82 @@ class EmbeddingUpdateRequest(BaseModel):
     graph_id: Optional[UUID] = Field(None, description="知识图谱ID（批量更新）")
 
 
+class EmbeddingBackfillReport(BaseModel):
+    """向量嵌入回填报告"""
+    
+    scope: str = Field(..., description="回填范围: 知识图谱ID 或 all")
+    resumed_from: Optional[UUID] = Field(None, description="从该节点之后恢复（无检查点时为空）")
+    processed_count: int = Field(..., description="处理的节点数")
+    updated_count: int = Field(..., description="写入向量的节点数")
+    failed_count: int = Field(..., description="失败的节点数")
+    request_count: int = Field(..., description="嵌入请求次数")
+    token_count: int = Field(..., description="估算的 token 数")
+    elapsed_seconds: float = Field(..., description="耗时（秒）")
+    nodes_per_second: float = Field(..., description="吞吐量（节点/秒）")
+    tokens_per_second: float = Field(..., description="吞吐量（token/秒）")
+    errors: List[str] = Field(default_factory=list, description="失败批次的错误信息（最多 10 条）")
+
+
 class EmbeddingUpdateResponse(BaseModel):
     """向量嵌入更新响应"""
     
     success: bool = Field(..., description="是否成功")
     updated_count: int = Field(..., description="更新的节点数量")
     message: str = Field(..., description="响应消息")
+    report: Optional[EmbeddingBackfillReport] = Field(None, description="批量回填报告")
+
+
+
+class VectorIndexInfo(BaseModel):
+    """向量索引信息"""
+    
+    name: str = Field(..., description="索引名称")
+    method: str = Field(..., description="索引类型: hnsw, ivfflat")
+    is_valid: bool = Field(..., description="索引是否可用")
+    is_ready: bool = Field(..., description="索引是否可写入")
+    size_bytes: int = Field(..., description="索引大小（字节）")
+    definition: str = Field(..., description="索引定义")
+
+
+class VectorIndexBuildProgress(BaseModel):
+    """向量索引构建进度"""
+    
+    index_name: str = Field(..., description="索引名称")
+    phase: str = Field(..., description="构建阶段")
+    blocks_done: int = Field(..., description="已处理数据块")
+    blocks_total: int = Field(..., description="数据块总数")
+    tuples_done: int = Field(..., description="已处理行数")
+    tuples_total: int = Field(..., description="总行数")
 
+
+class VectorIndexStatusResponse(BaseModel):
+    """向量索引状态响应"""
+    
+    configured_type: str = Field(..., description="配置的索引类型")
+    indexes: List[VectorIndexInfo] = Field(..., description="现有 ANN 索引")
+    build_progress: List[VectorIndexBuildProgress] = Field(..., description="正在进行的索引构建")
+    total_nodes: int = Field(..., description="节点总数")
+    embedded_nodes: int = Field(..., description="已生成向量的节点数")
+    ef_search: int = Field(..., description="默认 HNSW ef_search")
+    probes: int = Field(..., description="默认 IVFFlat probes")
+
+
+class VectorIndexBuildResponse(BaseModel):
+    """向量索引构建响应"""
+    
+    index_name: str = Field(..., description="索引名称")
+    index_type: str = Field(..., description="索引类型")
+    message: str = Field(..., description="响应消息")
+
+
+class VectorIndexRecallResponse(BaseModel):
+    """向量索引召回率评估响应"""
+    
+    sample_size: int = Field(..., description="实际抽样查询数量")
+    k: int = Field(..., description="Top-K")
+    ef_search: int = Field(..., description="使用的 ef_search")
+    probes: int = Field(..., description="使用的 probes")
+    recall: float = Field(..., description="平均召回率 recall@k")
+    min_recall: float = Field(..., description="最低召回率")
+    ann_avg_ms: float = Field(..., description="ANN 搜索平均耗时（毫秒）")
+    exact_avg_ms: float = Field(..., description="精确搜索平均耗时（毫秒）")
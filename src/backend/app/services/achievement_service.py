@@ -7,14 +7,10 @@
 3. 统计学习数据
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from sqlalchemy import func, and_, or_
+from typing import Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.memory_node import MemoryNode, MasteryLevel
-from app.models.review_log import ReviewLog
-from app.models.knowledge_graph import KnowledgeGraph
+from app.services.user_stats_service import user_stats_service
 
 
 class AchievementService:
@@ -227,140 +223,16 @@ class AchievementService:
         self.db = db
     
     async def get_user_stats(self, user_id: int) -> Dict:
-        """获取用户统计数据"""
-        
-        # 节点统计
-        total_nodes = await self.db.scalar(
-            func.count(MemoryNode.id).filter(MemoryNode.user_id == user_id)
-        )
-        
-        mastered_nodes = await self.db.scalar(
-            func.count(MemoryNode.id).filter(
-                and_(
-                    MemoryNode.user_id == user_id,
-                    MemoryNode.mastery_level == MasteryLevel.MASTERED
-                )
-            )
-        )
-        
-        # 复习统计
-        total_reviews = await self.db.scalar(
-            func.count(ReviewLog.id).filter(ReviewLog.user_id == user_id)
-        )
-        
-        # 知识图谱统计
-        total_graphs = await self.db.scalar(
-            func.count(KnowledgeGraph.id).filter(KnowledgeGraph.user_id == user_id)
-        )
-        
-        # 连续学习天数
-        current_streak = await self._calculate_streak(user_id)
-        
-        # 特殊统计
-        night_reviews = await self._count_time_reviews(user_id, 22, 2)
-        morning_reviews = await self._count_time_reviews(user_id, 5, 8)
-        perfect_week = await self._check_perfect_week(user_id)
-        
-        return {
-            "total_nodes": total_nodes or 0,
-            "mastered_nodes": mastered_nodes or 0,
-            "total_reviews": total_reviews or 0,
-            "total_graphs": total_graphs or 0,
-            "current_streak": current_streak,
-            "night_reviews": night_reviews,
-            "morning_reviews": morning_reviews,
-            "perfect_week": perfect_week,
-        }
-    
-    async def _calculate_streak(self, user_id: int) -> int:
-        """计算连续学习天数"""
-        from sqlalchemy import select, distinct, cast, Date
-        
-        # 获取所有复习日期（去重）
-        stmt = select(distinct(cast(ReviewLog.reviewed_at, Date))).where(
-            ReviewLog.user_id == user_id
-        ).order_by(cast(ReviewLog.reviewed_at, Date).desc())
-        
-        result = await self.db.execute(stmt)
-        review_dates = [row[0] for row in result.fetchall()]
-        
-        if not review_dates:
-            return 0
-        
-        # 计算连续天数
-        today = datetime.now().date()
-        streak = 0
-        
-        # 如果今天没有复习，从昨天开始算
-        check_date = today if review_dates[0] == today else today - timedelta(days=1)
-        
-        for date in review_dates:
-            if date == check_date:
-                streak += 1
-                check_date -= timedelta(days=1)
-            else:
-                break
-        
-        return streak
+        """获取用户统计数据（读取统计快照，一次主键查询）"""
+        snapshot = await user_stats_service.get(self.db, user_id)
+        return user_stats_service.to_achievement_stats(snapshot)
     
-    async def _count_time_reviews(self, user_id: int, start_hour: int, end_hour: int) -> int:
-        """统计特定时间段的复习次数"""
-        from sqlalchemy import select, extract
-        
-        if start_hour < end_hour:
-            # 正常时间段（如 5-8）
-            stmt = select(func.count(ReviewLog.id)).where(
-                and_(
-                    ReviewLog.user_id == user_id,
-                    extract('hour', ReviewLog.reviewed_at) >= start_hour,
-                    extract('hour', ReviewLog.reviewed_at) < end_hour
-                )
-            )
-        else:
-            # 跨天时间段（如 22-2）
-            stmt = select(func.count(ReviewLog.id)).where(
-                and_(
-                    ReviewLog.user_id == user_id,
-                    or_(
-                        extract('hour', ReviewLog.reviewed_at) >= start_hour,
-                        extract('hour', ReviewLog.reviewed_at) < end_hour
-                    )
-                )
-            )
-        
-        result = await self.db.scalar(stmt)
-        return result or 0
-    
-    async def _check_perfect_week(self, user_id: int) -> bool:
-        """检查是否有完美一周（连续7天每天都复习）"""
-        from sqlalchemy import select, distinct, cast, Date
-        
-        # 获取最近7天的复习日期
-        seven_days_ago = datetime.now().date() - timedelta(days=6)
-        
-        stmt = select(distinct(cast(ReviewLog.reviewed_at, Date))).where(
-            and_(
-                ReviewLog.user_id == user_id,
-                cast(ReviewLog.reviewed_at, Date) >= seven_days_ago
-            )
-        )
-        
-        result = await self.db.execute(stmt)
-        review_dates = set(row[0] for row in result.fetchall())
-        
-        # 检查最近7天是否每天都有复习
-        for i in range(7):
-            check_date = datetime.now().date() - timedelta(days=i)
-            if check_date not in review_dates:
-                return False
-        
-        return True
-    
-    async def calculate_level_and_exp(self, user_id: int) -> Dict:
-        """计算用户等级和经验值"""
+    async def calculate_level_and_exp(self, user_id: int, stats: Optional[Dict] = None) -> Dict:
+        """计算用户等级和经验值（可传入已读取的统计数据）"""
         
         # 获取统计数据
-        stats = await self.get_user_stats(user_id)
+        if stats is None:
+            stats = await self.get_user_stats(user_id)
         
         # 计算总经验值
         total_exp = 0
@@ -407,11 +279,12 @@ class AchievementService:
             "progress": round(progress, 2),
         }
     
-    async def get_achievements(self, user_id: int) -> Dict:
-        """获取用户成就"""
+    async def get_achievements(self, user_id: int, stats: Optional[Dict] = None) -> Dict:
+        """获取用户成就（可传入已读取的统计数据）"""
         
         # 获取统计数据
-        stats = await self.get_user_stats(user_id)
+        if stats is None:
+            stats = await self.get_user_stats(user_id)
         
         # 检查所有成就
         unlocked = []
@@ -446,8 +319,8 @@ class AchievementService:
         """获取用户完整档案（等级 + 成就 + 统计）"""
         
         stats = await self.get_user_stats(user_id)
-        level_info = await self.calculate_level_and_exp(user_id)
-        achievements = await self.get_achievements(user_id)
+        level_info = await self.calculate_level_and_exp(user_id, stats)
+        achievements = await self.get_achievements(user_id, stats)
         
         return {
             "stats": stats,
@@ -6,10 +6,11 @@ AI 分析服务
 import json
 from typing import Dict, List, Optional, Tuple
 
-import httpx
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.core.http_clients import http_clients
+from app.services.embedding_cache_service import EmbeddingCache
 
 
 class AIService:
@@ -19,6 +20,7 @@ class AIService:
         """初始化 AI 服务"""
         self.openai_configured = bool(settings.OPENAI_API_KEY)
         self.deepseek_configured = bool(settings.DEEPSEEK_API_KEY)
+        self.embedding_cache = EmbeddingCache() if settings.EMBEDDING_CACHE_ENABLED else None
     
     async def call_openai(
         self,
@@ -42,7 +44,7 @@ class AIService:
         if not self.openai_configured:
             raise HTTPException(status_code=500, detail="OpenAI API 未配置")
         
-        url = "https://api.openai.com/v1/chat/completions"
+        url = f"{settings.OPENAI_BASE_URL}/chat/completions"
         headers = {
             "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
             "Content-Type": "application/json"
@@ -54,17 +56,17 @@ class AIService:
             "max_tokens": max_tokens
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, headers=headers, json=data)
+        client = http_clients.get("openai")
+        response = await client.post(url, headers=headers, json=data)
             
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"OpenAI API 调用失败: {response.text}"
-                )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"OpenAI API 调用失败: {response.text}"
+            )
             
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
     
     async def call_deepseek(
         self,
@@ -100,17 +102,17 @@ class AIService:
             "max_tokens": max_tokens
         }
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(url, headers=headers, json=data)
+        client = http_clients.get("deepseek")
+        response = await client.post(url, headers=headers, json=data)
             
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"DeepSeek API 调用失败: {response.text}"
-                )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"DeepSeek API 调用失败: {response.text}"
+            )
             
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+        result = response.json()
+        return result["choices"][0]["message"]["content"]
     
     async def analyze_question(
         self,
@@ -269,10 +271,16 @@ class AIService:
         Returns:
             向量嵌入（1536维）
         """
+        # 先查缓存，相同文本不重复请求
+        if self.embedding_cache is not None:
+            cached = await self.embedding_cache.get(settings.EMBEDDING_MODEL, text)
+            if cached is not None:
+                return cached
+        
         if not self.openai_configured:
             raise HTTPException(status_code=500, detail="OpenAI API 未配置")
         
-        url = "https://api.openai.com/v1/embeddings"
+        url = f"{settings.OPENAI_BASE_URL}/embeddings"
         headers = {
             "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
             "Content-Type": "application/json"
@@ -282,17 +290,89 @@ class AIService:
             "input": text
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, headers=headers, json=data)
+        client = http_clients.get("openai")
+        response = await client.post(url, headers=headers, json=data, timeout=30.0)
             
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"生成向量嵌入失败: {response.text}"
-                )
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"生成向量嵌入失败: {response.text}"
+            )
             
-            result = response.json()
-            return result["data"][0]["embedding"]
+        result = response.json()
+        embedding = result["data"][0]["embedding"]
+        
+        if self.embedding_cache is not None:
+            await self.embedding_cache.set(settings.EMBEDDING_MODEL, text, embedding)
+        return embedding
+    
+    async def generate_embeddings(
+        self,
+        texts: List[str],
+        timeout: float = 60.0,
+        use_cache: bool = True
+    ) -> List[List[float]]:
+        """
+        批量生成文本的向量嵌入（单次请求多条输入）
+        
+        Args:
+            texts: 文本列表
+            timeout: 请求超时时间（秒）
+            use_cache: 是否读写嵌入缓存（大批量回填时关闭，避免冲掉热点条目）
+        
+        Returns:
+            向量嵌入列表，顺序与输入一致
+        """
+        if not texts:
+            return []
+        
+        cache = self.embedding_cache if use_cache else None
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if cache is not None:
+            embeddings = await cache.get_many(settings.EMBEDDING_MODEL, texts)
+        
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        missing_texts = [texts[i] for i in missing]
+        
+        if not self.openai_configured:
+            raise HTTPException(status_code=500, detail="OpenAI API 未配置")
+        
+        url = f"{settings.OPENAI_BASE_URL}/embeddings"
+        headers = {
+            "Authorization": f"Bearer {settings.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": settings.EMBEDDING_MODEL,
+            "input": missing_texts
+        }
+        
+        client = http_clients.get("openai")
+        response = await client.post(url, headers=headers, json=data, timeout=timeout)
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"批量生成向量嵌入失败: {response.text}"
+            )
+        
+        result = response.json()
+        items = sorted(result["data"], key=lambda item: item.get("index", 0))
+        if len(items) != len(missing_texts):
+            raise HTTPException(
+                status_code=500,
+                detail=f"批量生成向量嵌入失败: 期望 {len(missing_texts)} 条结果，实际 {len(items)} 条"
+            )
+        
+        new_embeddings = [item["embedding"] for item in items]
+        for i, embedding in zip(missing, new_embeddings):
+            embeddings[i] = embedding
+        
+        if cache is not None:
+            await cache.set_many(settings.EMBEDDING_MODEL, missing_texts, new_embeddings)
+        return embeddings
 
 
 # 创建全局 AI 服务实例
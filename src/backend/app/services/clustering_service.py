@@ -0,0 +1,353 @@
+"""
+向量聚类引擎
+基于 NumPy 在进程内对知识图谱节点的向量嵌入进行聚类
+"""
+
+from enum import Enum
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class ClusterMode(Enum):
+    """聚类模式"""
+    GREEDY = "greedy"  # 贪心聚类（按顺序以未访问节点为种子吸收相似节点）
+    CONNECTED = "connected"  # 连通分量（相似度超过阈值的节点传递性地归为一簇）
+    AGGLOMERATIVE = "agglomerative"  # 层次聚类（平均链接，合并到相似度低于阈值为止）
+    KMEANS = "kmeans"  # 球面 K-Means（余弦相似度）
+
+
+class ClusteringEngine:
+    """
+    向量聚类引擎
+    
+    所有向量一次性载入为连续的 float32 矩阵并做 L2 归一化，
+    余弦相似度即为矩阵乘积。相似度分块计算、逐块处理，不保存 N x N 矩阵或全局边数组：
+    connected 模式每块 tile_size x tile_size，greedy 模式每块 tile_size x N
+    （agglomerative 模式需要完整矩阵，节点数单独限制）。
+    """
+    
+    def __init__(self, tile_size: Optional[int] = None):
+        """
+        初始化聚类引擎
+        
+        Args:
+            tile_size: 相似度分块大小（默认取配置）
+        """
+        self.tile_size = max(1, int(tile_size or settings.CLUSTER_TILE_SIZE))
+    
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        """
+        转换为连续的 float32 矩阵并按行 L2 归一化
+        
+        Args:
+            matrix: (N, D) 向量矩阵
+        
+        Returns:
+            归一化后的矩阵
+        """
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if matrix.ndim != 2:
+            raise ValueError("向量矩阵必须是二维的")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    @staticmethod
+    def validate(mode: ClusterMode, n_nodes: int) -> None:
+        """
+        校验聚类模式能否处理给定规模的节点
+        
+        Args:
+            mode: 聚类模式
+            n_nodes: 节点数量
+        
+        Raises:
+            ValueError: 节点数超过该模式的上限
+        """
+        if mode == ClusterMode.AGGLOMERATIVE and n_nodes > settings.CLUSTER_AGGLOMERATIVE_MAX_NODES:
+            raise ValueError(
+                f"层次聚类最多支持 {settings.CLUSTER_AGGLOMERATIVE_MAX_NODES} 个节点，"
+                f"当前 {n_nodes} 个，请使用 connected 或 kmeans 模式"
+            )
+    
+    def iter_similarity_tiles(
+        self,
+        matrix: np.ndarray
+    ) -> Iterator[Tuple[int, int, np.ndarray]]:
+        """
+        分块计算上三角相似度矩阵
+        
+        Args:
+            matrix: 已归一化的 (N, D) 矩阵
+        
+        Yields:
+            (行起点, 列起点, 相似度分块)
+        """
+        n = matrix.shape[0]
+        for row_start in range(0, n, self.tile_size):
+            row_block = matrix[row_start:row_start + self.tile_size]
+            for col_start in range(row_start, n, self.tile_size):
+                col_block = matrix[col_start:col_start + self.tile_size]
+                yield row_start, col_start, row_block @ col_block.T
+    
+    def iter_similarity_edges(
+        self,
+        matrix: np.ndarray,
+        threshold: float
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        逐块找出相似度不低于阈值的节点对（i < j），不汇总为全局边数组
+        
+        Args:
+            matrix: 已归一化的 (N, D) 矩阵
+            threshold: 相似度阈值
+        
+        Yields:
+            每个分块的 (源索引数组, 目标索引数组)
+        """
+        for row_start, col_start, tile in self.iter_similarity_tiles(matrix):
+            rows, cols = np.nonzero(tile >= threshold)
+            rows = rows + row_start
+            cols = cols + col_start
+            upper = rows < cols
+            if upper.any():
+                yield rows[upper].astype(np.int64), cols[upper].astype(np.int64)
+    
+    @staticmethod
+    def _find(parents: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """并查集：查找节点的根（向量化），并把节点直接指向根"""
+        roots = parents[nodes]
+        while True:
+            grandparents = parents[roots]
+            if np.array_equal(grandparents, roots):
+                break
+            roots = grandparents
+        parents[nodes] = roots
+        return roots
+    
+    def greedy(self, matrix: np.ndarray, threshold: float) -> Iterator[List[int]]:
+        """
+        贪心聚类
+        
+        按节点顺序，以每个未访问节点为种子，吸收所有与种子相似度
+        不低于阈值且未访问的节点。按 tile_size 行分块计算种子与其后所有节点的相似度
+        （种子之前的节点都已访问），内存占用为 tile_size x N；
+        簇在确定后立即产出，可以流式返回。
+        """
+        n = matrix.shape[0]
+        visited = np.zeros(n, dtype=bool)
+        
+        for row_start in range(0, n, self.tile_size):
+            row_end = min(n, row_start + self.tile_size)
+            if visited[row_start:row_end].all():
+                continue
+            similar = (matrix[row_start:row_end] @ matrix[row_start:].T) >= threshold
+            
+            for offset in range(row_end - row_start):
+                seed = row_start + offset
+                if visited[seed]:
+                    continue
+                members = np.nonzero(similar[offset] & ~visited[row_start:])[0] + row_start
+                members = members[members != seed]
+                visited[seed] = True
+                visited[members] = True
+                yield [seed] + members.tolist()
+    
+    def connected_components(self, matrix: np.ndarray, threshold: float) -> Iterator[List[int]]:
+        """
+        连通分量聚类（等价于单链接层次聚类在阈值处截断）
+        
+        逐个相似度分块做向量化的并查集合并（根节点指向编号更小的根），
+        内存占用为一个分块的边和长度为 N 的父节点数组，不保存全局边数组。
+        """
+        n = matrix.shape[0]
+        parents = np.arange(n, dtype=np.int64)
+        
+        for sources, targets in self.iter_similarity_edges(matrix, threshold):
+            while sources.size:
+                source_roots = self._find(parents, sources)
+                target_roots = self._find(parents, targets)
+                pending = source_roots != target_roots
+                if not pending.any():
+                    break
+                # 已在同一集合的节点对以后也不会分开
+                sources, targets = sources[pending], targets[pending]
+                source_roots, target_roots = source_roots[pending], target_roots[pending]
+                np.minimum.at(
+                    parents,
+                    np.maximum(source_roots, target_roots),
+                    np.minimum(source_roots, target_roots),
+                )
+        
+        yield from self._groups_from_labels(self._find(parents, np.arange(n, dtype=np.int64)))
+    
+    def agglomerative(self, matrix: np.ndarray, threshold: float) -> Iterator[List[int]]:
+        """
+        平均链接层次聚类
+        
+        簇间相似度按 Lance-Williams 公式增量更新，每行缓存最近邻，
+        合并到最大簇间相似度低于阈值为止。需要 N x N 相似度矩阵，
+        节点数受配置 CLUSTER_AGGLOMERATIVE_MAX_NODES 限制。
+        """
+        n = matrix.shape[0]
+        self.validate(ClusterMode.AGGLOMERATIVE, n)
+        if n == 0:
+            return
+        
+        similarity = np.empty((n, n), dtype=np.float32)
+        for row_start, col_start, tile in self.iter_similarity_tiles(matrix):
+            rows = slice(row_start, row_start + tile.shape[0])
+            cols = slice(col_start, col_start + tile.shape[1])
+            similarity[rows, cols] = tile
+            similarity[cols, rows] = tile.T
+        np.fill_diagonal(similarity, -np.inf)
+        
+        sizes = np.ones(n, dtype=np.float32)
+        labels = np.arange(n, dtype=np.int64)
+        active = np.ones(n, dtype=bool)
+        nearest = np.argmax(similarity, axis=1)
+        best = similarity[np.arange(n), nearest]
+        
+        while True:
+            i = int(np.argmax(best))
+            if not np.isfinite(best[i]) or best[i] < threshold:
+                break
+            j = int(nearest[i])
+            
+            # 合并 j 到 i（平均链接）
+            merged = (sizes[i] * similarity[i] + sizes[j] * similarity[j]) / (sizes[i] + sizes[j])
+            merged[i] = -np.inf
+            merged[~active] = -np.inf
+            similarity[i] = merged
+            similarity[:, i] = merged
+            similarity[j] = -np.inf
+            similarity[:, j] = -np.inf
+            sizes[i] += sizes[j]
+            active[j] = False
+            labels[labels == j] = i
+            best[j] = -np.inf
+            
+            # 更新最近邻缓存：i 自身、以及最近邻曾是 i 或 j 的行
+            stale = np.nonzero(active & ((nearest == i) | (nearest == j)))[0]
+            for k in np.append(stale, i):
+                nearest[k] = np.argmax(similarity[k])
+                best[k] = similarity[k, nearest[k]]
+            improved = active & (merged > best)
+            nearest[improved] = i
+            best[improved] = merged[improved]
+        
+        yield from self._groups_from_labels(labels)
+    
+    def kmeans(
+        self,
+        matrix: np.ndarray,
+        n_clusters: Optional[int] = None,
+        max_iter: int = 50,
+        seed: int = 0
+    ) -> Iterator[List[int]]:
+        """
+        球面 K-Means（余弦相似度）
+        
+        k-means++ 初始化；分配步骤按行分块计算与质心的相似度，
+        内存占用为 tile_size x K。
+        
+        Args:
+            matrix: 已归一化的 (N, D) 矩阵
+            n_clusters: 簇数（默认 sqrt(N/2)）
+            max_iter: 最大迭代次数
+            seed: 随机种子
+        """
+        n = matrix.shape[0]
+        if n == 0:
+            return
+        k = int(n_clusters or max(1, round(np.sqrt(n / 2))))
+        k = min(k, n)
+        rng = np.random.default_rng(seed)
+        
+        # k-means++ 初始化（余弦距离）
+        centroids = np.empty((k, matrix.shape[1]), dtype=np.float32)
+        centroids[0] = matrix[rng.integers(n)]
+        closest = 1.0 - matrix @ centroids[0]
+        for c in range(1, k):
+            weights = np.clip(closest, 0, None) ** 2
+            total = weights.sum()
+            index = rng.choice(n, p=weights / total) if total > 0 else rng.integers(n)
+            centroids[c] = matrix[index]
+            closest = np.minimum(closest, 1.0 - matrix @ centroids[c])
+        
+        labels = np.full(n, -1, dtype=np.int64)
+        for _ in range(max_iter):
+            new_labels = np.empty(n, dtype=np.int64)
+            for start in range(0, n, self.tile_size):
+                block = matrix[start:start + self.tile_size]
+                new_labels[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+            
+            if np.array_equal(new_labels, labels):
+                break
+            labels = new_labels
+            
+            # 更新质心并重新归一化，空簇保留原质心
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, matrix)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            non_empty = norms[:, 0] > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty]
+        
+        yield from self._groups_from_labels(labels)
+    
+    @staticmethod
+    def _groups_from_labels(labels: np.ndarray) -> Iterator[List[int]]:
+        """按标签分组，按每组最小索引排序输出"""
+        if labels.size == 0:
+            return
+        order = np.argsort(labels, kind="stable")
+        sorted_labels = labels[order]
+        boundaries = np.nonzero(np.diff(sorted_labels))[0] + 1
+        groups = np.split(order, boundaries)
+        groups.sort(key=lambda group: group[0])
+        for group in groups:
+            yield group.tolist()
+    
+    def cluster(
+        self,
+        matrix: np.ndarray,
+        mode: ClusterMode = ClusterMode.GREEDY,
+        similarity_threshold: float = 0.8,
+        n_clusters: Optional[int] = None,
+        min_cluster_size: int = 2
+    ) -> Iterator[List[int]]:
+        """
+        对向量矩阵聚类
+        
+        Args:
+            matrix: (N, D) 向量矩阵（无需预先归一化）
+            mode: 聚类模式
+            similarity_threshold: 相似度阈值（kmeans 模式不使用）
+            n_clusters: 簇数（仅 kmeans 模式）
+            min_cluster_size: 最小簇大小，小于该值的簇不输出
+        
+        Yields:
+            每个簇的行索引列表
+        """
+        matrix = self.normalize(matrix)
+        
+        if mode == ClusterMode.GREEDY:
+            clusters = self.greedy(matrix, similarity_threshold)
+        elif mode == ClusterMode.CONNECTED:
+            clusters = self.connected_components(matrix, similarity_threshold)
+        elif mode == ClusterMode.AGGLOMERATIVE:
+            clusters = self.agglomerative(matrix, similarity_threshold)
+        else:  # KMEANS
+            clusters = self.kmeans(matrix, n_clusters=n_clusters)
+        
+        for cluster in clusters:
+            if len(cluster) >= min_cluster_size:
+                yield cluster
+
+
+# 创建全局聚类引擎实例
+clustering_engine = ClusteringEngine()
@@ -0,0 +1,371 @@
+"""
+向量嵌入回填服务
+为缺少向量嵌入的节点批量生成嵌入：服务端游标流式读取、按 token 预算打包多输入请求、
+有界并发调用嵌入接口、批量 UPDATE 写回，并记录检查点以便中断后恢复
+"""
+
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.embedding_backfill import EmbeddingBackfillCheckpoint
+from app.models.memory_node import MemoryNode
+from app.services.ai_service import ai_service
+
+
+# 中日韩字符约 1 字 1 token，其他字符约 4 字符 1 token
+_CJK_PATTERN = re.compile(r"[　-〿぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+
+def build_embedding_text(title: str, summary: Optional[str], content_data: Any) -> str:
+    """
+    构建节点的嵌入文本（标题 + 摘要 + 内容）
+    
+    Args:
+        title: 节点标题
+        summary: 节点摘要
+        content_data: 节点内容数据
+    
+    Returns:
+        嵌入文本
+    """
+    embedding_text_parts = [title]
+    
+    if summary:
+        embedding_text_parts.append(summary)
+    
+    # 从 content_data 中提取文本内容
+    if isinstance(content_data, dict):
+        if "question" in content_data:
+            embedding_text_parts.append(content_data["question"])
+        if "answer" in content_data:
+            embedding_text_parts.append(content_data["answer"])
+        if "content" in content_data:
+            embedding_text_parts.append(str(content_data["content"]))
+    
+    return " ".join(str(part) for part in embedding_text_parts)
+
+
+def estimate_tokens(value: str) -> int:
+    """
+    估算文本的 token 数（不依赖分词器的保守估算）
+    
+    Args:
+        value: 文本
+    
+    Returns:
+        估算的 token 数
+    """
+    cjk = len(_CJK_PATTERN.findall(value))
+    return max(1, cjk + (len(value) - cjk + 3) // 4)
+
+
+@dataclass
+class _Batch:
+    """一次嵌入请求的输入批次"""
+    
+    seq: int
+    node_ids: List[UUID] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+class EmbeddingBackfillService:
+    """向量嵌入回填服务"""
+    
+    # 单个批次调用嵌入接口的最大尝试次数
+    MAX_ATTEMPTS = 3
+    
+    @staticmethod
+    def _scope(graph_id: Optional[UUID]) -> str:
+        """检查点范围键"""
+        return str(graph_id) if graph_id else "all"
+    
+    @staticmethod
+    def _truncate(value: str, max_tokens: int) -> Tuple[str, int]:
+        """把文本截断到 token 上限以内"""
+        tokens = estimate_tokens(value)
+        while tokens > max_tokens:
+            value = value[:max(1, int(len(value) * max_tokens / tokens) - 1)]
+            tokens = estimate_tokens(value)
+        return value, tokens
+    
+    @staticmethod
+    def _vector_literal(embedding: List[float]) -> str:
+        """把向量格式化为 pgvector 文本格式"""
+        return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+    
+    async def get_checkpoint(
+        self,
+        db: AsyncSession,
+        graph_id: Optional[UUID] = None
+    ) -> Optional[EmbeddingBackfillCheckpoint]:
+        """
+        获取回填检查点
+        
+        Args:
+            db: 数据库会话
+            graph_id: 知识图谱ID（可选）
+        
+        Returns:
+            检查点，不存在时返回 None
+        """
+        result = await db.execute(
+            select(EmbeddingBackfillCheckpoint)
+            .where(EmbeddingBackfillCheckpoint.scope == self._scope(graph_id))
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
+    async def write_embeddings(
+        self,
+        db: AsyncSession,
+        node_ids: List[UUID],
+        embeddings: List[List[float]]
+    ) -> int:
+        """
+        用一条 UPDATE ... FROM (VALUES ...) 批量写回向量
+        
+        只更新仍没有向量的节点，重复写入（例如恢复时）不会覆盖已有结果。
+        
+        Args:
+            db: 数据库会话
+            node_ids: 节点ID列表
+            embeddings: 向量列表（与节点ID一一对应）
+        
+        Returns:
+            实际更新的行数
+        """
+        if not node_ids:
+            return 0
+        
+        values = ", ".join(
+            f"(CAST(:id_{i} AS uuid), CAST(CAST(:embedding_{i} AS text) AS vector))"
+            for i in range(len(node_ids))
+        )
+        params = {}
+        for i, (node_id, embedding) in enumerate(zip(node_ids, embeddings)):
+            params[f"id_{i}"] = str(node_id)
+            params[f"embedding_{i}"] = self._vector_literal(embedding)
+        
+        result = await db.execute(
+            text(
+                f"""
+                UPDATE memory_nodes AS m
+                SET content_embedding = v.embedding,
+                    updated_at = NOW()
+                FROM (VALUES {values}) AS v(id, embedding)
+                WHERE m.id = v.id
+                  AND m.content_embedding IS NULL
+                """
+            ),
+            params
+        )
+        return result.rowcount or 0
+    
+    async def _embed_batch(self, batch: _Batch) -> List[List[float]]:
+        """调用嵌入接口，失败时指数退避重试"""
+        for attempt in range(self.MAX_ATTEMPTS):
+            try:
+                # 回填文本基本不会重复，绕过缓存以免冲掉查询热点
+                embeddings = await ai_service.generate_embeddings(batch.texts, use_cache=False)
+                for embedding in embeddings:
+                    if len(embedding) != settings.EMBEDDING_DIMENSION:
+                        raise ValueError(
+                            f"向量维度不匹配: 期望 {settings.EMBEDDING_DIMENSION}，实际 {len(embedding)}"
+                        )
+                return embeddings
+            except Exception:
+                if attempt == self.MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(0.5 * 2 ** attempt)
+        return []
+    
+    async def run(
+        self,
+        db: AsyncSession,
+        graph_id: Optional[UUID] = None,
+        restart: bool = False,
+        concurrency: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_batch_inputs: Optional[int] = None,
+        fetch_size: Optional[int] = None
+    ) -> Dict:
+        """
+        回填缺失的向量嵌入
+        
+        读取使用独立连接上的服务端游标（按 id 排序流式读取），
+        写入和检查点使用传入的会话，每个批次一个事务。
+        批次可能乱序完成，检查点只推进到连续完成的最后一个批次。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 限制在特定知识图谱（可选）
+            restart: 忽略已有检查点，从头开始
+            concurrency: 同时进行的嵌入请求数
+            max_batch_tokens: 单次请求的 token 预算
+            max_batch_inputs: 单次请求的最大输入条数
+            fetch_size: 服务端游标每次读取的行数
+        
+        Returns:
+            回填报告（数量、吞吐量、是否从检查点恢复）
+        """
+        concurrency = max(1, concurrency or settings.EMBEDDING_BACKFILL_CONCURRENCY)
+        max_batch_tokens = max_batch_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        max_batch_inputs = max_batch_inputs or settings.EMBEDDING_BATCH_MAX_INPUTS
+        fetch_size = fetch_size or settings.EMBEDDING_BACKFILL_FETCH_SIZE
+        max_input_tokens = min(settings.EMBEDDING_MAX_INPUT_TOKENS, max_batch_tokens)
+        
+        # 加载或重置检查点
+        scope = self._scope(graph_id)
+        checkpoint = await self.get_checkpoint(db, graph_id)
+        resumed_from = None
+        if checkpoint is None:
+            checkpoint = EmbeddingBackfillCheckpoint(scope=scope)
+            db.add(checkpoint)
+        elif restart or checkpoint.completed:
+            checkpoint.last_node_id = None
+        else:
+            resumed_from = checkpoint.last_node_id
+        if resumed_from is None:
+            checkpoint.processed_count = 0
+            checkpoint.updated_count = 0
+            checkpoint.failed_count = 0
+            checkpoint.token_count = 0
+        checkpoint.completed = False
+        await db.commit()
+        
+        query = select(
+            MemoryNode.id,
+            MemoryNode.title,
+            MemoryNode.summary,
+            MemoryNode.content_data
+        ).where(
+            MemoryNode.deleted_at.is_(None),
+            MemoryNode.content_embedding.is_(None)
+        )
+        if graph_id:
+            query = query.where(MemoryNode.graph_id == graph_id)
+        if resumed_from:
+            query = query.where(MemoryNode.id > resumed_from)
+        query = query.order_by(MemoryNode.id).execution_options(yield_per=fetch_size)
+        
+        batch_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        result_queue: asyncio.Queue = asyncio.Queue()
+        
+        async def produce() -> None:
+            """流式读取节点并按预算打包"""
+            seq = 0
+            batch = _Batch(seq=seq)
+            async with db.bind.connect() as conn:
+                result = await conn.stream(query)
+                async for row in result:
+                    value, tokens = self._truncate(
+                        build_embedding_text(row.title, row.summary, row.content_data),
+                        max_input_tokens
+                    )
+                    if batch.node_ids and (
+                        batch.tokens + tokens > max_batch_tokens
+                        or len(batch.node_ids) >= max_batch_inputs
+                    ):
+                        await batch_queue.put(batch)
+                        seq += 1
+                        batch = _Batch(seq=seq)
+                    batch.node_ids.append(row.id)
+                    batch.texts.append(value)
+                    batch.tokens += tokens
+            if batch.node_ids:
+                await batch_queue.put(batch)
+            for _ in range(concurrency):
+                await batch_queue.put(None)
+        
+        async def embed_worker() -> None:
+            """调用嵌入接口，把结果交给写入端"""
+            while True:
+                batch = await batch_queue.get()
+                if batch is None:
+                    await result_queue.put(None)
+                    return
+                try:
+                    await result_queue.put((batch, await self._embed_batch(batch), None))
+                except Exception as e:
+                    await result_queue.put((batch, None, e))
+        
+        stats = {"processed": 0, "updated": 0, "failed": 0, "tokens": 0, "requests": 0}
+        errors: List[str] = []
+        completed_batches: Dict[int, UUID] = {}
+        next_seq = 0
+        start = time.perf_counter()
+        
+        tasks = [asyncio.create_task(produce())]
+        tasks += [asyncio.create_task(embed_worker()) for _ in range(concurrency)]
+        
+        try:
+            finished_workers = 0
+            while finished_workers < concurrency:
+                item = await result_queue.get()
+                if item is None:
+                    finished_workers += 1
+                    continue
+                
+                batch, embeddings, error = item
+                stats["requests"] += 1
+                stats["processed"] += len(batch.node_ids)
+                stats["tokens"] += batch.tokens
+                
+                if error is None:
+                    updated = await self.write_embeddings(db, batch.node_ids, embeddings)
+                    stats["updated"] += updated
+                    checkpoint.updated_count += updated
+                else:
+                    # 失败的节点保持无向量，restart 时会重新处理
+                    stats["failed"] += len(batch.node_ids)
+                    checkpoint.failed_count += len(batch.node_ids)
+                    errors.append(str(getattr(error, "detail", error)))
+                    print(f"批次 {batch.seq} 生成向量嵌入失败: {errors[-1]}")
+                
+                checkpoint.processed_count += len(batch.node_ids)
+                checkpoint.token_count += batch.tokens
+                
+                # 检查点只推进到连续完成的批次
+                completed_batches[batch.seq] = batch.node_ids[-1]
+                while next_seq in completed_batches:
+                    checkpoint.last_node_id = completed_batches.pop(next_seq)
+                    next_seq += 1
+                
+                await db.commit()
+            
+            # 读取端异常需要在这里抛出
+            await tasks[0]
+            checkpoint.completed = True
+            await db.commit()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        elapsed = time.perf_counter() - start
+        return {
+            "scope": scope,
+            "resumed_from": resumed_from,
+            "processed_count": stats["processed"],
+            "updated_count": stats["updated"],
+            "failed_count": stats["failed"],
+            "request_count": stats["requests"],
+            "token_count": stats["tokens"],
+            "elapsed_seconds": round(elapsed, 3),
+            "nodes_per_second": round(stats["processed"] / elapsed, 2) if elapsed > 0 else 0.0,
+            "tokens_per_second": round(stats["tokens"] / elapsed, 2) if elapsed > 0 else 0.0,
+            "errors": errors[:10],
+        }
+
+
+# 创建全局向量嵌入回填服务实例
+embedding_backfill_service = EmbeddingBackfillService()
@@ -0,0 +1,244 @@
+"""
+向量嵌入缓存服务
+两级缓存：进程内 LRU（按字节计量容量）+ 可选的 Redis（紧凑二进制存储）
+缓存键为 (模型, 归一化文本哈希)
+"""
+
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+
+# Redis 二进制格式的头字节，标识存储精度
+_DTYPE_HEADERS = {
+    "float16": b"\x02",
+    "float32": b"\x04",
+}
+_HEADER_DTYPES = {header: dtype for dtype, header in _DTYPE_HEADERS.items()}
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class EmbeddingCache:
+    """
+    向量嵌入缓存
+    
+    本地 LRU 中的向量以 float32 数组存储，容量按字节计算，超出时淘汰
+    最久未使用的条目；条目过期（TTL）后视为未命中。本地未命中时查询 Redis，
+    命中后回填本地。Redis 不可用时只记录错误，不影响嵌入生成。
+    """
+    
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+        redis_enabled: Optional[bool] = None,
+        redis_dtype: Optional[str] = None
+    ):
+        """
+        初始化嵌入缓存
+        
+        Args:
+            max_bytes: 本地 LRU 容量（字节，默认取配置）
+            ttl_seconds: 缓存有效期（秒，默认取配置）
+            redis_enabled: 是否启用 Redis 二级缓存（默认取配置）
+            redis_dtype: Redis 存储精度 float16 或 float32（默认取配置）
+        """
+        self.max_bytes = settings.EMBEDDING_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl_seconds = settings.EMBEDDING_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.redis_enabled = settings.EMBEDDING_CACHE_REDIS_ENABLED if redis_enabled is None else redis_enabled
+        self.redis_dtype = (redis_dtype or settings.EMBEDDING_CACHE_REDIS_DTYPE).lower()
+        if self.redis_dtype not in _DTYPE_HEADERS:
+            raise ValueError(f"不支持的缓存精度: {self.redis_dtype}。支持: float16, float32")
+        
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._bytes = 0
+        self._redis = None
+        self._counters = {
+            "hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "redis_errors": 0,
+        }
+    
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        生成缓存键
+        
+        文本做 NFKC 归一化、合并空白并去除首尾空白后取 SHA-256，
+        仅空白或全半角差异的文本共用同一个缓存条目。
+        
+        Args:
+            model: 嵌入模型名称
+            text: 文本
+        
+        Returns:
+            缓存键
+        """
+        normalized = _WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+    
+    @staticmethod
+    def _entry_size(key: str, vector: np.ndarray) -> int:
+        """条目占用的字节数（向量数据 + 键）"""
+        return vector.nbytes + len(key)
+    
+    def _get_local(self, key: str) -> Optional[np.ndarray]:
+        """读取本地 LRU，命中时移到队尾"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        expires_at, vector = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self._counters["expirations"] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        return vector
+    
+    def _put_local(self, key: str, vector: np.ndarray) -> None:
+        """写入本地 LRU，超出容量时淘汰最久未使用的条目"""
+        size = self._entry_size(key, vector)
+        if size > self.max_bytes:
+            return
+        
+        if key in self._entries:
+            self._remove(key)
+        
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, vector)
+        self._bytes += size
+        
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+    
+    def _remove(self, key: str) -> None:
+        """删除本地条目并更新字节计数"""
+        _, vector = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, vector)
+    
+    def _get_redis_client(self):
+        """延迟创建 Redis 客户端"""
+        if self._redis is None:
+            import redis.asyncio as redis
+            
+            self._redis = redis.from_url(settings.redis_url)
+        return self._redis
+    
+    def encode(self, vector: np.ndarray) -> bytes:
+        """把向量编码为 Redis 中存储的二进制（头字节 + 原始数组）"""
+        return _DTYPE_HEADERS[self.redis_dtype] + vector.astype(self.redis_dtype).tobytes()
+    
+    @staticmethod
+    def decode(blob: bytes) -> Optional[np.ndarray]:
+        """解码 Redis 中的二进制，格式不识别时返回 None"""
+        dtype = _HEADER_DTYPES.get(blob[:1])
+        if dtype is None:
+            return None
+        return np.frombuffer(blob[1:], dtype=dtype).astype(np.float32)
+    
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        批量读取缓存
+        
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+        
+        Returns:
+            与输入对应的向量列表，未命中的位置为 None
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [self._get_local(key) for key in keys]
+        hits = sum(1 for vector in results if vector is not None)
+        self._counters["hits"] += hits
+        
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing and self.redis_enabled:
+            try:
+                blobs = await self._get_redis_client().mget([f"embedding:{keys[i]}" for i in missing])
+            except Exception:
+                self._counters["redis_errors"] += 1
+                blobs = [None] * len(missing)
+            
+            for i, blob in zip(missing, blobs):
+                vector = self.decode(blob) if blob else None
+                if vector is not None:
+                    results[i] = vector
+                    self._put_local(keys[i], vector)
+                    self._counters["redis_hits"] += 1
+        
+        self._counters["misses"] += sum(1 for vector in results if vector is None)
+        return [vector.tolist() if vector is not None else None for vector in results]
+    
+    async def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        """
+        批量写入缓存
+        
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+            embeddings: 向量列表（与文本一一对应）
+        """
+        items = []
+        for text, embedding in zip(texts, embeddings):
+            key = self.make_key(model, text)
+            vector = np.asarray(embedding, dtype=np.float32)
+            self._put_local(key, vector)
+            items.append((f"embedding:{key}", self.encode(vector)))
+        
+        if items and self.redis_enabled:
+            try:
+                async with self._get_redis_client().pipeline(transaction=False) as pipe:
+                    for redis_key, blob in items:
+                        pipe.set(redis_key, blob, ex=self.ttl_seconds)
+                    await pipe.execute()
+            except Exception:
+                self._counters["redis_errors"] += 1
+    
+    async def get(self, model: str, text: str) -> Optional[List[float]]:
+        """读取单条缓存"""
+        return (await self.get_many(model, [text]))[0]
+    
+    async def set(self, model: str, text: str, embedding: List[float]) -> None:
+        """写入单条缓存"""
+        await self.set_many(model, [text], [embedding])
+    
+    def clear(self) -> None:
+        """清空本地缓存（不影响 Redis）"""
+        self._entries.clear()
+        self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """
+        获取缓存统计
+        
+        Returns:
+            命中、未命中、淘汰等计数和当前容量
+        """
+        lookups = self._counters["hits"] + self._counters["redis_hits"] + self._counters["misses"]
+        hit_count = self._counters["hits"] + self._counters["redis_hits"]
+        return {
+            **self._counters,
+            "hit_rate": round(hit_count / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "redis_enabled": self.redis_enabled,
+            "redis_dtype": self.redis_dtype,
+        }
@@ -1,17 +1,57 @@
 """
 文件存储服务
-支持本地存储和阿里云 OSS
+支持本地存储和阿里云 OSS；上传的文件按内容寻址存储，相同内容只存储一份
+上传时分块流式写入（本地 aiofiles / OSS 分片上传），同时计算哈希、识别图片格式和检查大小，内存占用与文件大小无关
 """
 
+import asyncio
+import hashlib
 import os
+import shutil
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, Tuple
-from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
 
+import aiofiles
 from fastapi import UploadFile, HTTPException
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
+from app.models.file_blob import FileBlob
+from app.models.file_upload import FileUpload
+from app.services.image_processing_service import image_processing_service
+
+
+# 读取上传文件和计算哈希时每次处理的字节数
+CHUNK_SIZE = 1024 * 1024
+
+# 图片格式的文件头（按文件头识别实际格式，不信任请求中的 Content-Type）
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+# 识别格式需要读取的文件头字节数
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+def sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    按文件头识别图片格式
+    
+    Args:
+        header: 文件开头的字节（至少 SNIFF_BYTES 字节，文件更短时为全部内容）
+    
+    Returns:
+        MIME 类型，无法识别时返回 None
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    return None
 
 
 class FileStorageService:
@@ -68,120 +108,473 @@ class FileStorageService:
                        f"支持的类型: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
             )
         
-        # 检查文件大小（需要读取文件）
-        file.file.seek(0, 2)  # 移动到文件末尾
-        file_size = file.file.tell()
-        file.file.seek(0)  # 重置到文件开头
+        # 检查文件大小（优先使用解析请求时记录的大小，流式保存时读取过程中还会逐块检查）
+        file_size = file.size
+        if file_size is None:
+            file.file.seek(0, 2)  # 移动到文件末尾
+            file_size = file.file.tell()
+            file.file.seek(0)  # 重置到文件开头
         
+        self.check_size(file_size)
+    
+    def check_size(self, file_size: int) -> None:
+        """
+        检查文件大小
+        
+        Args:
+            file_size: 文件大小（流式读取时为已读取的字节数）
+            
+        Raises:
+            HTTPException: 超过 MAX_UPLOAD_SIZE
+        """
         if file_size > settings.MAX_UPLOAD_SIZE:
             raise HTTPException(
                 status_code=400,
                 detail=f"文件大小超过限制: {file_size} bytes > {settings.MAX_UPLOAD_SIZE} bytes"
             )
     
-    def generate_filename(self, original_filename: str) -> Tuple[str, str]:
+    def check_image_type(self, header: bytes) -> None:
         """
-        生成唯一的文件名
+        按文件头检查图片格式
         
         Args:
-            original_filename: 原始文件名
+            header: 文件开头的字节
             
-        Returns:
-            (存储文件名, 文件扩展名)
+        Raises:
+            HTTPException: 文件内容不是支持的图片格式
         """
-        # 获取文件扩展名
-        ext = Path(original_filename).suffix.lower()
+        mime_type = sniff_image_type(header)
+        if mime_type not in settings.ALLOWED_IMAGE_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"文件内容不是支持的图片格式。"
+                       f"支持的类型: {', '.join(settings.ALLOWED_IMAGE_TYPES)}"
+            )
+    
+    def blob_filename(self, content_hash: str, original_filename: str) -> str:
+        """
+        生成内容寻址的存储文件名
         
-        # 生成唯一文件名: 日期_UUID.ext
-        date_str = datetime.now().strftime("%Y%m%d")
-        unique_id = str(uuid.uuid4())[:8]
-        stored_filename = f"{date_str}_{unique_id}{ext}"
+        Args:
+            content_hash: 文件内容 SHA-256
+            original_filename: 原始文件名（取扩展名）
+            
+        Returns:
+            存储文件名: <SHA-256><扩展名>
+        """
+        return f"{content_hash}{Path(original_filename).suffix.lower()}"
+    
+    def file_url(self, stored_filename: str) -> str:
+        """
+        存储文件的访问 URL
         
-        return stored_filename, ext
+        Args:
+            stored_filename: 存储文件名
+            
+        Returns:
+            本地存储为 /uploads/images/ 下的相对 URL，OSS 为对象 URL
+        """
+        if self.use_oss:
+            return f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT}/images/{stored_filename}"
+        return f"/uploads/images/{stored_filename}"
     
-    async def save_file_local(
-        self,
-        file: UploadFile,
-        stored_filename: str
-    ) -> str:
+    def stored_exists(self, stored_filename: str) -> bool:
+        """存储文件是否存在"""
+        if self.use_oss:
+            return self.oss_bucket.object_exists(f"images/{stored_filename}")
+        return (self.images_dir / stored_filename).exists()
+    
+    def hash_stored(self, stored_filename: str) -> str:
         """
-        保存文件到本地
+        计算已存储文件的 SHA-256（分块读取，阻塞调用）
         
         Args:
-            file: 上传的文件
             stored_filename: 存储文件名
             
         Returns:
-            文件访问 URL
+            十六进制摘要
         """
-        # 保存到本地
-        file_path = self.images_dir / stored_filename
+        digest = hashlib.sha256()
+        if self.use_oss:
+            stream = self.oss_bucket.get_object(f"images/{stored_filename}")
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        else:
+            with open(self.images_dir / stored_filename, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _copy_stored(self, source: str, target: str) -> None:
+        """复制存储文件（本地存储优先使用硬链接）"""
+        if self.use_oss:
+            self.oss_bucket.copy_object(settings.OSS_BUCKET_NAME, f"images/{source}", f"images/{target}")
+            return
         
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        try:
+            os.link(self.images_dir / source, self.images_dir / target)
+        except OSError:
+            shutil.copyfile(self.images_dir / source, self.images_dir / target)
+    
+    def _move_stored(self, source: str, target: str) -> None:
+        """重命名存储文件"""
+        if self.use_oss:
+            self._copy_stored(source, target)
+            self.oss_bucket.delete_object(f"images/{source}")
+        else:
+            os.replace(self.images_dir / source, self.images_dir / target)
+    
+    @asynccontextmanager
+    async def _open_local_writer(self, stored_filename: str) -> AsyncIterator[Callable[[bytes], Awaitable]]:
+        """
+        打开本地存储文件，逐块写入
         
-        # 返回相对 URL
-        return f"/uploads/images/{stored_filename}"
+        Args:
+            stored_filename: 存储文件名
+            
+        Yields:
+            写入一块数据的协程函数
+        """
+        async with aiofiles.open(self.images_dir / stored_filename, "wb") as output:
+            yield output.write
     
-    async def save_file_oss(
-        self,
-        file: UploadFile,
-        stored_filename: str
-    ) -> str:
+    @asynccontextmanager
+    async def _open_oss_writer(self, stored_filename: str) -> AsyncIterator[Callable[[bytes], Awaitable]]:
         """
-        保存文件到阿里云 OSS
+        开始 OSS 分片上传，每块数据上传为一个分片
+        
+        正常退出时合并分片，出错时取消分片上传。
         
         Args:
-            file: 上传的文件
             stored_filename: 存储文件名
             
-        Returns:
-            文件访问 URL
+        Yields:
+            上传一块数据的协程函数
         """
-        # OSS 路径
+        from oss2.models import PartInfo
+        
         oss_path = f"images/{stored_filename}"
+        upload_id = (await asyncio.to_thread(self.oss_bucket.init_multipart_upload, oss_path)).upload_id
+        parts = []
+        
+        async def write(chunk: bytes) -> None:
+            part_number = len(parts) + 1
+            result = await asyncio.to_thread(self.oss_bucket.upload_part, oss_path, upload_id, part_number, chunk)
+            parts.append(PartInfo(part_number, result.etag, size=len(chunk)))
         
-        # 上传到 OSS
-        content = await file.read()
-        self.oss_bucket.put_object(oss_path, content)
+        try:
+            yield write
+        except BaseException:
+            await asyncio.to_thread(self.oss_bucket.abort_multipart_upload, oss_path, upload_id)
+            raise
         
-        # 返回 OSS URL
-        return f"https://{settings.OSS_BUCKET_NAME}.{settings.OSS_ENDPOINT}/{oss_path}"
+        await asyncio.to_thread(self.oss_bucket.complete_multipart_upload, oss_path, upload_id, parts)
     
-    async def save_file(
-        self,
-        file: UploadFile,
-        user_id: uuid.UUID
-    ) -> Tuple[str, str, int]:
+    async def _receive(self, file: UploadFile) -> Tuple[str, str, int]:
         """
-        保存上传的文件
+        分块流式保存上传的文件到临时存储文件
+        
+        每次读取 CHUNK_SIZE 字节，计算 SHA-256、按文件头检查图片格式、检查累计大小，
+        并写入临时文件（本地存储）或作为一个分片上传（OSS），内存占用不随文件大小增长。
+        大小超过限制或格式不符时立即停止读取并删除临时文件。
         
         Args:
             file: 上传的文件
-            user_id: 用户ID
             
         Returns:
-            (存储文件名, 文件URL, 文件大小)
+            (临时存储文件名, 内容哈希, 文件大小)
+            
+        Raises:
+            HTTPException: 文件过大或不是支持的图片格式
+        """
+        digest = hashlib.sha256()
+        header = b""
+        file_size = 0
+        tmp_filename = f".upload-{uuid.uuid4().hex}.part"
+        writer = self._open_oss_writer if self.use_oss else self._open_local_writer
+        
+        try:
+            async with writer(tmp_filename) as write:
+                while chunk := await file.read(CHUNK_SIZE):
+                    file_size += len(chunk)
+                    self.check_size(file_size)
+                    
+                    if len(header) < SNIFF_BYTES:
+                        header += chunk[:SNIFF_BYTES - len(header)]
+                        if len(header) == SNIFF_BYTES:
+                            self.check_image_type(header)
+                    
+                    digest.update(chunk)
+                    await write(chunk)
+                
+                # 文件比文件头短
+                if len(header) < SNIFF_BYTES:
+                    self.check_image_type(header)
+        except BaseException:
+            if not self.use_oss:
+                (self.images_dir / tmp_filename).unlink(missing_ok=True)
+            raise
+        
+        return tmp_filename, digest.hexdigest(), file_size
+    
+    async def store_file(self, db: AsyncSession, file: UploadFile) -> Tuple[str, str, int, str]:
+        """
+        保存上传的文件（内容寻址，相同内容只存储一份）
+        
+        文件先流式保存为临时文件，存储为 <SHA-256><扩展名>，file_blobs 中的引用计数加 1，
+        已有相同内容的文件时删除临时文件。
+        引用计数的行锁持有到调用方提交，与同一文件的删除串行执行；
+        调用方在同一事务中写入上传记录（content_hash 为返回的内容哈希）并提交。
+        
+        Args:
+            db: 数据库会话
+            file: 上传的文件
+            
+        Returns:
+            (存储文件名, 文件URL, 文件大小, 内容哈希)
+            
+        Raises:
+            HTTPException: 文件类型不支持、文件过大或内容不是支持的图片格式
         """
         # 验证文件
         self.validate_file(file)
         
-        # 生成文件名
-        stored_filename, ext = self.generate_filename(file.filename or "upload")
+        tmp_filename, content_hash, file_size = await self._receive(file)
+        try:
+            stored_filename = self.blob_filename(content_hash, file.filename or "upload")
+            statement = insert(FileBlob).values(
+                content_hash=content_hash,
+                stored_filename=stored_filename,
+                file_url=self.file_url(stored_filename),
+                file_size=file_size,
+                ref_count=1,
+            )
+            blob = (await db.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[FileBlob.content_hash],
+                    set_={"ref_count": FileBlob.ref_count + 1, "updated_at": func.now()},
+                ).returning(FileBlob.stored_filename, FileBlob.file_url)
+            )).one()
+            
+            # 新内容，或最后一个引用删除后重新上传
+            if not await asyncio.to_thread(self.stored_exists, blob.stored_filename):
+                await asyncio.to_thread(self._move_stored, tmp_filename, blob.stored_filename)
+                tmp_filename = None
+        finally:
+            if tmp_filename is not None:
+                await asyncio.to_thread(self.delete_file, tmp_filename)
+        
+        return blob.stored_filename, blob.file_url, file_size, content_hash
+    
+    async def preprocess_image(self, stored_filename: str) -> Optional[Dict]:
+        """
+        预处理已存储的图片（生成 OCR 用图和缩略图，存储在原图旁边）
         
-        # 获取文件大小
-        file.file.seek(0, 2)
-        file_size = file.file.tell()
-        file.file.seek(0)
+        相同内容的图片已预处理过时不重新生成。OSS 存储暂不预处理。
+        预处理耗时较长，应在 store_file 的事务提交后调用（不持有 file_blobs 的行锁）。
         
-        # 保存文件
+        Args:
+            stored_filename: 存储文件名
+            
+        Returns:
+            预处理结果（file_uploads.variants），未预处理时返回 None
+        """
         if self.use_oss:
-            file_url = await self.save_file_oss(file, stored_filename)
-        else:
-            file_url = await self.save_file_local(file, stored_filename)
+            return None
+        return await image_processing_service.process(self.images_dir / stored_filename, self.file_url(""))
+    
+    @asynccontextmanager
+    async def release_file(self, db: AsyncSession, file_upload: FileUpload) -> AsyncIterator[None]:
+        """
+        释放上传记录对存储文件的引用（删除上传记录时使用）
+        
+        用法::
+        
+            async with file_storage_service.release_file(db, file_upload):
+                await db.delete(file_upload)
+                await db.commit()
+        
+        引用计数减到 0 时删除 file_blobs 记录，并在持有行锁期间把文件和预处理生成的图片改名为
+        待删除的名称，提交成功后删除、失败时改回；同一内容的并发上传等到提交后重新写入文件。
+        迁移前上传的文件（没有 file_blobs 记录）在提交成功后直接删除。
+        文件操作（本地文件系统或 OSS 请求）在线程中执行，不阻塞事件循环。
+        
+        Args:
+            db: 数据库会话
+            file_upload: 要删除的上传记录
+        """
+        stored_filename = file_upload.stored_filename
+        remaining = None
+        if file_upload.content_hash:
+            remaining = (await db.execute(
+                update(FileBlob)
+                .where(
+                    FileBlob.content_hash == file_upload.content_hash,
+                    FileBlob.stored_filename == stored_filename,
+                )
+                .values(ref_count=FileBlob.ref_count - 1)
+                .returning(FileBlob.ref_count)
+                .execution_options(synchronize_session=False)
+            )).scalar_one_or_none()
+        
+        filenames = [stored_filename, *image_processing_service.filenames(file_upload.variants)]
+        # 存储文件名 -> 待删除的名称
+        pending: Dict[str, str] = {}
+        if remaining is not None and remaining <= 0:
+            await db.execute(delete(FileBlob).where(FileBlob.content_hash == file_upload.content_hash))
+            suffix = uuid.uuid4().hex[:8]
+            for filename in filenames:
+                if await asyncio.to_thread(self.stored_exists, filename):
+                    pending[filename] = f".{filename}.deleting-{suffix}"
+                    await asyncio.to_thread(self._move_stored, filename, pending[filename])
+        
+        try:
+            yield
+        except BaseException:
+            for filename, pending_filename in pending.items():
+                await asyncio.to_thread(self._move_stored, pending_filename, filename)
+            raise
+        
+        for pending_filename in pending.values():
+            await asyncio.to_thread(self.delete_file, pending_filename)
+        if remaining is None:
+            for filename in filenames:
+                await asyncio.to_thread(self.delete_file, filename)
+    
+    async def backfill_blobs(
+        self,
+        db: AsyncSession,
+        batch_size: int = 100,
+        on_progress: Optional[Callable[[Dict], None]] = None
+    ) -> Dict:
+        """
+        把迁移前上传的文件迁移到内容寻址存储
+        
+        按 id 顺序分批处理没有对应 file_blobs 记录的上传记录：计算内容哈希，把文件复制
+        （本地存储为硬链接）为 <SHA-256><扩展名> 并增加引用计数，更新上传记录的存储文件名、
+        URL 和内容哈希；每批提交后删除不再被引用的原文件。文件不存在的记录跳过。
+        中断后重新执行会从未迁移的记录继续。
+        
+        Args:
+            db: 数据库会话
+            batch_size: 每批处理的记录数
+            on_progress: 每批提交后的回调，参数为当前统计
+            
+        Returns:
+            处理、新建存储文件、去重、缺失的记录数，以及删除的原文件数和释放的字节数
+        """
+        stats = {
+            "processed": 0,
+            "stored": 0,
+            "deduplicated": 0,
+            "missing": 0,
+            "removed_files": 0,
+            "freed_bytes": 0,
+        }
+        not_migrated = ~exists().where(FileBlob.stored_filename == FileUpload.stored_filename)
+        last_id = None
+        
+        while True:
+            query = select(FileUpload).where(not_migrated).order_by(FileUpload.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(FileUpload.id > last_id)
+            uploads = (await db.execute(query)).scalars().all()
+            if not uploads:
+                break
+            last_id = uploads[-1].id
+            
+            # 原存储文件名 -> 文件大小
+            replaced: Dict[str, int] = {}
+            for file_upload in uploads:
+                stats["processed"] += 1
+                legacy_filename = file_upload.stored_filename
+                if not await asyncio.to_thread(self.stored_exists, legacy_filename):
+                    stats["missing"] += 1
+                    continue
+                
+                content_hash = await asyncio.to_thread(self.hash_stored, legacy_filename)
+                stored_filename = self.blob_filename(content_hash, legacy_filename)
+                statement = insert(FileBlob).values(
+                    content_hash=content_hash,
+                    stored_filename=stored_filename,
+                    file_url=self.file_url(stored_filename),
+                    file_size=file_upload.file_size,
+                    ref_count=1,
+                )
+                blob = (await db.execute(
+                    statement.on_conflict_do_update(
+                        index_elements=[FileBlob.content_hash],
+                        set_={"ref_count": FileBlob.ref_count + 1, "updated_at": func.now()},
+                    ).returning(FileBlob.stored_filename, FileBlob.file_url)
+                )).one()
+                
+                if await asyncio.to_thread(self.stored_exists, blob.stored_filename):
+                    stats["deduplicated"] += 1
+                else:
+                    await asyncio.to_thread(self._copy_stored, legacy_filename, blob.stored_filename)
+                    stats["stored"] += 1
+                
+                file_upload.stored_filename = blob.stored_filename
+                file_upload.file_url = blob.file_url
+                file_upload.content_hash = content_hash
+                replaced[legacy_filename] = file_upload.file_size
+            
+            await db.commit()
+            
+            if replaced:
+                still_referenced = set((await db.execute(
+                    select(FileUpload.stored_filename).where(FileUpload.stored_filename.in_(list(replaced)))
+                )).scalars())
+                for legacy_filename, file_size in replaced.items():
+                    if legacy_filename not in still_referenced and self.delete_file(legacy_filename):
+                        stats["removed_files"] += 1
+                        stats["freed_bytes"] += file_size
+            
+            if on_progress is not None:
+                on_progress(dict(stats))
+        
+        return stats
+    
+    async def storage_report(self, db: AsyncSession) -> Dict:
+        """
+        统计去重节省的存储空间
+        
+        Args:
+            db: 数据库会话
+            
+        Returns:
+            上传记录数和总大小、存储文件数和实际占用、迁移前的文件、节省的字节数和去重比
+        """
+        uploads = (await db.execute(
+            select(func.count(), func.coalesce(func.sum(FileUpload.file_size), 0))
+        )).one()
+        blobs = (await db.execute(
+            select(
+                func.count(),
+                func.coalesce(func.sum(FileBlob.file_size), 0),
+                func.coalesce(func.sum(FileBlob.ref_count), 0),
+            )
+        )).one()
+        legacy = (await db.execute(
+            select(func.count(), func.coalesce(func.sum(FileUpload.file_size), 0)).where(
+                ~exists().where(FileBlob.stored_filename == FileUpload.stored_filename)
+            )
+        )).one()
         
-        return stored_filename, file_url, file_size
+        logical_bytes = int(uploads[1])
+        stored_bytes = int(blobs[1]) + int(legacy[1])
+        return {
+            "uploads": uploads[0],
+            "logical_bytes": logical_bytes,
+            "blobs": blobs[0],
+            "blob_bytes": int(blobs[1]),
+            "blob_references": int(blobs[2]),
+            "legacy_files": legacy[0],
+            "legacy_bytes": int(legacy[1]),
+            "stored_bytes": stored_bytes,
+            "saved_bytes": logical_bytes - stored_bytes,
+            "dedup_ratio": round(logical_bytes / stored_bytes, 4) if stored_bytes else 1.0,
+        }
     
     def delete_file_local(self, stored_filename: str) -> bool:
         """
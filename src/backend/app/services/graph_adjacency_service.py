@@ -0,0 +1,386 @@
+"""
+图谱邻接表服务
+把知识图谱的全部节点关联加载为 CSR 邻接表（NumPy 下标数组），按图谱缓存在进程内，
+供图谱遍历复习模式做前置优先的深度优先遍历和广度优先扩展
+"""
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import Integer, LargeBinary, SmallInteger, cast, func, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.knowledge_graph import KnowledgeGraph
+from app.models.node_relation import NodeRelation
+
+
+# 前置关系：源节点是目标节点的前置知识（如 极限 → 导数）
+PREREQUISITE_RELATION = "PREREQUISITE"
+
+
+def _build_csr(rows: np.ndarray, cols: np.ndarray, weights: np.ndarray, size: int):
+    """
+    由边列表构建 CSR（每行的邻居按权重从大到小排列）
+    
+    Args:
+        rows: 行下标
+        cols: 列下标
+        weights: 边权重
+        size: 行数
+    
+    Returns:
+        (indptr, indices)
+    """
+    order = np.lexsort((-weights, rows))
+    indptr = np.zeros(size + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, cols[order]
+
+
+def _pack_ids(node_ids: List[UUID]) -> np.ndarray:
+    """把 UUID 列表转换为 S16 数组（字节序与 PostgreSQL 的 uuid 排序一致）"""
+    return np.frombuffer(b"".join(UUID(str(node_id)).bytes for node_id in node_ids), dtype="S16")
+
+
+class GraphAdjacency:
+    """
+    单个图谱的邻接表
+    
+    节点 ID 以 16 字节（S16）按升序存放在 node_ids 中，下标即节点编号；没有关联的节点不在邻接表中。
+    prerequisite_* 为前置关系的反向邻接表（每个节点的前置节点），neighbor_* 为忽略方向、
+    包含所有关联类型的邻接表；每行的邻居按关联强度从大到小排列。
+    """
+    
+    def __init__(
+        self,
+        version: int,
+        node_ids: np.ndarray,
+        prerequisite_indptr: np.ndarray,
+        prerequisite_indices: np.ndarray,
+        neighbor_indptr: np.ndarray,
+        neighbor_indices: np.ndarray
+    ):
+        """初始化邻接表（一般通过 from_arrays 或 from_edges 构建）"""
+        self.version = version
+        self.node_ids = node_ids
+        self.prerequisite_indptr = prerequisite_indptr
+        self.prerequisite_indices = prerequisite_indices
+        self.neighbor_indptr = neighbor_indptr
+        self.neighbor_indices = neighbor_indices
+    
+    @classmethod
+    def from_arrays(
+        cls,
+        version: int,
+        sources: np.ndarray,
+        targets: np.ndarray,
+        strengths: np.ndarray,
+        is_prerequisite: np.ndarray
+    ) -> "GraphAdjacency":
+        """
+        由按列存放的关联构建邻接表
+        
+        Args:
+            version: 图谱的关联版本号
+            sources: 源节点 ID（S16）
+            targets: 目标节点 ID（S16）
+            strengths: 关联强度
+            is_prerequisite: 是否为前置关系
+        
+        Returns:
+            邻接表
+        """
+        edge_count = len(sources)
+        node_ids, inverse = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+        source_index, target_index = inverse[:edge_count], inverse[edge_count:]
+        weights = np.asarray(strengths, dtype=np.int64)
+        is_prerequisite = np.asarray(is_prerequisite, dtype=bool)
+        size = len(node_ids)
+        
+        prerequisite_indptr, prerequisite_indices = _build_csr(
+            target_index[is_prerequisite], source_index[is_prerequisite], weights[is_prerequisite], size
+        )
+        neighbor_indptr, neighbor_indices = _build_csr(
+            inverse,
+            np.concatenate([target_index, source_index]),
+            np.concatenate([weights, weights]),
+            size
+        )
+        return cls(version, node_ids, prerequisite_indptr, prerequisite_indices, neighbor_indptr, neighbor_indices)
+    
+    @classmethod
+    def from_edges(
+        cls,
+        version: int,
+        sources: List[UUID],
+        targets: List[UUID],
+        relation_types: List[str],
+        strengths: List[int]
+    ) -> "GraphAdjacency":
+        """
+        由关联列表构建邻接表
+        
+        Args:
+            version: 图谱的关联版本号
+            sources: 源节点 ID
+            targets: 目标节点 ID
+            relation_types: 关联类型（不区分大小写）
+            strengths: 关联强度
+        
+        Returns:
+            邻接表
+        """
+        return cls.from_arrays(
+            version,
+            _pack_ids(sources),
+            _pack_ids(targets),
+            np.asarray(strengths, dtype=np.int64).reshape(len(sources)),
+            np.array(
+                [(relation_type or "").upper() == PREREQUISITE_RELATION for relation_type in relation_types],
+                dtype=bool
+            ),
+        )
+    
+    def index_of(self, node_ids: List[UUID]) -> np.ndarray:
+        """
+        节点 ID 对应的下标
+        
+        Args:
+            node_ids: 节点 ID 列表
+        
+        Returns:
+            下标数组；不在邻接表中的节点为 -1
+        """
+        keys = _pack_ids(node_ids)
+        if not len(self.node_ids):
+            return np.full(len(keys), -1, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.node_ids, keys), len(self.node_ids) - 1)
+        return np.where(self.node_ids[positions] == keys, positions, -1)
+    
+    def ids_of(self, indices) -> List[UUID]:
+        """下标对应的节点 ID"""
+        packed = self.node_ids[np.asarray(indices, dtype=np.intp)].tobytes()
+        return [UUID(bytes=packed[i:i + 16]) for i in range(0, len(packed), 16)]
+    
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+    
+    @property
+    def edge_count(self) -> int:
+        return len(self.neighbor_indices) // 2
+    
+    def new_visited(self) -> np.ndarray:
+        """遍历状态（每个节点是否已访问）"""
+        return np.zeros(self.node_count, dtype=bool)
+    
+    def walk_prerequisites_first(self, start: int, visited: np.ndarray, order: List[int], limit: int) -> None:
+        """
+        从起点沿前置关系做后序深度优先遍历：未访问的前置节点（递归地）排在依赖它的节点之前
+        
+        Args:
+            start: 起点下标
+            visited: 遍历状态（原地更新）
+            order: 遍历结果（原地追加节点下标）
+            limit: order 的长度上限
+        """
+        if visited[start] or len(order) >= limit:
+            return
+        
+        indptr, indices = self.prerequisite_indptr, self.prerequisite_indices
+        visited[start] = True
+        stack = [[start, indptr[start]]]
+        while stack:
+            frame = stack[-1]
+            node, position = frame
+            end = indptr[node + 1]
+            while position < end and visited[indices[position]]:
+                position += 1
+            if position < end:
+                frame[1] = position + 1
+                child = indices[position]
+                visited[child] = True
+                stack.append([child, indptr[child]])
+            else:
+                stack.pop()
+                order.append(int(node))
+                if len(order) >= limit:
+                    return
+    
+    def expand(self, frontier: np.ndarray, visited: np.ndarray) -> np.ndarray:
+        """
+        广度优先扩展一层：返回 frontier 的未访问邻居（按首次出现的顺序去重）并标记为已访问
+        
+        Args:
+            frontier: 当前层的节点下标
+            visited: 遍历状态（原地更新）
+        
+        Returns:
+            下一层的节点下标
+        """
+        starts = self.neighbor_indptr[frontier]
+        counts = self.neighbor_indptr[frontier + 1] - starts
+        # 把各行的 [start, end) 区间拼接成一个下标数组
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        neighbors = self.neighbor_indices[positions]
+        neighbors = neighbors[~visited[neighbors]]
+        _, first = np.unique(neighbors, return_index=True)
+        neighbors = neighbors[np.sort(first)]
+        visited[neighbors] = True
+        return neighbors
+
+
+class GraphAdjacencyCache:
+    """
+    图谱邻接表缓存（进程内，按图谱 LRU）
+    
+    每次读取时按主键查询图谱的关联版本号，版本号与缓存一致时直接返回，否则用一条查询
+    加载图谱的全部关联重建。版本号在创建/删除关联和删除节点的事务中递增（bump_version），
+    多进程部署时各进程的缓存都能感知变化。
+    """
+    
+    def __init__(self, max_graphs: Optional[int] = None):
+        """
+        初始化邻接表缓存
+        
+        Args:
+            max_graphs: 最多缓存的图谱数（默认取配置）
+        """
+        self.max_graphs = settings.GRAPH_ADJACENCY_CACHE_MAX_GRAPHS if max_graphs is None else max_graphs
+        self._entries: "OrderedDict[UUID, GraphAdjacency]" = OrderedDict()
+        self._counters = {
+            "hits": 0,
+            "builds": 0,
+            "evictions": 0,
+        }
+    
+    @staticmethod
+    async def bump_version(db: AsyncSession, graph_id) -> None:
+        """
+        递增图谱的关联版本号（在增删关联的事务中调用，随事务提交生效）
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+        """
+        await db.execute(
+            update(KnowledgeGraph)
+            .where(KnowledgeGraph.id == graph_id)
+            .values(relation_version=KnowledgeGraph.relation_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    async def load(db: AsyncSession, graph_id, version: int) -> GraphAdjacency:
+        """
+        从数据库加载图谱的全部关联并构建邻接表
+        
+        各列在数据库中聚合为定长二进制（uuid_send/int4send/int2send），一行返回，
+        读取时直接转换为 NumPy 数组，不为每条关联创建 Python 对象。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            version: 图谱的关联版本号
+        
+        Returns:
+            邻接表
+        """
+        def packed(column):
+            return func.string_agg(column, literal(b"", LargeBinary))
+        
+        is_prerequisite = func.upper(NodeRelation.relation_type) == PREREQUISITE_RELATION
+        result = await db.execute(
+            select(
+                packed(func.uuid_send(NodeRelation.source_id)),
+                packed(func.uuid_send(NodeRelation.target_id)),
+                # string_agg 跳过 NULL，会让各列错位；数据库中 strength 可为空，按默认值 50 处理
+                packed(func.int4send(func.coalesce(NodeRelation.strength, 50))),
+                packed(func.int2send(cast(cast(is_prerequisite, Integer), SmallInteger))),
+            ).where(NodeRelation.graph_id == graph_id)
+        )
+        sources, targets, strengths, prerequisite_flags = (column or b"" for column in result.one())
+        return GraphAdjacency.from_arrays(
+            version,
+            np.frombuffer(sources, dtype="S16"),
+            np.frombuffer(targets, dtype="S16"),
+            np.frombuffer(strengths, dtype=">i4"),
+            np.frombuffer(prerequisite_flags, dtype=">i2").astype(bool),
+        )
+    
+    async def get_many(self, db: AsyncSession, graph_ids: Iterable) -> Dict[UUID, GraphAdjacency]:
+        """
+        获取多个图谱的邻接表（版本号用一条查询读取，过期的重建）
+        
+        Args:
+            db: 数据库会话
+            graph_ids: 图谱 ID 列表
+        
+        Returns:
+            {图谱 ID: 邻接表}；不存在的图谱不在结果中
+        """
+        graph_ids = list(dict.fromkeys(UUID(str(graph_id)) for graph_id in graph_ids))
+        if not graph_ids:
+            return {}
+        
+        result = await db.execute(
+            select(KnowledgeGraph.id, KnowledgeGraph.relation_version).where(KnowledgeGraph.id.in_(graph_ids))
+        )
+        versions = dict(result.all())
+        
+        adjacencies = {}
+        for graph_id in graph_ids:
+            if graph_id not in versions:
+                continue
+            adjacency = self._entries.get(graph_id)
+            if adjacency is not None and adjacency.version == versions[graph_id]:
+                self._entries.move_to_end(graph_id)
+                self._counters["hits"] += 1
+            else:
+                adjacency = await self.load(db, graph_id, versions[graph_id])
+                self._put(graph_id, adjacency)
+            adjacencies[graph_id] = adjacency
+        return adjacencies
+    
+    async def get(self, db: AsyncSession, graph_id) -> Optional[GraphAdjacency]:
+        """获取单个图谱的邻接表，图谱不存在时返回 None"""
+        return (await self.get_many(db, [graph_id])).get(UUID(str(graph_id)))
+    
+    def _put(self, graph_id: UUID, adjacency: GraphAdjacency) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的图谱"""
+        self._counters["builds"] += 1
+        if self.max_graphs <= 0:
+            return
+        self._entries[graph_id] = adjacency
+        self._entries.move_to_end(graph_id)
+        while len(self._entries) > self.max_graphs:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+    
+    def invalidate(self, graph_id) -> None:
+        """移除图谱的缓存（删除图谱后调用）"""
+        self._entries.pop(UUID(str(graph_id)), None)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """
+        获取缓存统计
+        
+        Returns:
+            命中、重建和淘汰计数，以及缓存的图谱数和边数
+        """
+        return {
+            **self._counters,
+            "graphs": len(self._entries),
+            "edges": sum(adjacency.edge_count for adjacency in self._entries.values()),
+        }
+
+
+# 创建全局图谱邻接表缓存
+graph_adjacency_cache = GraphAdjacencyCache()
@@ -0,0 +1,448 @@
+"""
+图谱导出服务
+用服务端游标流式读取图谱的节点、标签、关联和复习记录，逐块编码为 NDJSON 或 Parquet（ZIP 打包）
+边读边发送，内存占用与图谱大小无关
+"""
+
+import base64
+import io
+import json
+import zipfile
+from json.encoder import encode_basestring
+from datetime import datetime, timezone
+from typing import AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import String, Text, and_, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.knowledge_graph import KnowledgeGraph
+from app.models.knowledge_tag import KnowledgeTag
+from app.models.memory_node import MemoryNode
+from app.models.node_relation import NodeRelation
+from app.models.node_tag import NodeTag
+from app.models.review_log import ReviewLog
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+# 向量列：exclude 不导出，binary 导出为 float32 小端字节（NDJSON 中为 base64）
+EMBEDDING_MODES = ("exclude", "binary")
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+PARQUET_ARCHIVE_MEDIA_TYPE = "application/zip"
+EXPORT_FORMAT_VERSION = 1
+
+# 缓冲的输出达到该字节数时发送一块
+EXPORT_FLUSH_BYTES = 256 * 1024
+PARQUET_COMPRESSION = "zstd"
+
+# 列的种类：决定 NDJSON 的编码方式和 Parquet 的列类型
+# str/int/float/bool 原样输出；json 为数据库中的 JSON 文本（原样拼入 NDJSON）；
+# datetime 为 ISO 8601 / 带时区的时间戳；embedding 为 pgvector 的二进制表示（vector_send）
+ExportField = Tuple[str, str]
+
+
+def _embedding_bytes(value: bytes) -> bytes:
+    """pgvector 二进制表示（2 字节维度、2 字节保留、大端 float32）转为小端 float32 字节"""
+    return np.frombuffer(value, dtype=">f4", offset=4).astype("<f4").tobytes()
+
+
+# 按列种类直接编码，省去逐个值调用 json.dumps 的开销
+_NDJSON_ENCODERS: Dict[str, Callable] = {
+    "str": encode_basestring,
+    "int": str,
+    "float": float.__repr__,
+    "bool": lambda value: "true" if value else "false",
+    "json": lambda value: value,
+    "datetime": lambda value: f'"{value.isoformat()}"',
+    "embedding": lambda value: f'"{base64.b64encode(_embedding_bytes(value)).decode()}"',
+}
+
+
+def _arrow_type(kind: str):
+    """列种类对应的 Arrow 类型"""
+    return {
+        "str": pa.string(),
+        "json": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+        "embedding": pa.binary(),
+    }[kind]
+
+
+def export_tables(graph_id, embeddings: str = "exclude") -> List[Tuple[str, Select, List[ExportField]]]:
+    """
+    导出的各张表：(名称, 查询, 字段列表)
+    
+    只导出未删除的节点，以及两端（或所属节点）未删除的标签关联、节点关联和复习记录；
+    ID 和 JSON 列在数据库中转为文本，省去 Python 端的解析和再编码。
+    
+    Args:
+        graph_id: 图谱 ID
+        embeddings: 向量列的导出方式 (exclude, binary)
+    
+    Returns:
+        表列表（按导出顺序）
+    """
+    live_node = and_(MemoryNode.graph_id == graph_id, MemoryNode.deleted_at.is_(None))
+    
+    node_columns = [
+        ("id", cast(MemoryNode.id, String), "str"),
+        ("node_type", MemoryNode.node_type, "str"),
+        ("title", MemoryNode.title, "str"),
+        ("summary", MemoryNode.summary, "str"),
+        ("content_data", cast(MemoryNode.content_data, Text), "json"),
+        ("position_x", MemoryNode.position_x, "float"),
+        ("position_y", MemoryNode.position_y, "float"),
+        ("position_z", MemoryNode.position_z, "float"),
+        ("mastery_level", MemoryNode.mastery_level, "str"),
+        ("last_review_at", MemoryNode.last_review_at, "datetime"),
+        ("next_review_at", MemoryNode.next_review_at, "datetime"),
+        ("review_stats", cast(MemoryNode.review_stats, Text), "json"),
+        ("created_at", MemoryNode.created_at, "datetime"),
+        ("updated_at", MemoryNode.updated_at, "datetime"),
+    ]
+    if embeddings == "binary":
+        node_columns.append(("embedding", func.vector_send(MemoryNode.content_embedding), "embedding"))
+    
+    tag_columns = [
+        ("id", cast(KnowledgeTag.id, String), "str"),
+        ("name", KnowledgeTag.name, "str"),
+        ("description", KnowledgeTag.description, "str"),
+        ("parent_id", cast(KnowledgeTag.parent_id, String), "str"),
+        ("color", KnowledgeTag.color, "str"),
+        ("icon", KnowledgeTag.icon, "str"),
+        ("importance_score", KnowledgeTag.importance_score, "float"),
+        ("mastery_rate", KnowledgeTag.mastery_rate, "float"),
+        ("created_at", KnowledgeTag.created_at, "datetime"),
+    ]
+    node_tag_columns = [
+        ("node_id", cast(NodeTag.node_id, String), "str"),
+        ("tag_id", cast(NodeTag.tag_id, String), "str"),
+        ("confidence", NodeTag.confidence, "float"),
+        ("is_manual", NodeTag.is_manual, "bool"),
+        ("created_at", NodeTag.created_at, "datetime"),
+    ]
+    relation_columns = [
+        ("id", cast(NodeRelation.id, String), "str"),
+        ("source_id", cast(NodeRelation.source_id, String), "str"),
+        ("target_id", cast(NodeRelation.target_id, String), "str"),
+        ("relation_type", NodeRelation.relation_type, "str"),
+        ("strength", NodeRelation.strength, "int"),
+        ("is_auto_generated", NodeRelation.is_auto_generated, "bool"),
+        ("created_at", NodeRelation.created_at, "datetime"),
+    ]
+    review_log_columns = [
+        ("id", cast(ReviewLog.id, String), "str"),
+        ("node_id", cast(ReviewLog.node_id, String), "str"),
+        ("review_mode", ReviewLog.review_mode, "str"),
+        ("mastery_feedback", ReviewLog.mastery_feedback, "str"),
+        ("time_spent_seconds", ReviewLog.time_spent_seconds, "int"),
+        ("node_state_snapshot", cast(ReviewLog.node_state_snapshot, Text), "json"),
+        ("device_type", ReviewLog.device_type, "str"),
+        ("app_version", ReviewLog.app_version, "str"),
+        ("created_at", ReviewLog.created_at, "datetime"),
+    ]
+    
+    def query(columns, *clauses, joins=()) -> Tuple[Select, List[ExportField]]:
+        stmt = select(*(column for _, column, _ in columns))
+        for target, onclause in joins:
+            stmt = stmt.join(target, onclause)
+        return stmt.where(*clauses), [(name, kind) for name, _, kind in columns]
+    
+    source_node, target_node = aliased(MemoryNode), aliased(MemoryNode)
+    tables = [
+        ("nodes", *query(node_columns, live_node)),
+        ("tags", *query(tag_columns, KnowledgeTag.graph_id == graph_id)),
+        ("node_tags", *query(node_tag_columns, live_node, joins=[(MemoryNode, NodeTag.node_id == MemoryNode.id)])),
+        ("relations", *query(
+            relation_columns,
+            NodeRelation.graph_id == graph_id,
+            source_node.deleted_at.is_(None),
+            target_node.deleted_at.is_(None),
+            joins=[
+                (source_node, NodeRelation.source_id == source_node.id),
+                (target_node, NodeRelation.target_id == target_node.id),
+            ],
+        )),
+        ("review_logs", *query(
+            review_log_columns, live_node, joins=[(MemoryNode, ReviewLog.node_id == MemoryNode.id)]
+        )),
+    ]
+    return tables
+
+
+class _ChunkSink(io.RawIOBase):
+    """只追加的写入目标：记录写入位置，取走已写入的字节后释放"""
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def drain(self) -> bytes:
+        """取走已写入的字节"""
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class _NdjsonEncoder:
+    """把一张表的行编码为 NDJSON（每行带 type 字段）"""
+    
+    def __init__(self, record_type: str, fields: Sequence[ExportField]):
+        self.prefix = '{"type":%s' % json.dumps(record_type)
+        self.fields = [
+            (f',{json.dumps(name)}:', _NDJSON_ENCODERS[kind]) for name, kind in fields
+        ]
+    
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        lines = []
+        for row in rows:
+            parts = [self.prefix]
+            for (key, encoder), value in zip(self.fields, row):
+                parts.append(key)
+                parts.append("null" if value is None else encoder(value))
+            parts.append("}\n")
+            lines.append("".join(parts))
+        return "".join(lines).encode("utf-8")
+
+
+class _ParquetTableWriter:
+    """把一张表的行按行组写入 ZIP 中的一个 Parquet 文件"""
+    
+    def __init__(self, archive: zipfile.ZipFile, name: str, fields: Sequence[ExportField], metadata: Dict[str, str]):
+        self.fields = fields
+        self.schema = pa.schema(
+            [pa.field(field_name, _arrow_type(kind)) for field_name, kind in fields],
+            metadata=metadata,
+        )
+        self.member = archive.open(f"{name}.parquet", "w", force_zip64=True)
+        # ParquetWriter 需要 tell()，先写入可计数的缓冲，再转写到 ZIP 成员
+        self.buffer = _ChunkSink()
+        self.writer = pq.ParquetWriter(self.buffer, self.schema, compression=PARQUET_COMPRESSION)
+        # 未写出的行（每批读取后即转为 Arrow 表，不保留 Python 对象）
+        self.pending: List = []
+        self.pending_rows = 0
+    
+    def _column(self, values: Sequence, kind: str):
+        if kind == "embedding":
+            values = [None if value is None else _embedding_bytes(value) for value in values]
+        return pa.array(values, type=_arrow_type(kind))
+    
+    def _write_row_group(self, table) -> None:
+        self.writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        self.member.write(self.buffer.drain())
+    
+    def add(self, rows: Sequence[Sequence], row_group_size: int) -> None:
+        """追加行，每凑满一个行组写出一个"""
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        self.pending.append(pa.Table.from_arrays(
+            [self._column(values, kind) for values, (_, kind) in zip(columns, self.fields)],
+            schema=self.schema,
+        ))
+        self.pending_rows += len(rows)
+        if self.pending_rows < row_group_size:
+            return
+        
+        table = pa.concat_tables(self.pending)
+        offset = 0
+        while table.num_rows - offset >= row_group_size:
+            self._write_row_group(table.slice(offset, row_group_size))
+            offset += row_group_size
+        rest = table.slice(offset)
+        self.pending = [rest] if rest.num_rows else []
+        self.pending_rows = rest.num_rows
+    
+    def close(self) -> None:
+        """写出剩余的行和文件尾"""
+        if self.pending_rows:
+            self._write_row_group(pa.concat_tables(self.pending))
+            self.pending, self.pending_rows = [], 0
+        self.writer.close()
+        self.member.write(self.buffer.drain())
+        self.member.close()
+
+
+class GraphExportService:
+    """
+    图谱导出服务
+    
+    导出使用独立的只读连接，在一个 REPEATABLE READ 事务中依次读取各表，各表数据来自同一快照；
+    每张表用服务端游标分批读取（yield_per），编码在线程池中进行，缓冲的输出超过
+    EXPORT_FLUSH_BYTES（Parquet 为每个行组）后立即发送，内存占用只与批大小和行组大小有关。
+    
+    - NDJSON：第一行为图谱信息（type=graph），之后每行一条记录（type 为 node、tag、node_tag、
+      relation、review_log），最后一行为各表行数（type=end），缺少该行说明下载不完整
+    - Parquet：ZIP 中每张表一个 Parquet 文件，另有 graph.json 保存图谱信息和行数
+    """
+    
+    @staticmethod
+    async def get_graph_info(conn: AsyncConnection, graph_id) -> Optional[Dict]:
+        """读取导出文件头中的图谱信息"""
+        result = await conn.execute(
+            select(
+                KnowledgeGraph.name,
+                KnowledgeGraph.description,
+                KnowledgeGraph.subject,
+                KnowledgeGraph.created_at,
+                KnowledgeGraph.updated_at,
+            ).where(KnowledgeGraph.id == graph_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        return {
+            "id": str(graph_id),
+            "name": row.name,
+            "description": row.description,
+            "subject": row.subject,
+            "created_at": row.created_at.isoformat(),
+            "updated_at": row.updated_at.isoformat(),
+        }
+    
+    @staticmethod
+    def batch_sizes(fields: Sequence[ExportField]) -> Tuple[int, int]:
+        """
+        表的游标批大小和 Parquet 行组大小
+        
+        带向量的行（每行数 KB）按单独的配置取较小的批和行组，内存占用与不带向量的表相当。
+        
+        Args:
+            fields: 字段列表
+        
+        Returns:
+            (游标每批行数, 行组行数)
+        """
+        fetch_size, row_group_size = settings.GRAPH_EXPORT_FETCH_SIZE, settings.GRAPH_EXPORT_ROW_GROUP_SIZE
+        if any(kind == "embedding" for _, kind in fields):
+            fetch_size = min(fetch_size, settings.GRAPH_EXPORT_EMBEDDING_FETCH_SIZE)
+            row_group_size = min(row_group_size, settings.GRAPH_EXPORT_EMBEDDING_ROW_GROUP_SIZE)
+        return fetch_size, row_group_size
+    
+    @staticmethod
+    async def _stream_rows(conn: AsyncConnection, stmt: Select, fetch_size: int) -> AsyncIterator[Sequence]:
+        """服务端游标分批读取"""
+        result = await conn.stream(stmt.execution_options(yield_per=fetch_size))
+        async for rows in result.partitions():
+            yield rows
+    
+    @staticmethod
+    async def stream(
+        engine: AsyncEngine,
+        graph_id,
+        export_format: str,
+        embeddings: str = "exclude"
+    ) -> AsyncIterator[bytes]:
+        """
+        流式导出图谱
+        
+        调用前需已验证图谱所有权。
+        
+        Args:
+            engine: 数据库引擎（导出使用独立的连接，不占用请求的会话）
+            graph_id: 图谱 ID
+            export_format: 导出格式 (ndjson, parquet)
+            embeddings: 向量列的导出方式 (exclude, binary)
+        
+        Yields:
+            导出文件的字节块
+        """
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+            async with conn.begin():
+                header = await GraphExportService.get_graph_info(conn, graph_id)
+                if header is None:
+                    # 图谱在验证所有权之后被删除
+                    return
+                header.update(
+                    format_version=EXPORT_FORMAT_VERSION,
+                    exported_at=datetime.now(timezone.utc).isoformat(),
+                    embeddings=embeddings,
+                )
+                if embeddings == "binary":
+                    header["embedding_dtype"] = "float32"
+                    header["embedding_dimension"] = settings.EMBEDDING_DIMENSION
+                
+                tables = export_tables(graph_id, embeddings)
+                if export_format == "parquet":
+                    chunks = GraphExportService._stream_parquet(conn, header, tables)
+                else:
+                    chunks = GraphExportService._stream_ndjson(conn, header, tables)
+                async for chunk in chunks:
+                    yield chunk
+    
+    @staticmethod
+    async def _stream_ndjson(conn: AsyncConnection, header: Dict, tables) -> AsyncIterator[bytes]:
+        """NDJSON：图谱信息、各表记录、行数"""
+        yield (json.dumps({"type": "graph", **header}, ensure_ascii=False) + "\n").encode("utf-8")
+        
+        counts = {}
+        pending: List[bytes] = []
+        pending_size = 0
+        for name, stmt, fields in tables:
+            # 记录类型为表名的单数形式
+            encoder = _NdjsonEncoder(name[:-1], fields)
+            fetch_size, _ = GraphExportService.batch_sizes(fields)
+            counts[name] = 0
+            async for rows in GraphExportService._stream_rows(conn, stmt, fetch_size):
+                counts[name] += len(rows)
+                data = await run_in_threadpool(encoder.encode, rows)
+                pending.append(data)
+                pending_size += len(data)
+                if pending_size >= EXPORT_FLUSH_BYTES:
+                    yield b"".join(pending)
+                    pending, pending_size = [], 0
+        
+        pending.append((json.dumps({"type": "end", "counts": counts}) + "\n").encode("utf-8"))
+        yield b"".join(pending)
+    
+    @staticmethod
+    async def _stream_parquet(conn: AsyncConnection, header: Dict, tables) -> AsyncIterator[bytes]:
+        """Parquet：ZIP 中每张表一个文件（ZIP 顺序写入，不需要回写文件头）"""
+        sink = _ChunkSink()
+        archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        metadata = {"graph_id": header["id"], "format_version": str(EXPORT_FORMAT_VERSION)}
+        
+        counts = {}
+        for name, stmt, fields in tables:
+            writer = await run_in_threadpool(_ParquetTableWriter, archive, name, fields, metadata)
+            fetch_size, row_group_size = GraphExportService.batch_sizes(fields)
+            counts[name] = 0
+            async for rows in GraphExportService._stream_rows(conn, stmt, fetch_size):
+                counts[name] += len(rows)
+                await run_in_threadpool(writer.add, rows, row_group_size)
+                data = sink.drain()
+                if data:
+                    yield data
+            await run_in_threadpool(writer.close)
+            yield sink.drain()
+        
+        archive.writestr("graph.json", json.dumps({**header, "counts": counts}, ensure_ascii=False))
+        archive.close()
+        yield sink.drain()
@@ -0,0 +1,508 @@
+"""
+图谱布局服务
+在服务端计算力导向布局（2D/3D），写回节点坐标，避免大图谱在浏览器中卡顿
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+from uuid import UUID as UUID_TYPE
+
+import numpy as np
+from sqlalchemy import Float, LargeBinary, and_, cast, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.memory_node import MemoryNode
+from app.models.node_relation import NodeRelation
+
+
+FORCE_DIRECTED_ENGINE = "force-directed"
+
+# 布局参数默认值（ViewConfig.layout_params 和请求参数可覆盖）
+DEFAULT_LAYOUT_PARAMS = {
+    "dimensions": 2,
+    "iterations": 50,
+    "ideal_edge_length": 30.0,
+    "gravity": 0.05,
+    "seed": None,
+}
+
+# 斥力网格每个维度的最少/最多格子数
+GRID_MIN_CELLS = 2
+GRID_MAX_CELLS = 64
+# 不超过该节点数的格子内逐对计算斥力，超过时在格子内再划分网格
+NEAR_FIELD_MAX_NODES = 256
+# 每批计算斥力的（节点数 × 格子数）上限，控制临时数组大小
+REPULSION_CHUNK_ELEMENTS = 1 << 18
+# 节点对距离的下限（相对理想边长），避免重合节点产生无穷大的斥力
+MIN_DISTANCE_RATIO = 0.01
+# 已有布局时的初始温度（相对理想边长）；没有布局时为布局范围的 1/10
+WARM_START_TEMPERATURE = 0.5
+COLD_START_TEMPERATURE_RATIO = 0.1
+
+
+def _grid_cells_per_axis(node_count: int, dimensions: int) -> int:
+    """斥力网格每个维度的格子数（格子总数约为 √n，远场和近场的计算量相当）"""
+    cells = int(np.ceil(np.sqrt(node_count) ** (1 / dimensions)))
+    return int(np.clip(cells, GRID_MIN_CELLS, GRID_MAX_CELLS))
+
+
+def _pairwise_repulsion(positions: np.ndarray, min_distance2: float) -> np.ndarray:
+    """逐对计算的斥力 Σ (p - q) / |p - q|²（未乘 k²）"""
+    norms = np.einsum("ij,ij->i", positions, positions)
+    displacement = np.empty_like(positions)
+    rows = max(1, REPULSION_CHUNK_ELEMENTS // len(positions))
+    for start in range(0, len(positions), rows):
+        chunk = positions[start:start + rows]
+        # |p - q|² = |p|² + |q|² - 2p·q，原地计算减少临时数组
+        weights = chunk @ positions.T
+        weights *= -2
+        weights += norms
+        weights += norms[start:start + rows, None]
+        np.maximum(weights, min_distance2, out=weights)
+        np.divide(1.0, weights, out=weights)
+        # 去掉节点与自身
+        weights[np.arange(len(chunk)), np.arange(start, start + len(chunk))] = 0
+        # Σ w·(p - q) = p·Σw - w·Q
+        displacement[start:start + rows] = chunk * weights.sum(axis=1)[:, None] - weights @ positions
+    return displacement
+
+
+def _grid_repulsion(positions: np.ndarray, min_distance2: float, cell_floor: float, offset: np.ndarray) -> np.ndarray:
+    """
+    多层网格近似的斥力（未乘 k²）
+    
+    节点按坐标落入均匀网格，其他格子按质心（质量为格子内节点数）近似；
+    同一格子内的节点较少时逐对计算，较多时在格子内递归划分网格（向量化的 Barnes-Hut）。
+    """
+    node_count, dimensions = positions.shape
+    if node_count <= NEAR_FIELD_MAX_NODES:
+        return _pairwise_repulsion(positions, min_distance2)
+    
+    cells_per_axis = _grid_cells_per_axis(node_count, dimensions)
+    lower = positions.min(axis=0)
+    cell_size = np.maximum(positions.max(axis=0) - lower, cell_floor) / cells_per_axis
+    # 平移后最多多出一个格子
+    coords = np.minimum((positions - lower) / cell_size + offset, cells_per_axis).astype(np.intp)
+    cell_ids = np.ravel_multi_index(coords.T, (cells_per_axis + 1,) * dimensions)
+    
+    # 按格子排序，每个格子的节点在 order 中连续
+    order = np.argsort(cell_ids, kind="stable")
+    boundaries = np.flatnonzero(np.diff(cell_ids[order])) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [node_count]])
+    if starts.size == 1:
+        # 所有节点挤在同一个格子里（范围小于 cell_floor），无法再划分
+        return _pairwise_repulsion(positions, min_distance2)
+    
+    mass = (ends - starts).astype(np.float64)
+    cell_of_node = np.empty(node_count, dtype=np.intp)
+    cell_of_node[order] = np.repeat(np.arange(mass.size), ends - starts)
+    centroids = np.stack([
+        np.bincount(cell_of_node, weights=positions[:, axis], minlength=mass.size) for axis in range(dimensions)
+    ], axis=1) / mass[:, None]
+    centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+    
+    # 远场：所有格子的质心
+    displacement = np.empty_like(positions)
+    chunk_size = max(1, REPULSION_CHUNK_ELEMENTS // mass.size)
+    for start in range(0, node_count, chunk_size):
+        chunk = positions[start:start + chunk_size]
+        weights = chunk @ centroids.T
+        weights *= -2
+        weights += centroid_norms
+        weights += np.einsum("ij,ij->i", chunk, chunk)[:, None]
+        np.maximum(weights, min_distance2, out=weights)
+        np.divide(mass, weights, out=weights)
+        displacement[start:start + chunk_size] = chunk * weights.sum(axis=1)[:, None] - weights @ centroids
+    
+    # 所在格子：去掉按质心算的项，换成格子内节点之间的斥力
+    own_delta = positions - centroids[cell_of_node]
+    own_distance2 = np.maximum(np.einsum("ij,ij->i", own_delta, own_delta), min_distance2)
+    displacement -= own_delta * (mass[cell_of_node] / own_distance2)[:, None]
+    
+    for cell in np.flatnonzero(mass > 1):
+        members = order[starts[cell]:ends[cell]]
+        displacement[members] += _grid_repulsion(positions[members], min_distance2, cell_floor, offset)
+    
+    return displacement
+
+
+def _repulsion(positions: np.ndarray, ideal_edge_length: float, offset: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    节点间的斥力（Fruchterman-Reingold 斥力 k²/d）
+    
+    offset 为网格的平移（以格子为单位），每轮随机取值，相邻但分在两个格子的节点也能轮流逐对计算。
+    """
+    min_distance2 = (ideal_edge_length * MIN_DISTANCE_RATIO) ** 2
+    if offset is None:
+        offset = np.zeros(positions.shape[1])
+    return _grid_repulsion(positions, min_distance2, ideal_edge_length, offset) * ideal_edge_length ** 2
+
+
+def _attraction(
+    positions: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    weights: np.ndarray,
+    ideal_edge_length: float
+) -> np.ndarray:
+    """沿关联的引力（Fruchterman-Reingold 引力 d²/k，按关联强度加权）"""
+    node_count, dimensions = positions.shape
+    delta = positions[sources] - positions[targets]
+    distance = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+    pull = delta * (distance * weights / ideal_edge_length)[:, None]
+    
+    displacement = np.empty_like(positions)
+    for axis in range(dimensions):
+        displacement[:, axis] = (
+            np.bincount(targets, weights=pull[:, axis], minlength=node_count)
+            - np.bincount(sources, weights=pull[:, axis], minlength=node_count)
+        )
+    return displacement
+
+
+def _seed_positions(
+    positions: np.ndarray,
+    placed: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    ideal_edge_length: float,
+    rng: np.random.Generator
+) -> np.ndarray:
+    """
+    为尚未布局的节点生成初始坐标
+    
+    有已布局邻居的节点放在邻居质心附近，其余节点随机撒在布局范围内；
+    都没有布局时在边长约 k·n^(1/d) 的立方体内随机分布。
+    """
+    node_count, dimensions = positions.shape
+    positions = positions.copy()
+    if placed.all():
+        return positions
+    
+    if placed.any():
+        lower, upper = positions[placed].min(axis=0), positions[placed].max(axis=0)
+        upper = np.maximum(upper, lower + ideal_edge_length)
+    else:
+        half = ideal_edge_length * node_count ** (1 / dimensions) / 2
+        lower, upper = np.full(dimensions, -half), np.full(dimensions, half)
+    
+    unplaced = ~placed
+    positions[unplaced] = rng.uniform(lower, upper, size=(int(unplaced.sum()), dimensions))
+    
+    # 一端已布局、一端未布局的关联
+    forward = placed[sources] & unplaced[targets]
+    backward = placed[targets] & unplaced[sources]
+    anchors = np.concatenate([sources[forward], targets[backward]])
+    followers = np.concatenate([targets[forward], sources[backward]])
+    if followers.size:
+        counts = np.bincount(followers, minlength=node_count)
+        has_anchor = counts > 0
+        for axis in range(dimensions):
+            sums = np.bincount(followers, weights=positions[anchors, axis], minlength=node_count)
+            positions[has_anchor, axis] = sums[has_anchor] / counts[has_anchor]
+        positions[has_anchor] += rng.normal(scale=ideal_edge_length / 2, size=(int(has_anchor.sum()), dimensions))
+    return positions
+
+
+def force_directed_layout(
+    positions: np.ndarray,
+    placed: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    strengths: np.ndarray,
+    iterations: int = DEFAULT_LAYOUT_PARAMS["iterations"],
+    ideal_edge_length: float = DEFAULT_LAYOUT_PARAMS["ideal_edge_length"],
+    gravity: float = DEFAULT_LAYOUT_PARAMS["gravity"],
+    seed: Optional[int] = None
+) -> np.ndarray:
+    """
+    力导向布局（向量化的 Fruchterman-Reingold，斥力用网格近似）
+    
+    以已有坐标为起点：已经布局过的图谱从较低温度开始，只做局部调整，逐次调用逐步收敛；
+    新节点放在已布局邻居附近。每轮位移不超过当前温度，温度线性降到 0。
+    在进程池中执行，参数和返回值都是 NumPy 数组。
+    
+    Args:
+        positions: 初始坐标 (n, d)，d 为 2 或 3
+        placed: 节点是否已有布局 (n,)
+        sources: 关联源节点下标
+        targets: 关联目标节点下标
+        strengths: 关联强度 0-100
+        iterations: 迭代次数
+        ideal_edge_length: 理想边长 k
+        gravity: 向中心的引力系数（防止不连通的部分漂远）
+        seed: 随机种子
+    
+    Returns:
+        新坐标 (n, d)
+    """
+    node_count, dimensions = positions.shape
+    rng = np.random.default_rng(seed)
+    positions = _seed_positions(
+        np.asarray(positions, dtype=np.float64), placed, sources, targets, ideal_edge_length, rng
+    )
+    if node_count < 2 or iterations <= 0:
+        return positions
+    
+    # 重合的节点之间没有斥力方向，加一点抖动
+    positions += rng.normal(scale=ideal_edge_length * MIN_DISTANCE_RATIO, size=positions.shape)
+    weights = np.clip(strengths / 50.0, 0.1, 2.0)
+    
+    if placed.mean() >= 0.5:
+        temperature = ideal_edge_length * WARM_START_TEMPERATURE
+    else:
+        temperature = float(np.ptp(positions, axis=0).max()) * COLD_START_TEMPERATURE_RATIO
+    cooling = temperature / iterations
+    
+    for _ in range(iterations):
+        displacement = _repulsion(positions, ideal_edge_length, rng.random(dimensions))
+        displacement += _attraction(positions, sources, targets, weights, ideal_edge_length)
+        displacement -= gravity * ideal_edge_length * (positions - positions.mean(axis=0))
+        
+        length = np.sqrt(np.einsum("ij,ij->i", displacement, displacement))
+        scale = np.minimum(length, temperature) / np.maximum(length, 1e-12)
+        positions += displacement * scale[:, None]
+        temperature -= cooling
+    
+    return positions
+
+
+class GraphLayoutService:
+    """
+    图谱布局服务
+    
+    布局计算在独立的进程池中执行，不阻塞事件循环，也不受 GIL 限制；
+    结果用一条 UPDATE ... FROM unnest(...) 语句写回。
+    """
+    
+    _executor: Optional[ProcessPoolExecutor] = None
+    
+    @classmethod
+    def get_executor(cls) -> ProcessPoolExecutor:
+        """获取布局进程池（首次使用时创建）"""
+        if cls._executor is None:
+            # spawn：子进程不继承事件循环、数据库连接和线程锁
+            cls._executor = ProcessPoolExecutor(
+                max_workers=settings.GRAPH_LAYOUT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return cls._executor
+    
+    @classmethod
+    def shutdown(cls) -> None:
+        """关闭布局进程池（应用关闭时调用）"""
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+    
+    @staticmethod
+    def resolve_params(layout_params: Optional[Dict] = None, overrides: Optional[Dict] = None) -> Dict:
+        """
+        合并布局参数：默认值 < 视图配置的 layout_params < 请求参数
+        
+        Args:
+            layout_params: 视图配置中的布局参数
+            overrides: 请求中显式指定的参数
+        
+        Returns:
+            布局参数
+        
+        Raises:
+            ValueError: 参数不合法
+        """
+        params = dict(DEFAULT_LAYOUT_PARAMS)
+        for source in (layout_params or {}, overrides or {}):
+            params.update({key: value for key, value in source.items() if key in params and value is not None})
+        
+        try:
+            params["dimensions"] = int(params["dimensions"])
+            params["iterations"] = int(params["iterations"])
+            params["ideal_edge_length"] = float(params["ideal_edge_length"])
+            params["gravity"] = float(params["gravity"])
+            if params["seed"] is not None:
+                params["seed"] = int(params["seed"])
+        except (TypeError, ValueError):
+            raise ValueError("布局参数格式错误")
+        if params["dimensions"] not in (2, 3):
+            raise ValueError("布局维度只能是 2 或 3")
+        if not 0 <= params["iterations"] <= settings.GRAPH_LAYOUT_MAX_ITERATIONS:
+            raise ValueError(f"迭代次数必须在 0-{settings.GRAPH_LAYOUT_MAX_ITERATIONS} 之间")
+        if params["ideal_edge_length"] <= 0 or params["gravity"] < 0:
+            raise ValueError("理想边长必须大于 0，引力系数不能为负")
+        return params
+    
+    @staticmethod
+    async def load(db: AsyncSession, graph_id) -> Dict:
+        """
+        加载图谱的节点坐标和关联
+        
+        与邻接表缓存相同，各列在数据库中聚合为定长二进制（uuid_send/float8send/int4send），
+        读取时直接转换为 NumPy 数组；关联两端按排序后的节点 ID 二分查找换成下标。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+        
+        Returns:
+            ids（节点 ID 列表）、positions (n, 3)、sources/targets（节点下标）、strengths
+        """
+        def packed(column):
+            return func.string_agg(column, literal(b"", LargeBinary))
+        
+        node_result = await db.execute(
+            select(
+                packed(func.uuid_send(MemoryNode.id)),
+                # string_agg 跳过 NULL，会让各列错位；数据库中坐标和关联强度可为空，按默认值处理
+                # （空坐标视为尚未布局，2D 布局不写回 Z 坐标）
+                packed(func.float8send(func.coalesce(MemoryNode.position_x, 0.0))),
+                packed(func.float8send(func.coalesce(MemoryNode.position_y, 0.0))),
+                packed(func.float8send(func.coalesce(MemoryNode.position_z, 0.0))),
+            ).where(and_(MemoryNode.graph_id == graph_id, MemoryNode.deleted_at.is_(None)))
+        )
+        ids, xs, ys, zs = (column or b"" for column in node_result.one())
+        
+        relation_result = await db.execute(
+            select(
+                packed(func.uuid_send(NodeRelation.source_id)),
+                packed(func.uuid_send(NodeRelation.target_id)),
+                packed(func.int4send(func.coalesce(NodeRelation.strength, 50))),
+            ).where(NodeRelation.graph_id == graph_id)
+        )
+        sources, targets, strengths = (column or b"" for column in relation_result.one())
+        
+        node_ids = np.frombuffer(ids, dtype="S16")
+        order = np.argsort(node_ids)
+        node_ids = node_ids[order]
+        positions = np.column_stack([np.frombuffer(column, dtype=">f8") for column in (xs, ys, zs)])[order]
+        
+        def index_of(keys: bytes) -> np.ndarray:
+            keys = np.frombuffer(keys, dtype="S16")
+            indices = np.minimum(np.searchsorted(node_ids, keys), max(len(node_ids) - 1, 0))
+            found = node_ids[indices] == keys if len(node_ids) else np.zeros(len(keys), dtype=bool)
+            return np.where(found, indices, -1)
+        
+        sources, targets = index_of(sources), index_of(targets)
+        # 一端已软删除的关联不参与布局
+        keep = (sources >= 0) & (targets >= 0)
+        # 不经过 tolist()：S16 转 bytes 会去掉末尾的 0 字节
+        ids = node_ids.tobytes()
+        return {
+            "ids": [UUID_TYPE(bytes=ids[i:i + 16]) for i in range(0, len(ids), 16)],
+            "positions": positions.astype(np.float64),
+            "sources": sources[keep],
+            "targets": targets[keep],
+            "strengths": np.frombuffer(strengths, dtype=">i4")[keep].astype(np.float64),
+        }
+    
+    @staticmethod
+    async def save_positions(db: AsyncSession, graph_id, node_ids: Sequence, positions: np.ndarray) -> List:
+        """
+        用一条 UPDATE ... FROM unnest(...) 写回节点坐标（不提交事务）
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID（只更新该图谱内未删除的节点）
+            node_ids: 节点 ID 列表
+            positions: 坐标 (n, 3)；Z 坐标为 NaN 的节点保留原来的 Z 坐标
+        
+        Returns:
+            实际更新的节点 ID 列表
+        """
+        if not len(node_ids):
+            return []
+        
+        float_array = ARRAY(Float)
+        z = positions[:, 2]
+        values = func.unnest(
+            cast(list(node_ids), ARRAY(UUID(as_uuid=True))),
+            cast(positions[:, 0].tolist(), float_array),
+            cast(positions[:, 1].tolist(), float_array),
+            cast(np.where(np.isnan(z), None, z).tolist(), float_array),
+        ).table_valued("id", "x", "y", "z").render_derived(name="positions")
+        result = await db.execute(
+            update(MemoryNode)
+            .values(
+                position_x=values.c.x,
+                position_y=values.c.y,
+                position_z=func.coalesce(values.c.z, MemoryNode.position_z),
+                updated_at=func.now(),
+            )
+            .where(
+                MemoryNode.id == values.c.id,
+                MemoryNode.graph_id == graph_id,
+                MemoryNode.deleted_at.is_(None)
+            )
+            .returning(MemoryNode.id)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalars().all()
+    
+    @staticmethod
+    async def compute(db: AsyncSession, graph_id, params: Dict) -> Dict:
+        """
+        计算图谱布局并写回节点坐标（不提交事务）
+        
+        以节点当前坐标为起点；所有坐标都为 0 的节点视为尚未布局。
+        2D 布局只更新 X/Y 坐标，Z 坐标保持不变。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            params: 布局参数（resolve_params 的结果）
+        
+        Returns:
+            节点数、关联数、各阶段耗时等统计
+        """
+        started = time.perf_counter()
+        graph = await GraphLayoutService.load(db, graph_id)
+        load_ms = (time.perf_counter() - started) * 1000
+        
+        positions = graph["positions"]
+        node_count = len(graph["ids"])
+        if node_count > settings.GRAPH_LAYOUT_MAX_NODES:
+            raise ValueError(f"图谱节点数超过服务端布局上限 {settings.GRAPH_LAYOUT_MAX_NODES}")
+        
+        dimensions = params["dimensions"]
+        placed = np.any(positions[:, :dimensions] != 0, axis=1)
+        
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        layout = await loop.run_in_executor(
+            GraphLayoutService.get_executor(),
+            force_directed_layout,
+            positions[:, :dimensions],
+            placed,
+            graph["sources"],
+            graph["targets"],
+            graph["strengths"],
+            params["iterations"],
+            params["ideal_edge_length"],
+            params["gravity"],
+            params["seed"],
+        )
+        layout_ms = (time.perf_counter() - started) * 1000
+        
+        started = time.perf_counter()
+        positions = positions.copy()
+        positions[:, :dimensions] = layout
+        if dimensions == 2:
+            # Z 坐标为 NaN 时保留数据库中原来的值（包括加载时按 0 处理的空值）
+            positions[:, 2] = np.nan
+        updated = len(await GraphLayoutService.save_positions(db, graph_id, graph["ids"], positions))
+        save_ms = (time.perf_counter() - started) * 1000
+        
+        return {
+            "node_count": updated,
+            "relation_count": int(graph["sources"].size),
+            "dimensions": dimensions,
+            "iterations": params["iterations"],
+            "load_ms": round(load_ms, 1),
+            "layout_ms": round(layout_ms, 1),
+            "save_ms": round(save_ms, 1),
+        }
@@ -0,0 +1,294 @@
+"""
+图谱快照服务
+一次返回渲染整个图谱所需的节点和关联（列式），支持 ETag 条件请求、gzip/brotli 压缩和 MessagePack
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, and_, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.knowledge_graph import KnowledgeGraph
+from app.models.memory_node import MemoryNode
+from app.models.node_relation import NodeRelation
+
+try:
+    import brotli
+    
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import msgpack
+    
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+# 客户端可能使用的 MessagePack 媒体类型
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, "application/x-msgpack", "application/vnd.msgpack")
+
+# 流式查询每批读取的行数
+SNAPSHOT_STREAM_CHUNK_SIZE = 5000
+# 小于该字节数的响应不压缩
+COMPRESSION_MIN_SIZE = 1024
+GZIP_COMPRESS_LEVEL = 6
+# brotli 默认质量 11 压缩很慢，5 左右压缩率已优于 gzip
+BROTLI_QUALITY = 5
+
+
+def _parse_header_values(header: Optional[str]) -> Dict[str, float]:
+    """解析 Accept/Accept-Encoding 头为 {值: q}"""
+    values = {}
+    for item in (header or "").split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if not value:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        values[value.lower()] = quality
+    return values
+
+
+def _categorical(values: Iterable[Optional[str]]) -> Dict:
+    """把取值较少的列编码为类别表和下标"""
+    categories: Dict[Optional[str], int] = {}
+    codes = [categories.setdefault(value, len(categories)) for value in values]
+    return {"categories": list(categories), "codes": codes}
+
+
+class GraphSnapshotService:
+    """图谱快照服务"""
+    
+    @staticmethod
+    async def get_version(db: AsyncSession, graph_id, user_id) -> Optional[str]:
+        """
+        获取图谱的版本号（用于 ETag）
+        
+        由图谱行（创建/删除节点时更新节点数、增删关联时递增关联版本号，更新时间随之变化）和
+        图谱内节点的最大更新时间（沿 idx_memory_nodes_graph_updated 只读取一行）计算，
+        节点或关联有任何变化时版本号都会改变。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            user_id: 用户 ID（只能读取自己的图谱）
+        
+        Returns:
+            版本号；图谱不存在时返回 None
+        """
+        latest_node_update = (
+            select(func.max(MemoryNode.updated_at))
+            .where(MemoryNode.graph_id == KnowledgeGraph.id)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            select(
+                KnowledgeGraph.updated_at,
+                KnowledgeGraph.node_count,
+                KnowledgeGraph.relation_version,
+                latest_node_update,
+            ).where(
+                KnowledgeGraph.id == graph_id,
+                KnowledgeGraph.user_id == user_id
+            )
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        
+        state = "|".join(str(value) for value in (graph_id, *row))
+        return hashlib.blake2b(state.encode(), digest_size=12).hexdigest()
+    
+    @staticmethod
+    async def build(db: AsyncSession, graph_id, version: str) -> Dict:
+        """
+        构建图谱快照（列式）
+        
+        节点和关联各用一条流式查询分批读取；关联的两端用节点在 nodes 各列中的下标表示，
+        节点类型、掌握程度和关联类型编码为类别表加下标。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            version: 图谱版本号
+        
+        Returns:
+            快照数据字典
+        """
+        # 在会话的连接上以 Core 方式流式读取，省去 ORM 结果加载的开销
+        conn = await db.connection()
+        node_columns: Tuple[List, ...] = ([], [], [], [], [], [], [])
+        node_result = await conn.stream(
+            select(
+                cast(MemoryNode.id, String),
+                MemoryNode.node_type,
+                MemoryNode.title,
+                MemoryNode.position_x,
+                MemoryNode.position_y,
+                MemoryNode.position_z,
+                MemoryNode.mastery_level,
+            )
+            .where(and_(MemoryNode.graph_id == graph_id, MemoryNode.deleted_at.is_(None)))
+            .execution_options(yield_per=SNAPSHOT_STREAM_CHUNK_SIZE)
+        )
+        async for rows in node_result.partitions():
+            for values, column in zip(zip(*rows), node_columns):
+                column.extend(values)
+        ids, node_types, titles, position_x, position_y, position_z, mastery_levels = node_columns
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        
+        sources, targets, relation_types, strengths = [], [], [], []
+        relation_result = await conn.stream(
+            select(
+                cast(NodeRelation.source_id, String),
+                cast(NodeRelation.target_id, String),
+                NodeRelation.relation_type,
+                NodeRelation.strength,
+            )
+            .where(NodeRelation.graph_id == graph_id)
+            .execution_options(yield_per=SNAPSHOT_STREAM_CHUNK_SIZE)
+        )
+        async for rows in relation_result.partitions():
+            for source_id, target_id, relation_type, strength in rows:
+                source, target = index.get(source_id), index.get(target_id)
+                # 跳过一端已软删除的关联
+                if source is None or target is None:
+                    continue
+                sources.append(source)
+                targets.append(target)
+                relation_types.append(relation_type)
+                strengths.append(strength)
+        
+        return {
+            "graph_id": str(graph_id),
+            "version": version,
+            "node_count": len(ids),
+            "relation_count": len(sources),
+            "nodes": {
+                "id": ids,
+                "node_type": _categorical(node_types),
+                "title": titles,
+                "position_x": position_x,
+                "position_y": position_y,
+                "position_z": position_z,
+                "mastery_level": _categorical(mastery_levels),
+            },
+            "relations": {
+                "source": sources,
+                "target": targets,
+                "relation_type": _categorical(relation_types),
+                "strength": strengths,
+            },
+        }
+    
+    @staticmethod
+    def negotiate_media_type(accept: Optional[str]) -> str:
+        """
+        根据 Accept 头选择响应格式
+        
+        Args:
+            accept: Accept 请求头
+        
+        Returns:
+            MSGPACK_MEDIA_TYPE（客户端接受且已安装 msgpack）或 JSON_MEDIA_TYPE
+        """
+        values = _parse_header_values(accept)
+        msgpack_quality = max((values.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES), default=0.0)
+        json_quality = values.get(JSON_MEDIA_TYPE, values.get("application/*", values.get("*/*", 0.0)))
+        if MSGPACK_AVAILABLE and msgpack_quality > 0 and msgpack_quality >= json_quality:
+            return MSGPACK_MEDIA_TYPE
+        return JSON_MEDIA_TYPE
+    
+    @staticmethod
+    def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+        """
+        根据 Accept-Encoding 头选择压缩算法（同等优先级时 brotli 优先）
+        
+        Args:
+            accept_encoding: Accept-Encoding 请求头
+        
+        Returns:
+            "br"、"gzip" 或 None（不压缩）
+        """
+        values = _parse_header_values(accept_encoding)
+        wildcard = values.get("*", 0.0)
+        candidates = [("gzip", values.get("gzip", wildcard))]
+        if BROTLI_AVAILABLE:
+            candidates.insert(0, ("br", values.get("br", wildcard)))
+        encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+        return encoding if quality > 0 else None
+    
+    @staticmethod
+    def etag(version: str, media_type: str) -> str:
+        """
+        快照的 ETag（弱校验，不同压缩算法的响应内容等价；不同格式的 ETag 不同）
+        
+        Args:
+            version: 图谱版本号
+            media_type: 响应格式
+        
+        Returns:
+            ETag 头的值
+        """
+        suffix = "msgpack" if media_type == MSGPACK_MEDIA_TYPE else "json"
+        return f'W/"{version}-{suffix}"'
+    
+    @staticmethod
+    def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        """
+        判断 If-None-Match 是否与 ETag 匹配（弱比较）
+        
+        Args:
+            if_none_match: If-None-Match 请求头
+            etag: 当前 ETag
+        
+        Returns:
+            是否匹配（匹配时返回 304）
+        """
+        if not if_none_match:
+            return False
+        
+        def opaque(tag: str) -> str:
+            tag = tag.strip()
+            return tag[2:] if tag.startswith("W/") else tag
+        
+        tags = [opaque(tag) for tag in if_none_match.split(",")]
+        return "*" in tags or opaque(etag) in tags
+    
+    @staticmethod
+    def encode(snapshot: Dict, media_type: str, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        序列化并压缩快照（CPU 密集，在线程池中调用）
+        
+        Args:
+            snapshot: 快照数据
+            media_type: 响应格式
+            encoding: 压缩算法（None 表示不压缩）
+        
+        Returns:
+            (响应体, 实际使用的压缩算法)；响应体过小时不压缩
+        """
+        if media_type == MSGPACK_MEDIA_TYPE:
+            body = msgpack.packb(snapshot, use_bin_type=True)
+        else:
+            body = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        
+        if encoding is None or len(body) < COMPRESSION_MIN_SIZE:
+            return body, None
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+        return gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL), encoding
@@ -0,0 +1,665 @@
+"""
+节点批量导入服务
+从 JSONL、CSV 和 Anki 牌组（.apkg）文件增量解析记录，按块用 COPY 写入节点、标签和关联，
+图谱、标签和用户统计的计数在导入结束时各更新一次
+"""
+
+import csv
+import html
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import Integer, cast, func, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.models.knowledge_graph import KnowledgeGraph
+from app.models.knowledge_tag import KnowledgeTag
+from app.models.memory_node import MasteryLevel
+from app.services.graph_adjacency_service import graph_adjacency_cache
+from app.services.review_due_index import review_due_index
+from app.services.review_service import review_statistics_cache
+from app.services.user_stats_service import user_stats_service
+
+
+IMPORT_FORMATS = ("jsonl", "csv", "apkg")
+# 按文件扩展名推断格式（.colpkg 是整个 Anki 集合的备份，结构与 .apkg 相同）
+IMPORT_FORMAT_EXTENSIONS = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".csv": "csv",
+    ".apkg": "apkg",
+    ".colpkg": "apkg",
+}
+
+DEFAULT_NODE_TYPE = "QUESTION"
+DEFAULT_RELATION_TYPE = "RELATED"
+DEFAULT_RELATION_STRENGTH = 50
+# CSV 中标签、关联的分隔符（关联写作 "类型:目标键"，类型可省略）
+CSV_LIST_SEPARATOR = ";"
+# CSV 中有专门含义的列，其余非空列写入 content_data
+CSV_RESERVED_COLUMNS = (
+    "key", "title", "node_type", "summary", "content_data", "tags", "relations",
+    "position_x", "position_y", "position_z",
+)
+# 导入报告中保留的错误条数
+MAX_REPORTED_ERRORS = 20
+# 进程内保留的导入进度条数
+MAX_TRACKED_IMPORTS = 100
+
+# Anki 笔记字段分隔符
+ANKI_FIELD_SEPARATOR = "\x1f"
+_ANKI_COLLECTIONS = ("collection.anki21", "collection.anki2")
+_HTML_BREAK = re.compile(r"<br\s*/?>|</(?:div|p|li)>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_ANKI_SOUND = re.compile(r"\[sound:[^\]]*\]")
+_ANKI_CLOZE = re.compile(r"\{\{c\d+::(.*?)(?:::[^}]*)?\}\}", re.DOTALL)
+_HORIZONTAL_SPACE = re.compile(r"[ \t\r\f\v\xa0]+")
+
+_NODE_COLUMNS = (
+    "id", "graph_id", "user_id", "created_by", "node_type", "title", "summary", "content_data",
+    "position_x", "position_y", "position_z", "mastery_level", "review_stats", "created_at", "updated_at",
+)
+_TAG_COLUMNS = (
+    "id", "graph_id", "name", "color", "importance_score", "mastery_rate", "node_count", "created_at",
+)
+_NODE_TAG_COLUMNS = ("id", "node_id", "tag_id", "confidence", "is_manual", "created_at")
+_RELATION_COLUMNS = (
+    "id", "graph_id", "source_id", "target_id", "relation_type", "strength",
+    "is_auto_generated", "created_by", "created_at",
+)
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    """
+    按文件扩展名推断导入格式
+    
+    Args:
+        filename: 文件名
+    
+    Returns:
+        导入格式；无法识别时返回 None
+    """
+    return IMPORT_FORMAT_EXTENSIONS.get(os.path.splitext(filename or "")[1].lower())
+
+
+def _plain_text(value: str) -> str:
+    """Anki 字段转为纯文本（去掉 HTML 标签和音频引用，完形填空只保留答案）"""
+    value = _ANKI_CLOZE.sub(r"\1", value)
+    value = _ANKI_SOUND.sub("", value)
+    value = _HTML_BREAK.sub("\n", value)
+    value = html.unescape(_HTML_TAG.sub("", value))
+    lines = (_HORIZONTAL_SPACE.sub(" ", line).strip() for line in value.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def _split_list(value: Union[str, List, None]) -> List[str]:
+    """标签、关联列可以是列表或用分号分隔的字符串"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+    if isinstance(value, list):
+        return value
+    raise ValueError("应为列表或用分号分隔的字符串")
+
+
+@dataclass
+class ImportRecord:
+    """一条待导入的节点记录（已校验）"""
+    
+    key: Optional[str]  # 文件内的记录键（关联引用）
+    node_type: str
+    title: str
+    summary: Optional[str]
+    content_data: Dict[str, Any]
+    position: Tuple[float, float, float]
+    tags: List[str]
+    relations: List[Tuple[str, str, int]]  # (目标键, 关联类型, 强度)
+
+
+def _to_record(data: Dict[str, Any], default_node_type: str) -> ImportRecord:
+    """
+    校验一条原始记录
+    
+    Args:
+        data: 解析出的记录
+        default_node_type: 未指定类型时的节点类型
+    
+    Returns:
+        导入记录
+    
+    Raises:
+        ValueError: 记录不合法
+    """
+    if not isinstance(data, dict):
+        raise ValueError("记录应为 JSON 对象")
+    
+    title = data.get("title")
+    title = str(title).strip() if title is not None else ""
+    if not 1 <= len(title) <= 200:
+        raise ValueError("标题长度需在 1-200 之间")
+    
+    node_type = str(data.get("node_type") or default_node_type).strip().upper()
+    if not 1 <= len(node_type) <= 20:
+        raise ValueError("节点类型长度需在 1-20 之间")
+    
+    summary = data.get("summary")
+    summary = str(summary) if summary not in (None, "") else None
+    
+    content_data = data.get("content_data") or {}
+    if isinstance(content_data, str):
+        try:
+            content_data = json.loads(content_data)
+        except json.JSONDecodeError:
+            raise ValueError("content_data 不是合法的 JSON")
+    if not isinstance(content_data, dict):
+        raise ValueError("content_data 应为 JSON 对象")
+    
+    position = []
+    for axis in ("position_x", "position_y", "position_z"):
+        value = data.get(axis)
+        try:
+            value = float(value) if value not in (None, "") else 0.0
+        except (TypeError, ValueError):
+            raise ValueError(f"{axis} 不是数字")
+        if not math.isfinite(value):
+            raise ValueError(f"{axis} 不是有限数")
+        position.append(value)
+    
+    tags = []
+    for tag in _split_list(data.get("tags")):
+        tag = str(tag).strip()
+        if len(tag) > 100:
+            raise ValueError("标签名称不能超过 100 个字符")
+        if tag and tag not in tags:
+            tags.append(tag)
+    
+    relations = []
+    for relation in _split_list(data.get("relations")):
+        if isinstance(relation, str):
+            relation_type, separator, target = relation.partition(":")
+            relation = {"target": target, "type": relation_type} if separator else {"target": relation}
+        if not isinstance(relation, dict) or relation.get("target") in (None, ""):
+            raise ValueError("关联需指定目标记录的 key")
+        relation_type = str(relation.get("type") or DEFAULT_RELATION_TYPE).strip().upper()
+        if not 1 <= len(relation_type) <= 20:
+            raise ValueError("关联类型长度需在 1-20 之间")
+        try:
+            strength = int(relation.get("strength", DEFAULT_RELATION_STRENGTH))
+        except (TypeError, ValueError):
+            raise ValueError("关联强度不是整数")
+        if not 0 <= strength <= 100:
+            raise ValueError("关联强度需在 0-100 之间")
+        relations.append((str(relation["target"]), relation_type, strength))
+    
+    key = data.get("key")
+    return ImportRecord(
+        key=str(key) if key not in (None, "") else None,
+        node_type=node_type,
+        title=title,
+        summary=summary,
+        content_data=content_data,
+        position=tuple(position),
+        tags=tags,
+        relations=relations,
+    )
+
+
+# 解析器逐条产出 (行号或笔记序号, 原始记录)；无法解析的行产出错误信息字符串
+ParsedItem = Tuple[int, Union[Dict[str, Any], str]]
+
+
+def iter_jsonl(file: BinaryIO) -> Iterator[ParsedItem]:
+    """逐行解析 JSONL（每行一个 JSON 对象，空行跳过）"""
+    for line_number, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            yield line_number, f"无法解析的 JSON: {e}"
+
+
+def iter_csv(file: BinaryIO) -> Iterator[ParsedItem]:
+    """
+    逐行解析 CSV（首行为列名，必须包含 title 列）
+    
+    key, title, node_type, summary, content_data（JSON 对象）, tags, relations, position_x/y/z
+    之外的非空列写入 content_data，例如 question、answer 列。
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        yield from _iter_csv_rows(reader)
+    except UnicodeDecodeError:
+        raise ValueError("CSV 文件需为 UTF-8 编码")
+    except csv.Error as e:
+        raise ValueError(f"无法解析的 CSV（第 {reader.line_num} 行）: {e}")
+    finally:
+        # 不随包装对象关闭底层文件
+        text.detach()
+
+
+def _iter_csv_rows(reader: csv.DictReader) -> Iterator[ParsedItem]:
+    """把 CSV 行转为原始记录"""
+    if not reader.fieldnames or "title" not in reader.fieldnames:
+        raise ValueError("CSV 首行需包含 title 列")
+    extra_columns = [column for column in reader.fieldnames if column not in CSV_RESERVED_COLUMNS]
+    for row in reader:
+        data = {column: row.get(column) for column in CSV_RESERVED_COLUMNS if row.get(column) not in (None, "")}
+        extra = {column: row[column] for column in extra_columns if row.get(column) not in (None, "")}
+        if extra:
+            try:
+                content_data = json.loads(data.get("content_data") or "{}")
+            except json.JSONDecodeError:
+                yield reader.line_num, "content_data 不是合法的 JSON"
+                continue
+            if isinstance(content_data, dict):
+                data["content_data"] = {**extra, **content_data}
+        yield reader.line_num, data
+
+
+def _anki_note_types(collection: sqlite3.Connection) -> Dict[int, Tuple[str, List[str]]]:
+    """读取 Anki 笔记类型 {类型 ID: (名称, 字段名列表)}"""
+    row = collection.execute("SELECT models FROM col").fetchone()
+    models = json.loads(row[0]) if row and row[0] else {}
+    if models:
+        return {
+            int(model_id): (
+                model.get("name", ""),
+                [item["name"] for item in sorted(model.get("flds", []), key=lambda item: item.get("ord", 0))],
+            )
+            for model_id, model in models.items()
+        }
+    
+    # 新版集合（schema 18）的笔记类型在单独的表中
+    names = dict(collection.execute("SELECT id, name FROM notetypes"))
+    note_types = {note_type_id: (name, []) for note_type_id, name in names.items()}
+    for note_type_id, name in collection.execute("SELECT ntid, name FROM fields ORDER BY ntid, ord"):
+        note_types.setdefault(note_type_id, ("", []))[1].append(name)
+    return note_types
+
+
+def iter_apkg(file: BinaryIO) -> Iterator[ParsedItem]:
+    """
+    按笔记 ID 顺序读取 Anki 牌组中的笔记
+    
+    每条笔记导入为一个问答节点：第一个字段为问题（纯文本作为标题），第二个字段为答案，
+    原始字段（HTML）保存在 content_data.fields 中；复习进度不导入，节点从未开始复习的状态开始。
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise ValueError("不是有效的 Anki 牌组文件")
+    
+    with archive, tempfile.NamedTemporaryFile(suffix=".anki2") as database_file:
+        names = set(archive.namelist())
+        member = next((name for name in _ANKI_COLLECTIONS if name in names), None)
+        if member is None or ("collection.anki21b" in names and member == "collection.anki2"):
+            # 新版导出中的 collection.anki2 只是提示升级的占位集合
+            raise ValueError("不支持该 Anki 导出格式，请在导出时勾选“支持旧版 Anki”")
+        # 解压前按压缩包记录的大小检查，复制时再按实际解压的字节数检查（防止解压炸弹）
+        limit = settings.NODE_IMPORT_MAX_COLLECTION_SIZE
+        too_large = f"Anki 牌组解压后不能超过 {limit // (1024 * 1024)}MB"
+        if archive.getinfo(member).file_size > limit:
+            raise ValueError(too_large)
+        with archive.open(member) as source:
+            copied = 0
+            while chunk := source.read(1024 * 1024):
+                copied += len(chunk)
+                if copied > limit:
+                    raise ValueError(too_large)
+                database_file.write(chunk)
+        database_file.flush()
+        
+        # 解析在线程池中分块进行，连接会在不同线程中使用
+        collection = sqlite3.connect(database_file.name, check_same_thread=False)
+        try:
+            note_types = _anki_note_types(collection)
+            notes = collection.execute("SELECT guid, mid, tags, flds FROM notes ORDER BY id")
+            for number, (guid, note_type_id, tags, fields) in enumerate(notes, start=1):
+                values = fields.split(ANKI_FIELD_SEPARATOR)
+                note_type, field_names = note_types.get(note_type_id, ("", []))
+                field_names = field_names + [f"field{i + 1}" for i in range(len(field_names), len(values))]
+                question = _plain_text(values[0])
+                answer = _plain_text(values[1]) if len(values) > 1 else ""
+                if not question:
+                    yield number, "第一个字段为空"
+                    continue
+                
+                content_data = {"question": question, "fields": dict(zip(field_names, values))}
+                if answer:
+                    content_data["answer"] = answer
+                content_data["source"] = {"format": "anki", "guid": guid, "note_type": note_type}
+                yield number, {
+                    "key": guid,
+                    "title": question.replace("\n", " ")[:200],
+                    "content_data": content_data,
+                    "tags": tags.split(),
+                }
+        finally:
+            collection.close()
+
+
+_PARSERS: Dict[str, Callable[[BinaryIO], Iterator[ParsedItem]]] = {
+    "jsonl": iter_jsonl,
+    "csv": iter_csv,
+    "apkg": iter_apkg,
+}
+
+
+@dataclass
+class _ImportChunk:
+    """一块待写入的行"""
+    
+    nodes: List[Tuple] = field(default_factory=list)
+    tags: List[Tuple] = field(default_factory=list)
+    node_tags: List[Tuple] = field(default_factory=list)
+
+
+class _NodeImport:
+    """
+    一次导入的状态
+    
+    节点和标签 ID 在导入前生成，关联按记录键在全部节点写入后解析（目标记录可以出现在后面）；
+    解析和构造行在线程池中逐块进行，同一时刻只有一个线程访问该状态。
+    """
+    
+    def __init__(
+        self,
+        graph_id,
+        user_id,
+        items: Iterator[ParsedItem],
+        default_node_type: str,
+        existing_tags: Dict[str, uuid.UUID]
+    ):
+        self.graph_id = graph_id
+        self.user_id = user_id
+        self.items = items
+        self.default_node_type = default_node_type
+        self.tag_ids = dict(existing_tags)
+        self.now = datetime.now(timezone.utc)
+        self.node_ids: List[uuid.UUID] = []
+        self.key_ids: Dict[str, uuid.UUID] = {}
+        self.pending_relations: List[Tuple[uuid.UUID, str, str, int, int]] = []
+        self.tag_counts: Counter = Counter()
+        self.new_tags = 0
+        self.node_tags = 0
+        self.records = 0
+        self.skipped = 0
+        self.skipped_relations = 0
+        self.errors: List[Dict[str, Any]] = []
+    
+    def error(self, line: int, message: str, relation: bool = False) -> None:
+        """记一条跳过的记录（或关联）"""
+        if relation:
+            self.skipped_relations += 1
+        else:
+            self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "message": message})
+    
+    def next_chunk(self, size: int) -> Optional[_ImportChunk]:
+        """
+        解析下一块记录并构造 COPY 行（在线程池中调用）
+        
+        Args:
+            size: 每块的记录数
+        
+        Returns:
+            待写入的行；文件已读完时返回 None
+        """
+        chunk = _ImportChunk()
+        for line, data in self.items:
+            self.records += 1
+            if isinstance(data, str):
+                self.error(line, data)
+                continue
+            try:
+                record = _to_record(data, self.default_node_type)
+            except ValueError as e:
+                self.error(line, str(e))
+                continue
+            if record.key is not None and record.key in self.key_ids:
+                self.error(line, f"重复的 key: {record.key}")
+                continue
+            
+            node_id = uuid.uuid4()
+            self.node_ids.append(node_id)
+            if record.key is not None:
+                self.key_ids[record.key] = node_id
+            chunk.nodes.append((
+                node_id, self.graph_id, self.user_id, self.user_id, record.node_type, record.title,
+                record.summary, json.dumps(record.content_data, ensure_ascii=False), *record.position,
+                MasteryLevel.NOT_STARTED.value, "{}", self.now, self.now,
+            ))
+            for name in record.tags:
+                tag_id = self.tag_ids.get(name)
+                if tag_id is None:
+                    tag_id = self.tag_ids[name] = uuid.uuid4()
+                    chunk.tags.append((tag_id, self.graph_id, name, "#1890FF", 50.0, 0.0, 0, self.now))
+                chunk.node_tags.append((uuid.uuid4(), node_id, tag_id, 1.0, True, self.now))
+                self.tag_counts[tag_id] += 1
+            for target, relation_type, strength in record.relations:
+                self.pending_relations.append((node_id, target, relation_type, strength, line))
+            
+            if len(chunk.nodes) >= size:
+                break
+        
+        # 只有写满一块才会提前停止读取，块为空说明文件已读完
+        self.new_tags += len(chunk.tags)
+        self.node_tags += len(chunk.node_tags)
+        return chunk if chunk.nodes else None
+    
+    def relation_rows(self) -> List[Tuple]:
+        """解析关联的目标记录（跳过找不到目标的关联和重复的关联）"""
+        rows = []
+        seen = set()
+        for source_id, target, relation_type, strength, line in self.pending_relations:
+            target_id = self.key_ids.get(target)
+            if target_id is None:
+                self.error(line, f"关联的目标记录不存在: {target}", relation=True)
+                continue
+            if (source_id, target_id, relation_type) in seen:
+                continue
+            seen.add((source_id, target_id, relation_type))
+            rows.append((
+                uuid.uuid4(), self.graph_id, source_id, target_id, relation_type, strength,
+                False, self.user_id, self.now,
+            ))
+        return rows
+
+
+class NodeImportService:
+    """
+    节点批量导入服务
+    
+    整个导入在调用方会话的一个事务中完成：先锁定图谱行（同一图谱的导入串行执行），
+    再按块 COPY 节点、新标签和节点标签，最后 COPY 关联并一次更新图谱节点数、关联版本号、
+    标签节点数和用户统计，提交后把新节点写入复习到期索引。
+    导入进度保存在进程内，多进程部署时只能在处理导入的进程中查询。
+    """
+    
+    def __init__(self):
+        """初始化导入服务"""
+        self._progress: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+    
+    def get_progress(self, graph_id, import_id: str) -> Optional[Dict[str, Any]]:
+        """
+        查询导入进度
+        
+        Args:
+            graph_id: 图谱 ID
+            import_id: 导入 ID
+        
+        Returns:
+            进度；不存在（或已被较新的导入挤出）时返回 None
+        """
+        progress = self._progress.get((str(graph_id), import_id))
+        return dict(progress) if progress is not None else None
+    
+    def _track(self, graph_id, import_id: str, import_format: str) -> Dict[str, Any]:
+        """登记一次导入的进度"""
+        progress = {
+            "import_id": import_id,
+            "graph_id": graph_id,
+            "format": import_format,
+            "status": "running",
+            "records": 0,
+            "nodes": 0,
+            "tags": 0,
+            "node_tags": 0,
+            "relations": 0,
+            "skipped": 0,
+            "skipped_relations": 0,
+            "errors": [],
+            "elapsed_ms": 0.0,
+        }
+        key = (str(graph_id), import_id)
+        self._progress.pop(key, None)
+        self._progress[key] = progress
+        while len(self._progress) > MAX_TRACKED_IMPORTS:
+            self._progress.popitem(last=False)
+        return progress
+    
+    async def import_file(
+        self,
+        db: AsyncSession,
+        graph_id,
+        user_id,
+        file: BinaryIO,
+        import_format: str,
+        default_node_type: str = DEFAULT_NODE_TYPE,
+        import_id: Optional[str] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        导入文件中的节点、标签和关联并提交
+        
+        调用前需已验证图谱所有权；不合法的记录跳过并计入 skipped（报告前 20 条错误），
+        写入失败时回滚整个导入。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            user_id: 用户 ID
+            file: 文件对象（二进制，.apkg 需可随机读取）
+            import_format: 文件格式 (jsonl, csv, apkg)
+            default_node_type: 记录未指定类型时的节点类型
+            import_id: 导入 ID（用于查询进度，默认自动生成）
+            on_progress: 每写入一块后调用，参数为当前进度
+        
+        Returns:
+            导入结果（各类行数、跳过的记录数、错误和耗时）
+        
+        Raises:
+            ValueError: 格式不支持或文件无法解析
+        """
+        if import_format not in _PARSERS:
+            raise ValueError(f"不支持的导入格式: {import_format}。支持: {', '.join(IMPORT_FORMATS)}")
+        
+        started = time.perf_counter()
+        progress = self._track(graph_id, import_id or uuid.uuid4().hex, import_format)
+        items = _PARSERS[import_format](file)
+        
+        def report(state: _NodeImport, relations: int = 0) -> None:
+            progress.update(
+                records=state.records,
+                nodes=len(state.node_ids),
+                tags=state.new_tags,
+                node_tags=state.node_tags,
+                relations=relations,
+                skipped=state.skipped,
+                skipped_relations=state.skipped_relations,
+                errors=list(state.errors),
+                elapsed_ms=(time.perf_counter() - started) * 1000,
+            )
+            if on_progress is not None:
+                on_progress(dict(progress))
+        
+        try:
+            # 锁定图谱行，同时开启事务：之后的 COPY 在同一事务中执行
+            await db.execute(select(KnowledgeGraph.id).where(KnowledgeGraph.id == graph_id).with_for_update())
+            existing_tags = await db.execute(
+                select(KnowledgeTag.name, KnowledgeTag.id).where(
+                    KnowledgeTag.graph_id == graph_id,
+                    KnowledgeTag.parent_id.is_(None)
+                )
+            )
+            state = _NodeImport(graph_id, user_id, items, default_node_type, dict(existing_tags.all()))
+            
+            connection = (await (await db.connection()).get_raw_connection()).driver_connection
+            chunk_size = settings.NODE_IMPORT_CHUNK_SIZE
+            while True:
+                chunk = await run_in_threadpool(state.next_chunk, chunk_size)
+                if chunk is None:
+                    break
+                await connection.copy_records_to_table("memory_nodes", records=chunk.nodes, columns=_NODE_COLUMNS)
+                if chunk.tags:
+                    await connection.copy_records_to_table("knowledge_tags", records=chunk.tags, columns=_TAG_COLUMNS)
+                if chunk.node_tags:
+                    await connection.copy_records_to_table(
+                        "node_tags", records=chunk.node_tags, columns=_NODE_TAG_COLUMNS
+                    )
+                report(state)
+            
+            relation_rows = await run_in_threadpool(state.relation_rows)
+            for start in range(0, len(relation_rows), chunk_size):
+                await connection.copy_records_to_table(
+                    "node_relations", records=relation_rows[start:start + chunk_size], columns=_RELATION_COLUMNS
+                )
+            
+            node_count = len(state.node_ids)
+            if node_count:
+                await db.execute(
+                    update(KnowledgeGraph)
+                    .where(KnowledgeGraph.id == graph_id)
+                    .values(node_count=KnowledgeGraph.node_count + node_count)
+                    .execution_options(synchronize_session=False)
+                )
+                await user_stats_service.record_nodes_created(db, user_id, count=node_count)
+            if relation_rows:
+                await graph_adjacency_cache.bump_version(db, graph_id)
+            if state.tag_counts:
+                counts = func.unnest(
+                    cast(list(state.tag_counts), ARRAY(UUID(as_uuid=True))),
+                    cast(list(state.tag_counts.values()), ARRAY(Integer)),
+                ).table_valued("id", "count").render_derived(name="tag_counts")
+                await db.execute(
+                    update(KnowledgeTag)
+                    .where(KnowledgeTag.id == counts.c.id)
+                    .values(node_count=KnowledgeTag.node_count + counts.c.count)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            progress.update(status="failed", error=str(e), elapsed_ms=(time.perf_counter() - started) * 1000)
+            raise
+        finally:
+            items.close()
+        
+        await review_due_index.add_unscheduled(user_id, graph_id, state.node_ids)
+        review_statistics_cache.invalidate(user_id)
+        progress["status"] = "completed"
+        report(state, relations=len(relation_rows))
+        return dict(progress)
+
+
+node_import_service = NodeImportService()
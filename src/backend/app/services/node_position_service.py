@@ -0,0 +1,201 @@
+"""
+节点坐标批量更新服务
+拖动或自动排列时客户端频繁提交大量节点坐标，同一客户端的并发请求合并为一条 UPDATE 写入
+"""
+
+import asyncio
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.graph_layout_service import GraphLayoutService
+
+
+@dataclass
+class _PendingPosition:
+    """等待写入的节点坐标"""
+    
+    ticket: int  # 提交该坐标的请求
+    sequence: Optional[int]  # 客户端序号（越大越新）
+    x: float
+    y: float
+    z: Optional[float]  # None 表示不修改 Z 坐标
+
+
+@dataclass
+class _ClientState:
+    """同一图谱、同一客户端的合并状态"""
+    
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: Dict[UUID, _PendingPosition] = field(default_factory=dict)
+    # 各请求的计数 {ticket: {"applied", "rejected", "coalesced", "rejected_ids"}}
+    results: Dict[int, Dict] = field(default_factory=dict)
+    # 已经写入（或写入失败）的最大请求编号
+    flushed_through: int = 0
+    errors: Dict[int, Exception] = field(default_factory=dict)
+    # 各节点已取出写入的最大客户端序号（与合并器中保留的序号共用，状态删除后仍然有效）
+    written_sequences: Dict[UUID, int] = field(default_factory=dict)
+    waiters: int = 0
+
+
+class NodePositionCoalescer:
+    """
+    节点坐标更新合并器（组提交）
+    
+    每个请求先把坐标放入 (图谱, 客户端) 的待写入集合（同一节点只保留最新的坐标），
+    再排队获取该客户端的写锁；拿到锁的请求把当前集合里所有请求的坐标用一条 UPDATE 写入并提交，
+    排在后面、坐标已被写入的请求直接返回结果。拖动时连续发送的请求因此合并成少量写入，
+    不需要额外等待。客户端提供递增的序号时，乱序到达的旧坐标不会覆盖新坐标：
+    各节点已写入的最大序号在请求全部返回、客户端状态删除后继续保留（按最近使用保留
+    NODE_POSITIONS_SEQUENCE_CLIENTS 个客户端）。
+    
+    合并只在单个进程内进行；多进程部署时各进程分别合并，仍然每个请求最多一条 UPDATE。
+    """
+    
+    def __init__(self):
+        """初始化合并器"""
+        self._states: Dict[Tuple[UUID, Optional[str]], _ClientState] = {}
+        # (图谱, 客户端) -> {节点: 已写入的最大序号}，按最近使用排序
+        self._sequences: "OrderedDict[Tuple[UUID, Optional[str]], Dict[UUID, int]]" = OrderedDict()
+        self._tickets = itertools.count(1)
+        self._counters = {"requests": 0, "flushes": 0, "coalesced": 0}
+    
+    async def submit(
+        self,
+        db: AsyncSession,
+        graph_id: UUID,
+        node_ids: Sequence[UUID],
+        xs: Sequence[float],
+        ys: Sequence[float],
+        zs: Optional[Sequence[Optional[float]]] = None,
+        client_id: Optional[str] = None,
+        sequence: Optional[int] = None
+    ) -> Dict:
+        """
+        提交一批节点坐标，返回时坐标已写入并提交（或被更新的坐标取代）
+        
+        调用前需已验证图谱所有权；只更新该图谱内未删除的节点。
+        
+        Args:
+            db: 数据库会话（本请求负责写入时使用）
+            graph_id: 图谱 ID
+            node_ids: 节点 ID 列表
+            xs: X 坐标
+            ys: Y 坐标
+            zs: Z 坐标（可选，None 表示不修改）
+            client_id: 客户端标识（同一客户端的请求互相合并）
+            sequence: 客户端序号（可选，越大越新）
+        
+        Returns:
+            applied（写入的节点数）、rejected（不在图谱中或已删除的节点数）、
+            coalesced（被同一客户端更新的坐标取代、未单独写入的节点数）、rejected_ids
+        """
+        key = (graph_id, client_id)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _ClientState(written_sequences=self._written_sequences(key))
+        ticket = next(self._tickets)
+        result = {"applied": 0, "rejected": 0, "coalesced": 0, "rejected_ids": []}
+        state.results[ticket] = result
+        state.waiters += 1
+        self._counters["requests"] += 1
+        
+        try:
+            zs = zs if zs is not None else [None] * len(node_ids)
+            for node_id, x, y, z in zip(node_ids, xs, ys, zs):
+                previous = state.pending.get(node_id)
+                if sequence is not None and (
+                    state.written_sequences.get(node_id, -1) > sequence
+                    or (previous is not None and previous.sequence is not None and previous.sequence > sequence)
+                ):
+                    # 乱序到达的旧坐标
+                    self._coalesce(state, ticket)
+                    continue
+                if previous is not None:
+                    self._coalesce(state, previous.ticket)
+                state.pending[node_id] = _PendingPosition(ticket, sequence, x, y, z)
+            
+            async with state.lock:
+                if ticket > state.flushed_through:
+                    await self._flush(db, graph_id, state)
+            
+            if ticket in state.errors:
+                raise state.errors.pop(ticket)
+            return result
+        finally:
+            state.results.pop(ticket, None)
+            state.errors.pop(ticket, None)
+            state.waiters -= 1
+            if state.waiters == 0 and self._states.get(key) is state:
+                del self._states[key]
+    
+    def _written_sequences(self, key: Tuple[UUID, Optional[str]]) -> Dict[UUID, int]:
+        """取出客户端已写入的序号（移到最近使用），超出保留数量时丢弃最久未使用的客户端"""
+        sequences = self._sequences.pop(key, None)
+        if sequences is None:
+            sequences = {}
+        self._sequences[key] = sequences
+        while len(self._sequences) > settings.NODE_POSITIONS_SEQUENCE_CLIENTS:
+            self._sequences.popitem(last=False)
+        return sequences
+    
+    def _coalesce(self, state: _ClientState, ticket: int) -> None:
+        """记一个被取代的坐标"""
+        if ticket in state.results:
+            state.results[ticket]["coalesced"] += 1
+        self._counters["coalesced"] += 1
+    
+    async def _flush(self, db: AsyncSession, graph_id: UUID, state: _ClientState) -> None:
+        """写入待写入集合中所有请求的坐标（持有写锁时调用）"""
+        batch, state.pending = state.pending, {}
+        through = max(state.results)
+        # 取出时就记下序号：写入期间到达的更旧坐标不会再覆盖
+        for node_id, item in batch.items():
+            if item.sequence is not None:
+                state.written_sequences[node_id] = max(state.written_sequences.get(node_id, -1), item.sequence)
+        if not batch:
+            # 坐标都是乱序到达的旧坐标
+            state.flushed_through = through
+            return
+        
+        try:
+            node_ids = list(batch)
+            positions = np.array(
+                [(item.x, item.y, np.nan if item.z is None else item.z) for item in batch.values()],
+                dtype=np.float64
+            ).reshape(-1, 3)
+            updated = set(await GraphLayoutService.save_positions(db, graph_id, node_ids, positions))
+            await db.commit()
+            self._counters["flushes"] += 1
+        except Exception as e:
+            await db.rollback()
+            # 本次写入涵盖的请求（包括坐标全部被取代的请求）都返回错误
+            for ticket in state.results:
+                if ticket <= through:
+                    state.errors[ticket] = e
+            state.flushed_through = through
+            return
+        
+        for node_id, item in batch.items():
+            result = state.results.get(item.ticket)
+            if result is None:
+                continue
+            if node_id in updated:
+                result["applied"] += 1
+            else:
+                result["rejected"] += 1
+                result["rejected_ids"].append(node_id)
+        state.flushed_through = through
+    
+    def stats(self) -> Dict:
+        """合并统计（请求数、写入次数、被取代的坐标数）"""
+        return dict(self._counters)
+
+
+node_position_coalescer = NodePositionCoalescer()
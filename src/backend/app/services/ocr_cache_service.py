@@ -0,0 +1,279 @@
+"""
+OCR 结果缓存服务
+两级缓存：进程内 LRU（按字节计量容量）+ Postgres 表 ocr_result_cache（多进程共享，按字节容量淘汰）
+缓存键为 (图片内容 SHA-256, OCR 引擎, 识别模式)
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.ocr_cache import OCRCacheEntry
+
+
+# 计算文件哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 按最近命中时间从新到旧累加结果字节数，删除超出容量的条目
+_EVICT_SQL = text("""
+    DELETE FROM ocr_result_cache AS cache
+    USING (
+        SELECT content_hash, engine, mode
+        FROM (
+            SELECT
+                content_hash, engine, mode,
+                sum(result_bytes) OVER (
+                    ORDER BY last_hit_at DESC, content_hash, engine, mode
+                ) AS retained_bytes
+            FROM ocr_result_cache
+        ) AS ranked
+        WHERE retained_bytes > :max_bytes
+    ) AS expired
+    WHERE cache.content_hash = expired.content_hash
+      AND cache.engine = expired.engine
+      AND cache.mode = expired.mode
+""")
+
+
+def file_sha256(path: Path) -> str:
+    """
+    计算文件内容的 SHA-256（分块读取，阻塞调用，在线程中执行）
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    OCR 结果缓存
+    
+    本地 LRU 命中时不访问数据库；未命中时查询 ocr_result_cache 表，命中后回填本地
+    并更新最近命中时间（随调用方的事务提交）。识别结果按内容寻址、不会变化，
+    因此本地条目不设有效期；需要重新识别时由调用方跳过缓存，新结果覆盖旧条目。
+    """
+    
+    def __init__(
+        self,
+        local_max_bytes: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        evict_interval: Optional[int] = None
+    ):
+        """
+        初始化 OCR 结果缓存
+        
+        Args:
+            local_max_bytes: 本地 LRU 容量（字节，默认取配置）
+            max_bytes: 数据库中识别结果的总字节数上限（默认取配置）
+            evict_interval: 每写入多少条检查一次数据库容量（默认取配置）
+        """
+        self.local_max_bytes = (
+            settings.OCR_CACHE_LOCAL_MAX_BYTES if local_max_bytes is None else local_max_bytes
+        )
+        self.max_bytes = settings.OCR_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.evict_interval = settings.OCR_CACHE_EVICT_INTERVAL if evict_interval is None else evict_interval
+        
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self._stores_since_evict = 0
+        self._counters = {
+            "hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "db_evictions": 0,
+        }
+    
+    @staticmethod
+    def make_key(content_hash: str, engine: str, mode: str) -> Tuple[str, str, str]:
+        """
+        生成缓存键
+        
+        Args:
+            content_hash: 图片内容 SHA-256
+            engine: OCR 引擎（已解析的实际引擎，不是 auto）
+            mode: 识别模式 (text, math)
+        
+        Returns:
+            缓存键
+        """
+        return content_hash, engine, mode
+    
+    @staticmethod
+    def result_size(result: Dict) -> int:
+        """识别结果的 JSON 字节数"""
+        return len(json.dumps(result, ensure_ascii=False).encode("utf-8"))
+    
+    def _get_local(self, key: Tuple[str, str, str]) -> Optional[Dict]:
+        """读取本地 LRU，命中时移到队尾"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+    
+    def _put_local(self, key: Tuple[str, str, str], result: Dict, size: int) -> None:
+        """写入本地 LRU，超出容量时淘汰最久未使用的条目"""
+        if size > self.local_max_bytes:
+            return
+        
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[0]
+        
+        self._entries[key] = (size, result)
+        self._bytes += size
+        
+        while self._bytes > self.local_max_bytes:
+            _, (oldest_size, _) = self._entries.popitem(last=False)
+            self._bytes -= oldest_size
+            self._counters["evictions"] += 1
+    
+    async def get(
+        self,
+        db: AsyncSession,
+        content_hash: str,
+        engine: str,
+        mode: str,
+        bypass: bool = False
+    ) -> Optional[Dict]:
+        """
+        读取缓存的识别结果
+        
+        Args:
+            db: 数据库会话
+            content_hash: 图片内容 SHA-256
+            engine: OCR 引擎
+            mode: 识别模式
+            bypass: 跳过缓存（强制重新识别，只计数）
+        
+        Returns:
+            识别结果，未命中时返回 None
+        """
+        if bypass:
+            self._counters["bypassed"] += 1
+            return None
+        
+        key = self.make_key(content_hash, engine, mode)
+        result = self._get_local(key)
+        if result is not None:
+            self._counters["hits"] += 1
+            return result
+        
+        condition = and_(
+            OCRCacheEntry.content_hash == content_hash,
+            OCRCacheEntry.engine == engine,
+            OCRCacheEntry.mode == mode,
+        )
+        row = (
+            await db.execute(select(OCRCacheEntry.result, OCRCacheEntry.result_bytes).where(condition))
+        ).one_or_none()
+        if row is None:
+            self._counters["misses"] += 1
+            return None
+        
+        await db.execute(
+            update(OCRCacheEntry)
+            .where(condition)
+            .values(hit_count=OCRCacheEntry.hit_count + 1, last_hit_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        self._put_local(key, row.result, row.result_bytes)
+        self._counters["db_hits"] += 1
+        return row.result
+    
+    async def set(self, db: AsyncSession, content_hash: str, engine: str, mode: str, result: Dict) -> None:
+        """
+        写入识别结果（已有条目时覆盖），随调用方的事务提交
+        
+        Args:
+            db: 数据库会话
+            content_hash: 图片内容 SHA-256
+            engine: OCR 引擎
+            mode: 识别模式
+            result: 识别结果
+        """
+        size = self.result_size(result)
+        statement = insert(OCRCacheEntry).values(
+            content_hash=content_hash,
+            engine=engine,
+            mode=mode,
+            result=result,
+            result_bytes=size,
+            hit_count=0,
+        )
+        await db.execute(
+            statement.on_conflict_do_update(
+                index_elements=[OCRCacheEntry.content_hash, OCRCacheEntry.engine, OCRCacheEntry.mode],
+                set_={
+                    "result": statement.excluded.result,
+                    "result_bytes": statement.excluded.result_bytes,
+                    "last_hit_at": func.now(),
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        self._put_local(self.make_key(content_hash, engine, mode), result, size)
+        self._counters["stores"] += 1
+        
+        self._stores_since_evict += 1
+        if self._stores_since_evict >= self.evict_interval:
+            self._stores_since_evict = 0
+            await self.evict(db)
+    
+    async def evict(self, db: AsyncSession) -> int:
+        """
+        按容量淘汰数据库中最久未命中的条目（随调用方的事务提交）
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            删除的条目数
+        """
+        result = await db.execute(_EVICT_SQL, {"max_bytes": self.max_bytes})
+        self._counters["db_evictions"] += result.rowcount
+        return result.rowcount
+    
+    def clear(self) -> None:
+        """清空本地缓存（不影响数据库）"""
+        self._entries.clear()
+        self._bytes = 0
+    
+    def stats(self) -> Dict:
+        """
+        获取缓存统计（本进程）
+        
+        Returns:
+            命中、未命中、跳过、淘汰等计数和本地容量
+        """
+        hit_count = self._counters["hits"] + self._counters["db_hits"]
+        lookups = hit_count + self._counters["misses"]
+        return {
+            **self._counters,
+            "hit_rate": round(hit_count / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "local_max_bytes": self.local_max_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 创建全局 OCR 结果缓存实例
+ocr_result_cache = OCRResultCache()
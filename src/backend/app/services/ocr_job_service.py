@@ -0,0 +1,623 @@
+"""
+OCR 任务队列
+提交 OCR 后立即返回任务 ID，任务保存在 ocr_jobs 表中；每个进程按引擎启动若干工作协程，
+用 FOR UPDATE SKIP LOCKED 领取任务，经令牌桶限速后调用 OCR 服务，失败时按指数退避加随机抖动重试；
+识别结果按图片内容缓存，重复的图片在提交时直接完成
+"""
+
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.models.file_upload import FileUpload
+from app.models.ocr_job import OCRJob
+from app.services.ocr_cache_service import file_sha256, ocr_result_cache
+from app.services.ocr_service import ocr_service
+
+
+TERMINAL_STATUSES = ("completed", "failed")
+# SSE 没有状态变化时发送注释行保持连接的间隔（秒）
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+def local_file_path(file_url: str) -> Optional[Path]:
+    """
+    本地存储文件的路径
+    
+    Args:
+        file_url: 文件URL
+    
+    Returns:
+        文件路径；OSS 文件返回 None
+    """
+    if file_url.startswith("/uploads/"):
+        return Path("uploads") / file_url.replace("/uploads/", "")
+    return None
+
+
+def engine_limits(engine: str) -> Tuple[int, float, int]:
+    """
+    引擎的并发和速率限制（每个进程）
+    
+    Args:
+        engine: OCR 引擎
+    
+    Returns:
+        (工作协程数, 每秒请求数, 令牌桶容量)
+    """
+    if engine == "fake":
+        return settings.OCR_FAKE_WORKERS, settings.OCR_FAKE_QPS, settings.OCR_FAKE_BURST
+    return settings.BAIDU_OCR_WORKERS, settings.BAIDU_OCR_QPS, settings.BAIDU_OCR_BURST
+
+
+def retry_delay(attempt: int) -> float:
+    """
+    第 attempt 次尝试失败后的重试延迟（指数退避，在 [0, 上限] 内随机取值，避免同时重试）
+    
+    Args:
+        attempt: 已尝试次数（从 1 开始）
+    
+    Returns:
+        延迟秒数
+    """
+    ceiling = min(settings.OCR_JOB_RETRY_MAX_DELAY, settings.OCR_JOB_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 capacity 个；rate 不大于 0 时不限速"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+    
+    async def acquire(self) -> float:
+        """
+        取一个令牌，不足时等待（等待者按先后顺序取得）
+        
+        Returns:
+            等待的秒数
+        """
+        if self.rate <= 0:
+            return 0.0
+        
+        async with self._lock:
+            started = time.monotonic()
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    waited = now - started
+                    self.waited_seconds += waited
+                    return waited
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class OCRJobQueue:
+    """
+    OCR 任务队列
+    
+    - 提交：在一个事务中写入任务并把文件状态改为 processing，立即返回；
+      结果缓存命中时任务和文件直接标记为完成，不进入队列
+    - 处理：每个可用引擎按 engine_limits 启动工作协程（即该引擎在本进程的并发上限），
+      领取任务后先从该引擎的令牌桶取令牌再调用 OCR 服务；任务结果和文件状态在一个事务中写入
+    - 失败：未超过最大尝试次数时推迟 available_at 后重新排队，否则标记为 failed；
+      文件不存在等无法重试的错误直接失败
+    - 进程中断：running 状态超过租约的任务会被重新领取
+    
+    数据库连接只在领取和写回结果时占用，等待 OCR 服务期间不占用连接。
+    并发和速率限制按进程计算，部署多个进程时需按进程数分摊服务商的 QPS 配额。
+    """
+    
+    def __init__(self):
+        """初始化任务队列"""
+        self._session_factory: Optional[async_sessionmaker] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        # 本进程内等待任务结束的协程（任务结束或重新排队时通知）
+        self._job_events: Dict[str, asyncio.Event] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._counters = {
+            "submitted": 0,
+            "cached": 0,
+            "claimed": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "errors": 0,
+        }
+    
+    @property
+    def running(self) -> bool:
+        """本进程是否已启动工作协程"""
+        return bool(self._tasks)
+    
+    @staticmethod
+    def available_engines() -> List[str]:
+        """已配置的 OCR 引擎"""
+        engines = []
+        if ocr_service.baidu_configured:
+            engines.append("baidu")
+        if settings.OCR_FAKE_ENABLED:
+            engines.append("fake")
+        return engines
+    
+    def _bucket(self, engine: str) -> TokenBucket:
+        """引擎的令牌桶（事件循环变化时重建，asyncio.Lock 不能跨事件循环使用）"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._buckets_loop:
+            self._buckets = {}
+            self._buckets_loop = loop
+        if engine not in self._buckets:
+            _, rate, capacity = engine_limits(engine)
+            self._buckets[engine] = TokenBucket(rate, capacity)
+        return self._buckets[engine]
+    
+    def _notify(self, job_id) -> None:
+        """通知本进程内等待该任务的协程"""
+        event = self._job_events.pop(str(job_id), None)
+        if event is not None:
+            event.set()
+    
+    def start(self, engine: AsyncEngine) -> None:
+        """
+        启动工作协程（应用启动时调用）
+        
+        Args:
+            engine: 数据库引擎
+        """
+        if self._tasks:
+            return
+        
+        self._session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        for name in self.available_engines():
+            workers, _, _ = engine_limits(name)
+            self._wakeups[name] = asyncio.Event()
+            for index in range(workers):
+                self._tasks.append(asyncio.create_task(self._worker(name), name=f"ocr-{name}-{index}"))
+    
+    async def stop(self) -> None:
+        """停止工作协程（应用关闭时调用；处理中的任务在租约过期后由其他进程重新领取）"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._wakeups.clear()
+        self._session_factory = None
+    
+    async def submit(
+        self,
+        db: AsyncSession,
+        file_upload: FileUpload,
+        mode: str = "text",
+        engine: str = "baidu",
+        bypass_cache: bool = False
+    ) -> OCRJob:
+        """
+        提交 OCR 任务
+        
+        Args:
+            db: 数据库会话
+            file_upload: 要识别的文件（调用前已验证所有权和文件类型）
+            mode: 识别模式 (text, math)
+            engine: 请求的 OCR 引擎 (baidu, tencent, auto, fake)
+            bypass_cache: 跳过结果缓存，强制重新识别（新结果覆盖缓存）
+        
+        Returns:
+            任务（缓存命中时已完成）
+        
+        Raises:
+            HTTPException: 没有可用的 OCR 服务
+        """
+        job = OCRJob(
+            user_id=file_upload.user_id,
+            file_id=file_upload.id,
+            mode=mode,
+            engine=ocr_service.resolve_engine(engine),
+            status="queued",
+            attempts=0,
+            max_attempts=settings.OCR_JOB_MAX_ATTEMPTS,
+        )
+        
+        cached = None
+        content_hash = await self._content_hash(file_upload) if settings.OCR_CACHE_ENABLED else None
+        if content_hash is not None:
+            cached = await ocr_result_cache.get(db, content_hash, job.engine, mode, bypass=bypass_cache)
+        
+        if cached is not None:
+            job.status = "completed"
+            job.result = {**cached, "cached": True}
+            job.started_at = job.finished_at = func.now()
+            file_upload.status = "completed"
+            file_upload.processing_result = {key: value for key, value in cached.items() if key != "raw_result"}
+            file_upload.processed_at = func.now()
+        else:
+            file_upload.status = "processing"
+        file_upload.error_message = None
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        
+        self._counters["cached" if cached is not None else "submitted"] += 1
+        if cached is not None:
+            return job
+        wakeup = self._wakeups.get(job.engine)
+        if wakeup is not None:
+            wakeup.set()
+        return job
+    
+    @staticmethod
+    async def _content_hash(file_upload: FileUpload) -> Optional[str]:
+        """
+        文件内容的 SHA-256（首次计算后记录在文件上，随提交的事务写入）
+        
+        Args:
+            file_upload: 文件记录
+        
+        Returns:
+            十六进制摘要；OSS 文件或文件不存在时返回 None
+        """
+        if file_upload.content_hash:
+            return file_upload.content_hash
+        
+        path = local_file_path(file_upload.file_url)
+        if path is None or not path.exists():
+            return None
+        file_upload.content_hash = await asyncio.to_thread(file_sha256, path)
+        return file_upload.content_hash
+    
+    async def get_job(self, db: AsyncSession, job_id, user_id=None) -> Optional[OCRJob]:
+        """
+        读取任务（总是读取数据库中的最新状态）
+        
+        Args:
+            db: 数据库会话
+            job_id: 任务ID
+            user_id: 用户ID（可选，限定任务所属用户）
+        
+        Returns:
+            任务，不存在时返回 None
+        """
+        query = select(OCRJob).where(OCRJob.id == job_id)
+        if user_id is not None:
+            query = query.where(OCRJob.user_id == user_id)
+        result = await db.execute(query.execution_options(populate_existing=True))
+        return result.scalar_one_or_none()
+    
+    async def _wait_for_change(self, job_id, timeout: float) -> None:
+        """等待本进程的通知，最多 timeout 秒（其他进程处理的任务靠调用方重新查询）"""
+        event = self._job_events.setdefault(str(job_id), asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def wait(self, engine: AsyncEngine, job_id, timeout: float) -> Optional[OCRJob]:
+        """
+        等待任务结束
+        
+        本进程处理的任务结束时立即返回，其他进程处理的任务按 OCR_JOB_POLL_INTERVAL 查询。
+        每次查询使用新的会话，等待期间不占用数据库连接（也不会让请求的会话停留在事务中）。
+        
+        Args:
+            engine: 数据库引擎
+            job_id: 任务ID
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            任务（超时时为未结束的状态）
+        """
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        deadline = time.monotonic() + timeout
+        while True:
+            async with session_factory() as db:
+                job = await self.get_job(db, job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in TERMINAL_STATUSES or remaining <= 0:
+                self._job_events.pop(str(job_id), None)
+                return job
+            await self._wait_for_change(job_id, min(settings.OCR_JOB_POLL_INTERVAL, remaining))
+    
+    async def run_until_done(self, engine: AsyncEngine, job_id, timeout: float) -> None:
+        """
+        在当前协程中处理指定任务直到结束或超时（本进程没有工作协程时使用）
+        
+        Args:
+            engine: 数据库引擎
+            job_id: 任务ID
+            timeout: 最长处理时间（秒）
+        """
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            async with session_factory() as db:
+                job = await self.get_job(db, job_id)
+            if job is None or job.status in TERMINAL_STATUSES:
+                return
+            
+            claimed = await self._claim(session_factory, job.engine, job_id)
+            if claimed is not None:
+                await self._execute(session_factory, claimed)
+                continue
+            # 等待重试时间或其他进程处理完成
+            await asyncio.sleep(min(settings.OCR_JOB_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+    
+    async def watch(self, engine: AsyncEngine, job_id) -> AsyncIterator[Optional[OCRJob]]:
+        """
+        跟踪任务状态（SSE）
+        
+        状态或尝试次数变化时产出任务，超过 SSE_KEEPALIVE_SECONDS 没有变化时产出 None（用于保持连接），
+        任务结束或不存在时停止。每次查询使用新的会话，不依赖请求的会话。
+        
+        Args:
+            engine: 数据库引擎
+            job_id: 任务ID
+        
+        Yields:
+            任务或 None
+        """
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        last_state = None
+        last_sent = time.monotonic()
+        while True:
+            async with session_factory() as db:
+                job = await self.get_job(db, job_id)
+            if job is None:
+                return
+            
+            state = (job.status, job.attempts)
+            if state != last_state:
+                last_state, last_sent = state, time.monotonic()
+                yield job
+            elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield None
+            
+            if job.status in TERMINAL_STATUSES:
+                self._job_events.pop(str(job_id), None)
+                return
+            await self._wait_for_change(job_id, settings.OCR_JOB_POLL_INTERVAL)
+    
+    async def _worker(self, engine: str) -> None:
+        """工作协程：领取并处理任务，队列为空时等待唤醒或下一次查询"""
+        wakeup = self._wakeups[engine]
+        while True:
+            wakeup.clear()
+            try:
+                job = await self._claim(self._session_factory, engine)
+                if job is not None:
+                    await self._execute(self._session_factory, job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 数据库暂时不可用等；已领取的任务在租约过期后重新领取
+                self._counters["errors"] += 1
+            try:
+                await asyncio.wait_for(wakeup.wait(), settings.OCR_JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _claim(self, session_factory: async_sessionmaker, engine: str, job_id=None) -> Optional[Dict]:
+        """
+        领取一个任务（到期的排队任务，或租约过期的处理中任务）
+        
+        Args:
+            session_factory: 会话工厂
+            engine: OCR 引擎
+            job_id: 只领取指定任务（可选）
+        
+        Returns:
+            任务信息（含文件URL、内容哈希、预处理结果和领取标识），没有可领取的任务时返回 None
+        """
+        now = func.now()
+        claimable = or_(
+            and_(OCRJob.status == "queued", OCRJob.available_at <= now),
+            and_(
+                OCRJob.status == "running",
+                OCRJob.locked_at < now - timedelta(seconds=settings.OCR_JOB_LEASE_SECONDS),
+            ),
+        )
+        candidate = select(OCRJob.id).where(OCRJob.engine == engine, claimable)
+        if job_id is not None:
+            candidate = candidate.where(OCRJob.id == job_id)
+        candidate = candidate.order_by(OCRJob.available_at).limit(1).with_for_update(skip_locked=True)
+        
+        # 每次领取使用新的标识，租约过期被重新领取后，原处理者的结果不会覆盖
+        lock = f"{os.getpid()}-{uuid.uuid4().hex[:16]}"
+        async with session_factory() as db:
+            result = await db.execute(
+                update(OCRJob)
+                .where(OCRJob.id == candidate.scalar_subquery())
+                .values(
+                    status="running",
+                    attempts=OCRJob.attempts + 1,
+                    locked_by=lock,
+                    locked_at=now,
+                    started_at=func.coalesce(OCRJob.started_at, now),
+                )
+                .returning(
+                    OCRJob.id, OCRJob.file_id, OCRJob.mode, OCRJob.engine, OCRJob.attempts, OCRJob.max_attempts
+                )
+                # 会话中没有已加载的任务；同步会话状态会在 RETURNING 中追加主键列
+                .execution_options(synchronize_session=False)
+            )
+            row = result.one_or_none()
+            if row is None:
+                await db.rollback()
+                return None
+            file_row = (
+                await db.execute(
+                    select(FileUpload.file_url, FileUpload.content_hash, FileUpload.variants)
+                    .where(FileUpload.id == row.file_id)
+                )
+            ).one()
+            await db.commit()
+        
+        self._counters["claimed"] += 1
+        return {**row._asdict(), **file_row._asdict(), "lock": lock}
+    
+    async def _execute(self, session_factory: async_sessionmaker, job: Dict) -> None:
+        """调用 OCR 服务并写回结果"""
+        if job["attempts"] > job["max_attempts"]:
+            # 多次在处理中中断（进程退出）
+            await self._record_failure(session_factory, job, RuntimeError("OCR 任务多次中断"), retry=False)
+            return
+        
+        try:
+            image_path = local_file_path(job["file_url"])
+            if image_path is None:
+                raise ValueError("暂不支持 OSS 文件的 OCR 识别")
+            if not image_path.exists():
+                raise FileNotFoundError("文件不存在于服务器")
+            
+            # 优先识别预处理生成的缩小灰度图（上传的数据量小得多）
+            if job["variants"]:
+                reduced_path = image_path.with_name(job["variants"]["ocr"]["filename"])
+                if reduced_path.exists():
+                    image_path = reduced_path
+            
+            await self._bucket(job["engine"]).acquire()
+            if job["mode"] == "math":
+                text, confidence, raw_result = await ocr_service.ocr_with_math(image_path, engine=job["engine"])
+            else:
+                text, confidence, raw_result = await ocr_service.ocr_image(image_path, engine=job["engine"])
+        except Exception as e:
+            # 文件问题重试也不会成功
+            await self._record_failure(
+                session_factory, job, e, retry=not isinstance(e, (ValueError, FileNotFoundError))
+            )
+            return
+        
+        processing_result = {
+            "ocr_text": text,
+            "confidence": confidence,
+            "engine": raw_result.get("engine", job["engine"]),
+            "processing_time": raw_result.get("processing_time"),
+        }
+        if job["mode"] == "math":
+            processing_result["has_math"] = True
+        await self._record_success(
+            session_factory, job, processing_result, {**processing_result, "raw_result": raw_result.get("raw_result")}
+        )
+    
+    async def _record_success(
+        self,
+        session_factory: async_sessionmaker,
+        job: Dict,
+        processing_result: Dict,
+        result: Dict
+    ) -> None:
+        """在一个事务中写入任务结果、文件的处理结果和结果缓存"""
+        async with session_factory() as db:
+            finished = await db.execute(
+                update(OCRJob)
+                .where(OCRJob.id == job["id"], OCRJob.locked_by == job["lock"])
+                .values(
+                    status="completed",
+                    result=result,
+                    error_message=None,
+                    finished_at=func.now(),
+                    locked_by=None,
+                    locked_at=None,
+                )
+            )
+            if finished.rowcount:
+                await db.execute(
+                    update(FileUpload)
+                    .where(FileUpload.id == job["file_id"])
+                    .values(
+                        status="completed",
+                        processing_result=processing_result,
+                        error_message=None,
+                        processed_at=func.now(),
+                    )
+                )
+                if settings.OCR_CACHE_ENABLED and job["content_hash"]:
+                    await ocr_result_cache.set(db, job["content_hash"], job["engine"], job["mode"], result)
+            await db.commit()
+        
+        self._counters["completed"] += 1
+        self._notify(job["id"])
+    
+    async def _record_failure(
+        self,
+        session_factory: async_sessionmaker,
+        job: Dict,
+        error: Exception,
+        retry: bool
+    ) -> None:
+        """失败的任务重新排队（推迟重试）或标记为失败"""
+        message = str(getattr(error, "detail", None) or error) or type(error).__name__
+        retry = retry and job["attempts"] < job["max_attempts"]
+        
+        async with session_factory() as db:
+            if retry:
+                await db.execute(
+                    update(OCRJob)
+                    .where(OCRJob.id == job["id"], OCRJob.locked_by == job["lock"])
+                    .values(
+                        status="queued",
+                        available_at=func.now() + timedelta(seconds=retry_delay(job["attempts"])),
+                        error_message=message,
+                        locked_by=None,
+                        locked_at=None,
+                    )
+                )
+            else:
+                finished = await db.execute(
+                    update(OCRJob)
+                    .where(OCRJob.id == job["id"], OCRJob.locked_by == job["lock"])
+                    .values(
+                        status="failed",
+                        error_message=message,
+                        finished_at=func.now(),
+                        locked_by=None,
+                        locked_at=None,
+                    )
+                )
+                if finished.rowcount:
+                    await db.execute(
+                        update(FileUpload)
+                        .where(FileUpload.id == job["file_id"])
+                        .values(status="failed", error_message=message, processed_at=func.now())
+                    )
+            await db.commit()
+        
+        self._counters["retried" if retry else "failed"] += 1
+        self._notify(job["id"])
+    
+    def stats(self) -> Dict:
+        """
+        获取队列统计（本进程）
+        
+        Returns:
+            计数、工作协程数和各引擎令牌桶的累计等待时间
+        """
+        return {
+            **self._counters,
+            "workers": len(self._tasks),
+            "rate_limit_wait_seconds": {
+                name: round(bucket.waited_seconds, 3) for name, bucket in self._buckets.items()
+            },
+        }
+
+
+# 创建全局 OCR 任务队列实例
+ocr_job_queue = OCRJobQueue()
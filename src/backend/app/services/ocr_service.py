@@ -1,17 +1,19 @@
 """
 OCR 识别服务
-支持百度 OCR 和腾讯 OCR
+支持百度 OCR 和腾讯 OCR，另有不调用外部服务的本地模拟 OCR（负载测试用）
 """
 
+import asyncio
+import random
 import time
 import base64
 from typing import Dict, Optional, Tuple
 from pathlib import Path
 
-import httpx
 from fastapi import HTTPException
 
 from app.core.config import settings
+from app.core.http_clients import http_clients
 
 
 class OCRService:
@@ -47,21 +49,21 @@ class OCRService:
             "client_secret": settings.BAIDU_OCR_SECRET_KEY,
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, params=params)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail="获取百度 OCR Access Token 失败"
-                )
-            
-            data = response.json()
-            self.baidu_access_token = data["access_token"]
-            # Token 有效期 30 天，提前 1 天刷新
-            self.baidu_token_expires_at = time.time() + (29 * 24 * 3600)
-            
-            return self.baidu_access_token
+        client = http_clients.get("baidu")
+        response = await client.post(url, params=params)
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail="获取百度 OCR Access Token 失败"
+            )
+        
+        data = response.json()
+        self.baidu_access_token = data["access_token"]
+        # Token 有效期 30 天，提前 1 天刷新
+        self.baidu_token_expires_at = time.time() + (29 * 24 * 3600)
+        
+        return self.baidu_access_token
     
     async def ocr_baidu(self, image_path: Path) -> Dict:
         """
@@ -82,9 +84,8 @@ class OCRService:
         # 获取 Access Token
         access_token = await self.get_baidu_access_token()
         
-        # 读取图片并转为 base64
-        with open(image_path, "rb") as f:
-            image_data = f.read()
+        # 读取图片并转为 base64（上传时已生成缩小的灰度图）
+        image_data = await asyncio.to_thread(image_path.read_bytes)
         image_base64 = base64.b64encode(image_data).decode("utf-8")
         
         # 调用百度 OCR API（通用文字识别-高精度版）
@@ -93,25 +94,93 @@ class OCRService:
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {"image": image_base64}
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, params=params, headers=headers, data=data)
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"百度 OCR 识别失败: {response.text}"
-                )
+        client = http_clients.get("baidu")
+        response = await client.post(url, params=params, headers=headers, data=data)
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=500,
+                detail=f"百度 OCR 识别失败: {response.text}"
+            )
+        
+        result = response.json()
+        
+        # 检查是否有错误
+        if "error_code" in result:
+            raise HTTPException(
+                status_code=500,
+                detail=f"百度 OCR 错误: {result.get('error_msg', 'Unknown error')}"
+            )
+        
+        return result
+    
+    async def ocr_fake(self, image_path: Path) -> Dict:
+        """
+        本地模拟 OCR（负载测试用）
+        
+        等待 OCR_FAKE_LATENCY 秒后返回与百度 OCR 格式相同的结果，不调用外部服务；
+        按 OCR_FAKE_FAILURE_RATE 的比例随机失败。
+        
+        Args:
+            image_path: 图片路径
             
-            result = response.json()
+        Returns:
+            识别结果
+        """
+        if not settings.OCR_FAKE_ENABLED:
+            raise HTTPException(
+                status_code=500,
+                detail="本地模拟 OCR 未启用"
+            )
+        
+        size = image_path.stat().st_size
+        await asyncio.sleep(settings.OCR_FAKE_LATENCY)
+        if random.random() < settings.OCR_FAKE_FAILURE_RATE:
+            raise HTTPException(
+                status_code=500,
+                detail="模拟 OCR 错误: Open api qps request limit reached"
+            )
+        return {
+            "words_result": [
+                {"words": f"fake ocr: {image_path.name}", "probability": {"average": 0.99}},
+                {"words": f"{size} bytes", "probability": {"average": 0.99}},
+            ],
+            "words_result_num": 2,
+        }
+    
+    def resolve_engine(self, engine: str = "baidu") -> str:
+        """
+        确定实际使用的 OCR 引擎
+        
+        Args:
+            engine: 请求的 OCR 引擎 (baidu, tencent, auto, fake)
             
-            # 检查是否有错误
-            if "error_code" in result:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"百度 OCR 错误: {result.get('error_msg', 'Unknown error')}"
-                )
+        Returns:
+            实际使用的引擎 (baidu, fake)
             
-            return result
+        Raises:
+            HTTPException: 没有可用的 OCR 服务
+        """
+        if engine == "fake":
+            if settings.OCR_FAKE_ENABLED:
+                return "fake"
+            raise HTTPException(
+                status_code=500,
+                detail="本地模拟 OCR 未启用"
+            )
+        
+        if engine == "baidu" or engine == "auto":
+            if self.baidu_configured:
+                return "baidu"
+            # 未配置外部服务时 auto 回退到本地模拟 OCR（仅在启用时）
+            if engine == "auto" and settings.OCR_FAKE_ENABLED:
+                return "fake"
+        
+        # 如果没有配置任何 OCR 服务
+        raise HTTPException(
+            status_code=500,
+            detail="没有可用的 OCR 服务，请配置百度或腾讯 OCR"
+        )
     
     def parse_baidu_result(self, result: Dict) -> Tuple[str, float]:
         """
@@ -158,7 +227,7 @@ class OCRService:
         
         Args:
             image_path: 图片路径
-            engine: OCR 引擎 (baidu, tencent, auto)
+            engine: OCR 引擎 (baidu, tencent, auto, fake)
             
         Returns:
             (识别文本, 置信度, 原始结果)
@@ -166,23 +235,19 @@ class OCRService:
         start_time = time.time()
         
         # 根据引擎选择
-        if engine == "baidu" or engine == "auto":
-            if self.baidu_configured:
-                raw_result = await self.ocr_baidu(image_path)
-                text, confidence = self.parse_baidu_result(raw_result)
-                processing_time = time.time() - start_time
-                
-                return text, confidence, {
-                    "engine": "baidu",
-                    "raw_result": raw_result,
-                    "processing_time": processing_time
-                }
+        engine = self.resolve_engine(engine)
+        if engine == "fake":
+            raw_result = await self.ocr_fake(image_path)
+        else:
+            raw_result = await self.ocr_baidu(image_path)
+        text, confidence = self.parse_baidu_result(raw_result)
+        processing_time = time.time() - start_time
         
-        # 如果没有配置任何 OCR 服务
-        raise HTTPException(
-            status_code=500,
-            detail="没有可用的 OCR 服务，请配置百度或腾讯 OCR"
-        )
+        return text, confidence, {
+            "engine": engine,
+            "raw_result": raw_result,
+            "processing_time": processing_time
+        }
     
     async def ocr_with_math(
         self,
@@ -0,0 +1,323 @@
+"""
+复习到期索引（可选，Redis 有序集合）
+按用户和图谱维护以 next_review_at 为分数的有序集合，间隔重复队列直接按分数取候选节点，
+不再在 memory_nodes 上做带过滤条件的排序；候选节点用一条 IN 查询加载
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.memory_node import MasteryLevel, MemoryNode
+
+
+# 没有复习时间（从未复习或未排期）的节点单独一组
+UNSCHEDULED_GROUP = "unscheduled"
+# 各掌握程度一组；无法识别的掌握程度遗忘速度按未开始计算，归入未开始
+MASTERY_GROUPS = tuple(level.value for level in MasteryLevel)
+DUE_INDEX_GROUPS = MASTERY_GROUPS + (UNSCHEDULED_GROUP,)
+
+# 每条 ZADD 写入的成员数
+_ZADD_CHUNK_SIZE = 1000
+
+
+class ReviewDueIndex:
+    """
+    复习到期索引
+    
+    每个范围（用户、用户下的图谱）按分组各有一个有序集合：成员为节点 ID，分数为
+    next_review_at 的 Unix 秒（没有复习时间为 +inf）。同一掌握程度的到期节点遗忘指数随
+    超期时间单调不减，各组按分数取前 k 个的并集一定包含遗忘指数 top-k，与数据库候选查询一致。
+    
+    索引在提交事务后更新，由 rebuild 从数据库全量重建；用户的索引重建前不使用。
+    Redis 不可用时只记录错误，复习队列回退到数据库查询；Redis 故障恢复后需要重建索引。
+    """
+    
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        初始化到期索引
+        
+        Args:
+            enabled: 是否启用（默认取配置）
+        """
+        self.enabled = settings.REVIEW_DUE_INDEX_ENABLED if enabled is None else enabled
+        self._redis = None
+        self._counters = {
+            "queries": 0,
+            "fallbacks": 0,
+            "errors": 0,
+        }
+    
+    def _get_redis_client(self):
+        """延迟创建 Redis 客户端"""
+        if self._redis is None:
+            import redis.asyncio as redis
+            
+            self._redis = redis.from_url(settings.redis_url)
+        return self._redis
+    
+    @staticmethod
+    def _key(user_id, graph_id=None, group: Optional[str] = None) -> str:
+        """有序集合的键；group 为 None 时返回就绪标记的键"""
+        scope = f"review_due:{user_id}" if graph_id is None else f"review_due:{user_id}:{graph_id}"
+        return f"{scope}:{group}" if group else f"review_due:{user_id}:ready"
+    
+    @staticmethod
+    def group_of(
+        mastery_level: Optional[str],
+        last_review_at: Optional[datetime],
+        next_review_at: Optional[datetime]
+    ) -> str:
+        """
+        节点所在的分组（与 ReviewService._spaced_queue_candidates 的分支对应）
+        
+        Args:
+            mastery_level: 掌握程度
+            last_review_at: 上次复习时间
+            next_review_at: 下次复习时间
+        
+        Returns:
+            分组名
+        """
+        if last_review_at is None or next_review_at is None:
+            return UNSCHEDULED_GROUP
+        if mastery_level in MASTERY_GROUPS:
+            return mastery_level
+        return MasteryLevel.NOT_STARTED.value
+    
+    @staticmethod
+    def score_of(next_review_at: Optional[datetime]) -> float:
+        """
+        节点的分数（next_review_at 的 Unix 秒，不带时区的时间按 UTC 处理）
+        
+        Args:
+            next_review_at: 下次复习时间
+        
+        Returns:
+            分数；没有复习时间时为 +inf（排在最后）
+        """
+        if next_review_at is None:
+            return float("inf")
+        if next_review_at.tzinfo is None:
+            next_review_at = next_review_at.replace(tzinfo=timezone.utc)
+        return next_review_at.timestamp()
+    
+    @staticmethod
+    def _remove_entries(pipe, node_id: str, user_id, graph_id) -> None:
+        """在管道中把节点从两个范围的所有分组中移除"""
+        for group in DUE_INDEX_GROUPS:
+            pipe.zrem(ReviewDueIndex._key(user_id, None, group), node_id)
+            pipe.zrem(ReviewDueIndex._key(user_id, graph_id, group), node_id)
+    
+    async def add_nodes(self, nodes: Iterable[MemoryNode]) -> None:
+        """
+        写入或更新节点（创建节点、提交复习后调用）
+        
+        节点需要已加载 id, user_id, graph_id 和复习相关的列；先从所有分组中移除，
+        掌握程度变化时不需要知道原来的分组。
+        
+        Args:
+            nodes: 节点列表
+        """
+        nodes = list(nodes)
+        if not nodes or not self.enabled:
+            return
+        
+        try:
+            async with self._get_redis_client().pipeline(transaction=False) as pipe:
+                for node in nodes:
+                    node_id = str(node.id)
+                    group = self.group_of(node.mastery_level, node.last_review_at, node.next_review_at)
+                    score = self.score_of(node.next_review_at)
+                    self._remove_entries(pipe, node_id, node.user_id, node.graph_id)
+                    pipe.zadd(self._key(node.user_id, None, group), {node_id: score})
+                    pipe.zadd(self._key(node.user_id, node.graph_id, group), {node_id: score})
+                await pipe.execute()
+        except Exception:
+            self._counters["errors"] += 1
+    
+    async def add_unscheduled(self, user_id, graph_id, node_ids: Iterable) -> None:
+        """
+        写入一批新建、尚未排期的节点（批量导入后调用）
+        
+        新节点不在任何分组中，不需要先移除，直接分块 ZADD 到未排期分组。
+        
+        Args:
+            user_id: 用户 ID
+            graph_id: 图谱 ID
+            node_ids: 节点 ID 列表
+        """
+        members = [str(node_id) for node_id in node_ids]
+        if not members or not self.enabled:
+            return
+        
+        score = self.score_of(None)
+        try:
+            async with self._get_redis_client().pipeline(transaction=False) as pipe:
+                for start in range(0, len(members), _ZADD_CHUNK_SIZE):
+                    mapping = dict.fromkeys(members[start:start + _ZADD_CHUNK_SIZE], score)
+                    pipe.zadd(self._key(user_id, None, UNSCHEDULED_GROUP), mapping)
+                    pipe.zadd(self._key(user_id, graph_id, UNSCHEDULED_GROUP), mapping)
+                await pipe.execute()
+        except Exception:
+            self._counters["errors"] += 1
+    
+    async def remove_node(self, node_id, user_id, graph_id) -> None:
+        """
+        移除节点（删除节点后调用）
+        
+        Args:
+            node_id: 节点 ID
+            user_id: 用户 ID
+            graph_id: 图谱 ID
+        """
+        if not self.enabled:
+            return
+        
+        try:
+            async with self._get_redis_client().pipeline(transaction=False) as pipe:
+                self._remove_entries(pipe, str(node_id), user_id, graph_id)
+                await pipe.execute()
+        except Exception:
+            self._counters["errors"] += 1
+    
+    async def remove_graph(self, user_id, graph_id) -> None:
+        """
+        移除图谱内的所有节点（删除图谱后调用）
+        
+        图谱范围的有序集合正好是图谱内的节点，按它从用户范围中移除后删除图谱的键。
+        
+        Args:
+            user_id: 用户 ID
+            graph_id: 图谱 ID
+        """
+        if not self.enabled:
+            return
+        
+        graph_keys = [self._key(user_id, graph_id, group) for group in DUE_INDEX_GROUPS]
+        try:
+            redis = self._get_redis_client()
+            async with redis.pipeline(transaction=False) as pipe:
+                for key in graph_keys:
+                    pipe.zrange(key, 0, -1)
+                members = await pipe.execute()
+            
+            async with redis.pipeline(transaction=True) as pipe:
+                for group, group_members in zip(DUE_INDEX_GROUPS, members):
+                    for start in range(0, len(group_members), _ZADD_CHUNK_SIZE):
+                        pipe.zrem(self._key(user_id, None, group), *group_members[start:start + _ZADD_CHUNK_SIZE])
+                pipe.delete(*graph_keys)
+                await pipe.execute()
+        except Exception:
+            self._counters["errors"] += 1
+    
+    async def candidates(self, user_id, graph_id, now: datetime, limit: int) -> Optional[List[str]]:
+        """
+        间隔重复队列的候选节点 ID（各分组按分数取已到期的前 limit 个）
+        
+        Args:
+            user_id: 用户 ID
+            graph_id: 知识图谱 ID（可选）
+            now: 当前时间
+            limit: 队列长度 k
+        
+        Returns:
+            候选节点 ID 列表；未启用、用户的索引未重建或 Redis 出错时返回 None（回退到数据库查询）
+        """
+        if not self.enabled:
+            return None
+        try:
+            graph_id = UUID(str(graph_id)) if graph_id else None
+        except ValueError:
+            return None
+        
+        self._counters["queries"] += 1
+        now_score = self.score_of(now)
+        try:
+            async with self._get_redis_client().pipeline(transaction=False) as pipe:
+                pipe.exists(self._key(user_id))
+                for group in DUE_INDEX_GROUPS:
+                    pipe.zrangebyscore(self._key(user_id, graph_id, group), "-inf", now_score, start=0, num=limit)
+                # 没有复习时间的节点排在有复习时间的到期节点之后
+                pipe.zrangebyscore(
+                    self._key(user_id, graph_id, UNSCHEDULED_GROUP), "+inf", "+inf", start=0, num=limit
+                )
+                ready, *groups = await pipe.execute()
+        except Exception:
+            self._counters["errors"] += 1
+            self._counters["fallbacks"] += 1
+            return None
+        
+        if not ready:
+            self._counters["fallbacks"] += 1
+            return None
+        
+        *scheduled, unscheduled_due, unscheduled_none = groups
+        members = [member for group in scheduled for member in group]
+        members.extend((unscheduled_due + unscheduled_none)[:limit])
+        return [member.decode() if isinstance(member, bytes) else member for member in members]
+    
+    async def rebuild(self, db: AsyncSession, user_id) -> int:
+        """
+        从数据库重建用户的到期索引
+        
+        在一个 Redis 事务中删除用户原有的键、写入全部节点并设置就绪标记，
+        读取方只会看到重建前或重建后的索引；重建期间提交的复习可能被覆盖，宜在低峰期执行。
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+        
+        Returns:
+            写入的节点数
+        """
+        result = await db.execute(
+            select(
+                MemoryNode.id,
+                MemoryNode.graph_id,
+                MemoryNode.mastery_level,
+                MemoryNode.last_review_at,
+                MemoryNode.next_review_at,
+            ).where(and_(MemoryNode.user_id == user_id, MemoryNode.deleted_at.is_(None)))
+        )
+        
+        entries: Dict[str, Dict[str, float]] = {}
+        count = 0
+        for node_id, graph_id, mastery_level, last_review_at, next_review_at in result.all():
+            group = self.group_of(mastery_level, last_review_at, next_review_at)
+            score = self.score_of(next_review_at)
+            entries.setdefault(self._key(user_id, None, group), {})[str(node_id)] = score
+            entries.setdefault(self._key(user_id, graph_id, group), {})[str(node_id)] = score
+            count += 1
+        
+        redis = self._get_redis_client()
+        old_keys = [key async for key in redis.scan_iter(match=f"review_due:{user_id}:*")]
+        async with redis.pipeline(transaction=True) as pipe:
+            if old_keys:
+                pipe.delete(*old_keys)
+            for key, mapping in entries.items():
+                items = list(mapping.items())
+                for start in range(0, len(items), _ZADD_CHUNK_SIZE):
+                    pipe.zadd(key, dict(items[start:start + _ZADD_CHUNK_SIZE]))
+            pipe.set(self._key(user_id), int(time.time()))
+            await pipe.execute()
+        
+        return count
+    
+    def stats(self) -> Dict:
+        """
+        获取索引统计
+        
+        Returns:
+            查询、回退和错误计数
+        """
+        return {**self._counters, "enabled": self.enabled}
+
+
+# 创建全局复习到期索引实例
+review_due_index = ReviewDueIndex()
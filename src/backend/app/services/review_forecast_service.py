@@ -0,0 +1,267 @@
+"""
+复习负载预测服务
+以每张卡片当前的 SM-2 状态为起点，按用户历史复习质量分布做蒙特卡洛模拟，
+预测未来每天到期的复习数（用于容量规划和新卡片限流）
+"""
+
+from datetime import date, datetime, time, timezone
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Float, Integer, and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.models.memory_node import MemoryNode
+from app.models.review_log import ReviewLog
+from app.services.review_service import ReviewService
+
+
+# 没有复习记录时使用的复习质量分布（0-5 分）
+DEFAULT_QUALITY_DISTRIBUTION = (0.05, 0.05, 0.10, 0.20, 0.35, 0.25)
+# 历史分布的平滑权重（相当于按默认分布补充的虚拟复习次数），复习记录少时不至于过拟合
+QUALITY_PRIOR_WEIGHT = 20
+
+DEFAULT_RUNS = 32
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+# 质量抽样表大小（按 16 位随机数查表）
+QUALITY_TABLE_SIZE = 1 << 16
+# 每次模拟的卡片数
+SIMULATION_CHUNK_SIZE = 1 << 16
+
+
+class ReviewForecastService:
+    """
+    复习负载预测服务
+    
+    卡片状态保存为整列数组，按“复习轮”推进：每一轮把仍在预测区间内到期的卡片
+    一起复习一次（按质量分布抽样、向量化执行 SM-2），记入到期当天的计数后移到下次到期日，
+    直到没有卡片在区间内到期。每个模拟轮次独立抽样，分位数取自各轮次的每日计数。
+    """
+    
+    @staticmethod
+    async def load_cards(
+        db: AsyncSession,
+        user_id,
+        graph_id=None,
+        today: Optional[date] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        加载用户所有卡片的 SM-2 状态（在数据库中聚合成整列）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            graph_id: 知识图谱 ID（可选）
+            today: 预测第 0 天（UTC 日期，默认今天）
+        
+        Returns:
+            repetitions, easiness, interval, due_day 四个等长数组；
+            已逾期或从未复习的卡片 due_day 为 0（今天到期）
+        """
+        today = today or ReviewService._get_utc_now().date()
+        stats = MemoryNode.review_stats
+        
+        conditions = [MemoryNode.user_id == user_id, MemoryNode.deleted_at.is_(None)]
+        if graph_id:
+            conditions.append(MemoryNode.graph_id == graph_id)
+        
+        result = await db.execute(
+            select(
+                func.array_agg(func.coalesce(stats["repetitions"].astext.cast(Integer), 0)),
+                func.array_agg(
+                    func.coalesce(stats["easiness"].astext.cast(Float), ReviewService.DEFAULT_EASINESS)
+                ),
+                func.array_agg(func.coalesce(stats["interval"].astext.cast(Integer), 1)),
+                func.array_agg(func.date_part("epoch", MemoryNode.next_review_at)),
+            ).where(and_(*conditions))
+        )
+        repetitions, easiness, interval, next_review_at = result.one()
+        
+        start = datetime.combine(today, time.min, tzinfo=timezone.utc).timestamp()
+        next_review_at = np.array(next_review_at or [], dtype=np.float64)
+        due_day = np.floor((next_review_at - start) / 86400)
+        due_day = np.where(np.isnan(due_day), 0, np.maximum(due_day, 0))
+        
+        return {
+            "repetitions": np.array(repetitions or [], dtype=np.int32),
+            "easiness": np.array(easiness or [], dtype=np.float64),
+            "interval": np.array(interval or [], dtype=np.int32),
+            "due_day": np.minimum(due_day, np.iinfo(np.int32).max).astype(np.int32),
+        }
+    
+    @staticmethod
+    async def load_quality_distribution(db: AsyncSession, user_id) -> np.ndarray:
+        """
+        根据复习记录统计用户的复习质量分布（按默认分布平滑）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+        
+        Returns:
+            长度为 6 的概率数组（0-5 分）
+        """
+        quality = ReviewLog.node_state_snapshot["quality"].astext
+        result = await db.execute(
+            select(quality, func.count(ReviewLog.id))
+            .where(and_(ReviewLog.user_id == user_id, quality.isnot(None)))
+            .group_by(quality)
+        )
+        
+        counts = np.zeros(6, dtype=np.float64)
+        for value, count in result.all():
+            if value in ("0", "1", "2", "3", "4", "5"):
+                counts[int(value)] += count
+        
+        counts += QUALITY_PRIOR_WEIGHT * np.asarray(DEFAULT_QUALITY_DISTRIBUTION)
+        return counts / counts.sum()
+    
+    @staticmethod
+    def _quality_table(quality_distribution: np.ndarray) -> np.ndarray:
+        """
+        构造复习质量抽样表：用 16 位随机数查表代替逐个二分查找累积分布
+        
+        Args:
+            quality_distribution: 复习质量分布（0-5 分的概率）
+        
+        Returns:
+            长度为 65536 的质量评分表
+        """
+        cdf = np.cumsum(quality_distribution)
+        cdf /= cdf[-1]
+        points = (np.arange(QUALITY_TABLE_SIZE) + 0.5) / QUALITY_TABLE_SIZE
+        return np.minimum(np.searchsorted(cdf, points, side="right"), 5).astype(np.intp)
+    
+    @staticmethod
+    def _simulate_chunk(
+        due_day: np.ndarray,
+        repetitions: np.ndarray,
+        easiness: np.ndarray,
+        interval: np.ndarray,
+        days: int,
+        quality_table: np.ndarray,
+        rng: np.random.Generator,
+        counts: np.ndarray
+    ) -> None:
+        """
+        模拟一组卡片直到全部移出预测区间，把每天的复习数累加到 counts
+        
+        区间外的到期日统一记为 days（counts 多出的最后一格）；
+        仍在区间内的卡片不足一半时才压缩数组，减少每轮的拷贝。
+        """
+        while due_day.size:
+            counts += np.bincount(due_day, minlength=days + 1)
+            
+            quality = quality_table.take(rng.integers(0, QUALITY_TABLE_SIZE, due_day.size, dtype=np.uint16))
+            interval, easiness, repetitions = ReviewService.calculate_next_review_batch(
+                quality, repetitions, easiness, interval
+            )
+            # 间隔达到 days 的卡片已移出区间，截断后不会在后续轮次中溢出
+            np.clip(interval, 1, days, out=interval)
+            due_day = np.minimum(due_day + interval, days)
+            
+            active = due_day < days
+            if np.count_nonzero(active) * 2 <= due_day.size:
+                index = np.flatnonzero(active)
+                due_day, repetitions, easiness, interval = (
+                    values.take(index) for values in (due_day, repetitions, easiness, interval)
+                )
+    
+    @staticmethod
+    def simulate(
+        cards: Dict[str, np.ndarray],
+        quality_distribution: np.ndarray,
+        days: int,
+        runs: int = DEFAULT_RUNS,
+        seed: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        蒙特卡洛模拟每天到期的复习数
+        
+        假设每张卡片都在到期当天复习；间隔至少按 1 天推进。
+        
+        Args:
+            cards: load_cards 返回的卡片状态
+            quality_distribution: 复习质量分布（0-5 分的概率）
+            days: 预测天数
+            runs: 模拟轮次
+            seed: 随机种子
+        
+        Returns:
+            形状为 (runs, days) 的每日到期复习数
+        """
+        rng = np.random.default_rng(seed)
+        quality_table = ReviewForecastService._quality_table(quality_distribution)
+        
+        # 区间外到期的卡片不参与模拟；整数状态统一用 intp，查表时不需要转换下标类型
+        active = cards["due_day"] < days
+        due_day = cards["due_day"][active].astype(np.intp)
+        repetitions = cards["repetitions"][active].astype(np.intp)
+        easiness = cards["easiness"][active]
+        interval = np.minimum(cards["interval"][active], days).astype(np.intp)
+        
+        counts = np.zeros((runs, days + 1), dtype=np.int64)
+        for run in range(runs):
+            # 分块模拟，让每轮处理的数组留在 CPU 缓存中
+            for start in range(0, due_day.size, SIMULATION_CHUNK_SIZE):
+                chunk = slice(start, start + SIMULATION_CHUNK_SIZE)
+                ReviewForecastService._simulate_chunk(
+                    due_day[chunk], repetitions[chunk], easiness[chunk], interval[chunk],
+                    days, quality_table, rng, counts[run]
+                )
+        
+        return counts[:, :days]
+    
+    @staticmethod
+    async def forecast(
+        db: AsyncSession,
+        user_id,
+        graph_id=None,
+        days: int = 30,
+        runs: int = DEFAULT_RUNS,
+        percentiles: Sequence[int] = DEFAULT_PERCENTILES,
+        seed: Optional[int] = None
+    ) -> Dict:
+        """
+        预测用户未来每天的复习负载
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            graph_id: 知识图谱 ID（可选）
+            days: 预测天数（第 0 天为今天）
+            runs: 模拟轮次
+            percentiles: 返回的分位数
+            seed: 随机种子
+        
+        Returns:
+            预测结果字典
+        """
+        today = ReviewService._get_utc_now().date()
+        cards = await ReviewForecastService.load_cards(db, user_id, graph_id, today)
+        quality_distribution = await ReviewForecastService.load_quality_distribution(db, user_id)
+        
+        # 模拟是纯 CPU 计算，放到线程池中执行，不阻塞事件循环
+        counts = await run_in_threadpool(
+            ReviewForecastService.simulate, cards, quality_distribution, days, runs, seed
+        )
+        values = np.percentile(counts, percentiles, axis=0)
+        
+        return {
+            "start_date": today,
+            "days": days,
+            "runs": runs,
+            "total_cards": int(len(cards["due_day"])),
+            "quality_distribution": [round(float(p), 4) for p in quality_distribution],
+            "mean": np.round(counts.mean(axis=0), 2).tolist(),
+            "percentiles": {
+                f"p{percentile}": np.round(row, 2).tolist()
+                for percentile, row in zip(percentiles, values)
+            },
+        }
+
+
+# 创建全局复习负载预测服务实例
+review_forecast_service = ReviewForecastService()
@@ -3,15 +3,28 @@
 实现基于 SM-2 算法的遗忘曲线计算
 """
 
+import base64
+import bisect
+import copy
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import select, and_, or_
+import numpy as np
+from sqlalchemy import (
+    DateTime, Float, Integer, LargeBinary, Text, and_, bindparam, case, cast, func, insert, literal,
+    literal_column, or_, select, union_all
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.memory_node import MemoryNode, MasteryLevel
+from app.core.config import settings
+from app.models.memory_node import KNOWN_MASTERY_LEVELS_SQL, MemoryNode, MasteryLevel, node_load_options
 from app.models.review_log import ReviewLog
+from app.services.graph_adjacency_service import graph_adjacency_cache
+from app.services.review_due_index import review_due_index
+from app.services.user_stats_service import user_stats_service
 
 
 class ReviewQuality(Enum):
@@ -32,6 +45,69 @@ class ReviewMode(Enum):
     SPACED = "spaced"  # 间隔重复模式（基于遗忘曲线）
 
 
+class ReviewStatisticsCache:
+    """
+    复习统计结果缓存（进程内，按用户 LRU）
+    
+    统计页会被频繁刷新，短时间内直接返回上次结果（默认不启用）；
+    用户提交复习、创建/删除节点或图谱、导入节点后清除该用户的全部缓存。
+    过期的结果在读取或写入时删除，用户数超过上限时淘汰最久未使用的用户。
+    """
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, max_users: Optional[int] = None):
+        """
+        初始化缓存
+        
+        Args:
+            ttl_seconds: 缓存有效期（秒，默认取配置，0 表示不缓存）
+            max_users: 缓存的用户数上限（默认取配置）
+        """
+        self.ttl_seconds = settings.REVIEW_STATS_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_users = settings.REVIEW_STATS_CACHE_MAX_USERS if max_users is None else max_users
+        self._entries: "OrderedDict[str, Dict[Optional[str], Tuple[float, Dict]]]" = OrderedDict()
+    
+    def get(self, user_id: str, graph_id: Optional[str] = None) -> Optional[Dict]:
+        """读取缓存，未命中或已过期时返回 None（过期的结果同时删除）"""
+        user_key, graph_key = str(user_id), str(graph_id) if graph_id else None
+        entries = self._entries.get(user_key)
+        entry = entries.get(graph_key) if entries else None
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del entries[graph_key]
+            if not entries:
+                del self._entries[user_key]
+            return None
+        self._entries.move_to_end(user_key)
+        return copy.deepcopy(entry[1])
+    
+    def set(self, user_id: str, graph_id: Optional[str], statistics: Dict) -> None:
+        """写入缓存（同时删除该用户已过期的结果）"""
+        if self.ttl_seconds <= 0:
+            return
+        user_key = str(user_id)
+        now = time.monotonic()
+        entries = {
+            key: entry for key, entry in self._entries.pop(user_key, {}).items() if entry[0] >= now
+        }
+        entries[str(graph_id) if graph_id else None] = (now + self.ttl_seconds, copy.deepcopy(statistics))
+        self._entries[user_key] = entries
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: str) -> None:
+        """清除用户的全部缓存（包括各图谱的统计）"""
+        self._entries.pop(str(user_id), None)
+    
+    def clear(self) -> None:
+        """清空缓存"""
+        self._entries.clear()
+
+
+# 创建全局复习统计缓存
+review_statistics_cache = ReviewStatisticsCache()
+
+
 class ReviewService:
     """复习算法服务"""
     
@@ -79,6 +155,43 @@ class ReviewService:
         
         return new_interval, new_easiness, new_repetitions
     
+    # 批量计算使用的查找表：各质量评分的难度因子增量；复习次数 0/1/2 对应的固定间隔
+    EASINESS_DELTA = np.array([0.1 - (5 - q) * (0.08 + (5 - q) * 0.02) for q in range(6)])
+    FIXED_INTERVALS = np.array([1, 1, 6, 0], dtype=np.intp)
+    
+    @staticmethod
+    def calculate_next_review_batch(
+        quality: np.ndarray,
+        repetitions: np.ndarray,
+        easiness: np.ndarray,
+        interval: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量计算下次复习时间（calculate_next_review 的向量化版本）
+        
+        分支改写成查表和按掩码相乘，避免随机掩码上 np.where 的开销。
+        
+        Args:
+            quality: 复习质量评分数组 (0-5)
+            repetitions: 已复习次数数组
+            easiness: 难度因子数组
+            interval: 当前间隔天数数组
+        
+        Returns:
+            (新间隔天数, 新难度因子, 新复习次数)，间隔和复习次数保持输入的整数类型
+        """
+        new_easiness = np.maximum(easiness + ReviewService.EASINESS_DELTA.take(quality), ReviewService.MIN_EASINESS)
+        
+        # 质量评分 < 3 时重置复习次数
+        new_repetitions = (repetitions + 1) * (quality >= 3)
+        
+        # 复习次数为 0/1 时间隔 1 天，为 2 时 6 天，之后按难度因子放大
+        stage = np.minimum(new_repetitions, 3)
+        scaled = (interval * new_easiness).astype(interval.dtype)
+        new_interval = (ReviewService.FIXED_INTERVALS.take(stage) + scaled * (stage == 3)).astype(interval.dtype, copy=False)
+        
+        return new_interval, new_easiness, new_repetitions.astype(repetitions.dtype, copy=False)
+    
     @staticmethod
     def _get_utc_now() -> datetime:
         """
@@ -145,19 +258,23 @@ class ReviewService:
             overdue_days = overdue_seconds / 86400
             
             # 根据掌握程度调整遗忘速度
-            mastery_factor = {
-                MasteryLevel.NOT_STARTED: 1.5,
-                MasteryLevel.LEARNING: 1.2,
-                MasteryLevel.FAMILIAR: 1.0,
-                MasteryLevel.PROFICIENT: 0.8,
-                MasteryLevel.MASTERED: 0.5
-            }.get(mastery_level, 1.0)
+            mastery_factor = ReviewService.MASTERY_FORGETTING_FACTOR.get(mastery_level, 1.0)
             
             # 遗忘指数 = 0.5 + 超期天数 * 遗忘速度因子
             forgetting_index = min(1.0, 0.5 + overdue_days * 0.1 * mastery_factor)
         
         return forgetting_index
     
+    # 遗忘指数颜色分档：指数小于第 i 个阈值时使用第 i 个颜色，都不小于时使用最后一个
+    FORGETTING_COLOR_THRESHOLDS = (0.2, 0.4, 0.6, 0.8)
+    FORGETTING_PALETTE = (
+        "#4CAF50",  # 绿色 - 记忆牢固
+        "#8BC34A",  # 浅绿色 - 记忆良好
+        "#FFC107",  # 黄色 - 需要复习
+        "#FF9800",  # 橙色 - 急需复习
+        "#F44336",  # 红色 - 即将遗忘
+    )
+    
     @staticmethod
     def get_forgetting_color(forgetting_index: float) -> str:
         """
@@ -169,45 +286,260 @@ class ReviewService:
         Returns:
             颜色代码（十六进制）
         """
-        if forgetting_index < 0.2:
-            return "#4CAF50"  # 绿色 - 记忆牢固
-        elif forgetting_index < 0.4:
-            return "#8BC34A"  # 浅绿色 - 记忆良好
-        elif forgetting_index < 0.6:
-            return "#FFC107"  # 黄色 - 需要复习
-        elif forgetting_index < 0.8:
-            return "#FF9800"  # 橙色 - 急需复习
-        else:
-            return "#F44336"  # 红色 - 即将遗忘
+        return ReviewService.FORGETTING_PALETTE[
+            bisect.bisect_right(ReviewService.FORGETTING_COLOR_THRESHOLDS, forgetting_index)
+        ]
     
     @staticmethod
-    async def update_review_stats(
+    def calculate_forgetting_indices(
+        last_review_at: np.ndarray,
+        next_review_at: np.ndarray,
+        mastery_factor: np.ndarray,
+        now: float
+    ) -> np.ndarray:
+        """
+        批量计算遗忘指数（calculate_forgetting_index 的向量化版本）
+        
+        Args:
+            last_review_at: 上次复习时间（Unix 秒，缺失为 NaN）
+            next_review_at: 下次复习时间（Unix 秒，缺失为 NaN）
+            mastery_factor: 各节点的遗忘速度因子
+            now: 当前时间（Unix 秒）
+            
+        Returns:
+            遗忘指数数组；没有复习时间的节点为 0.8
+        """
+        total_interval = next_review_at - last_review_at
+        with np.errstate(divide="ignore", invalid="ignore"):
+            before_due = np.minimum(0.5, (now - last_review_at) / total_interval * 0.5)
+        before_due = np.where(total_interval == 0, 0.0, before_due)
+        overdue = np.minimum(1.0, 0.5 + (now - next_review_at) / 86400 * 0.1 * mastery_factor)
+        
+        forgetting_index = np.where(now < next_review_at, before_due, overdue)
+        scheduled = ~(np.isnan(last_review_at) | np.isnan(next_review_at))
+        return np.where(scheduled, forgetting_index, 0.8)
+    
+    @staticmethod
+    def get_forgetting_color_indices(forgetting_index: np.ndarray) -> np.ndarray:
+        """
+        批量获取颜色在 FORGETTING_PALETTE 中的下标（与 get_forgetting_color 分档一致）
+        
+        Args:
+            forgetting_index: 遗忘指数数组
+            
+        Returns:
+            uint8 下标数组
+        """
+        thresholds = np.asarray(ReviewService.FORGETTING_COLOR_THRESHOLDS)
+        return np.searchsorted(thresholds, forgetting_index, side="right").astype(np.uint8)
+    
+    # 遗忘速度因子（与 calculate_forgetting_index 一致；无法识别的掌握程度按未开始处理）
+    MASTERY_FORGETTING_FACTOR = {
+        MasteryLevel.NOT_STARTED: 1.5,
+        MasteryLevel.LEARNING: 1.2,
+        MasteryLevel.FAMILIAR: 1.0,
+        MasteryLevel.PROFICIENT: 0.8,
+        MasteryLevel.MASTERED: 0.5
+    }
+    
+    @staticmethod
+    def mastery_factor_expression():
+        """
+        遗忘速度因子的 SQL 表达式（无法识别的掌握程度按未开始处理）
+        
+        Returns:
+            SQL CASE 表达式
+        """
+        return case(
+            *[
+                (MemoryNode.mastery_level == level.value, factor)
+                for level, factor in ReviewService.MASTERY_FORGETTING_FACTOR.items()
+            ],
+            else_=ReviewService.MASTERY_FORGETTING_FACTOR[MasteryLevel.NOT_STARTED]
+        )
+    
+    @staticmethod
+    def forgetting_index_expression(now: datetime):
+        """
+        遗忘指数的 SQL 表达式（与 calculate_forgetting_index 的计算规则一致）
+        
+        - 未到复习时间：按已过时间占复习间隔的比例线性增长，最高 0.5
+        - 已过复习时间：0.5 + 超期天数 * 0.1 * 遗忘速度因子，最高 1.0
+        - 没有复习时间：0.8
+        
+        Args:
+            now: 当前时间
+            
+        Returns:
+            可用于 SELECT / ORDER BY 的 SQL 表达式
+        """
+        now = bindparam("forgetting_now", now, type_=DateTime(timezone=True))
+        last_review_at = MemoryNode.last_review_at
+        next_review_at = MemoryNode.next_review_at
+        
+        mastery_factor = ReviewService.mastery_factor_expression()
+        total_interval = func.extract("epoch", next_review_at - last_review_at)
+        time_passed = func.extract("epoch", now - last_review_at)
+        overdue_days = func.extract("epoch", now - next_review_at) / 86400
+        
+        return case(
+            (or_(last_review_at.is_(None), next_review_at.is_(None)), 0.8),
+            (
+                now < next_review_at,
+                case(
+                    (total_interval == 0, 0.0),
+                    else_=func.least(0.5, time_passed / total_interval * 0.5)
+                )
+            ),
+            else_=func.least(1.0, 0.5 + overdue_days * 0.1 * mastery_factor)
+        )
+    
+    @staticmethod
+    def _spaced_queue_candidates(conditions: List, now: datetime, limit: int):
+        """
+        间隔重复队列的候选节点（只需对少量候选计算遗忘指数和排序）
+        
+        同一掌握程度、有复习时间的到期节点，遗忘指数随超期时间单调不减，
+        因此各掌握程度按 next_review_at 取超期最久的 k 个、再加上没有复习时间的 k 个，
+        其并集一定包含全局 top-k；每个分支都沿索引（idx_memory_nodes_user_mastery_next_review，
+        没有复习时间或掌握程度无法识别时为 idx_memory_nodes_user_irregular_review）只读取 k 行。
+        
+        Args:
+            conditions: 节点的过滤条件（用户、图谱、未删除）
+            now: 当前时间
+            limit: 队列长度 k
+            
+        Returns:
+            候选节点 ID 的子查询
+        """
+        levels = [level.value for level in ReviewService.MASTERY_FORGETTING_FACTOR]
+        scheduled = and_(MemoryNode.last_review_at.isnot(None), MemoryNode.next_review_at <= now)
+        unscheduled = or_(MemoryNode.last_review_at.is_(None), MemoryNode.next_review_at.is_(None))
+        
+        def branch(*extra):
+            return (
+                select(MemoryNode.id)
+                .where(*conditions, *extra)
+                .order_by(MemoryNode.next_review_at.asc().nulls_last())
+                .limit(limit)
+            )
+        
+        branches = [branch(scheduled, MemoryNode.mastery_level == level) for level in levels]
+        # 无法识别的掌握程度（遗忘速度按未开始计算），条件与部分索引谓词写法一致
+        unknown_level = func.array_position(
+            literal_column(KNOWN_MASTERY_LEVELS_SQL), cast(MemoryNode.mastery_level, Text)
+        ).is_(None)
+        branches.append(branch(scheduled, unknown_level))
+        # 没有复习时间的节点遗忘指数固定为 0.8
+        branches.append(branch(unscheduled, or_(MemoryNode.next_review_at <= now, MemoryNode.next_review_at.is_(None))))
+        candidates = union_all(*branches).subquery("review_candidates")
+        return select(candidates.c.id)
+    
+    # 图谱遍历模式中作为起点的薄弱掌握程度（未到期也作为起点）
+    WEAK_MASTERY_LEVELS = (MasteryLevel.NOT_STARTED.value, MasteryLevel.LEARNING.value)
+    
+    @staticmethod
+    async def _graph_traversal_order(
         db: AsyncSession,
-        node_id: str,
-        quality: int,
-        review_duration: int
-    ) -> Dict:
+        conditions: List,
+        now: datetime,
+        forgetting_index,
+        limit: int
+    ) -> List:
         """
-        更新节点的复习统计数据
+        图谱遍历队列的节点顺序
+        
+        以到期或掌握程度低的节点为起点（遗忘指数高的优先；都没有时按创建时间取起点），
+        先沿前置关系做后序深度优先遍历，未访问的前置知识排在依赖它的节点之前；
+        队列不足 limit 时再从已加入队列的节点沿所有关联逐层广度优先扩展。
+        邻接表按图谱缓存，关联不变时遍历不需要查询关联表。
         
         Args:
             db: 数据库会话
-            node_id: 节点 ID
-            quality: 复习质量评分 (0-5)
-            review_duration: 复习时长（秒）
+            conditions: 节点的过滤条件（用户、图谱、未删除）
+            now: 当前时间
+            forgetting_index: 遗忘指数的 SQL 表达式
+            limit: 队列长度
             
         Returns:
-            更新后的复习统计数据
+            节点 ID 列表（按遍历顺序，最多 limit 个）
         """
-        # 查询节点
+        # 薄弱节点按掌握程度分支，各自沿 idx_memory_nodes_user_mastery_next_review 只读取 k 行
+        weak = [
+            select(MemoryNode.id)
+            .where(*conditions, MemoryNode.mastery_level == level)
+            .order_by(MemoryNode.next_review_at.asc().nulls_last())
+            .limit(limit)
+            for level in ReviewService.WEAK_MASTERY_LEVELS
+        ]
+        candidates = ReviewService._spaced_queue_candidates(conditions, now, limit).union_all(*weak)
         result = await db.execute(
-            select(MemoryNode).where(MemoryNode.id == node_id)
+            select(MemoryNode.id, MemoryNode.graph_id, forgetting_index)
+            .where(*conditions, MemoryNode.id.in_(candidates))
+            .order_by(forgetting_index.desc(), MemoryNode.next_review_at.asc().nulls_last())
+            .limit(limit)
         )
-        node = result.scalar_one_or_none()
+        seeds = [(node_id, graph_id) for node_id, graph_id, _ in result.all()]
+        if not seeds:
+            result = await db.execute(
+                select(MemoryNode.id, MemoryNode.graph_id)
+                .where(*conditions)
+                .order_by(MemoryNode.created_at.asc())
+                .limit(limit)
+            )
+            seeds = [tuple(row) for row in result.all()]
         
-        if not node:
-            raise ValueError(f"节点不存在: {node_id}")
+        adjacencies = await graph_adjacency_cache.get_many(db, [graph_id for _, graph_id in seeds])
+        visited = {graph_id: adjacency.new_visited() for graph_id, adjacency in adjacencies.items()}
+        walked = {graph_id: [] for graph_id in adjacencies}
+        order = []
+        
+        starts = {}
+        for graph_id, adjacency in adjacencies.items():
+            graph_seeds = [node_id for node_id, seed_graph_id in seeds if seed_graph_id == graph_id]
+            starts.update(zip(graph_seeds, adjacency.index_of(graph_seeds).tolist()))
+        
+        # 前置优先：依次从各起点遍历，没有关联的起点直接加入队列
+        for node_id, graph_id in seeds:
+            if len(order) >= limit:
+                break
+            start = starts.get(node_id, -1)
+            if start < 0:
+                order.append(node_id)
+                continue
+            walk = []
+            adjacencies[graph_id].walk_prerequisites_first(start, visited[graph_id], walk, limit - len(order))
+            walked[graph_id].extend(walk)
+            order.extend(adjacencies[graph_id].ids_of(walk))
+        
+        # 广度优先扩展到相邻的知识点
+        for graph_id, adjacency in adjacencies.items():
+            frontier = np.asarray(walked[graph_id], dtype=np.intp)
+            while len(order) < limit and frontier.size:
+                frontier = adjacency.expand(frontier, visited[graph_id])
+                order.extend(adjacency.ids_of(frontier[:limit - len(order)]))
+        
+        return order
+    
+    @staticmethod
+    def _apply_review(
+        node: MemoryNode,
+        quality: int,
+        review_duration: int,
+        reviewed_at: datetime
+    ) -> Tuple[Dict, Dict]:
+        """
+        在内存中对节点应用一次 SM-2 复习（不访问数据库）
         
+        Args:
+            node: 已加载复习列的节点
+            quality: 复习质量评分 (0-5)
+            review_duration: 复习时长（秒）
+            reviewed_at: 复习时间
+            
+        Returns:
+            (复习结果, 复习记录的节点状态快照)
+        """
         # 获取当前复习统计
         review_stats = node.review_stats or {}
         
@@ -238,11 +570,12 @@ class ReviewService:
             new_mastery = MasteryLevel.LEARNING
         
         # 计算下次复习时间
-        next_review_time = ReviewService._get_utc_now() + timedelta(days=new_interval)
+        next_review_time = reviewed_at + timedelta(days=new_interval)
         
         # 更新节点
+        mastery_before = node.mastery_level
         node.mastery_level = new_mastery.value  # 存储为字符串
-        node.last_review_at = ReviewService._get_utc_now()
+        node.last_review_at = reviewed_at
         node.next_review_at = next_review_time
         node.review_stats = {
             "repetitions": new_repetitions,
@@ -253,6 +586,59 @@ class ReviewService:
             "last_duration": review_duration
         }
         
+        result = {
+            "node_id": str(node.id),
+            "mastery_level": new_mastery.value,
+            "next_review_at": next_review_time.isoformat(),
+            "interval_days": new_interval,
+            "easiness": new_easiness,
+            "repetitions": new_repetitions
+        }
+        snapshot = {
+            "mastery_before": mastery_before,
+            "mastery_after": new_mastery.value,
+            "quality": quality
+        }
+        return result, snapshot
+    
+    @staticmethod
+    def _is_mastered(mastery_level: Optional[str]) -> bool:
+        """判断掌握程度是否为已掌握（兼容大小写）"""
+        return (mastery_level or "").lower() == MasteryLevel.MASTERED.value
+    
+    @staticmethod
+    async def update_review_stats(
+        db: AsyncSession,
+        node_id: str,
+        quality: int,
+        review_duration: int
+    ) -> Dict:
+        """
+        更新节点的复习统计数据
+        
+        Args:
+            db: 数据库会话
+            node_id: 节点 ID
+            quality: 复习质量评分 (0-5)
+            review_duration: 复习时长（秒）
+            
+        Returns:
+            更新后的复习统计数据
+        """
+        # 查询节点（只加载复习相关的列）
+        result = await db.execute(
+            select(MemoryNode).options(node_load_options("review")).where(MemoryNode.id == node_id)
+        )
+        node = result.scalar_one_or_none()
+        
+        if not node:
+            raise ValueError(f"节点不存在: {node_id}")
+        
+        was_mastered = ReviewService._is_mastered(node.mastery_level)
+        review_result, snapshot = ReviewService._apply_review(
+            node, quality, review_duration, ReviewService._get_utc_now()
+        )
+        
         # 创建复习记录
         review_log = ReviewLog(
             user_id=node.user_id,
@@ -260,24 +646,193 @@ class ReviewService:
             review_mode="manual",
             mastery_feedback="remembered" if quality >= 3 else "forgot",
             time_spent_seconds=review_duration,
-            node_state_snapshot={
-                "mastery_before": node.mastery_level,
-                "mastery_after": new_mastery.value,
-                "quality": quality
-            }
+            node_state_snapshot=snapshot
         )
         db.add(review_log)
         
+        # 在同一事务中更新用户统计快照
+        await user_stats_service.record_review(
+            db,
+            node.user_id,
+            mastered_delta=int(ReviewService._is_mastered(node.mastery_level)) - int(was_mastered)
+        )
+        
         await db.commit()
-        await db.refresh(node)
+        review_statistics_cache.invalidate(node.user_id)
+        await review_due_index.add_nodes([node])
+        
+        return review_result
+    
+    @staticmethod
+    async def submit_review_batch(db: AsyncSession, user_id: str, items: List[Dict]) -> Dict:
+        """
+        批量提交复习记录（离线复习同步）
         
+        按提交顺序在内存中依次应用 SM-2（同一节点多次复习会累积），
+        一次查询加载全部节点，批量写入复习记录，只提交一次。
+        客户端为每条复习提供唯一 client_review_id，已提交过的记录直接跳过，重放请求不会重复计算。
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            items: 复习列表，每项包含 client_review_id, node_id, quality, review_duration, reviewed_at
+            
+        Returns:
+            各项处理结果和汇总数量
+        """
+        # 同一用户的批量提交串行执行，保证去重检查和写入之间没有并发插入
+        await db.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(f"review-batch:{user_id}")))
+        )
+        
+        client_ids = [item["client_review_id"] for item in items]
+        existing = await db.execute(
+            select(ReviewLog.client_review_id).where(
+                and_(
+                    ReviewLog.user_id == user_id,
+                    ReviewLog.client_review_id.in_(client_ids)
+                )
+            )
+        )
+        seen = set(existing.scalars().all())
+        
+        # 一次查询加载本批次涉及的节点（只加载复习相关的列）
+        node_ids = {str(item["node_id"]) for item in items}
+        result = await db.execute(
+            select(MemoryNode).options(node_load_options("review")).where(
+                and_(
+                    MemoryNode.id.in_(node_ids),
+                    MemoryNode.user_id == user_id
+                )
+            )
+        )
+        nodes = {str(node.id): node for node in result.scalars().all()}
+        was_mastered = {node_id: ReviewService._is_mastered(node.mastery_level) for node_id, node in nodes.items()}
+        
+        now = ReviewService._get_utc_now()
+        results = []
+        logs = []
+        reviewed_times = []
+        for item in items:
+            client_review_id = item["client_review_id"]
+            node_id = str(item["node_id"])
+            entry = {"client_review_id": client_review_id, "node_id": node_id}
+            
+            if client_review_id in seen:
+                results.append({**entry, "status": "duplicate"})
+                continue
+            node = nodes.get(node_id)
+            if node is None:
+                results.append({**entry, "status": "not_found", "error": f"节点不存在: {node_id}"})
+                continue
+            seen.add(client_review_id)
+            
+            # 复习时间统一为不带时区的 UTC 时间，不晚于服务器当前时间；未提供时按当前时间
+            reviewed_at = item.get("reviewed_at") or now
+            if reviewed_at.tzinfo is not None:
+                reviewed_at = reviewed_at.astimezone(timezone.utc).replace(tzinfo=None)
+            reviewed_at = min(reviewed_at, now)
+            
+            review_result, snapshot = ReviewService._apply_review(
+                node, item["quality"], item["review_duration"], reviewed_at
+            )
+            results.append({**entry, **review_result, "status": "applied"})
+            reviewed_times.append(reviewed_at)
+            logs.append({
+                "user_id": node.user_id,
+                "node_id": node.id,
+                "client_review_id": client_review_id,
+                "review_mode": "manual",
+                "mastery_feedback": "remembered" if item["quality"] >= 3 else "forgot",
+                "time_spent_seconds": item["review_duration"],
+                "node_state_snapshot": snapshot,
+                "created_at": reviewed_at,
+            })
+        
+        if logs:
+            await db.execute(insert(ReviewLog), logs)
+            mastered_delta = sum(
+                int(ReviewService._is_mastered(nodes[node_id].mastery_level)) - int(mastered)
+                for node_id, mastered in was_mastered.items()
+            )
+            await user_stats_service.record_reviews(db, user_id, reviewed_times, mastered_delta=mastered_delta)
+        
+        await db.commit()
+        if logs:
+            review_statistics_cache.invalidate(user_id)
+            applied_ids = {entry["node_id"] for entry in results if entry["status"] == "applied"}
+            await review_due_index.add_nodes(nodes[node_id] for node_id in applied_ids)
+        
+        statuses = [entry["status"] for entry in results]
         return {
-            "node_id": str(node.id),
-            "mastery_level": new_mastery.value,
-            "next_review_at": next_review_time.isoformat(),
-            "interval_days": new_interval,
-            "easiness": new_easiness,
-            "repetitions": new_repetitions
+            "applied": statuses.count("applied"),
+            "duplicates": statuses.count("duplicate"),
+            "failed": len(statuses) - statuses.count("applied") - statuses.count("duplicate"),
+            "results": results
+        }
+    
+    @staticmethod
+    async def get_forgetting_map(db: AsyncSession, graph_id) -> Dict:
+        """
+        获取整个图谱的遗忘热力图（列式数据）
+        
+        一次查询只取计算所需的列，并在数据库中聚合成整列（同一查询中的聚合按相同的行顺序累积，
+        各列一一对应，无需排序）：ID 拼接为 bytea，
+        时间转换为 Unix 秒数组，掌握程度转换为遗忘速度因子数组，避免逐行构造 Python 对象；
+        遗忘指数和颜色分档用 NumPy 整列计算。各列按同一顺序排列并 base64 编码：
+        
+        - ids: 每个节点 16 字节 UUID
+        - forgetting_index: float16（小端）
+        - color_index: uint8，FORGETTING_PALETTE 中的下标
+        
+        Args:
+            db: 数据库会话
+            graph_id: 图谱 ID
+            
+        Returns:
+            热力图数据字典
+        """
+        now = ReviewService._get_utc_now().replace(tzinfo=timezone.utc)
+        
+        def column(expression):
+            return func.array_agg(cast(expression, Float))
+        
+        result = await db.execute(
+            select(
+                func.count(MemoryNode.id),
+                func.string_agg(func.uuid_send(MemoryNode.id), literal(b"", LargeBinary)),
+                # date_part 直接返回 double precision，比 extract（numeric）快
+                column(func.date_part("epoch", MemoryNode.last_review_at)),
+                column(func.date_part("epoch", MemoryNode.next_review_at)),
+                column(ReviewService.mastery_factor_expression()),
+            ).where(
+                and_(
+                    MemoryNode.graph_id == graph_id,
+                    MemoryNode.deleted_at.is_(None)
+                )
+            )
+        )
+        count, ids, last_review_at, next_review_at, mastery_factor = result.one()
+        
+        forgetting_index = ReviewService.calculate_forgetting_indices(
+            last_review_at=np.array(last_review_at or [], dtype=np.float64),
+            next_review_at=np.array(next_review_at or [], dtype=np.float64),
+            mastery_factor=np.array(mastery_factor or [], dtype=np.float64),
+            now=now.timestamp()
+        )
+        color_index = ReviewService.get_forgetting_color_indices(forgetting_index)
+        
+        def encode(data: bytes) -> str:
+            return base64.b64encode(data).decode("ascii")
+        
+        return {
+            "graph_id": str(graph_id),
+            "count": count,
+            "computed_at": now,
+            "palette": list(ReviewService.FORGETTING_PALETTE),
+            "ids": encode(ids or b""),
+            "forgetting_index": encode(forgetting_index.astype("<f2").tobytes()),
+            "color_index": encode(color_index.tobytes()),
         }
     
     @staticmethod
@@ -303,6 +858,11 @@ class ReviewService:
         """
         now = ReviewService._normalize_datetime(ReviewService._get_utc_now())
         
+        # 遗忘指数在数据库中计算，间隔重复模式直接按它取 top-k
+        forgetting_index = ReviewService.forgetting_index_expression(
+            now.replace(tzinfo=timezone.utc)
+        ).label("forgetting_index")
+        
         # 基础查询条件
         conditions = [MemoryNode.user_id == user_id]
         if graph_id:
@@ -310,14 +870,20 @@ class ReviewService:
         
         # 根据模式选择节点
         if mode == ReviewMode.SPACED:
-            # 间隔重复：选择到期的节点
+            # 间隔重复：选择到期的节点，遗忘风险最高的优先（同分时超期更久的优先）
+            conditions.append(MemoryNode.deleted_at.is_(None))
+            # 候选节点优先从 Redis 到期索引读取，未启用或不可用时在数据库中查询
+            candidates = await review_due_index.candidates(user_id, graph_id, now, limit)
+            if candidates is None:
+                candidates = ReviewService._spaced_queue_candidates(conditions, now, limit)
             conditions.append(
                 or_(
                     MemoryNode.next_review_at <= now,
                     MemoryNode.next_review_at.is_(None)
                 )
             )
-            order_by = MemoryNode.next_review_at.asc()
+            conditions.append(MemoryNode.id.in_(candidates))
+            order_by = [forgetting_index.desc(), MemoryNode.next_review_at.asc().nulls_last()]
             
         elif mode == ReviewMode.FOCUSED:
             # 集中攻克：选择掌握程度低的节点
@@ -328,54 +894,41 @@ class ReviewService:
                     MasteryLevel.FAMILIAR.value
                 ])
             )
-            order_by = MemoryNode.mastery_level.asc()
+            order_by = [MemoryNode.mastery_level.asc()]
             
         elif mode == ReviewMode.RANDOM:
             # 随机抽查：随机排序
             order_by = None  # 后续使用 func.random()
             
         else:  # GRAPH_TRAVERSAL
-            # 图谱遍历：按创建时间排序
-            order_by = MemoryNode.created_at.asc()
+            # 图谱遍历：从到期或薄弱的节点出发，前置知识优先，沿节点关联遍历
+            conditions.append(MemoryNode.deleted_at.is_(None))
+            traversal_order = await ReviewService._graph_traversal_order(
+                db, conditions, now, forgetting_index, limit
+            )
+            conditions.append(MemoryNode.id.in_(traversal_order))
+            order_by = None
         
-        # 构建查询
-        query = select(MemoryNode).where(and_(*conditions))
+        # 构建查询（只加载复习相关的列）
+        query = select(MemoryNode, forgetting_index).options(node_load_options("review")).where(and_(*conditions))
         
         if order_by is not None:
-            query = query.order_by(order_by)
+            query = query.order_by(*order_by)
         
         query = query.limit(limit)
         
         # 执行查询
         result = await db.execute(query)
-        nodes = result.scalars().all()
+        rows = result.all()
+        if mode == ReviewMode.GRAPH_TRAVERSAL:
+            # 按遍历顺序返回
+            position = {node_id: i for i, node_id in enumerate(traversal_order)}
+            rows.sort(key=lambda row: position[row[0].id])
         
         # 构建返回数据
         review_queue = []
-        for node in nodes:
-            # 转换 mastery_level 为枚举（如果是字符串）
-            try:
-                if isinstance(node.mastery_level, str):
-                    mastery_level_enum = MasteryLevel(node.mastery_level)
-                else:
-                    mastery_level_enum = node.mastery_level
-            except (ValueError, AttributeError):
-                mastery_level_enum = MasteryLevel.NOT_STARTED
-            
-            # 计算遗忘指数
-            if node.last_review_at and node.next_review_at:
-                try:
-                    forgetting_index = ReviewService.calculate_forgetting_index(
-                        last_review_time=node.last_review_at,
-                        next_review_time=node.next_review_at,
-                        mastery_level=mastery_level_enum
-                    )
-                except Exception as e:
-                    print(f"Warning: Failed to calculate forgetting index for node {node.id}: {e}")
-                    forgetting_index = 0.8  # 默认值
-            else:
-                forgetting_index = 0.8  # 未复习过的节点，默认较高
-            
+        for node, node_forgetting_index in rows:
+            node_forgetting_index = round(float(node_forgetting_index), 6)
             review_queue.append({
                 "node_id": str(node.id),
                 "title": node.title,
@@ -383,8 +936,8 @@ class ReviewService:
                 "mastery_level": node.mastery_level if isinstance(node.mastery_level, str) else node.mastery_level.value,
                 "last_review_at": node.last_review_at.isoformat() if node.last_review_at else None,
                 "next_review_at": node.next_review_at.isoformat() if node.next_review_at else None,
-                "forgetting_index": forgetting_index,
-                "forgetting_color": ReviewService.get_forgetting_color(forgetting_index),
+                "forgetting_index": node_forgetting_index,
+                "forgetting_color": ReviewService.get_forgetting_color(node_forgetting_index),
                 "review_stats": node.review_stats or {}
             })
         
@@ -394,100 +947,95 @@ class ReviewService:
     async def get_review_statistics(
         db: AsyncSession,
         user_id: str,
-        graph_id: Optional[str] = None
+        graph_id: Optional[str] = None,
+        use_cache: bool = True
     ) -> Dict:
         """
         获取复习统计信息
         
+        在数据库中一次聚合完成（按掌握程度分组计数、到期/逾期计数、
+        复习次数求和），不加载节点的内容和向量。
+        
         Args:
             db: 数据库会话
             user_id: 用户 ID
             graph_id: 知识图谱 ID（可选）
+            use_cache: 是否使用短期结果缓存
             
         Returns:
             复习统计数据
         """
-        try:
-            # 基础查询条件
-            conditions = [MemoryNode.user_id == user_id]
-            if graph_id:
-                conditions.append(MemoryNode.graph_id == graph_id)
-            
-            # 查询所有节点
-            result = await db.execute(
-                select(MemoryNode).where(and_(*conditions))
+        if use_cache:
+            cached = review_statistics_cache.get(user_id, graph_id)
+            if cached is not None:
+                return cached
+        
+        # 基础查询条件
+        conditions = [MemoryNode.user_id == user_id]
+        if graph_id:
+            conditions.append(MemoryNode.graph_id == graph_id)
+        
+        # 今天（UTC）的起止时间：今天到期的计入 due_today，之前到期的计入 overdue
+        now = ReviewService._normalize_datetime(ReviewService._get_utc_now())
+        today_start = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+        tomorrow_start = today_start + timedelta(days=1)
+        
+        mastery_key = func.lower(MemoryNode.mastery_level)
+        result = await db.execute(
+            select(
+                mastery_key.label("mastery_level"),
+                func.count().label("node_count"),
+                func.count().filter(
+                    and_(
+                        MemoryNode.next_review_at >= today_start,
+                        MemoryNode.next_review_at < tomorrow_start
+                    )
+                ).label("due_today"),
+                func.count().filter(MemoryNode.next_review_at < today_start).label("overdue"),
+                func.sum(
+                    func.coalesce(MemoryNode.review_stats["total_reviews"].astext.cast(Integer), 0)
+                ).label("total_reviews"),
             )
-            nodes = result.scalars().all()
-            
-            # 统计数据
-            total_nodes = len(nodes)
-            mastery_distribution = {
-                "not_started": 0,
-                "learning": 0,
-                "familiar": 0,
-                "proficient": 0,
-                "mastered": 0
-            }
-            
-            due_today = 0
-            overdue = 0
-            total_reviews = 0
-            
-            now = ReviewService._normalize_datetime(ReviewService._get_utc_now())
-            
-            for node in nodes:
-                try:
-                    # 掌握程度分布（处理字符串类型）
-                    if isinstance(node.mastery_level, str):
-                        mastery_key = node.mastery_level.lower()
-                    else:
-                        mastery_key = node.mastery_level.value.lower()
-                    mastery_distribution[mastery_key] = mastery_distribution.get(mastery_key, 0) + 1
-                    
-                    # 复习次数
-                    review_stats = node.review_stats or {}
-                    total_reviews += review_stats.get("total_reviews", 0)
-                    
-                    # 到期统计
-                    if node.next_review_at:
-                        try:
-                            # 统一移除时区信息
-                            next_review_date = ReviewService._normalize_datetime(node.next_review_at)
-                            now_date = now  # now 已经是不带时区的
-                            
-                            if next_review_date.date() == now_date.date():
-                                due_today += 1
-                            elif next_review_date < now_date:
-                                overdue += 1
-                        except Exception as e:
-                            # 跳过有问题的节点
-                            print(f"Warning: Failed to compare dates for node {node.id}: {e}")
-                            print(f"  next_review_at type: {type(node.next_review_at)}, value: {node.next_review_at}")
-                            print(f"  now type: {type(now)}, value: {now}")
-                            continue
-                except Exception as e:
-                    print(f"Error processing node {node.id}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    continue
-            
-            # 计算掌握率
-            mastery_rate = 0
-            if total_nodes > 0:
-                mastered_count = mastery_distribution["proficient"] + mastery_distribution["mastered"]
-                mastery_rate = round(mastered_count / total_nodes * 100, 2)
-            
-            return {
-                "total_nodes": total_nodes,
-                "mastery_distribution": mastery_distribution,
-                "mastery_rate": mastery_rate,
-                "due_today": due_today,
-                "overdue": overdue,
-                "total_reviews": total_reviews
-            }
-        except Exception as e:
-            print(f"Error in get_review_statistics: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
-
+            .where(and_(*conditions))
+            .group_by(mastery_key)
+        )
+        
+        # 统计数据
+        mastery_distribution = {
+            "not_started": 0,
+            "learning": 0,
+            "familiar": 0,
+            "proficient": 0,
+            "mastered": 0
+        }
+        total_nodes = 0
+        due_today = 0
+        overdue = 0
+        total_reviews = 0
+        
+        for row in result.all():
+            mastery_distribution[row.mastery_level] = mastery_distribution.get(row.mastery_level, 0) + row.node_count
+            total_nodes += row.node_count
+            due_today += row.due_today
+            overdue += row.overdue
+            total_reviews += row.total_reviews or 0
+        
+        # 计算掌握率
+        mastery_rate = 0
+        if total_nodes > 0:
+            mastered_count = mastery_distribution["proficient"] + mastery_distribution["mastered"]
+            mastery_rate = round(mastered_count / total_nodes * 100, 2)
+        
+        statistics = {
+            "total_nodes": total_nodes,
+            "mastery_distribution": mastery_distribution,
+            "mastery_rate": mastery_rate,
+            "due_today": due_today,
+            "overdue": overdue,
+            "total_reviews": total_reviews
+        }
+        
+        if use_cache:
+            review_statistics_cache.set(user_id, graph_id, statistics)
+        
+        return statistics
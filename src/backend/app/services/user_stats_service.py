@@ -0,0 +1,361 @@
+"""
+用户学习统计快照服务
+在创建节点/图谱、删除节点/图谱和提交复习的同一事务中增量更新 user_stats，
+成就系统读取时只需按主键查询一行
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, case, cast, extract, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.knowledge_graph import KnowledgeGraph
+from app.models.memory_node import MasteryLevel, MemoryNode
+from app.models.review_log import ReviewLog
+from app.models.user_stats import UserStats
+
+
+# 特殊成就统计的时间段（UTC 小时）
+NIGHT_HOURS = (22, 23, 0, 1)  # 深夜 22:00-02:00
+MORNING_HOURS = (5, 6, 7)  # 清晨 05:00-08:00
+
+
+class UserStatsService:
+    """
+    用户学习统计快照服务
+    
+    写入方法只执行一条 UPDATE，不提交事务，由调用方与业务数据一起提交；
+    用户还没有快照（例如升级前的老用户）时，从业务表重建一次。
+    删除节点不回退复习次数和复习时段统计（已完成的复习仍计入成就）。
+    """
+    
+    @staticmethod
+    def _get_utc_now() -> datetime:
+        """获取当前 UTC 时间"""
+        return datetime.now(timezone.utc)
+    
+    @staticmethod
+    def _as_utc(value: datetime) -> datetime:
+        """转换为 UTC 时间（不带时区的时间按 UTC 处理）"""
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
+    
+    @staticmethod
+    async def _apply(db: AsyncSession, user_id, values: Dict) -> None:
+        """
+        对快照执行增量更新，快照不存在时重建
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            values: UPDATE 的 SET 子句
+        """
+        # 先写入待提交的业务数据，重建时才能统计到本次变更
+        await db.flush()
+        
+        stmt = (
+            update(UserStats)
+            .where(UserStats.user_id == user_id)
+            .values(values)
+            .returning(UserStats.user_id)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        if result.scalar_one_or_none() is not None:
+            return
+        
+        # 重建结果已包含本次变更；并发重建时对方先插入，则在其结果上再增量更新
+        if not await UserStatsService.rebuild(db, user_id):
+            await db.execute(stmt)
+    
+    @staticmethod
+    async def record_nodes_created(db: AsyncSession, user_id, count: int = 1) -> None:
+        """
+        记录新建节点
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            count: 新建节点数
+        """
+        await UserStatsService._apply(db, user_id, {
+            UserStats.total_nodes: UserStats.total_nodes + count,
+        })
+    
+    @staticmethod
+    async def record_nodes_deleted(db: AsyncSession, user_id, count: int = 1, mastered: int = 0) -> None:
+        """
+        记录删除节点
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            count: 删除节点数
+            mastered: 其中已掌握的节点数
+        """
+        await UserStatsService._apply(db, user_id, {
+            UserStats.total_nodes: func.greatest(UserStats.total_nodes - count, 0),
+            UserStats.mastered_nodes: func.greatest(UserStats.mastered_nodes - mastered, 0),
+        })
+    
+    @staticmethod
+    async def record_graph_created(db: AsyncSession, user_id) -> None:
+        """
+        记录新建知识图谱
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+        """
+        await UserStatsService._apply(db, user_id, {
+            UserStats.total_graphs: UserStats.total_graphs + 1,
+        })
+    
+    @staticmethod
+    async def record_graph_deleted(db: AsyncSession, user_id, node_count: int = 0, mastered: int = 0) -> None:
+        """
+        记录删除知识图谱（图谱内节点级联删除）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            node_count: 图谱内的节点数
+            mastered: 其中已掌握的节点数
+        """
+        await UserStatsService._apply(db, user_id, {
+            UserStats.total_graphs: func.greatest(UserStats.total_graphs - 1, 0),
+            UserStats.total_nodes: func.greatest(UserStats.total_nodes - node_count, 0),
+            UserStats.mastered_nodes: func.greatest(UserStats.mastered_nodes - mastered, 0),
+        })
+    
+    @staticmethod
+    async def record_review(
+        db: AsyncSession,
+        user_id,
+        reviewed_at: Optional[datetime] = None,
+        mastered_delta: int = 0
+    ) -> None:
+        """
+        记录一次复习
+        
+        同一条 UPDATE 内完成复习次数、时段统计和连续天数的更新，
+        并发提交时由行锁保证不丢失计数。
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            reviewed_at: 复习时间（默认当前时间）
+            mastered_delta: 已掌握节点数的变化（新掌握 +1，掌握程度下降 -1）
+        """
+        reviewed_at = UserStatsService._as_utc(reviewed_at or UserStatsService._get_utc_now())
+        review_date = reviewed_at.date()
+        # PostgreSQL 数组下标从 1 开始
+        hour_slot = UserStats.review_hours[reviewed_at.hour + 1]
+        
+        new_streak = case(
+            (UserStats.last_review_date >= review_date, UserStats.current_streak),
+            (UserStats.last_review_date == review_date - timedelta(days=1), UserStats.current_streak + 1),
+            else_=1,
+        )
+        await UserStatsService._apply(db, user_id, {
+            UserStats.total_reviews: UserStats.total_reviews + 1,
+            UserStats.mastered_nodes: func.greatest(UserStats.mastered_nodes + mastered_delta, 0),
+            hour_slot: hour_slot + 1,
+            UserStats.current_streak: new_streak,
+            UserStats.longest_streak: func.greatest(UserStats.longest_streak, new_streak),
+            UserStats.last_review_date: func.greatest(
+                func.coalesce(UserStats.last_review_date, review_date), review_date
+            ),
+        })
+    
+    @staticmethod
+    async def record_reviews(
+        db: AsyncSession,
+        user_id,
+        reviewed_at: List[datetime],
+        mastered_delta: int = 0
+    ) -> None:
+        """
+        记录一批复习（批量提交时使用，整批只更新一次快照）
+        
+        锁定快照行后在内存中按时间顺序推进连续天数，规则与 record_review 相同。
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+            reviewed_at: 各次复习的时间
+            mastered_delta: 整批复习后已掌握节点数的变化
+        """
+        await db.flush()
+        locked = (
+            select(UserStats)
+            .where(UserStats.user_id == user_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        snapshot = (await db.execute(locked)).scalar_one_or_none()
+        if snapshot is None:
+            # 重建结果已包含本批写入的复习记录和节点状态
+            if await UserStatsService.rebuild(db, user_id):
+                return
+            snapshot = (await db.execute(locked)).scalar_one()
+        
+        review_hours = list(snapshot.review_hours or [0] * 24)
+        current_streak = snapshot.current_streak
+        longest_streak = snapshot.longest_streak
+        last_review_date = snapshot.last_review_date
+        for moment in sorted(UserStatsService._as_utc(value) for value in reviewed_at):
+            review_hours[moment.hour] += 1
+            review_date = moment.date()
+            if last_review_date is not None and last_review_date >= review_date:
+                continue
+            if last_review_date == review_date - timedelta(days=1):
+                current_streak += 1
+            else:
+                current_streak = 1
+            longest_streak = max(longest_streak, current_streak)
+            last_review_date = review_date
+        
+        snapshot.total_reviews += len(reviewed_at)
+        snapshot.mastered_nodes = max(snapshot.mastered_nodes + mastered_delta, 0)
+        snapshot.review_hours = review_hours
+        snapshot.current_streak = current_streak
+        snapshot.longest_streak = longest_streak
+        snapshot.last_review_date = last_review_date
+    
+    @staticmethod
+    def _streaks(review_dates: List[date]) -> Tuple[int, int]:
+        """
+        根据复习日期计算连续天数
+        
+        Args:
+            review_dates: 去重后按升序排列的复习日期
+        
+        Returns:
+            (截至最后复习日的连续天数, 最长连续天数)
+        """
+        current = longest = 0
+        previous = None
+        for review_date in review_dates:
+            current = current + 1 if previous == review_date - timedelta(days=1) else 1
+            longest = max(longest, current)
+            previous = review_date
+        return current, longest
+    
+    @staticmethod
+    async def rebuild(db: AsyncSession, user_id) -> bool:
+        """
+        从业务表重建用户的统计快照（已存在时不覆盖）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+        
+        Returns:
+            是否插入了新快照
+        """
+        is_mastered = func.lower(MemoryNode.mastery_level) == MasteryLevel.MASTERED.value
+        counts = (await db.execute(
+            select(
+                select(func.count(MemoryNode.id)).where(MemoryNode.user_id == user_id).scalar_subquery(),
+                select(func.count(MemoryNode.id)).where(
+                    and_(MemoryNode.user_id == user_id, is_mastered)
+                ).scalar_subquery(),
+                select(func.count(KnowledgeGraph.id)).where(KnowledgeGraph.user_id == user_id).scalar_subquery(),
+            )
+        )).one()
+        
+        # 复习时间统一按 UTC 计算日期和小时
+        reviewed_at = func.timezone("UTC", ReviewLog.created_at)
+        review_day = cast(reviewed_at, Date)
+        review_hour = extract("hour", reviewed_at)
+        rows = (await db.execute(
+            select(review_day, review_hour, func.count(ReviewLog.id))
+            .where(ReviewLog.user_id == user_id)
+            .group_by(review_day, review_hour)
+        )).all()
+        
+        review_hours = [0] * 24
+        review_dates = set()
+        for review_date, hour, count in rows:
+            review_hours[int(hour)] += count
+            review_dates.add(review_date)
+        current_streak, longest_streak = UserStatsService._streaks(sorted(review_dates))
+        
+        result = await db.execute(
+            insert(UserStats)
+            .values(
+                user_id=user_id,
+                total_nodes=counts[0],
+                mastered_nodes=counts[1],
+                total_graphs=counts[2],
+                total_reviews=sum(review_hours),
+                current_streak=current_streak,
+                longest_streak=longest_streak,
+                last_review_date=max(review_dates) if review_dates else None,
+                review_hours=review_hours,
+            )
+            .on_conflict_do_nothing(index_elements=[UserStats.user_id])
+            .returning(UserStats.user_id)
+        )
+        return result.scalar_one_or_none() is not None
+    
+    @staticmethod
+    async def get(db: AsyncSession, user_id) -> UserStats:
+        """
+        获取用户的统计快照（不存在时重建）
+        
+        Args:
+            db: 数据库会话
+            user_id: 用户 ID
+        
+        Returns:
+            UserStats
+        """
+        snapshot = await db.get(UserStats, user_id, populate_existing=True)
+        if snapshot is None:
+            await UserStatsService.rebuild(db, user_id)
+            snapshot = await db.get(UserStats, user_id, populate_existing=True)
+        return snapshot
+    
+    @staticmethod
+    def to_achievement_stats(snapshot: UserStats, today: Optional[date] = None) -> Dict:
+        """
+        把快照转换为成就系统使用的统计数据
+        
+        连续天数按读取日期判断：最后复习日早于昨天时连续中断。
+        
+        Args:
+            snapshot: 统计快照
+            today: 当前 UTC 日期（默认今天）
+        
+        Returns:
+            统计数据字典
+        """
+        today = today or UserStatsService._get_utc_now().date()
+        last_review_date = snapshot.last_review_date
+        current_streak = (
+            snapshot.current_streak
+            if last_review_date is not None and last_review_date >= today - timedelta(days=1)
+            else 0
+        )
+        review_hours = snapshot.review_hours or [0] * 24
+        
+        return {
+            "total_nodes": snapshot.total_nodes,
+            "mastered_nodes": snapshot.mastered_nodes,
+            "total_reviews": snapshot.total_reviews,
+            "total_graphs": snapshot.total_graphs,
+            "current_streak": current_streak,
+            "night_reviews": sum(review_hours[hour] for hour in NIGHT_HOURS),
+            "morning_reviews": sum(review_hours[hour] for hour in MORNING_HOURS),
+            # 最近 7 天每天都复习过
+            "perfect_week": last_review_date == today and current_streak >= 7,
+        }
+
+
+# 创建全局用户统计服务实例
+user_stats_service = UserStatsService()
@@ -0,0 +1,315 @@
+"""
+向量索引管理服务
+管理 memory_nodes.content_embedding 上的 PgVector ANN 索引（HNSW / IVFFlat）
+"""
+
+import time
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import async_engine
+from app.models.memory_node import MemoryNode
+
+
+class VectorIndexService:
+    """向量索引管理服务"""
+    
+    # 支持的索引类型
+    INDEX_TYPES = ("hnsw", "ivfflat")
+    
+    # 索引名称（与 init-scripts/05_add_vector_indexes.sql 保持一致）
+    INDEX_NAMES = {
+        "hnsw": "idx_memory_nodes_embedding_hnsw",
+        "ivfflat": "idx_memory_nodes_embedding_ivfflat",
+    }
+    
+    def validate_index_type(self, index_type: str) -> str:
+        """校验索引类型"""
+        index_type = (index_type or "").lower()
+        if index_type not in self.INDEX_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"不支持的索引类型: {index_type}。支持的类型: {', '.join(self.INDEX_TYPES)}"
+            )
+        return index_type
+    
+    def build_index_ddl(self, index_type: str, concurrently: bool = True) -> str:
+        """
+        生成创建索引的 DDL
+        
+        Args:
+            index_type: 索引类型 (hnsw, ivfflat)
+            concurrently: 是否并发创建（不锁表，不能在事务中执行）
+        
+        Returns:
+            CREATE INDEX 语句
+        """
+        index_type = self.validate_index_type(index_type)
+        
+        if index_type == "hnsw":
+            with_clause = (
+                f"m = {int(settings.VECTOR_HNSW_M)}, "
+                f"ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)}"
+            )
+        else:
+            with_clause = f"lists = {int(settings.VECTOR_IVFFLAT_LISTS)}"
+        
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+            f"{self.INDEX_NAMES[index_type]} ON memory_nodes "
+            f"USING {index_type} (content_embedding vector_cosine_ops) "
+            f"WITH ({with_clause})"
+        )
+    
+    async def apply_search_params(
+        self,
+        db: AsyncSession,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> None:
+        """
+        设置当前事务的 ANN 查询参数
+        
+        使用 set_config(..., is_local=true)，参数只在当前事务内生效，
+        不会污染连接池中的其他连接。
+        
+        Args:
+            db: 数据库会话
+            ef_search: HNSW 查询候选集大小（默认取配置）
+            probes: IVFFlat 探测聚类数（默认取配置）
+        """
+        await db.execute(
+            text(
+                "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+                "set_config('ivfflat.probes', :probes, true)"
+            ),
+            {
+                "ef_search": str(int(ef_search or settings.VECTOR_HNSW_EF_SEARCH)),
+                "probes": str(int(probes or settings.VECTOR_IVFFLAT_PROBES)),
+            }
+        )
+    
+    async def get_index_status(self, db: AsyncSession) -> Dict:
+        """
+        获取向量索引状态
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            索引列表、构建进度和向量覆盖情况
+        """
+        # 现有的 ANN 索引
+        result = await db.execute(
+            text(
+                """
+                SELECT i.relname AS name,
+                       am.amname AS method,
+                       ix.indisvalid AS is_valid,
+                       ix.indisready AS is_ready,
+                       pg_relation_size(i.oid) AS size_bytes,
+                       pg_get_indexdef(i.oid) AS definition
+                FROM pg_index ix
+                JOIN pg_class i ON i.oid = ix.indexrelid
+                JOIN pg_class t ON t.oid = ix.indrelid
+                JOIN pg_am am ON am.oid = i.relam
+                WHERE t.relname = 'memory_nodes'
+                  AND am.amname IN ('hnsw', 'ivfflat')
+                ORDER BY i.relname
+                """
+            )
+        )
+        indexes = [dict(row._mapping) for row in result.all()]
+        
+        # 正在进行的索引构建
+        result = await db.execute(
+            text(
+                """
+                SELECT COALESCE(NULLIF(p.index_relid, 0)::regclass::text, '') AS index_name,
+                       p.phase,
+                       p.blocks_done,
+                       p.blocks_total,
+                       p.tuples_done,
+                       p.tuples_total
+                FROM pg_stat_progress_create_index p
+                JOIN pg_class t ON t.oid = p.relid
+                WHERE t.relname = 'memory_nodes'
+                """
+            )
+        )
+        build_progress = [dict(row._mapping) for row in result.all()]
+        
+        # 向量覆盖情况
+        result = await db.execute(
+            select(
+                func.count(MemoryNode.id),
+                func.count(MemoryNode.content_embedding),
+            ).where(MemoryNode.deleted_at.is_(None))
+        )
+        total_nodes, embedded_nodes = result.one()
+        
+        return {
+            "configured_type": settings.VECTOR_INDEX_TYPE,
+            "indexes": indexes,
+            "build_progress": build_progress,
+            "total_nodes": total_nodes or 0,
+            "embedded_nodes": embedded_nodes or 0,
+            "ef_search": settings.VECTOR_HNSW_EF_SEARCH,
+            "probes": settings.VECTOR_IVFFLAT_PROBES,
+        }
+    
+    async def create_index(
+        self,
+        index_type: Optional[str] = None,
+        replace: bool = False
+    ) -> str:
+        """
+        并发创建 ANN 索引
+        
+        CREATE INDEX CONCURRENTLY 不能在事务块中执行，因此使用独立的
+        AUTOCOMMIT 连接，而不是请求的数据库会话。
+        
+        Args:
+            index_type: 索引类型（默认取配置 VECTOR_INDEX_TYPE）
+            replace: 是否删除另一种类型的索引
+        
+        Returns:
+            创建的索引名称
+        """
+        index_type = self.validate_index_type(index_type or settings.VECTOR_INDEX_TYPE)
+        
+        async with async_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            
+            # 清理之前构建失败留下的无效索引
+            result = await conn.execute(
+                text(
+                    "SELECT ix.indisvalid FROM pg_index ix "
+                    "JOIN pg_class i ON i.oid = ix.indexrelid "
+                    "WHERE i.relname = :name"
+                ),
+                {"name": self.INDEX_NAMES[index_type]}
+            )
+            is_valid = result.scalar_one_or_none()
+            if is_valid is False:
+                await conn.execute(
+                    text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.INDEX_NAMES[index_type]}")
+                )
+            
+            await conn.execute(text(self.build_index_ddl(index_type, concurrently=True)))
+            
+            if replace:
+                for other_type, other_name in self.INDEX_NAMES.items():
+                    if other_type != index_type:
+                        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other_name}"))
+            
+            await conn.execute(text("ANALYZE memory_nodes"))
+        
+        return self.INDEX_NAMES[index_type]
+    
+    async def _top_k_ids(
+        self,
+        db: AsyncSession,
+        embedding: List[float],
+        k: int,
+        graph_id: Optional[UUID] = None,
+        exclude_id: Optional[UUID] = None
+    ) -> List[UUID]:
+        """按余弦距离取 Top-K 节点 ID"""
+        distance = MemoryNode.content_embedding.cosine_distance(embedding)
+        query = select(MemoryNode.id).where(
+            MemoryNode.deleted_at.is_(None),
+            MemoryNode.content_embedding.isnot(None)
+        )
+        if graph_id:
+            query = query.where(MemoryNode.graph_id == graph_id)
+        if exclude_id:
+            query = query.where(MemoryNode.id != exclude_id)
+        query = query.order_by(distance).limit(k)
+        
+        result = await db.execute(query)
+        return list(result.scalars().all())
+    
+    async def measure_recall(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        graph_id: Optional[UUID] = None,
+        sample_size: int = 20,
+        k: int = 10,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> Dict:
+        """
+        评估 ANN 索引相对精确搜索的召回率
+        
+        从用户的节点中随机抽样作为查询向量，分别执行索引搜索和
+        关闭索引扫描后的精确搜索，计算 recall@k。
+        
+        Args:
+            db: 数据库会话
+            user_id: 抽样节点所属用户
+            graph_id: 限制在特定知识图谱（可选）
+            sample_size: 抽样查询数量
+            k: Top-K
+            ef_search: HNSW 查询参数
+            probes: IVFFlat 查询参数
+        
+        Returns:
+            召回率和平均延迟
+        """
+        sample_query = select(MemoryNode.id, MemoryNode.content_embedding).where(
+            MemoryNode.user_id == user_id,
+            MemoryNode.deleted_at.is_(None),
+            MemoryNode.content_embedding.isnot(None)
+        )
+        if graph_id:
+            sample_query = sample_query.where(MemoryNode.graph_id == graph_id)
+        sample_query = sample_query.order_by(func.random()).limit(sample_size)
+        
+        result = await db.execute(sample_query)
+        samples = result.all()
+        
+        recalls = []
+        ann_times = []
+        exact_times = []
+        
+        for node_id, embedding in samples:
+            # ANN 搜索（允许使用索引）
+            await self.apply_search_params(db, ef_search=ef_search, probes=probes)
+            start = time.perf_counter()
+            ann_ids = await self._top_k_ids(db, embedding, k, graph_id, exclude_id=node_id)
+            ann_times.append(time.perf_counter() - start)
+            
+            # 精确搜索（关闭索引扫描，强制顺序扫描）
+            await db.execute(text("SELECT set_config('enable_indexscan', 'off', true)"))
+            start = time.perf_counter()
+            exact_ids = await self._top_k_ids(db, embedding, k, graph_id, exclude_id=node_id)
+            exact_times.append(time.perf_counter() - start)
+            await db.execute(text("SELECT set_config('enable_indexscan', 'on', true)"))
+            
+            if exact_ids:
+                recalls.append(len(set(ann_ids) & set(exact_ids)) / len(exact_ids))
+        
+        def _avg_ms(values: List[float]) -> float:
+            return round(sum(values) / len(values) * 1000, 3) if values else 0.0
+        
+        return {
+            "sample_size": len(samples),
+            "k": k,
+            "ef_search": int(ef_search or settings.VECTOR_HNSW_EF_SEARCH),
+            "probes": int(probes or settings.VECTOR_IVFFLAT_PROBES),
+            "recall": round(sum(recalls) / len(recalls), 4) if recalls else 0.0,
+            "min_recall": round(min(recalls), 4) if recalls else 0.0,
+            "ann_avg_ms": _avg_ms(ann_times),
+            "exact_avg_ms": _avg_ms(exact_times),
+        }
+
+
+# 创建全局向量索引服务实例
+vector_index_service = VectorIndexService()
@@ -3,15 +3,20 @@
 基于 PgVector 实现语义搜索
 """
 
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 from uuid import UUID
 
-from sqlalchemy import select, func, text
+import numpy as np
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 
-from app.models.memory_node import MemoryNode
+from app.models.memory_node import MemoryNode, node_load_options
 from app.services.ai_service import ai_service
+from app.services.clustering_service import ClusterMode, ClusteringEngine, clustering_engine
+from app.services.embedding_backfill_service import build_embedding_text, embedding_backfill_service
+from app.services.vector_index_service import vector_index_service
 
 
 class VectorSearchService:
@@ -24,7 +29,9 @@ class VectorSearchService:
         graph_id: Optional[UUID] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
     ) -> List[Tuple[MemoryNode, float]]:
         """
         基于文本查询搜索相似节点
@@ -36,6 +43,8 @@ class VectorSearchService:
             node_type: 限制节点类型（可选）
             limit: 返回结果数量
             similarity_threshold: 相似度阈值（0-1）
+            ef_search: HNSW 查询候选集大小（可选，越大召回越高）
+            probes: IVFFlat 探测聚类数（可选，越大召回越高）
             
         Returns:
             (节点, 相似度分数) 元组列表，按相似度降序排列
@@ -49,11 +58,47 @@ class VectorSearchService:
                 detail=f"生成查询向量失败: {str(e)}"
             )
         
-        # 构建查询
+        return await self._search_by_embedding(
+            db=db,
+            embedding=query_embedding,
+            graph_id=graph_id,
+            node_type=node_type,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            ef_search=ef_search,
+            probes=probes,
+        )
+    
+    async def _search_by_embedding(
+        self,
+        db: AsyncSession,
+        embedding: List[float],
+        graph_id: Optional[UUID] = None,
+        node_type: Optional[str] = None,
+        limit: int = 10,
+        similarity_threshold: float = 0.7,
+        exclude_id: Optional[UUID] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ) -> List[Tuple[MemoryNode, float]]:
+        """
+        按向量执行 ANN 搜索
+        
+        查询写成 ORDER BY content_embedding <=> :q LIMIT k 的形式，
+        以便规划器使用 HNSW / IVFFlat 索引；相似度阈值在 Top-K 结果上过滤，
+        与"先过滤阈值再取 Top-K"结果一致。
+        
+        注意：带 graph_id / node_type 过滤时，ANN 索引是先取候选再过滤，
+        结果可能少于 limit，可通过调大 ef_search / probes 提升召回。
+        """
+        distance = MemoryNode.content_embedding.cosine_distance(embedding)
+        
+        # 构建查询（余弦相似度 = 1 - 余弦距离）
         query = select(
             MemoryNode,
-            # 使用余弦相似度（1 - 余弦距离）
-            (1 - MemoryNode.content_embedding.cosine_distance(query_embedding)).label("similarity")
+            (1 - distance).label("similarity")
+        ).options(
+            node_load_options("search")
         ).where(
             MemoryNode.deleted_at.is_(None),
             MemoryNode.content_embedding.isnot(None)
@@ -66,22 +111,24 @@ class VectorSearchService:
         if node_type:
             query = query.where(MemoryNode.node_type == node_type)
         
-        # 添加相似度阈值过滤
-        query = query.having(
-            text(f"similarity >= {similarity_threshold}")
-        )
+        if exclude_id:
+            query = query.where(MemoryNode.id != exclude_id)
         
-        # 按相似度降序排列
-        query = query.order_by(text("similarity DESC"))
+        # 按距离升序排列（命中 ANN 索引），限制结果数量
+        query = query.order_by(distance).limit(limit)
         
-        # 限制结果数量
-        query = query.limit(limit)
+        # 设置当前事务的 ANN 查询参数
+        await vector_index_service.apply_search_params(db, ef_search=ef_search, probes=probes)
         
         # 执行查询
         result = await db.execute(query)
         rows = result.all()
         
-        return [(row[0], row[1]) for row in rows]
+        return [
+            (row[0], float(row[1]))
+            for row in rows
+            if row[1] is not None and row[1] >= similarity_threshold
+        ]
     
     async def find_similar_nodes_by_id(
         self,
@@ -90,7 +137,9 @@ class VectorSearchService:
         graph_id: Optional[UUID] = None,
         node_type: Optional[str] = None,
         limit: int = 10,
-        similarity_threshold: float = 0.7
+        similarity_threshold: float = 0.7,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
     ) -> List[Tuple[MemoryNode, float]]:
         """
         查找与指定节点相似的其他节点
@@ -102,66 +151,46 @@ class VectorSearchService:
             node_type: 限制节点类型（可选）
             limit: 返回结果数量
             similarity_threshold: 相似度阈值（0-1）
+            ef_search: HNSW 查询候选集大小（可选）
+            probes: IVFFlat 探测聚类数（可选）
             
         Returns:
             (节点, 相似度分数) 元组列表，按相似度降序排列
         """
-        # 获取参考节点
+        # 获取参考节点的向量
         result = await db.execute(
-            select(MemoryNode).where(
+            select(MemoryNode.id, MemoryNode.content_embedding).where(
                 MemoryNode.id == node_id,
                 MemoryNode.deleted_at.is_(None)
             )
         )
-        reference_node = result.scalar_one_or_none()
+        reference = result.one_or_none()
         
-        if not reference_node:
+        if not reference:
             raise HTTPException(status_code=404, detail="参考节点不存在")
         
-        if not reference_node.content_embedding:
+        if reference.content_embedding is None:
             raise HTTPException(status_code=400, detail="参考节点没有向量嵌入")
         
-        # 构建查询
-        query = select(
-            MemoryNode,
-            (1 - MemoryNode.content_embedding.cosine_distance(
-                reference_node.content_embedding
-            )).label("similarity")
-        ).where(
-            MemoryNode.deleted_at.is_(None),
-            MemoryNode.content_embedding.isnot(None),
-            MemoryNode.id != node_id  # 排除自己
-        )
-        
-        # 添加过滤条件
-        if graph_id:
-            query = query.where(MemoryNode.graph_id == graph_id)
-        
-        if node_type:
-            query = query.where(MemoryNode.node_type == node_type)
-        
-        # 添加相似度阈值过滤
-        query = query.having(
-            text(f"similarity >= {similarity_threshold}")
+        return await self._search_by_embedding(
+            db=db,
+            embedding=reference.content_embedding,
+            graph_id=graph_id,
+            node_type=node_type,
+            limit=limit,
+            similarity_threshold=similarity_threshold,
+            exclude_id=node_id,  # 排除自己
+            ef_search=ef_search,
+            probes=probes,
         )
-        
-        # 按相似度降序排列
-        query = query.order_by(text("similarity DESC"))
-        
-        # 限制结果数量
-        query = query.limit(limit)
-        
-        # 执行查询
-        result = await db.execute(query)
-        rows = result.all()
-        
-        return [(row[0], row[1]) for row in rows]
     
     async def recommend_related_nodes(
         self,
         db: AsyncSession,
         node_id: UUID,
-        limit: int = 5
+        limit: int = 5,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
     ) -> List[Tuple[MemoryNode, float]]:
         """
         为指定节点推荐相关节点（用于学习路径推荐）
@@ -170,93 +199,149 @@ class VectorSearchService:
             db: 数据库会话
             node_id: 节点ID
             limit: 推荐数量
+            ef_search: HNSW 查询候选集大小（可选）
+            probes: IVFFlat 探测聚类数（可选）
             
         Returns:
             (节点, 相似度分数) 元组列表
         """
-        # 获取节点
+        # 获取节点所属图谱
         result = await db.execute(
-            select(MemoryNode).where(
+            select(MemoryNode.graph_id).where(
                 MemoryNode.id == node_id,
                 MemoryNode.deleted_at.is_(None)
             )
         )
-        node = result.scalar_one_or_none()
+        graph_id = result.scalar_one_or_none()
         
-        if not node:
+        if not graph_id:
             raise HTTPException(status_code=404, detail="节点不存在")
         
         # 在同一知识图谱中查找相似节点
         similar_nodes = await self.find_similar_nodes_by_id(
             db=db,
             node_id=node_id,
-            graph_id=node.graph_id,
+            graph_id=graph_id,
             limit=limit,
-            similarity_threshold=0.6  # 降低阈值以获得更多推荐
+            similarity_threshold=0.6,  # 降低阈值以获得更多推荐
+            ef_search=ef_search,
+            probes=probes
         )
         
         return similar_nodes
     
-    async def cluster_nodes_by_similarity(
+    async def load_graph_embeddings(
         self,
         db: AsyncSession,
-        graph_id: UUID,
-        similarity_threshold: float = 0.8
-    ) -> List[List[UUID]]:
+        graph_id: UUID
+    ) -> Tuple[List[UUID], np.ndarray]:
         """
-        基于相似度对节点进行聚类
+        一次性载入知识图谱中所有节点的向量嵌入
+        
+        只查询 id 和 content_embedding 两列，避免加载整行 ORM 对象。
         
         Args:
             db: 数据库会话
             graph_id: 知识图谱ID
-            similarity_threshold: 相似度阈值
-            
+        
         Returns:
-            节点ID聚类列表
+            (节点ID列表, (N, D) float32 向量矩阵)
         """
-        # 获取图谱中所有有向量嵌入的节点
         result = await db.execute(
-            select(MemoryNode).where(
+            select(MemoryNode.id, MemoryNode.content_embedding).where(
                 MemoryNode.graph_id == graph_id,
                 MemoryNode.deleted_at.is_(None),
                 MemoryNode.content_embedding.isnot(None)
-            )
+            ).order_by(MemoryNode.created_at, MemoryNode.id)
         )
-        nodes = result.scalars().all()
+        rows = result.all()
+        
+        if not rows:
+            return [], np.empty((0, 0), dtype=np.float32)
         
-        if not nodes:
-            return []
+        node_ids = [row[0] for row in rows]
+        matrix = np.stack([np.asarray(row[1], dtype=np.float32) for row in rows])
+        return node_ids, matrix
+    
+    def iter_clusters(
+        self,
+        node_ids: List[UUID],
+        matrix: np.ndarray,
+        similarity_threshold: float = 0.8,
+        mode: ClusterMode = ClusterMode.GREEDY,
+        n_clusters: Optional[int] = None,
+        tile_size: Optional[int] = None
+    ) -> Iterator[List[UUID]]:
+        """
+        对已载入的向量矩阵聚类，逐个产出簇
         
-        # 简单的聚类算法：贪心聚类
-        clusters = []
-        visited = set()
+        纯 CPU 计算，不访问数据库，可在线程池中迭代。
         
-        for node in nodes:
-            if node.id in visited:
-                continue
-            
-            # 创建新簇
-            cluster = [node.id]
-            visited.add(node.id)
-            
-            # 查找相似节点
-            similar_nodes = await self.find_similar_nodes_by_id(
-                db=db,
-                node_id=node.id,
-                graph_id=graph_id,
-                limit=100,  # 查找所有相似节点
-                similarity_threshold=similarity_threshold
-            )
-            
-            for similar_node, _ in similar_nodes:
-                if similar_node.id not in visited:
-                    cluster.append(similar_node.id)
-                    visited.add(similar_node.id)
+        Args:
+            node_ids: 节点ID列表（与矩阵行一一对应）
+            matrix: 向量矩阵
+            similarity_threshold: 相似度阈值
+            mode: 聚类模式
+            n_clusters: 簇数（仅 kmeans 模式）
+            tile_size: 相似度分块大小
+        
+        Yields:
+            节点ID簇（只包含多个节点的簇）
+        """
+        if not node_ids:
+            return
+        
+        engine = ClusteringEngine(tile_size) if tile_size else clustering_engine
+        for cluster in engine.cluster(
+            matrix,
+            mode=mode,
+            similarity_threshold=similarity_threshold,
+            n_clusters=n_clusters,
+            min_cluster_size=2
+        ):
+            yield [node_ids[index] for index in cluster]
+    
+    async def cluster_nodes_by_similarity(
+        self,
+        db: AsyncSession,
+        graph_id: UUID,
+        similarity_threshold: float = 0.8,
+        mode: ClusterMode = ClusterMode.GREEDY,
+        n_clusters: Optional[int] = None,
+        tile_size: Optional[int] = None
+    ) -> List[List[UUID]]:
+        """
+        基于相似度对节点进行聚类
+        
+        一次查询载入全部向量，在进程内用 NumPy 分块计算余弦相似度，
+        计算在线程池中执行，不阻塞事件循环。
+        
+        Args:
+            db: 数据库会话
+            graph_id: 知识图谱ID
+            similarity_threshold: 相似度阈值
+            mode: 聚类模式 (greedy, connected, agglomerative, kmeans)
+            n_clusters: 簇数（仅 kmeans 模式）
+            tile_size: 相似度分块大小
             
-            if len(cluster) > 1:  # 只保留包含多个节点的簇
-                clusters.append(cluster)
+        Returns:
+            节点ID聚类列表
+        """
+        node_ids, matrix = await self.load_graph_embeddings(db, graph_id)
         
-        return clusters
+        try:
+            return await run_in_threadpool(
+                lambda: list(self.iter_clusters(
+                    node_ids,
+                    matrix,
+                    similarity_threshold=similarity_threshold,
+                    mode=mode,
+                    n_clusters=n_clusters,
+                    tile_size=tile_size
+                ))
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     
     async def update_node_embedding(
         self,
@@ -273,9 +358,9 @@ class VectorSearchService:
         Returns:
             更新后的节点
         """
-        # 获取节点
+        # 获取节点（向量列只写不读）
         result = await db.execute(
-            select(MemoryNode).where(
+            select(MemoryNode).options(node_load_options("full")).where(
                 MemoryNode.id == node_id,
                 MemoryNode.deleted_at.is_(None)
             )
@@ -286,21 +371,7 @@ class VectorSearchService:
             raise HTTPException(status_code=404, detail="节点不存在")
         
         # 构建嵌入文本（标题 + 摘要 + 内容）
-        embedding_text_parts = [node.title]
-        
-        if node.summary:
-            embedding_text_parts.append(node.summary)
-        
-        # 从 content_data 中提取文本内容
-        if isinstance(node.content_data, dict):
-            if "question" in node.content_data:
-                embedding_text_parts.append(node.content_data["question"])
-            if "answer" in node.content_data:
-                embedding_text_parts.append(node.content_data["answer"])
-            if "content" in node.content_data:
-                embedding_text_parts.append(str(node.content_data["content"]))
-        
-        embedding_text = " ".join(embedding_text_parts)
+        embedding_text = build_embedding_text(node.title, node.summary, node.content_data)
         
         # 生成向量嵌入
         try:
@@ -319,40 +390,24 @@ class VectorSearchService:
     async def batch_update_embeddings(
         self,
         db: AsyncSession,
-        graph_id: Optional[UUID] = None
+        graph_id: Optional[UUID] = None,
+        restart: bool = False
     ) -> int:
         """
         批量更新节点的向量嵌入
         
+        委托给回填流水线：批量请求嵌入接口、批量写回，并支持从检查点恢复。
+        
         Args:
             db: 数据库会话
             graph_id: 限制在特定知识图谱（可选）
+            restart: 忽略检查点，从头开始
             
         Returns:
             更新的节点数量
         """
-        # 查询需要更新的节点（没有向量嵌入的节点）
-        query = select(MemoryNode).where(
-            MemoryNode.deleted_at.is_(None),
-            MemoryNode.content_embedding.is_(None)
-        )
-        
-        if graph_id:
-            query = query.where(MemoryNode.graph_id == graph_id)
-        
-        result = await db.execute(query)
-        nodes = result.scalars().all()
-        
-        updated_count = 0
-        for node in nodes:
-            try:
-                await self.update_node_embedding(db, node.id)
-                updated_count += 1
-            except Exception as e:
-                print(f"更新节点 {node.id} 的向量嵌入失败: {str(e)}")
-                continue
-        
-        return updated_count
+        report = await embedding_backfill_service.run(db, graph_id=graph_id, restart=restart)
+        return report["updated_count"]
 
 
 # 创建全局向量搜索服务实例
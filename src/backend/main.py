@@ -13,6 +13,11 @@ from fastapi.staticfiles import StaticFiles
 
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.core.database import async_engine
+from app.core.http_clients import http_clients
+from app.services.graph_layout_service import GraphLayoutService
+from app.services.image_processing_service import ImageProcessingService
+from app.services.ocr_job_service import ocr_job_queue
 
 
 @asynccontextmanager
@@ -24,10 +29,21 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     print(f"🔧 调试模式: {settings.DEBUG}")
     print(f"🗄️  数据库: {settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}")
     
+    # 创建外部服务的共享 HTTP 连接池
+    await http_clients.start()
+    
+    # 启动 OCR 任务队列的工作协程
+    if settings.OCR_JOB_WORKERS_ENABLED:
+        ocr_job_queue.start(async_engine)
+    
     yield
     
     # 关闭时执行
     print("👋 NeuralNote API 关闭中...")
+    await ocr_job_queue.stop()
+    await http_clients.aclose()
+    GraphLayoutService.shutdown()
+    ImageProcessingService.shutdown()
 
 
 # 创建 FastAPI 应用实例
@@ -0,0 +1,85 @@
+"""
+迁移已上传的文件到内容寻址存储
+把 file_blobs 中没有记录的上传文件按内容 SHA-256 重新存储，内容相同的文件只保留一份，
+逐批打印进度，最后打印节省的存储空间
+
+用法（在 src/backend 目录下）:
+    python scripts/backfill_file_blobs.py
+    python scripts/backfill_file_blobs.py --report-only
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.services.file_storage import file_storage_service  # noqa: E402
+
+
+def format_bytes(size: int) -> str:
+    """把字节数格式化为 MB"""
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def print_progress(progress: Dict) -> None:
+    """打印一批提交后的进度"""
+    print(
+        f"  已处理 {progress['processed']:>8}  新存储 {progress['stored']:>8}  去重 {progress['deduplicated']:>8}  "
+        f"缺失 {progress['missing']:>6}  释放 {format_bytes(progress['freed_bytes'])}"
+    )
+
+
+def print_report(report: Dict) -> None:
+    """打印存储统计"""
+    print(f"上传记录 {report['uploads']} 条，共 {format_bytes(report['logical_bytes'])}")
+    print(
+        f"内容寻址存储 {report['blobs']} 个文件（{report['blob_references']} 个引用），"
+        f"共 {format_bytes(report['blob_bytes'])}；未迁移 {report['legacy_files']} 个文件，"
+        f"共 {format_bytes(report['legacy_bytes'])}"
+    )
+    print(
+        f"实际占用 {format_bytes(report['stored_bytes'])}，节省 {format_bytes(report['saved_bytes'])}，"
+        f"去重比 {report['dedup_ratio']:.2f}"
+    )
+
+
+async def run(database_url: str, batch_size: int, report_only: bool) -> None:
+    """迁移文件并打印存储统计"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    try:
+        async with session_factory() as db:
+            if not report_only:
+                print(f"迁移到内容寻址存储（{'OSS' if file_storage_service.use_oss else '本地存储'}）")
+                stats = await file_storage_service.backfill_blobs(db, batch_size=batch_size, on_progress=print_progress)
+                print(
+                    f"处理 {stats['processed']} 条记录：新存储 {stats['stored']} 个文件，去重 {stats['deduplicated']} 个，"
+                    f"缺失 {stats['missing']} 个；删除原文件 {stats['removed_files']} 个，"
+                    f"释放 {format_bytes(stats['freed_bytes'])}"
+                )
+            print_report(await file_storage_service.storage_report(db))
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="迁移已上传的文件到内容寻址存储")
+    parser.add_argument("--batch-size", type=int, default=100, help="每批处理的上传记录数")
+    parser.add_argument("--report-only", action="store_true", help="只打印存储统计，不迁移")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.database_url, args.batch_size, args.report_only))
+
+
+if __name__ == "__main__":
+    main()
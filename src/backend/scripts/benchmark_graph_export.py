@@ -0,0 +1,227 @@
+"""
+图谱导出性能基准
+生成指定规模的图谱（节点、节点标签、关联和复习记录），逐个格式流式导出并丢弃输出，
+测量行数、字节数、耗时和进程的峰值内存（每种组合在独立子进程中导出，峰值互不影响）
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_graph_export.py --nodes 200000
+    python scripts/benchmark_graph_export.py --nodes 20000 --with-embeddings --embeddings exclude,binary
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import KnowledgeGraph, KnowledgeTag, MemoryNode, User  # noqa: E402
+from app.services.graph_export_service import (  # noqa: E402
+    EMBEDDING_MODES,
+    EXPORT_FORMATS,
+    PARQUET_AVAILABLE,
+    GraphExportService,
+    export_tables,
+)
+
+
+async def seed_graph(db: AsyncSession, user_id, graph_id, nodes: int, review_logs: int, with_embeddings: bool) -> None:
+    """用 generate_series 批量生成节点（每个节点一个标签、一条关联和 review_logs 条复习记录）"""
+    embedding = (
+        "(SELECT array_agg(random())::vector(1536) FROM generate_series(1, 1536) WHERE i > 0)"
+        if with_embeddings else "NULL"
+    )
+    await db.execute(
+        text(f"""
+            INSERT INTO memory_nodes (
+                id, graph_id, user_id, node_type, title, summary, content_data, content_embedding,
+                position_x, position_y, position_z, mastery_level, review_stats
+            )
+            SELECT
+                gen_random_uuid(), :graph_id, :user_id, 'QUESTION', '基准节点 ' || i, '摘要 ' || i,
+                jsonb_build_object('question', repeat('题目内容', 20), 'answer', repeat('答案', 40)),
+                {embedding}, random() * 1000, random() * 1000, 0,
+                (ARRAY['not_started', 'learning', 'familiar', 'proficient', 'mastered'])[1 + i % 5],
+                jsonb_build_object('total_reviews', i % 13)
+            FROM generate_series(1, :count) AS i
+        """),
+        {"graph_id": graph_id, "user_id": user_id, "count": nodes},
+    )
+    await db.execute(
+        text("""
+            INSERT INTO knowledge_tags (id, graph_id, name, color, importance_score, mastery_rate, node_count)
+            SELECT gen_random_uuid(), :graph_id, '基准标签 ' || i, '#1890ff', 0.5, 0, 0
+            FROM generate_series(1, 100) AS i
+        """),
+        {"graph_id": graph_id},
+    )
+    await db.execute(
+        text("""
+            INSERT INTO node_tags (id, node_id, tag_id, confidence, is_manual)
+            SELECT gen_random_uuid(), n.id, t.ids[1 + abs(hashtext(n.id::text)) % 100], 1.0, false
+            FROM memory_nodes n,
+                 (SELECT array_agg(id) AS ids FROM knowledge_tags WHERE graph_id = :graph_id) t
+            WHERE n.graph_id = :graph_id
+        """),
+        {"graph_id": graph_id},
+    )
+    # 按标题序号把节点连成一条链
+    await db.execute(
+        text("""
+            INSERT INTO node_relations (id, graph_id, source_id, target_id, relation_type, strength, is_auto_generated)
+            SELECT gen_random_uuid(), :graph_id, id, next_id, 'RELATED', 50, false
+            FROM (
+                SELECT id, lead(id) OVER (ORDER BY created_at, id) AS next_id
+                FROM memory_nodes WHERE graph_id = :graph_id
+            ) chain
+            WHERE next_id IS NOT NULL
+        """),
+        {"graph_id": graph_id},
+    )
+    await db.execute(
+        text("""
+            INSERT INTO review_logs (
+                id, node_id, user_id, review_mode, mastery_feedback, time_spent_seconds, node_state_snapshot
+            )
+            SELECT
+                gen_random_uuid(), n.id, :user_id, 'spaced',
+                (ARRAY['remembered', 'partial', 'forgot'])[1 + k % 3], 10 + k,
+                jsonb_build_object('quality', k % 6)
+            FROM memory_nodes n, generate_series(1, :count) AS k
+            WHERE n.graph_id = :graph_id
+        """),
+        {"graph_id": graph_id, "user_id": user_id, "count": review_logs},
+    )
+    await db.commit()
+
+
+async def count_rows(db: AsyncSession, graph_id) -> int:
+    """导出的总行数"""
+    total = 0
+    for _, stmt, _ in export_tables(graph_id):
+        total += (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar_one()
+    return total
+
+
+def peak_rss_mb() -> float:
+    """进程的峰值常驻内存（MB，Linux 下 ru_maxrss 单位为 KB）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _export(database_url: str, graph_id, export_format: str, embeddings: str) -> Tuple[int, float]:
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    size = 0
+    started = time.perf_counter()
+    try:
+        with open("/dev/null", "wb") as sink:
+            async for chunk in GraphExportService.stream(engine, graph_id, export_format, embeddings):
+                size += len(chunk)
+                sink.write(chunk)
+    finally:
+        await engine.dispose()
+    return size, time.perf_counter() - started
+
+
+def export_in_process(database_url: str, graph_id, export_format: str, embeddings: str, results) -> None:
+    """子进程：导出一次，返回字节数、耗时、导出前后的峰值内存"""
+    before = peak_rss_mb()
+    size, seconds = asyncio.run(_export(database_url, graph_id, export_format, embeddings))
+    results.put((size, seconds, before, peak_rss_mb()))
+
+
+def run_export(database_url: str, graph_id, export_format: str, embeddings: str) -> Tuple[int, float, float, float]:
+    """在独立子进程中导出（每次导出的峰值内存单独计算）"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(
+        target=export_in_process, args=(database_url, graph_id, export_format, embeddings, results)
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+async def run(
+    database_url: str,
+    nodes: int,
+    review_logs: int,
+    with_embeddings: bool,
+    formats: List[str],
+    embedding_modes: List[str]
+) -> None:
+    """生成图谱、逐个组合导出并清理"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async with session_factory() as db:
+        user = User(
+            email=f"benchmark-{time.time_ns()}@neuralnote.local",
+            username=f"benchmark_{time.time_ns()}",
+            password_hash="-",
+        )
+        db.add(user)
+        await db.flush()
+        graph = KnowledgeGraph(user_id=user.id, name="导出基准")
+        db.add(graph)
+        await db.commit()
+        user_id, graph_id = user.id, graph.id
+        
+        try:
+            started = time.perf_counter()
+            await seed_graph(db, user_id, graph_id, nodes, review_logs, with_embeddings)
+            await db.execute(text("ANALYZE memory_nodes, node_tags, node_relations, review_logs"))
+            rows = await count_rows(db, graph_id)
+            print(f"生成 {rows} 行（{nodes} 个节点），耗时 {time.perf_counter() - started:.1f} s")
+            
+            print(
+                f"{'格式':>8} {'向量':>8} {'大小 (MB)':>10} {'耗时 (s)':>9} {'行/秒':>10} "
+                f"{'导出前内存 (MB)':>16} {'峰值内存 (MB)':>14}"
+            )
+            for export_format in formats:
+                for embeddings in embedding_modes:
+                    size, seconds, before, peak = run_export(database_url, graph_id, export_format, embeddings)
+                    print(
+                        f"{export_format:>8} {embeddings:>8} {size / 1024 / 1024:>10.1f} {seconds:>9.2f} "
+                        f"{rows / seconds:>10.0f} {before:>16.1f} {peak:>14.1f}"
+                    )
+        finally:
+            await db.rollback()
+            await db.execute(delete(MemoryNode).where(MemoryNode.graph_id == graph_id))
+            await db.execute(delete(KnowledgeTag).where(KnowledgeTag.graph_id == graph_id))
+            await db.execute(delete(KnowledgeGraph).where(KnowledgeGraph.id == graph_id))
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="图谱导出性能基准")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--nodes", type=int, default=200000, help="节点数（总行数约为节点数 x (3 + 复习记录数)）")
+    parser.add_argument("--review-logs", type=int, default=2, help="每个节点的复习记录数")
+    parser.add_argument("--with-embeddings", action="store_true", help="为节点生成向量（写入 HNSW 索引较慢）")
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS), help="导出格式，逗号分隔")
+    parser.add_argument("--embeddings", default="exclude", help=f"向量导出方式，逗号分隔: {', '.join(EMBEDDING_MODES)}")
+    args = parser.parse_args()
+    
+    formats = [name for name in args.formats.split(",") if name]
+    if "parquet" in formats and not PARQUET_AVAILABLE:
+        parser.error("未安装 pyarrow，不能测量 Parquet 导出")
+    embedding_modes = [mode for mode in args.embeddings.split(",") if mode]
+    asyncio.run(run(args.database_url, args.nodes, args.review_logs, args.with_embeddings, formats, embedding_modes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+图谱布局性能基准
+在随机生成的分簇图谱上测量力导向布局的耗时（从零开始布局和在已有布局上增量调整），
+指定 --graph-id 时再对数据库中的图谱测量加载、布局（进程池）和写回坐标的耗时
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_graph_layout.py --nodes 10000 50000
+    python scripts/benchmark_graph_layout.py --nodes 10000 --graph-id <图谱 ID>
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.services.graph_layout_service import GraphLayoutService, force_directed_layout  # noqa: E402
+
+
+def clustered_graph(node_count: int, degree: int, rng: np.random.Generator):
+    """生成分簇图谱：每簇约 200 个节点，95% 的关联在簇内"""
+    clusters = max(1, node_count // 200)
+    cluster_of = rng.integers(0, clusters, size=node_count)
+    members = np.argsort(cluster_of, kind="stable")
+    starts = np.searchsorted(cluster_of[members], np.arange(clusters))
+    sizes = np.bincount(cluster_of, minlength=clusters)
+
+    sources = rng.integers(0, node_count, size=node_count * degree)
+    cluster = cluster_of[sources]
+    targets = members[starts[cluster] + (rng.random(sources.size) * sizes[cluster]).astype(np.intp)]
+    cross = rng.random(sources.size) < 0.05
+    targets[cross] = rng.integers(0, node_count, size=int(cross.sum()))
+    keep = sources != targets
+    return sources[keep], targets[keep], rng.integers(20, 101, size=int(keep.sum())).astype(np.float64)
+
+
+def edge_ratio(positions: np.ndarray, sources: np.ndarray, targets: np.ndarray, rng: np.random.Generator) -> float:
+    """关联的平均长度与随机节点对平均距离之比（越小说明相连的节点越靠近）"""
+    edge = np.linalg.norm(positions[sources] - positions[targets], axis=1).mean()
+    pairs = rng.integers(0, len(positions), size=(2, 20000))
+    return edge / np.linalg.norm(positions[pairs[0]] - positions[pairs[1]], axis=1).mean()
+
+
+def benchmark_synthetic(node_counts: List[int], dimensions: List[int], iterations: int, degree: int) -> None:
+    """在随机图谱上测量布局耗时"""
+    print(f"{'节点数':>8} {'关联数':>8} {'维度':>4} {'布局(s)':>9} {'每轮(ms)':>9} {'增量(s)':>9} {'边长比':>7}")
+    for node_count in node_counts:
+        rng = np.random.default_rng(0)
+        sources, targets, strengths = clustered_graph(node_count, degree, rng)
+        for dimension in dimensions:
+            started = time.perf_counter()
+            positions = force_directed_layout(
+                np.zeros((node_count, dimension)), np.zeros(node_count, dtype=bool),
+                sources, targets, strengths, iterations=iterations, seed=0
+            )
+            cold = time.perf_counter() - started
+
+            # 增量：已有布局上加入 1% 的新节点，迭代次数减半
+            placed = rng.random(node_count) >= 0.01
+            started = time.perf_counter()
+            force_directed_layout(
+                np.where(placed[:, None], positions, 0.0), placed,
+                sources, targets, strengths, iterations=iterations // 2, seed=1
+            )
+            warm = time.perf_counter() - started
+
+            print(
+                f"{node_count:>8} {sources.size:>8} {dimension:>4} {cold:>9.2f} "
+                f"{cold / max(iterations, 1) * 1000:>9.1f} {warm:>9.2f} {edge_ratio(positions, sources, targets, rng):>7.3f}"
+            )
+
+
+async def benchmark_database(database_url: str, graph_id: str, iterations: int, dimension: int, commit: bool) -> None:
+    """对数据库中的图谱执行一次完整布局（默认回滚，不修改坐标）"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            params = GraphLayoutService.resolve_params(overrides={"iterations": iterations, "dimensions": dimension})
+            stats = await GraphLayoutService.compute(db, graph_id, params)
+            if commit:
+                await db.commit()
+            else:
+                await db.rollback()
+    finally:
+        GraphLayoutService.shutdown()
+        await engine.dispose()
+
+    print(
+        f"图谱 {graph_id}: {stats['node_count']} 个节点，{stats['relation_count']} 条关联，{dimension}D {iterations} 轮；"
+        f"加载 {stats['load_ms']:.0f} ms，布局 {stats['layout_ms']:.0f} ms（含进程池启动），"
+        f"写回 {stats['save_ms']:.0f} ms{'' if commit else '（已回滚）'}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="图谱布局性能基准")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 50000], help="随机图谱的节点数")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=[2, 3], help="布局维度")
+    parser.add_argument("--iterations", type=int, default=50, help="迭代次数")
+    parser.add_argument("--degree", type=int, default=2, help="每个节点的平均关联数")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--graph-id", default=None, help="同时测量数据库中的图谱（可选）")
+    parser.add_argument("--commit", action="store_true", help="提交数据库图谱的布局结果（默认回滚）")
+    args = parser.parse_args()
+
+    benchmark_synthetic(args.nodes, args.dimensions, args.iterations, args.degree)
+    if args.graph_id:
+        asyncio.run(benchmark_database(
+            args.database_url, args.graph_id, args.iterations, args.dimensions[0], args.commit
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+图片预处理性能基准
+在模拟的手机拍照（4032x3024 JPEG，带 EXIF 方向）上测量：
+1. OCR 请求的数据量：原图与预处理后的灰度图（base64 编码后）的字节数，以及按上行带宽估算的传输时间
+2. 单张图片的预处理耗时
+3. 进程池的吞吐量（张/秒，以及每个 CPU 核心的吞吐量）
+指定 --baidu 时再调用百度 OCR 实测原图和预处理后图片的识别耗时（需要配置百度 OCR）
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_image_preprocessing.py --images 16 --workers 1 2 4
+    python scripts/benchmark_image_preprocessing.py --images 4 --baidu
+"""
+
+import argparse
+import asyncio
+import base64
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.core.http_clients import http_clients  # noqa: E402
+from app.services.image_processing_service import preprocess_image  # noqa: E402
+from app.services.ocr_service import ocr_service  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    """百分位数"""
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def phone_photo(seed: int) -> bytes:
+    """生成模拟的手机拍照：纸面底色、多行文字和传感器噪声，EXIF 方向为顺时针旋转 90 度"""
+    rng = np.random.default_rng(seed)
+    width, height = 4032, 3024
+    page = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(page)
+    for row, y in enumerate(range(200, height - 200, 90)):
+        text = f"{seed:03d}-{row:02d} x^2 + {row}x - {seed} = 0   " * 3
+        draw.text((240, y), text, fill=30, font_size=56)
+    
+    gray = np.asarray(page, dtype=np.int16)
+    noise = rng.normal(0, 6, size=(height, width, 3))
+    tint = np.array([8, 4, -6])
+    pixels = np.clip(gray[:, :, None] + tint + noise, 0, 255).astype(np.uint8)
+    
+    output = BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    Image.fromarray(pixels, "RGB").save(output, format="JPEG", quality=92, exif=exif)
+    return output.getvalue()
+
+
+def preprocess_args(path: Path) -> tuple:
+    """preprocess_image 的参数（使用配置中的参数）"""
+    return (
+        str(path),
+        settings.IMAGE_OCR_MAX_SIDE,
+        settings.IMAGE_OCR_JPEG_QUALITY,
+        settings.IMAGE_THUMBNAIL_SIZES,
+        settings.IMAGE_THUMBNAIL_WEBP_QUALITY,
+    )
+
+
+def prepare(directory: Path, photos: List[bytes]) -> List[Path]:
+    """在空目录中写入原图"""
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    paths = []
+    for i, photo in enumerate(photos):
+        path = directory / f"photo{i:03d}.jpg"
+        path.write_bytes(photo)
+        paths.append(path)
+    return paths
+
+
+def benchmark_payload(paths: List[Path], uplink_mbps: float) -> None:
+    """对比 OCR 请求的数据量和单张预处理耗时"""
+    original_bytes, reduced_bytes, thumbnail_bytes, elapsed_ms, encode_ms = [], [], [], [], []
+    for path in paths:
+        result = preprocess_image(*preprocess_args(path))
+        elapsed_ms.append(result["elapsed_ms"])
+        
+        original = path.read_bytes()
+        reduced = (path.parent / result["ocr"]["filename"]).read_bytes()
+        started = time.perf_counter()
+        original_bytes.append(len(base64.b64encode(original)))
+        encode_ms.append((time.perf_counter() - started) * 1000)
+        reduced_bytes.append(len(base64.b64encode(reduced)))
+        thumbnail_bytes.append(sum(thumbnail["bytes"] for thumbnail in result["thumbnails"].values()))
+    
+    def seconds(size: float) -> float:
+        return size * 8 / (uplink_mbps * 1_000_000)
+    
+    original_mean = float(np.mean(original_bytes))
+    reduced_mean = float(np.mean(reduced_bytes))
+    print(f"OCR 请求数据量（base64，{len(paths)} 张平均，上行带宽 {uplink_mbps:g} Mbit/s 估算传输时间）:")
+    print(f"  原图          {original_mean / 1024 / 1024:8.2f} MB  传输 {seconds(original_mean):6.2f} s  "
+          f"base64 编码 {np.mean(encode_ms):.1f} ms")
+    print(f"  预处理后      {reduced_mean / 1024 / 1024:8.2f} MB  传输 {seconds(reduced_mean):6.2f} s  "
+          f"减少 {1 - reduced_mean / original_mean:.1%}")
+    print(f"  缩略图合计    {np.mean(thumbnail_bytes) / 1024:8.1f} KB（{', '.join(map(str, settings.IMAGE_THUMBNAIL_SIZES))}）")
+    print(f"单张预处理耗时: p50 {percentile(elapsed_ms, 50):.0f} ms  p95 {percentile(elapsed_ms, 95):.0f} ms")
+
+
+def benchmark_throughput(directory: Path, photos: List[bytes], worker_counts: List[int]) -> None:
+    """测量进程池的吞吐量"""
+    cores = os.cpu_count() or 1
+    print(f"进程池吞吐量（{len(photos)} 张，{cores} 个 CPU 核心）:")
+    print(f"{'进程数':>6} {'耗时(s)':>8} {'张/秒':>7} {'每核 张/秒':>10}")
+    for workers in worker_counts:
+        paths = prepare(directory, photos)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            # 先启动子进程，不计入耗时
+            list(executor.map(abs, range(workers)))
+            started = time.perf_counter()
+            list(executor.map(preprocess_image, *zip(*(preprocess_args(path) for path in paths))))
+            elapsed = time.perf_counter() - started
+        rate = len(paths) / elapsed
+        print(f"{workers:>6} {elapsed:>8.2f} {rate:>7.2f} {rate / min(workers, cores):>10.2f}")
+
+
+async def benchmark_baidu(paths: List[Path]) -> None:
+    """调用百度 OCR 实测原图和预处理后图片的识别耗时"""
+    await http_clients.start()
+    try:
+        for label, variant in (("原图", None), ("预处理后", "ocr")):
+            latencies = []
+            for path in paths:
+                image_path = path if variant is None else path.with_name(f"{path.stem}.{variant}.jpg")
+                started = time.perf_counter()
+                await ocr_service.ocr_baidu(image_path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                # 免费额度 QPS 为 2
+                await asyncio.sleep(0.5)
+            print(f"百度 OCR {label}: p50 {percentile(latencies, 50):.0f} ms  p95 {percentile(latencies, 95):.0f} ms")
+    finally:
+        await http_clients.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="图片预处理性能基准")
+    parser.add_argument("--images", type=int, default=16, help="模拟照片数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="进程池的进程数")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="估算传输时间的上行带宽（Mbit/s）")
+    parser.add_argument("--baidu", action="store_true", help="调用百度 OCR 实测识别耗时")
+    args = parser.parse_args()
+    
+    print(f"生成 {args.images} 张模拟照片...")
+    photos = [phone_photo(i) for i in range(args.images)]
+    
+    directory = Path(tempfile.mkdtemp(prefix="benchmark_preprocess_"))
+    try:
+        paths = prepare(directory, photos)
+        benchmark_payload(paths, args.uplink_mbps)
+        if args.baidu:
+            asyncio.run(benchmark_baidu(paths))
+        benchmark_throughput(directory, photos, args.workers)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
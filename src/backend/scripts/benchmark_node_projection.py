@@ -0,0 +1,138 @@
+"""
+节点列投影性能基准
+对比加载整行（含向量和内容）与按列分组投影加载时，各视图的每行字节数和查询延迟
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_node_projection.py --nodes 5000
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import undefer
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import NODE_COLUMN_GROUPS, KnowledgeGraph, MemoryNode, User, node_load_options  # noqa: E402
+
+
+# 各视图对应的查询：(视图, 列分组, 每次查询的行数)
+VIEWS = [
+    ("节点列表", "list", 100),
+    ("复习队列", "review", 100),
+    ("相似搜索", "search", 10),
+    ("节点详情", "full", 1),
+]
+
+
+async def seed_nodes(db: AsyncSession, user_id, graph_id, count: int) -> None:
+    """批量生成带向量和 JSONB 内容的节点"""
+    await db.execute(
+        text("""
+            INSERT INTO memory_nodes (
+                id, graph_id, user_id, node_type, title, summary, content_data, content_embedding,
+                position_x, position_y, position_z, mastery_level, next_review_at, review_stats
+            )
+            SELECT
+                gen_random_uuid(), :graph_id, :user_id, 'QUESTION', 'node ' || i, 'summary ' || i,
+                jsonb_build_object('question', repeat('question text ', 40), 'answer', repeat('answer ', 80)),
+                (SELECT array_agg(random())::vector(1536) FROM generate_series(1, 1536) WHERE i > 0),
+                0, 0, 0, 'learning', now() - interval '1 day',
+                jsonb_build_object('total_reviews', i % 13, 'easiness', 2.5, 'interval', 1)
+            FROM generate_series(1, :count) AS i
+        """),
+        {"graph_id": graph_id, "user_id": user_id, "count": count},
+    )
+    await db.commit()
+
+
+async def bytes_per_row(db: AsyncSession, graph_id, columns: List[str]) -> float:
+    """查询列的平均存储字节数（pg_column_size，近似传输量）"""
+    size = sum(func.coalesce(func.pg_column_size(getattr(MemoryNode, key)), 0) for key in columns)
+    result = await db.execute(select(func.avg(size)).where(MemoryNode.graph_id == graph_id))
+    return float(result.scalar() or 0)
+
+
+async def measure(func: Callable[[], Awaitable], repeat: int) -> float:
+    """执行 repeat 次，返回延迟中位数（毫秒）"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run(database_url: str, count: int, repeat: int) -> None:
+    """生成数据，逐个视图测量整行加载与投影加载"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    all_columns = [column.key for column in MemoryNode.__table__.columns]
+    
+    async with session_factory() as db:
+        user = User(
+            email=f"benchmark-{time.time_ns()}@neuralnote.local",
+            username=f"benchmark_{time.time_ns()}",
+            password_hash="-",
+        )
+        db.add(user)
+        await db.flush()
+        graph = KnowledgeGraph(user_id=user.id, name="列投影基准")
+        db.add(graph)
+        await db.commit()
+        user_uuid, graph_uuid = user.id, graph.id
+        
+        try:
+            await seed_nodes(db, user_uuid, graph_uuid, count)
+            await db.execute(text("ANALYZE memory_nodes"))
+            full_bytes = await bytes_per_row(db, graph_uuid, all_columns)
+            
+            print(f"节点数: {count}")
+            print(f"{'视图':<8} {'行数':>6} {'整行 B/行':>10} {'投影 B/行':>10} {'整行 ms':>9} {'投影 ms':>9}")
+            for view, group, limit in VIEWS:
+                projected_bytes = await bytes_per_row(db, graph_uuid, list(NODE_COLUMN_GROUPS[group]))
+                base_query = select(MemoryNode).where(MemoryNode.graph_id == graph_uuid).limit(limit)
+                
+                async def load(option):
+                    result = await db.execute(base_query.options(option))
+                    result.scalars().all()
+                    db.expunge_all()
+                
+                full_ms = await measure(lambda: load(undefer(MemoryNode.content_embedding)), repeat)
+                projected_ms = await measure(lambda: load(node_load_options(group)), repeat)
+                print(
+                    f"{view:<8} {limit:>6} {full_bytes:>10.0f} {projected_bytes:>10.0f} "
+                    f"{full_ms:>9.2f} {projected_ms:>9.2f}"
+                )
+        finally:
+            await db.rollback()
+            await db.execute(delete(MemoryNode).where(MemoryNode.user_id == user_uuid))
+            await db.execute(delete(KnowledgeGraph).where(KnowledgeGraph.id == graph_uuid))
+            await db.execute(delete(User).where(User.id == user_uuid))
+            await db.commit()
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="节点列投影性能基准")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--nodes", type=int, default=5000, help="生成的节点数")
+    parser.add_argument("--repeat", type=int, default=20, help="每种加载方式的执行次数（取中位数）")
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.database_url, args.nodes, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+OCR 任务队列负载测试
+使用本地模拟 OCR 一次提交大量任务，测量提交延迟、端到端延迟、吞吐量，
+以及令牌桶限速下对 OCR 服务的实际请求速率（与直接并发调用对比）；
+最后测量结果缓存命中时的提交延迟和缓存查询耗时
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_ocr_jobs.py --jobs 500 --qps 50 --workers 8
+    python scripts/benchmark_ocr_jobs.py --jobs 200 --failure-rate 0.2
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import FileUpload, OCRJob, User  # noqa: E402
+from app.services.ocr_cache_service import ocr_result_cache  # noqa: E402
+from app.services.ocr_job_service import TERMINAL_STATUSES, ocr_job_queue  # noqa: E402
+from app.services.ocr_service import ocr_service  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    """第 q 百分位数"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def peak_rate(timestamps: List[float]) -> int:
+    """任意 1 秒窗口内的最大请求数"""
+    ordered = sorted(timestamps)
+    peak, start = 0, 0
+    for end, stamp in enumerate(ordered):
+        while stamp - ordered[start] >= 1.0:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+
+def record_calls(calls: List[float]) -> None:
+    """记录每次调用模拟 OCR 的时间"""
+    original = ocr_service.ocr_fake
+    
+    async def recorded(image_path):
+        calls.append(time.monotonic())
+        return await original(image_path)
+    
+    ocr_service.ocr_fake = recorded
+
+
+async def direct_burst(image_path: Path, count: int) -> List[float]:
+    """对比：所有请求同时直接调用 OCR 服务（原 /ocr 的行为），返回调用时间"""
+    calls: List[float] = []
+    
+    async def call():
+        calls.append(time.monotonic())
+        try:
+            await ocr_service.ocr_image(image_path, engine="fake")
+        except Exception:
+            pass
+    
+    await asyncio.gather(*(call() for _ in range(count)))
+    return calls
+
+
+async def cache_hits(db: AsyncSession, engine, upload_ids: List) -> None:
+    """识别一次后重新提交同一张图片的其他上传记录，测量缓存命中时的提交延迟"""
+    settings.OCR_CACHE_ENABLED = True
+    settings.OCR_FAKE_FAILURE_RATE = 0.0
+    uploads = (await db.execute(
+        select(FileUpload).where(FileUpload.id.in_(upload_ids))
+    )).scalars().all()
+    first = await ocr_job_queue.submit(db, uploads[0], engine="fake", bypass_cache=True)
+    await ocr_job_queue.run_until_done(engine, first.id, timeout=30)
+    
+    submit_ms: List[float] = []
+    completed = 0
+    for file_upload in uploads[1:]:
+        started = time.perf_counter()
+        job = await ocr_job_queue.submit(db, file_upload, engine="fake")
+        submit_ms.append((time.perf_counter() - started) * 1000)
+        completed += job.status == "completed"
+    
+    content_hash = uploads[0].content_hash
+    lookups = 10000
+    started = time.perf_counter()
+    for _ in range(lookups):
+        await ocr_result_cache.get(db, content_hash, "fake", "text")
+    lookup_us = (time.perf_counter() - started) / lookups * 1e6
+    
+    print(
+        f"缓存命中提交 {len(submit_ms)} 次（提交时完成 {completed}）: "
+        f"p50 {percentile(submit_ms, 50):.2f} ms  p95 {percentile(submit_ms, 95):.2f} ms"
+    )
+    print(f"缓存查询（本地 LRU 命中）: {lookup_us:.2f} µs/次  命中率 {ocr_result_cache.stats()['hit_rate']:.1%}")
+
+
+async def run(
+    database_url: str,
+    jobs: int,
+    workers: int,
+    qps: float,
+    burst: int,
+    latency: float,
+    failure_rate: float
+) -> None:
+    """提交任务、启动工作协程直到全部结束，并打印统计"""
+    settings.OCR_FAKE_ENABLED = True
+    settings.OCR_FAKE_WORKERS = workers
+    settings.OCR_FAKE_QPS = qps
+    settings.OCR_FAKE_BURST = burst
+    settings.OCR_FAKE_LATENCY = latency
+    settings.OCR_FAKE_FAILURE_RATE = failure_rate
+    settings.OCR_JOB_POLL_INTERVAL = 0.2
+    # 所有任务使用同一张图片，先关闭结果缓存测量队列本身
+    settings.OCR_CACHE_ENABLED = False
+    
+    engine = create_async_engine(database_url, pool_size=workers + 2, max_overflow=0)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    image_path = Path("uploads") / "images" / f"benchmark_ocr_{uuid.uuid4().hex[:8]}.jpg"
+    image_path.parent.mkdir(parents=True, exist_ok=True)
+    image_path.write_bytes(b"\xff\xd8\xff\xe0" + b"0" * 1024)
+    
+    async with session_factory() as db:
+        user = User(
+            email=f"benchmark-{time.time_ns()}@neuralnote.local",
+            username=f"benchmark_{time.time_ns()}",
+            password_hash="-",
+        )
+        db.add(user)
+        await db.commit()
+        user_id = user.id
+        
+        try:
+            uploads = [
+                FileUpload(
+                    user_id=user_id,
+                    original_filename=f"page{i}.jpg",
+                    stored_filename=image_path.name,
+                    file_url=f"/uploads/images/{image_path.name}",
+                    file_size=1028,
+                    mime_type="image/jpeg",
+                    status="pending",
+                )
+                for i in range(jobs)
+            ]
+            db.add_all(uploads)
+            await db.commit()
+            upload_ids = [file_upload.id for file_upload in uploads]
+            
+            submit_ms: List[float] = []
+            for file_upload in uploads:
+                started = time.perf_counter()
+                await ocr_job_queue.submit(db, file_upload, engine="fake")
+                submit_ms.append((time.perf_counter() - started) * 1000)
+            
+            calls: List[float] = []
+            record_calls(calls)
+            started = time.monotonic()
+            ocr_job_queue.start(engine)
+            try:
+                while True:
+                    pending = (await db.execute(
+                        select(OCRJob.id).where(OCRJob.user_id == user_id, OCRJob.status.notin_(TERMINAL_STATUSES))
+                        .limit(1)
+                    )).first()
+                    await db.rollback()
+                    if pending is None:
+                        break
+                    await asyncio.sleep(0.1)
+            finally:
+                await ocr_job_queue.stop()
+            elapsed = time.monotonic() - started
+            
+            finished = (await db.execute(
+                select(OCRJob.status, OCRJob.attempts, OCRJob.created_at, OCRJob.finished_at)
+                .where(OCRJob.user_id == user_id)
+            )).all()
+            statuses = Counter(row.status for row in finished)
+            latencies = [(row.finished_at - row.created_at).total_seconds() for row in finished]
+            retries = sum(row.attempts - 1 for row in finished)
+            
+            print(
+                f"任务: {jobs}  工作协程: {workers}  限速: {qps:g} QPS（突发 {burst}）  "
+                f"模拟延迟: {latency * 1000:.0f} ms  失败率: {failure_rate:.0%}"
+            )
+            print(f"提交延迟 (ms)  p50 {percentile(submit_ms, 50):.2f}  p95 {percentile(submit_ms, 95):.2f}")
+            print(
+                f"处理耗时 {elapsed:.2f} s  吞吐量 {jobs / elapsed:.1f} 任务/s  "
+                f"完成 {statuses['completed']}  失败 {statuses['failed']}  重试 {retries}"
+            )
+            print(
+                f"端到端延迟 (s)  p50 {percentile(latencies, 50):.2f}  p95 {percentile(latencies, 95):.2f}  "
+                f"max {max(latencies):.2f}"
+            )
+            print(
+                f"OCR 请求: {len(calls)} 次  平均 {len(calls) / elapsed:.1f} /s  "
+                f"1 秒窗口峰值 {peak_rate(calls)}  令牌桶等待 {ocr_job_queue.stats()['rate_limit_wait_seconds']}"
+            )
+            
+            direct = await direct_burst(image_path, jobs)
+            print(f"直接并发调用 {jobs} 次: 1 秒窗口峰值 {peak_rate(direct)}")
+            
+            await cache_hits(db, engine, upload_ids)
+        finally:
+            await db.rollback()
+            await db.execute(delete(User).where(User.id == user_id))
+            await db.commit()
+            image_path.unlink(missing_ok=True)
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OCR 任务队列负载测试")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--jobs", type=int, default=500, help="提交的任务数")
+    parser.add_argument("--workers", type=int, default=8, help="工作协程数")
+    parser.add_argument("--qps", type=float, default=50.0, help="每秒请求数限制（0 表示不限速）")
+    parser.add_argument("--burst", type=int, default=10, help="令牌桶容量")
+    parser.add_argument("--latency", type=float, default=0.1, help="模拟 OCR 的延迟（秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟 OCR 的失败率")
+    args = parser.parse_args()
+    
+    asyncio.run(run(
+        args.database_url, args.jobs, args.workers, args.qps, args.burst, args.latency, args.failure_rate
+    ))
+
+
+if __name__ == "__main__":
+    main()
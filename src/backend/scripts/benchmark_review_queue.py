@@ -0,0 +1,160 @@
+"""
+复习队列性能基准
+对比按 next_review_at 取前 k 个后在 Python 中计算遗忘指数的旧实现，
+与在数据库中按遗忘指数排序取 top-k 的新实现在大量到期节点下的延迟
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_review_queue.py --due 100000
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import and_, delete, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import KnowledgeGraph, MemoryNode, User, node_load_options  # noqa: E402
+from app.models.memory_node import MasteryLevel  # noqa: E402
+from app.services.review_service import ReviewMode, ReviewService  # noqa: E402
+
+
+async def legacy_review_queue(db: AsyncSession, user_id: str, limit: int) -> List[Dict]:
+    """旧实现：按下次复习时间取前 k 个，再逐个计算遗忘指数"""
+    now = ReviewService._normalize_datetime(ReviewService._get_utc_now())
+    result = await db.execute(
+        select(MemoryNode).options(node_load_options("review")).where(
+            and_(
+                MemoryNode.user_id == user_id,
+                or_(MemoryNode.next_review_at <= now, MemoryNode.next_review_at.is_(None))
+            )
+        ).order_by(MemoryNode.next_review_at.asc()).limit(limit)
+    )
+    queue = []
+    for node in result.scalars().all():
+        try:
+            mastery_level = MasteryLevel(node.mastery_level)
+        except ValueError:
+            mastery_level = MasteryLevel.NOT_STARTED
+        forgetting_index = ReviewService.calculate_forgetting_index(
+            node.last_review_at, node.next_review_at, mastery_level
+        )
+        queue.append({"node_id": str(node.id), "forgetting_index": forgetting_index})
+    return queue
+
+
+async def seed_nodes(db: AsyncSession, user_id, graph_id, count: int, overdue_days: int) -> None:
+    """生成到期节点（超期 0-overdue_days 天，掌握程度循环分布），另有同等数量未到期节点"""
+    await db.execute(
+        text("""
+            INSERT INTO memory_nodes (
+                id, graph_id, user_id, node_type, title, content_data,
+                position_x, position_y, position_z, mastery_level,
+                last_review_at, next_review_at, review_stats
+            )
+            SELECT
+                gen_random_uuid(), :graph_id, :user_id, 'QUESTION', 'node ' || i, '{}'::jsonb, 0, 0, 0,
+                (ARRAY['not_started', 'learning', 'familiar', 'proficient', 'mastered'])[1 + i % 5],
+                due - interval '7 days', due, '{}'::jsonb
+            FROM (
+                SELECT i, now() + CASE WHEN i <= :count
+                    THEN -(random() * :overdue_days * interval '1 day')
+                    ELSE random() * interval '60 days' END AS due
+                FROM generate_series(1, :count * 2) AS i
+            ) AS seeded
+        """),
+        {"graph_id": graph_id, "user_id": user_id, "count": count, "overdue_days": overdue_days},
+    )
+    await db.commit()
+
+
+async def measure(func: Callable[[], Awaitable], repeat: int) -> float:
+    """执行 repeat 次，返回延迟中位数（毫秒）"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run(database_url: str, due: int, overdue_days: int, limit: int, repeat: int) -> None:
+    """生成数据，测量两种实现，并比较所选节点的遗忘指数"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async with session_factory() as db:
+        user = User(
+            email=f"benchmark-{time.time_ns()}@neuralnote.local",
+            username=f"benchmark_{time.time_ns()}",
+            password_hash="-",
+        )
+        db.add(user)
+        await db.flush()
+        graph = KnowledgeGraph(user_id=user.id, name="复习队列基准")
+        db.add(graph)
+        await db.commit()
+        user_uuid, graph_uuid = user.id, graph.id
+        user_id = str(user_uuid)
+        
+        try:
+            await seed_nodes(db, user_uuid, graph_uuid, due, overdue_days)
+            await db.execute(text("ANALYZE memory_nodes"))
+            
+            async def legacy_call():
+                await legacy_review_queue(db, user_id, limit)
+                db.expunge_all()
+            
+            async def ranked_call():
+                await ReviewService.get_review_queue(db, user_id, mode=ReviewMode.SPACED, limit=limit)
+                db.expunge_all()
+            
+            legacy = await legacy_review_queue(db, user_id, limit)
+            db.expunge_all()
+            ranked = await ReviewService.get_review_queue(db, user_id, mode=ReviewMode.SPACED, limit=limit)
+            db.expunge_all()
+            
+            legacy_ms = await measure(legacy_call, repeat)
+            ranked_ms = await measure(ranked_call, repeat)
+            
+            print(f"到期节点: {due}（超期 0-{overdue_days} 天，另有 {due} 个未到期），k = {limit}")
+            print(f"{'实现':<16} {'延迟 (ms)':>10} {'平均遗忘指数':>12} {'最低遗忘指数':>12}")
+            for name, queue, elapsed in (
+                ("next_review_at", legacy, legacy_ms),
+                ("遗忘指数 top-k", ranked, ranked_ms),
+            ):
+                values = [item["forgetting_index"] for item in queue]
+                print(f"{name:<16} {elapsed:>10.2f} {statistics.mean(values):>12.3f} {min(values):>12.3f}")
+        finally:
+            await db.rollback()
+            await db.execute(delete(MemoryNode).where(MemoryNode.user_id == user_uuid))
+            await db.execute(delete(KnowledgeGraph).where(KnowledgeGraph.id == graph_uuid))
+            await db.execute(delete(User).where(User.id == user_uuid))
+            await db.commit()
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="复习队列性能基准")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--due", type=int, default=100000, help="到期节点数")
+    parser.add_argument("--overdue-days", type=int, default=60, help="到期节点的最长超期天数")
+    parser.add_argument("--limit", type=int, default=20, help="队列长度 k")
+    parser.add_argument("--repeat", type=int, default=20, help="每种实现的执行次数（取中位数）")
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.database_url, args.due, args.overdue_days, args.limit, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
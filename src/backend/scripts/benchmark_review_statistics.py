@@ -0,0 +1,179 @@
+"""
+复习统计性能基准
+对比逐行加载节点的旧实现与单次 SQL 聚合的新实现在不同节点规模下的延迟
+
+用法（在 src/backend 目录下）:
+    python scripts/benchmark_review_statistics.py --sizes 1000,10000,100000
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import KnowledgeGraph, MemoryNode, User  # noqa: E402
+from app.services.review_service import ReviewService  # noqa: E402
+
+
+async def legacy_review_statistics(db: AsyncSession, user_id: str) -> Dict:
+    """旧实现：加载全部节点（含内容和向量）后在 Python 中统计"""
+    result = await db.execute(select(MemoryNode).where(MemoryNode.user_id == user_id))
+    nodes = result.scalars().all()
+    
+    mastery_distribution = {
+        "not_started": 0,
+        "learning": 0,
+        "familiar": 0,
+        "proficient": 0,
+        "mastered": 0
+    }
+    due_today = 0
+    overdue = 0
+    total_reviews = 0
+    now = ReviewService._get_utc_now()
+    
+    for node in nodes:
+        mastery_key = node.mastery_level.lower()
+        mastery_distribution[mastery_key] = mastery_distribution.get(mastery_key, 0) + 1
+        total_reviews += (node.review_stats or {}).get("total_reviews", 0)
+        if node.next_review_at:
+            next_review_date = ReviewService._normalize_datetime(node.next_review_at)
+            if next_review_date.date() == now.date():
+                due_today += 1
+            elif next_review_date < now:
+                overdue += 1
+    
+    mastery_rate = 0
+    if nodes:
+        mastery_rate = round(
+            (mastery_distribution["proficient"] + mastery_distribution["mastered"]) / len(nodes) * 100, 2
+        )
+    
+    return {
+        "total_nodes": len(nodes),
+        "mastery_distribution": mastery_distribution,
+        "mastery_rate": mastery_rate,
+        "due_today": due_today,
+        "overdue": overdue,
+        "total_reviews": total_reviews
+    }
+
+
+async def seed_nodes(db: AsyncSession, user_id, graph_id, count: int, with_embeddings: bool) -> None:
+    """用 generate_series 批量生成节点（掌握程度、复习时间和复习次数按序号循环分布）"""
+    # 每个节点生成不同的随机向量（写入 HNSW 索引较慢，大规模时耗时明显）
+    embedding = (
+        "(SELECT array_agg(random())::vector(1536) FROM generate_series(1, 1536) WHERE i > 0)"
+        if with_embeddings else "NULL"
+    )
+    await db.execute(
+        text(f"""
+            INSERT INTO memory_nodes (
+                id, graph_id, user_id, node_type, title, content_data, content_embedding,
+                position_x, position_y, position_z, mastery_level, next_review_at, review_stats
+            )
+            SELECT
+                gen_random_uuid(), :graph_id, :user_id, 'QUESTION', '基准节点 ' || i,
+                jsonb_build_object('question', repeat('题目内容', 20), 'answer', repeat('答案', 40)),
+                {embedding}, 0, 0, 0,
+                (ARRAY['not_started', 'learning', 'familiar', 'proficient', 'mastered'])[1 + i % 5],
+                CASE WHEN i % 7 = 0 THEN NULL ELSE now() + (i % 21 - 10) * interval '1 day' END,
+                jsonb_build_object('total_reviews', i % 13)
+            FROM generate_series(1, :count) AS i
+        """),
+        {"graph_id": graph_id, "user_id": user_id, "count": count},
+    )
+    await db.commit()
+
+
+async def measure(func: Callable, repeat: int) -> float:
+    """执行 repeat 次，返回延迟中位数（毫秒）"""
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def run(database_url: str, sizes: List[int], repeat: int, with_embeddings: bool) -> None:
+    """对每个规模生成数据、测量并清理"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    print(f"{'节点数':>10} {'旧实现 (ms)':>14} {'聚合 (ms)':>12} {'缓存命中 (ms)':>14} {'加速比':>8}")
+    for size in sizes:
+        async with session_factory() as db:
+            user = User(
+                email=f"benchmark-{time.time_ns()}@neuralnote.local",
+                username=f"benchmark_{time.time_ns()}",
+                password_hash="-",
+            )
+            db.add(user)
+            await db.flush()
+            graph = KnowledgeGraph(user_id=user.id, name="复习统计基准")
+            db.add(graph)
+            await db.commit()
+            user_uuid, graph_uuid = user.id, graph.id
+            user_id = str(user_uuid)
+            
+            try:
+                await seed_nodes(db, user_uuid, graph_uuid, size, with_embeddings)
+                await db.execute(text("ANALYZE memory_nodes"))
+                
+                legacy = await legacy_review_statistics(db, user_id)
+                db.expunge_all()
+                aggregated = await ReviewService.get_review_statistics(db, user_id, use_cache=False)
+                if legacy != aggregated:
+                    raise AssertionError(f"结果不一致: {legacy} != {aggregated}")
+                
+                async def legacy_call():
+                    await legacy_review_statistics(db, user_id)
+                    db.expunge_all()
+                
+                legacy_ms = await measure(legacy_call, repeat)
+                aggregate_ms = await measure(
+                    lambda: ReviewService.get_review_statistics(db, user_id, use_cache=False), repeat
+                )
+                await ReviewService.get_review_statistics(db, user_id)
+                cached_ms = await measure(lambda: ReviewService.get_review_statistics(db, user_id), repeat)
+                
+                print(
+                    f"{size:>10} {legacy_ms:>14.2f} {aggregate_ms:>12.2f} "
+                    f"{cached_ms:>14.3f} {legacy_ms / aggregate_ms:>7.1f}x"
+                )
+            finally:
+                await db.rollback()
+                await db.execute(delete(MemoryNode).where(MemoryNode.user_id == user_uuid))
+                await db.execute(delete(KnowledgeGraph).where(KnowledgeGraph.id == graph_uuid))
+                await db.execute(delete(User).where(User.id == user_uuid))
+                await db.commit()
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="复习统计性能基准")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="节点规模，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=5, help="每种实现的执行次数（取中位数）")
+    parser.add_argument("--with-embeddings", action="store_true", help="为节点生成向量（旧实现会加载向量，差距更大）")
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    asyncio.run(run(args.database_url, sizes, args.repeat, args.with_embeddings))
+
+
+if __name__ == "__main__":
+    main()
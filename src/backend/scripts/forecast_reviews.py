@@ -0,0 +1,74 @@
+"""
+复习负载预测
+按用户当前所有卡片的 SM-2 状态和历史复习质量分布，预测未来每天的复习数
+
+用法（在 src/backend 目录下）:
+    python scripts/forecast_reviews.py --user-id <用户 ID> --days 90
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.services.review_forecast_service import (  # noqa: E402
+    DEFAULT_PERCENTILES,
+    DEFAULT_RUNS,
+    ReviewForecastService,
+)
+
+
+async def run(database_url: str, user_id: str, graph_id: str, days: int, runs: int, seed: int) -> None:
+    """加载卡片状态，模拟并打印每天的复习数"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_factory() as db:
+        started = time.perf_counter()
+        cards = await ReviewForecastService.load_cards(db, user_id, graph_id)
+        quality_distribution = await ReviewForecastService.load_quality_distribution(db, user_id)
+        load_ms = (time.perf_counter() - started) * 1000
+
+    await engine.dispose()
+
+    started = time.perf_counter()
+    counts = ReviewForecastService.simulate(cards, quality_distribution, days, runs, seed)
+    simulate_ms = (time.perf_counter() - started) * 1000
+
+    mean = counts.mean(axis=0)
+    values = np.percentile(counts, DEFAULT_PERCENTILES, axis=0)
+
+    print(f"卡片数: {len(cards['due_day'])}，模拟轮次: {runs}，预测天数: {days}")
+    print("复习质量分布: " + ", ".join(f"{quality}={p:.3f}" for quality, p in enumerate(quality_distribution)))
+    header = "".join(f"{f'p{percentile}':>10}" for percentile in DEFAULT_PERCENTILES)
+    print(f"{'天':>5} {'平均':>10}{header}")
+    for day in range(days):
+        row = "".join(f"{value:>10.1f}" for value in values[:, day])
+        print(f"{day:>5} {mean[day]:>10.1f}{row}")
+    print(f"加载耗时 {load_ms:.1f} ms，模拟耗时 {simulate_ms:.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="复习负载预测")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--user-id", required=True, help="用户 ID")
+    parser.add_argument("--graph-id", default=None, help="知识图谱 ID（默认全部图谱）")
+    parser.add_argument("--days", type=int, default=30, help="预测天数")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="蒙特卡洛模拟轮次")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.database_url, args.user_id, args.graph_id, args.days, args.runs, args.seed))
+
+
+if __name__ == "__main__":
+    main()
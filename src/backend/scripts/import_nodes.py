@@ -0,0 +1,96 @@
+"""
+批量导入节点
+把 JSONL、CSV 或 Anki 牌组（.apkg）文件导入到指定图谱（节点属于图谱的所有者），
+逐块打印导入进度
+
+用法（在 src/backend 目录下）:
+    python scripts/import_nodes.py --graph-id <图谱 ID> notes.jsonl
+    python scripts/import_nodes.py --graph-id <图谱 ID> deck.apkg --node-type QUESTION
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import KnowledgeGraph  # noqa: E402
+from app.services.node_import_service import (  # noqa: E402
+    DEFAULT_NODE_TYPE,
+    IMPORT_FORMATS,
+    detect_format,
+    node_import_service,
+)
+
+
+def print_progress(progress: dict) -> None:
+    """打印一块写入后的进度"""
+    print(
+        f"  {progress['nodes']:>8} 个节点  {progress['node_tags']:>8} 个节点标签  "
+        f"跳过 {progress['skipped']:>6}  {progress['elapsed_ms'] / 1000:>7.1f} s"
+    )
+
+
+async def run(database_url: str, graph_id: str, path: Path, import_format: str, node_type: str) -> bool:
+    """导入一个文件并打印结果，返回是否成功"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with session_factory() as db:
+            user_id = (
+                await db.execute(select(KnowledgeGraph.user_id).where(KnowledgeGraph.id == graph_id))
+            ).scalar_one_or_none()
+            if user_id is None:
+                print(f"知识图谱不存在: {graph_id}")
+                return False
+
+            print(f"导入 {path}（{import_format}）到图谱 {graph_id}")
+            with path.open("rb") as file:
+                result = await node_import_service.import_file(
+                    db, graph_id, user_id, file, import_format,
+                    default_node_type=node_type, on_progress=print_progress
+                )
+    except ValueError as e:
+        print(f"导入失败: {e}")
+        return False
+    finally:
+        await engine.dispose()
+
+    for error in result["errors"]:
+        print(f"  第 {error['line']} 行: {error['message']}")
+    print(
+        f"读取 {result['records']} 条记录，导入 {result['nodes']} 个节点、{result['relations']} 条关联，"
+        f"新建 {result['tags']} 个标签；跳过 {result['skipped']} 条记录、{result['skipped_relations']} 条关联，"
+        f"耗时 {result['elapsed_ms'] / 1000:.2f} s"
+    )
+    return True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量导入节点")
+    parser.add_argument("path", type=Path, help="导入文件")
+    parser.add_argument("--graph-id", required=True, help="目标知识图谱 ID")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default=None, help="文件格式（默认按扩展名推断）")
+    parser.add_argument("--node-type", default=DEFAULT_NODE_TYPE, help="记录未指定类型时的节点类型")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    args = parser.parse_args()
+
+    import_format: Optional[str] = args.format or detect_format(args.path.name)
+    if import_format is None:
+        parser.error(f"无法识别文件格式，请指定 --format: {', '.join(IMPORT_FORMATS)}")
+
+    ok = asyncio.run(run(args.database_url, args.graph_id, args.path, import_format, args.node_type.upper()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+重建复习到期索引
+从 PostgreSQL 读取节点的复习时间，重建 Redis 中的到期索引（启用 REVIEW_DUE_INDEX_ENABLED 前、
+Redis 数据丢失或故障恢复后运行）
+
+用法（在 src/backend 目录下）:
+    python scripts/rebuild_review_due_index.py              # 所有用户
+    python scripts/rebuild_review_due_index.py --user-id <用户 ID>
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.models import User  # noqa: E402
+from app.services.review_due_index import review_due_index  # noqa: E402
+
+
+async def run(database_url: str, user_ids: List[str]) -> None:
+    """逐个用户重建索引并打印写入的节点数"""
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    async with session_factory() as db:
+        if not user_ids:
+            user_ids = [str(user_id) for user_id in (await db.execute(select(User.id))).scalars().all()]
+        
+        total = 0
+        started = time.perf_counter()
+        for user_id in user_ids:
+            count = await review_due_index.rebuild(db, user_id)
+            total += count
+            print(f"{user_id}: {count} 个节点")
+        
+        elapsed = time.perf_counter() - started
+        print(f"共重建 {len(user_ids)} 个用户、{total} 个节点，耗时 {elapsed:.2f} s")
+    
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="重建复习到期索引")
+    parser.add_argument("--database-url", default=settings.async_database_url, help="异步数据库连接 URL")
+    parser.add_argument("--user-id", action="append", default=[], help="只重建指定用户（可重复，默认所有用户）")
+    args = parser.parse_args()
+    
+    asyncio.run(run(args.database_url, args.user_id))
+
+
+if __name__ == "__main__":
+    main()
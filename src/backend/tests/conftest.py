@@ -7,6 +7,7 @@ import asyncio
 from typing import AsyncGenerator, Generator
 import pytest
 from httpx import AsyncClient, ASGITransport
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.pool import NullPool
 
@@ -161,6 +162,34 @@ async def test_node(db_session: AsyncSession, test_graph: KnowledgeGraph, test_u
     return node
 
 
+async def seed_nodes(db_session: AsyncSession, user: User, graph: KnowledgeGraph, count: int, title: str = "node"):
+    """创建 count 个 Z 坐标为 7 的节点（X/Y 为 0）并提交"""
+    nodes = [
+        MemoryNode(
+            graph_id=graph.id,
+            user_id=user.id,
+            node_type="CONCEPT",
+            title=f"{title} {i}",
+            content_data={},
+            position_z=7.0,
+        )
+        for i in range(count)
+    ]
+    db_session.add_all(nodes)
+    await db_session.commit()
+    return nodes
+
+
+async def node_positions(db_session: AsyncSession, nodes) -> dict:
+    """读取节点坐标 {节点ID: (x, y, z)}"""
+    result = await db_session.execute(
+        select(MemoryNode.id, MemoryNode.position_x, MemoryNode.position_y, MemoryNode.position_z)
+        .where(MemoryNode.id.in_([node.id for node in nodes]))
+        .execution_options(populate_existing=True)
+    )
+    return {row[0]: tuple(row[1:]) for row in result.all()}
+
+
 # 测试数据
 TEST_USER_DATA = {
     "email": "newuser@example.com",
@@ -0,0 +1,234 @@
+"""
+向量聚类测试
+测试 NumPy 聚类引擎的各聚类模式和基于数据库的图谱聚类
+"""
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import KnowledgeGraph, MemoryNode, User
+from app.services.clustering_service import ClusterMode, ClusteringEngine
+from app.services.vector_search_service import VectorSearchService
+
+
+def _make_blobs(rng: np.random.Generator, centers: int = 3, per_center: int = 10, dim: int = 64):
+    """生成围绕若干正交中心的紧凑向量簇"""
+    basis = np.eye(dim, dtype=np.float32)[:centers]
+    vectors = []
+    labels = []
+    for label in range(centers):
+        noise = rng.standard_normal((per_center, dim)).astype(np.float32) * 0.05
+        vectors.append(basis[label] + noise)
+        labels.extend([label] * per_center)
+    return np.vstack(vectors), np.array(labels)
+
+
+def _as_partition(clusters) -> set:
+    """把簇列表转为不可变集合，便于比较"""
+    return {frozenset(cluster) for cluster in clusters}
+
+
+def _expected_partition(labels: np.ndarray) -> set:
+    """按真实标签构造期望的簇集合"""
+    return {frozenset(np.nonzero(labels == label)[0].tolist()) for label in np.unique(labels)}
+
+
+class TestClusteringEngine:
+    """测试聚类引擎"""
+    
+    @pytest.mark.parametrize("mode", list(ClusterMode))
+    def test_modes_recover_blobs(self, mode: ClusterMode):
+        """测试所有模式都能还原明显分离的簇"""
+        matrix, labels = _make_blobs(np.random.default_rng(0))
+        
+        clusters = list(ClusteringEngine(tile_size=7).cluster(
+            matrix,
+            mode=mode,
+            similarity_threshold=0.8,
+            n_clusters=3,
+        ))
+        
+        assert _as_partition(clusters) == _expected_partition(labels)
+    
+    def test_tile_size_does_not_change_edges(self):
+        """测试分块大小不影响相似度计算结果"""
+        matrix, _ = _make_blobs(np.random.default_rng(1), per_center=15)
+        matrix = ClusteringEngine.normalize(matrix)
+        
+        def edges(tile_size):
+            pairs = set()
+            for sources, targets in ClusteringEngine(tile_size=tile_size).iter_similarity_edges(matrix, 0.5):
+                assert np.all(sources < targets)
+                pairs.update(zip(sources.tolist(), targets.tolist()))
+            return pairs
+        
+        assert edges(4) == edges(1024)
+        assert len(edges(4)) > 0
+        
+        for mode in (ClusterMode.GREEDY, ClusterMode.CONNECTED):
+            small = list(ClusteringEngine(tile_size=4).cluster(matrix, mode, 0.3))
+            large = list(ClusteringEngine(tile_size=1024).cluster(matrix, mode, 0.3))
+            assert small == large
+    
+    def test_greedy_matches_reference(self):
+        """测试贪心模式与逐节点实现的结果一致"""
+        rng = np.random.default_rng(2)
+        matrix = ClusteringEngine.normalize(rng.standard_normal((40, 8)))
+        threshold = 0.5
+        
+        # 逐节点的参考实现（原 N+1 查询算法的内存版本）
+        similarity = matrix @ matrix.T
+        visited = set()
+        expected = []
+        for seed in range(len(matrix)):
+            if seed in visited:
+                continue
+            cluster = [seed]
+            visited.add(seed)
+            for other in np.nonzero(similarity[seed] >= threshold)[0]:
+                if other != seed and other not in visited:
+                    cluster.append(int(other))
+                    visited.add(int(other))
+            if len(cluster) > 1:
+                expected.append(cluster)
+        
+        clusters = list(ClusteringEngine(tile_size=16).cluster(matrix, ClusterMode.GREEDY, threshold))
+        
+        assert _as_partition(clusters) == _as_partition(expected)
+    
+    def test_connected_matches_reference(self):
+        """测试分块并查集与全矩阵的连通分量一致（包括跨分块的长链）"""
+        rng = np.random.default_rng(3)
+        matrix = ClusteringEngine.normalize(rng.standard_normal((120, 6)))
+        threshold = 0.7
+        
+        # 全矩阵上的广度优先搜索
+        similar = (matrix @ matrix.T) >= threshold
+        component = -np.ones(len(matrix), dtype=int)
+        for start in range(len(matrix)):
+            if component[start] >= 0:
+                continue
+            frontier = [start]
+            component[start] = start
+            while frontier:
+                node = frontier.pop()
+                for other in np.nonzero(similar[node] & (component < 0))[0]:
+                    component[other] = start
+                    frontier.append(int(other))
+        expected = [np.nonzero(component == label)[0].tolist() for label in np.unique(component)]
+        
+        clusters = list(ClusteringEngine(tile_size=7).cluster(matrix, ClusterMode.CONNECTED, threshold, min_cluster_size=1))
+        
+        assert _as_partition(clusters) == _as_partition(expected)
+    
+    def test_greedy_streams_clusters(self):
+        """测试贪心模式在处理完第一个分块前就产出簇"""
+        matrix, _ = _make_blobs(np.random.default_rng(4), per_center=20)
+        engine = ClusteringEngine(tile_size=8)
+        
+        clusters = engine.greedy(engine.normalize(matrix), 0.8)
+        first = next(clusters)
+        
+        assert len(first) == 20
+        assert first[0] == 0
+        assert len(list(clusters)) == 2
+    
+    def test_connected_is_transitive(self):
+        """测试连通分量模式会把相似链上的节点归为一簇"""
+        # 0-1、1-2 相似，0-2 不相似
+        angles = np.array([0.0, 0.5, 1.0, 3.0])
+        matrix = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+        threshold = float(np.cos(0.6))
+        
+        connected = list(ClusteringEngine().cluster(matrix, ClusterMode.CONNECTED, threshold))
+        greedy = list(ClusteringEngine().cluster(matrix, ClusterMode.GREEDY, threshold))
+        
+        assert connected == [[0, 1, 2]]
+        assert greedy == [[0, 1]]
+    
+    def test_min_cluster_size_and_empty(self):
+        """测试单节点簇被过滤，空矩阵返回空结果"""
+        matrix = np.eye(4, dtype=np.float32)
+        
+        for mode in ClusterMode:
+            assert list(ClusteringEngine().cluster(matrix, mode, 0.9, n_clusters=4)) == []
+            assert list(ClusteringEngine().cluster(np.empty((0, 4)), mode, 0.9)) == []
+    
+    def test_agglomerative_node_limit(self, monkeypatch):
+        """测试层次聚类节点数上限"""
+        monkeypatch.setattr(settings, "CLUSTER_AGGLOMERATIVE_MAX_NODES", 5)
+        
+        with pytest.raises(ValueError):
+            list(ClusteringEngine().cluster(np.ones((6, 3)), ClusterMode.AGGLOMERATIVE))
+
+
+class TestGraphClustering:
+    """测试图谱节点聚类"""
+    
+    @pytest.fixture
+    async def clustered_nodes(self, db_session: AsyncSession, test_user: User, test_graph: KnowledgeGraph) -> list:
+        """创建两组相似的带向量节点和一个孤立节点"""
+        rng = np.random.default_rng(7)
+        basis = np.eye(1536, dtype=np.float32)
+        groups = [0, 0, 0, 1, 1, 2]
+        nodes = []
+        for i, group in enumerate(groups):
+            vector = basis[group] + rng.standard_normal(1536).astype(np.float32) * 0.001
+            node = MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=f"聚类节点 {i}",
+                content_data={},
+                content_embedding=vector.tolist(),
+            )
+            db_session.add(node)
+            nodes.append(node)
+        await db_session.commit()
+        return nodes
+    
+    @pytest.mark.asyncio
+    async def test_cluster_nodes_by_similarity(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        clustered_nodes: list
+    ):
+        """测试从数据库一次载入向量并聚类"""
+        service = VectorSearchService()
+        
+        for mode in (ClusterMode.GREEDY, ClusterMode.CONNECTED, ClusterMode.AGGLOMERATIVE):
+            clusters = await service.cluster_nodes_by_similarity(
+                db=db_session,
+                graph_id=test_graph.id,
+                similarity_threshold=0.9,
+                mode=mode,
+            )
+            
+            assert _as_partition(clusters) == {
+                frozenset(node.id for node in clustered_nodes[:3]),
+                frozenset(node.id for node in clustered_nodes[3:5]),
+            }
+    
+    @pytest.mark.asyncio
+    async def test_cluster_node_limit_error(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        clustered_nodes: list,
+        monkeypatch
+    ):
+        """测试超过层次聚类上限时返回 400"""
+        monkeypatch.setattr(settings, "CLUSTER_AGGLOMERATIVE_MAX_NODES", 2)
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await VectorSearchService().cluster_nodes_by_similarity(
+                db=db_session,
+                graph_id=test_graph.id,
+                mode=ClusterMode.AGGLOMERATIVE,
+            )
+        
+        assert exc_info.value.status_code == 400
@@ -0,0 +1,265 @@
+"""
+向量嵌入回填测试
+使用本地桩嵌入服务（兼容 OpenAI /embeddings 接口）测试批量回填流水线
+"""
+
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models import KnowledgeGraph, MemoryNode, User
+from app.services.ai_service import ai_service
+from app.services.embedding_backfill_service import (
+    EmbeddingBackfillService,
+    build_embedding_text,
+    estimate_tokens,
+)
+
+
+def _stub_embedding(value: str) -> list:
+    """根据文本生成确定性的向量"""
+    rng = np.random.default_rng(abs(hash(value)) % (2 ** 32))
+    vector = rng.standard_normal(settings.EMBEDDING_DIMENSION)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def _create_stub_app(requests: list) -> FastAPI:
+    """创建桩嵌入服务，记录每次请求的输入"""
+    stub = FastAPI()
+    
+    @stub.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        requests.append(inputs)
+        if any("坏数据" in value for value in inputs):
+            raise HTTPException(status_code=400, detail="invalid input")
+        # 倒序返回，验证客户端按 index 重新排序
+        data = [
+            {"object": "embedding", "index": i, "embedding": _stub_embedding(value)}
+            for i, value in enumerate(inputs)
+        ]
+        return {"object": "list", "data": list(reversed(data)), "model": body["model"]}
+    
+    return stub
+
+
+@pytest.fixture(scope="module")
+def stub_server():
+    """在后台线程中启动本地桩嵌入服务"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    
+    requests: list = []
+    server = uvicorn.Server(
+        uvicorn.Config(
+            _create_stub_app(requests),
+            host="127.0.0.1",
+            port=port,
+            loop="asyncio",
+            log_level="warning",
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    
+    yield {"base_url": f"http://127.0.0.1:{port}/v1", "requests": requests}
+    
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture
+def stub_embeddings(stub_server, monkeypatch):
+    """把 AI 服务指向桩服务"""
+    monkeypatch.setattr(settings, "OPENAI_BASE_URL", stub_server["base_url"])
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(ai_service, "openai_configured", True)
+    stub_server["requests"].clear()
+    return stub_server["requests"]
+
+
+@pytest.fixture
+async def pending_nodes(db_session: AsyncSession, test_user: User, test_graph: KnowledgeGraph) -> list:
+    """创建 23 个没有向量嵌入的节点"""
+    nodes = []
+    for i in range(23):
+        node = MemoryNode(
+            graph_id=test_graph.id,
+            user_id=test_user.id,
+            node_type="CONCEPT",
+            title=f"回填节点 {i}",
+            summary="牛顿第二定律" if i % 2 else None,
+            content_data={"content": "F = ma " * (i + 1)},
+        )
+        db_session.add(node)
+        nodes.append(node)
+    await db_session.commit()
+    return nodes
+
+
+async def _stored_embeddings(db_session: AsyncSession, graph_id) -> dict:
+    """读取图谱中节点的向量（按列查询，不受会话中已加载对象的影响）"""
+    result = await db_session.execute(
+        select(MemoryNode.id, MemoryNode.title, MemoryNode.summary, MemoryNode.content_data, MemoryNode.content_embedding)
+        .where(MemoryNode.graph_id == graph_id)
+    )
+    return {row.id: row for row in result.all()}
+
+
+class TestEmbeddingText:
+    """测试嵌入文本构建与 token 估算"""
+    
+    def test_build_embedding_text(self):
+        """测试标题、摘要和内容的拼接"""
+        value = build_embedding_text("标题", "摘要", {"question": "问题", "answer": "答案", "content": 42})
+        
+        assert value == "标题 摘要 问题 答案 42"
+    
+    def test_estimate_tokens(self):
+        """测试中英文 token 估算"""
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("a" * 40) == 10
+    
+    def test_truncate(self):
+        """测试超长文本截断到 token 上限"""
+        value, tokens = EmbeddingBackfillService._truncate("知识" * 1000, 100)
+        
+        assert tokens <= 100
+        assert value.startswith("知识")
+
+
+class TestEmbeddingBackfill:
+    """测试批量回填流水线"""
+    
+    @pytest.mark.asyncio
+    async def test_backfill_batches_and_writes(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        pending_nodes: list,
+        stub_embeddings: list
+    ):
+        """测试按输入条数打包、并发请求并批量写回"""
+        report = await EmbeddingBackfillService().run(
+            db_session,
+            graph_id=test_graph.id,
+            concurrency=3,
+            max_batch_inputs=5,
+            fetch_size=4,
+        )
+        
+        assert report["processed_count"] == 23
+        assert report["updated_count"] == 23
+        assert report["failed_count"] == 0
+        assert report["request_count"] == 5
+        assert report["nodes_per_second"] > 0
+        assert report["tokens_per_second"] > 0
+        assert all(len(inputs) <= 5 for inputs in stub_embeddings)
+        
+        # 每个节点写入的向量与其文本对应
+        rows = await _stored_embeddings(db_session, test_graph.id)
+        for row in rows.values():
+            expected = _stub_embedding(build_embedding_text(row.title, row.summary, row.content_data))
+            assert np.allclose(row.content_embedding, expected, atol=1e-6)
+        
+        checkpoint = await EmbeddingBackfillService().get_checkpoint(db_session, test_graph.id)
+        assert checkpoint.completed is True
+        assert checkpoint.last_node_id == max(node.id for node in pending_nodes)
+    
+    @pytest.mark.asyncio
+    async def test_backfill_token_budget(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        pending_nodes: list,
+        stub_embeddings: list
+    ):
+        """测试单次请求不超过 token 预算"""
+        budget = 60
+        report = await EmbeddingBackfillService().run(
+            db_session,
+            graph_id=test_graph.id,
+            max_batch_tokens=budget,
+        )
+        
+        assert report["updated_count"] == 23
+        assert len(stub_embeddings) > 1
+        for inputs in stub_embeddings:
+            assert len(inputs) == 1 or sum(estimate_tokens(value) for value in inputs) <= budget
+    
+    @pytest.mark.asyncio
+    async def test_backfill_resume_after_interruption(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        pending_nodes: list,
+        stub_embeddings: list,
+        monkeypatch
+    ):
+        """测试中断后从检查点恢复，只处理剩余节点"""
+        service = EmbeddingBackfillService()
+        original_write = service.write_embeddings
+        calls = []
+        
+        async def interrupted_write(db, node_ids, embeddings):
+            calls.append(node_ids)
+            if len(calls) == 3:
+                raise RuntimeError("模拟中断")
+            return await original_write(db, node_ids, embeddings)
+        
+        monkeypatch.setattr(service, "write_embeddings", interrupted_write)
+        
+        with pytest.raises(RuntimeError):
+            await service.run(db_session, graph_id=test_graph.id, concurrency=1, max_batch_inputs=5)
+        await db_session.rollback()
+        
+        checkpoint = await service.get_checkpoint(db_session, test_graph.id)
+        assert checkpoint.completed is False
+        assert checkpoint.last_node_id == calls[1][-1]
+        assert checkpoint.updated_count == 10
+        
+        monkeypatch.setattr(service, "write_embeddings", original_write)
+        report = await service.run(db_session, graph_id=test_graph.id, concurrency=2, max_batch_inputs=5)
+        
+        assert report["resumed_from"] == calls[1][-1]
+        assert report["processed_count"] == 13
+        assert report["updated_count"] == 13
+        
+        rows = await _stored_embeddings(db_session, test_graph.id)
+        assert all(row.content_embedding is not None for row in rows.values())
+    
+    @pytest.mark.asyncio
+    async def test_backfill_failed_batch(
+        self,
+        db_session: AsyncSession,
+        test_graph: KnowledgeGraph,
+        pending_nodes: list,
+        stub_embeddings: list,
+        monkeypatch
+    ):
+        """测试失败批次被记录，其他批次正常写入"""
+        pending_nodes[0].title = "坏数据"
+        await db_session.commit()
+        
+        service = EmbeddingBackfillService()
+        monkeypatch.setattr(service, "MAX_ATTEMPTS", 1)
+        report = await service.run(db_session, graph_id=test_graph.id, max_batch_inputs=1)
+        
+        assert report["failed_count"] == 1
+        assert report["updated_count"] == 22
+        assert report["errors"]
+        
+        rows = await _stored_embeddings(db_session, test_graph.id)
+        assert rows[pending_nodes[0].id].content_embedding is None
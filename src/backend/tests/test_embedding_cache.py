@@ -0,0 +1,186 @@
+"""
+向量嵌入缓存测试
+测试缓存键归一化、LRU 字节容量、TTL 过期、Redis 二级缓存和 AI 服务集成
+"""
+
+from unittest.mock import Mock, patch
+
+import fakeredis.aioredis
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import embedding_cache_service
+from app.services.ai_service import AIService
+from app.services.embedding_cache_service import EmbeddingCache
+
+
+def _vector(seed: int, dim: int = 4) -> list:
+    """生成可以精确用 float32 表示的测试向量"""
+    return [float(seed + i) / 8 for i in range(dim)]
+
+
+def _entry_bytes(dim: int = 4) -> int:
+    """单个测试条目的字节数（向量 + 键）"""
+    return dim * 4 + len(EmbeddingCache.make_key("m", "x"))
+
+
+class TestCacheKey:
+    """测试缓存键"""
+    
+    def test_normalized_text_shares_key(self):
+        """测试空白和全半角差异的文本共用缓存键"""
+        assert EmbeddingCache.make_key("m", "  牛顿\n第二定律 ") == EmbeddingCache.make_key("m", "牛顿 第二定律")
+        assert EmbeddingCache.make_key("m", "ＡＢＣ１") == EmbeddingCache.make_key("m", "ABC1")
+    
+    def test_model_in_key(self):
+        """测试不同模型的缓存键不同"""
+        assert EmbeddingCache.make_key("model-a", "文本") != EmbeddingCache.make_key("model-b", "文本")
+
+
+class TestLocalCache:
+    """测试进程内 LRU 缓存"""
+    
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_counters(self):
+        """测试命中和未命中计数"""
+        cache = EmbeddingCache(redis_enabled=False)
+        
+        assert await cache.get("m", "a") is None
+        await cache.set("m", "a", _vector(1))
+        assert await cache.get("m", "a") == _vector(1)
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["entries"] == 1
+        assert stats["bytes"] == _entry_bytes()
+    
+    @pytest.mark.asyncio
+    async def test_lru_eviction_by_bytes(self):
+        """测试超出字节容量时淘汰最久未使用的条目"""
+        cache = EmbeddingCache(max_bytes=_entry_bytes() * 2, redis_enabled=False)
+        
+        await cache.set("m", "a", _vector(1))
+        await cache.set("m", "b", _vector(2))
+        await cache.get("m", "a")  # a 变为最近使用
+        await cache.set("m", "c", _vector(3))
+        
+        assert await cache.get("m", "b") is None
+        assert await cache.get("m", "a") == _vector(1)
+        assert await cache.get("m", "c") == _vector(3)
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] <= cache.max_bytes
+    
+    @pytest.mark.asyncio
+    async def test_ttl_expiration(self, monkeypatch):
+        """测试条目过期后视为未命中"""
+        now = [1000.0]
+        monkeypatch.setattr(embedding_cache_service.time, "monotonic", lambda: now[0])
+        cache = EmbeddingCache(ttl_seconds=60, redis_enabled=False)
+        
+        await cache.set("m", "a", _vector(1))
+        now[0] += 61
+        
+        assert await cache.get("m", "a") is None
+        assert cache.stats()["expirations"] == 1
+        assert cache.stats()["entries"] == 0
+    
+    @pytest.mark.parametrize("dtype", ["float16", "float32"])
+    def test_encode_decode(self, dtype: str):
+        """测试 Redis 二进制编码"""
+        cache = EmbeddingCache(redis_enabled=False, redis_dtype=dtype)
+        vector = np.random.default_rng(0).standard_normal(1536).astype(np.float32)
+        
+        blob = cache.encode(vector)
+        decoded = EmbeddingCache.decode(blob)
+        
+        assert len(blob) == 1 + 1536 * np.dtype(dtype).itemsize
+        assert np.allclose(decoded, vector, atol=1e-2 if dtype == "float16" else 0)
+
+
+class TestRedisCache:
+    """测试 Redis 二级缓存"""
+    
+    @pytest.mark.asyncio
+    async def test_redis_tier_shared_between_processes(self):
+        """测试一个实例写入后，另一个实例可以从 Redis 命中并回填本地"""
+        redis = fakeredis.aioredis.FakeRedis()
+        writer = EmbeddingCache(redis_enabled=True)
+        reader = EmbeddingCache(redis_enabled=True)
+        writer._redis = redis
+        reader._redis = redis
+        
+        await writer.set_many("m", ["a", "b"], [_vector(1), _vector(2)])
+        
+        assert await reader.get_many("m", ["a", "b", "c"]) == [_vector(1), _vector(2), None]
+        assert reader.stats()["redis_hits"] == 2
+        assert reader.stats()["misses"] == 1
+        
+        # 第二次从本地命中
+        assert await reader.get("m", "a") == _vector(1)
+        assert reader.stats()["hits"] == 1
+        assert 0 < await redis.ttl(f"embedding:{EmbeddingCache.make_key('m', 'a')}") <= reader.ttl_seconds
+    
+    @pytest.mark.asyncio
+    async def test_redis_error_falls_back(self):
+        """测试 Redis 不可用时不影响本地缓存"""
+        cache = EmbeddingCache(redis_enabled=True)
+        broken = Mock()
+        broken.mget.side_effect = ConnectionError("redis down")
+        broken.pipeline.side_effect = ConnectionError("redis down")
+        cache._redis = broken
+        
+        await cache.set("m", "a", _vector(1))
+        
+        assert await cache.get("m", "a") == _vector(1)
+        assert await cache.get("m", "b") is None
+        assert cache.stats()["redis_errors"] == 2
+
+
+class TestAIServiceEmbeddingCache:
+    """测试 AI 服务的嵌入缓存集成"""
+    
+    @pytest.mark.asyncio
+    @patch('httpx.AsyncClient.post')
+    async def test_generate_embedding_cached(self, mock_post):
+        """测试相同文本只请求一次"""
+        service = AIService()
+        service.openai_configured = True
+        
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"data": [{"index": 0, "embedding": _vector(1, 1536)}]}
+        mock_post.return_value = mock_response
+        
+        first = await service.generate_embedding("什么是导数？")
+        second = await service.generate_embedding("什么是导数？ ")
+        
+        assert first == second == _vector(1, 1536)
+        assert mock_post.call_count == 1
+    
+    @pytest.mark.asyncio
+    @patch('httpx.AsyncClient.post')
+    async def test_generate_embeddings_only_requests_misses(self, mock_post):
+        """测试批量生成只请求未命中的文本"""
+        service = AIService()
+        service.openai_configured = True
+        await service.embedding_cache.set(settings.EMBEDDING_MODEL, "b", _vector(2))
+        service.embedding_cache._counters["misses"] = 0
+        
+        mock_response = Mock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "data": [
+                {"index": 1, "embedding": _vector(3)},
+                {"index": 0, "embedding": _vector(1)},
+            ]
+        }
+        mock_post.return_value = mock_response
+        
+        result = await service.generate_embeddings(["a", "b", "c"])
+        
+        assert result == [_vector(1), _vector(2), _vector(3)]
+        assert mock_post.call_args.kwargs["json"]["input"] == ["a", "c"]
+        assert service.embedding_cache.stats()["misses"] == 2
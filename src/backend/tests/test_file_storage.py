@@ -3,16 +3,22 @@
 测试文件存储、验证、管理等功能
 """
 
+import hashlib
 import pytest
+import tracemalloc
 import uuid
 from pathlib import Path
 from io import BytesIO
+from types import SimpleNamespace
 from PIL import Image
 from fastapi import UploadFile, HTTPException
 from httpx import AsyncClient
+from sqlalchemy import select
 from starlette.datastructures import Headers
 
-from app.services.file_storage import FileStorageService
+from app.core.config import settings
+from app.models import FileBlob, FileUpload
+from app.services.file_storage import CHUNK_SIZE, FileStorageService, sniff_image_type
 
 
 class TestFileValidation:
@@ -84,44 +90,6 @@ class TestFileValidation:
         assert "文件大小超过限制" in exc_info.value.detail
 
 
-class TestFileNameGeneration:
-    """测试文件名生成"""
-    
-    @pytest.fixture
-    def service(self):
-        """创建文件存储服务实例"""
-        return FileStorageService()
-    
-    def test_generate_filename(self, service):
-        """测试生成唯一文件名"""
-        filename1, ext1 = service.generate_filename("test.jpg")
-        filename2, ext2 = service.generate_filename("test.jpg")
-        
-        # 两次生成的文件名应该不同
-        assert filename1 != filename2
-        
-        # 应该保留原始扩展名
-        assert ext1 == ".jpg"
-        assert ext2 == ".jpg"
-        assert filename1.endswith(".jpg")
-        assert filename2.endswith(".jpg")
-    
-    def test_generate_filename_preserves_extension(self, service):
-        """测试保留文件扩展名"""
-        extensions = [".jpg", ".png", ".jpeg", ".gif", ".webp"]
-        
-        for ext in extensions:
-            filename, returned_ext = service.generate_filename(f"test{ext}")
-            assert returned_ext == ext.lower()
-            assert filename.endswith(ext.lower())
-    
-    def test_generate_filename_no_extension(self, service):
-        """测试没有扩展名的文件"""
-        filename, ext = service.generate_filename("test")
-        assert len(filename) > 0
-        assert ext == ""
-
-
 class TestLocalStorage:
     """测试本地存储功能"""
     
@@ -146,42 +114,13 @@ class TestLocalStorage:
         img_bytes.seek(0)
         return img_bytes
     
-    @pytest.mark.asyncio
-    async def test_save_file_local(self, service, test_image):
-        """测试保存文件到本地"""
-        headers = Headers({"content-type": "image/jpeg"})
-        upload_file = UploadFile(
-            file=test_image,
-            filename="test.jpg",
-            headers=headers
-        )
-        
-        stored_filename, ext = service.generate_filename("test.jpg")
-        file_url = await service.save_file_local(upload_file, stored_filename)
-        
-        assert file_url is not None
-        assert file_url.startswith("/uploads/images/")
-        assert stored_filename in file_url
-        
-        # 验证文件存在
-        file_path = service.images_dir / stored_filename
-        assert file_path.exists()
-    
     @pytest.mark.asyncio
     async def test_delete_file_local(self, service, test_image):
         """测试删除本地文件"""
-        headers = Headers({"content-type": "image/jpeg"})
-        upload_file = UploadFile(
-            file=test_image,
-            filename="test.jpg",
-            headers=headers
-        )
-        
         # 先保存文件
-        stored_filename, ext = service.generate_filename("test.jpg")
-        await service.save_file_local(upload_file, stored_filename)
-        
+        stored_filename = f"20240101_{uuid.uuid4().hex[:8]}.jpg"
         file_path = service.images_dir / stored_filename
+        file_path.write_bytes(test_image.getvalue())
         assert file_path.exists()
         
         # 删除文件
@@ -348,3 +287,376 @@ class TestFileMetadata:
         assert update_response.status_code == 200
         data = update_response.json()
         assert data["status"] == "processed"
+
+
+class TestContentAddressedStorage:
+    """测试内容寻址存储（去重和引用计数）"""
+    
+    @pytest.fixture
+    def service(self, tmp_path):
+        """创建文件存储服务实例（使用临时目录）"""
+        service = FileStorageService()
+        service.upload_dir = tmp_path / "uploads"
+        service.images_dir = service.upload_dir / "images"
+        service.images_dir.mkdir(parents=True)
+        service.use_oss = False
+        return service
+    
+    @staticmethod
+    def _upload(content: bytes, filename: str = "photo.jpg") -> UploadFile:
+        """创建上传文件"""
+        return UploadFile(file=BytesIO(content), filename=filename, headers=Headers({"content-type": "image/jpeg"}))
+    
+    @staticmethod
+    async def _store(service, db_session, test_user, content: bytes, filename: str = "photo.jpg") -> FileUpload:
+        """保存文件并写入上传记录"""
+        stored_filename, file_url, file_size, content_hash = await service.store_file(
+            db_session, TestContentAddressedStorage._upload(content, filename)
+        )
+        file_upload = FileUpload(
+            user_id=test_user.id,
+            original_filename=filename,
+            stored_filename=stored_filename,
+            file_url=file_url,
+            file_size=file_size,
+            mime_type="image/jpeg",
+            content_hash=content_hash,
+            status="pending",
+        )
+        db_session.add(file_upload)
+        await db_session.commit()
+        return file_upload
+    
+    @staticmethod
+    async def _blob(db_session, content: bytes):
+        """读取存储文件记录"""
+        result = await db_session.execute(
+            select(FileBlob)
+            .where(FileBlob.content_hash == hashlib.sha256(content).hexdigest())
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+    
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_blob(self, service, db_session, test_user):
+        """测试内容相同的上传只存储一份"""
+        content = b"\xff\xd8\xff\xe0" + b"worksheet" * 100
+        first = await self._store(service, db_session, test_user, content, "a.jpg")
+        second = await self._store(service, db_session, test_user, content, "b.JPG")
+        other = await self._store(service, db_session, test_user, content + b"!", "c.jpg")
+        
+        digest = hashlib.sha256(content).hexdigest()
+        assert first.stored_filename == second.stored_filename == f"{digest}.jpg"
+        assert first.file_url == f"/uploads/images/{digest}.jpg"
+        assert first.content_hash == digest
+        assert other.stored_filename != first.stored_filename
+        assert sorted(path.name for path in service.images_dir.iterdir()) == sorted(
+            [first.stored_filename, other.stored_filename]
+        )
+        assert (service.images_dir / first.stored_filename).read_bytes() == content
+        assert (await self._blob(db_session, content)).ref_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_last_reference_deletes_blob(self, service, db_session, test_user):
+        """测试删除最后一个引用时才删除文件，之后重新上传会重新写入"""
+        content = b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes
+        first = await self._store(service, db_session, test_user, content)
+        second = await self._store(service, db_session, test_user, content)
+        path = service.images_dir / first.stored_filename
+        
+        async with service.release_file(db_session, first):
+            await db_session.delete(first)
+            await db_session.commit()
+        assert path.exists()
+        assert (await self._blob(db_session, content)).ref_count == 1
+        
+        async with service.release_file(db_session, second):
+            await db_session.delete(second)
+            await db_session.commit()
+        assert not path.exists()
+        assert list(service.images_dir.iterdir()) == []
+        assert await self._blob(db_session, content) is None
+        
+        third = await self._store(service, db_session, test_user, content)
+        assert (service.images_dir / third.stored_filename).read_bytes() == content
+        assert (await self._blob(db_session, content)).ref_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_failed_delete_restores_blob(self, service, db_session, test_user):
+        """测试删除事务失败时文件恢复原名"""
+        content = b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes
+        file_upload = await self._store(service, db_session, test_user, content)
+        file_id, stored_filename = file_upload.id, file_upload.stored_filename
+        
+        with pytest.raises(RuntimeError):
+            async with service.release_file(db_session, file_upload):
+                assert not (service.images_dir / stored_filename).exists()
+                raise RuntimeError("commit failed")
+        await db_session.rollback()
+        
+        assert [path.name for path in service.images_dir.iterdir()] == [stored_filename]
+        assert (await self._blob(db_session, content)).ref_count == 1
+        assert await db_session.get(FileUpload, file_id) is not None
+    
+    @pytest.mark.asyncio
+    async def test_legacy_file_deleted(self, service, db_session, test_user):
+        """测试迁移前上传的文件在删除记录后直接删除"""
+        stored_filename = f"20240101_{uuid.uuid4().hex[:8]}.jpg"
+        (service.images_dir / stored_filename).write_bytes(b"legacy")
+        file_upload = FileUpload(
+            user_id=test_user.id,
+            original_filename="legacy.jpg",
+            stored_filename=stored_filename,
+            file_url=f"/uploads/images/{stored_filename}",
+            file_size=6,
+            mime_type="image/jpeg",
+            status="pending",
+        )
+        db_session.add(file_upload)
+        await db_session.commit()
+        
+        async with service.release_file(db_session, file_upload):
+            await db_session.delete(file_upload)
+            await db_session.commit()
+        
+        assert not (service.images_dir / stored_filename).exists()
+    
+    @pytest.mark.asyncio
+    async def test_backfill_and_report(self, service, db_session, test_user):
+        """测试迁移已有文件并统计节省的空间"""
+        duplicate = b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes * 10
+        unique = b"\x89PNG" + uuid.uuid4().bytes
+        legacy = []
+        for content, name in ((duplicate, "a.jpg"), (duplicate, "b.jpg"), (unique, "c.png"), (None, "gone.jpg")):
+            stored_filename = f"20240101_{uuid.uuid4().hex[:8]}{Path(name).suffix}"
+            if content is not None:
+                (service.images_dir / stored_filename).write_bytes(content)
+            legacy.append(FileUpload(
+                user_id=test_user.id,
+                original_filename=name,
+                stored_filename=stored_filename,
+                file_url=f"/uploads/images/{stored_filename}",
+                file_size=len(content or b""),
+                mime_type="image/jpeg",
+                status="pending",
+            ))
+        db_session.add_all(legacy)
+        await db_session.commit()
+        file_ids = [file_upload.id for file_upload in legacy]
+        
+        before = await service.storage_report(db_session)
+        assert before["legacy_files"] == 4
+        assert before["saved_bytes"] == 0
+        
+        progress = []
+        stats = await service.backfill_blobs(db_session, batch_size=2, on_progress=progress.append)
+        
+        assert stats == {
+            "processed": 4,
+            "stored": 2,
+            "deduplicated": 1,
+            "missing": 1,
+            "removed_files": 3,
+            "freed_bytes": len(duplicate) * 2 + len(unique),
+        }
+        assert len(progress) == 2
+        assert sorted(path.name for path in service.images_dir.iterdir()) == sorted([
+            f"{hashlib.sha256(duplicate).hexdigest()}.jpg",
+            f"{hashlib.sha256(unique).hexdigest()}.png",
+        ])
+        
+        uploads = (await db_session.execute(
+            select(FileUpload).where(FileUpload.id.in_(file_ids)).execution_options(populate_existing=True)
+        )).scalars().all()
+        by_name = {file_upload.original_filename: file_upload for file_upload in uploads}
+        assert by_name["a.jpg"].stored_filename == by_name["b.jpg"].stored_filename
+        assert by_name["a.jpg"].content_hash == hashlib.sha256(duplicate).hexdigest()
+        assert by_name["gone.jpg"].content_hash is None
+        assert (await self._blob(db_session, duplicate)).ref_count == 2
+        
+        report = await service.storage_report(db_session)
+        assert report["blobs"] == 2
+        assert report["blob_references"] == 3
+        assert report["legacy_files"] == 1
+        assert report["saved_bytes"] == len(duplicate)
+        assert report["dedup_ratio"] > 1
+        
+        # 重新执行只会再检查缺失的文件
+        stats = await service.backfill_blobs(db_session)
+        assert (stats["processed"], stats["missing"], stats["stored"]) == (1, 1, 0)
+
+
+class PatternStream:
+    """按块生成 JPEG 文件内容的文件对象（不在内存中保存整个文件，记录读取的字节数）"""
+    
+    def __init__(self, total_size=None):
+        """total_size 为 None 时无限长"""
+        self.total_size = total_size
+        self.bytes_read = 0
+        self.block = b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes * (CHUNK_SIZE // 16)
+    
+    def read(self, size=-1):
+        remaining = CHUNK_SIZE if self.total_size is None else self.total_size - self.bytes_read
+        size = min(size if size > 0 else CHUNK_SIZE, CHUNK_SIZE, remaining)
+        self.bytes_read += size
+        return self.block[:size]
+
+
+class FakeOSSBucket:
+    """记录分片上传的 OSS Bucket 替身"""
+    
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.part_sizes = []
+        self.aborted = 0
+    
+    def init_multipart_upload(self, key):
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {}
+        return SimpleNamespace(upload_id=upload_id)
+    
+    def upload_part(self, key, upload_id, part_number, data):
+        self.uploads[upload_id][part_number] = bytes(data)
+        self.part_sizes.append(len(data))
+        return SimpleNamespace(etag=hashlib.md5(data).hexdigest())
+    
+    def complete_multipart_upload(self, key, upload_id, parts):
+        stored = self.uploads.pop(upload_id)
+        self.objects[key] = b"".join(stored[part.part_number] for part in parts)
+    
+    def abort_multipart_upload(self, key, upload_id):
+        self.uploads.pop(upload_id)
+        self.aborted += 1
+    
+    def object_exists(self, key):
+        return key in self.objects
+    
+    def copy_object(self, bucket_name, source, target):
+        self.objects[target] = self.objects[source]
+    
+    def delete_object(self, key):
+        self.objects.pop(key, None)
+
+
+class TestStreamingUpload:
+    """测试分块流式上传"""
+    
+    @pytest.fixture
+    def service(self, tmp_path):
+        """创建文件存储服务实例（使用临时目录）"""
+        service = FileStorageService()
+        service.upload_dir = tmp_path / "uploads"
+        service.images_dir = service.upload_dir / "images"
+        service.images_dir.mkdir(parents=True)
+        service.use_oss = False
+        return service
+    
+    @staticmethod
+    def _upload(file, filename="scan.jpg", size=None, content_type="image/jpeg") -> UploadFile:
+        """创建上传文件"""
+        return UploadFile(file=file, filename=filename, size=size, headers=Headers({"content-type": content_type}))
+    
+    def test_sniff_image_type(self):
+        """测试按文件头识别图片格式"""
+        png = BytesIO()
+        Image.new("RGB", (4, 4)).save(png, format="PNG")
+        
+        assert sniff_image_type(png.getvalue()[:8]) == "image/png"
+        assert sniff_image_type(b"\xff\xd8\xff\xdb") == "image/jpeg"
+        assert sniff_image_type(b"GIF89a") is None
+        assert sniff_image_type(b"") is None
+    
+    @pytest.mark.asyncio
+    async def test_memory_independent_of_file_size(self, service, db_session, monkeypatch):
+        """测试保存大文件时内存占用只有几个块"""
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 64 * 1024 * 1024)
+        file_size = 32 * 1024 * 1024
+        stream = PatternStream(file_size)
+        
+        tracemalloc.start()
+        try:
+            stored_filename, _, size, content_hash = await service.store_file(
+                db_session, self._upload(stream, size=file_size)
+            )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        await db_session.commit()
+        
+        assert size == file_size
+        assert peak < 8 * CHUNK_SIZE
+        assert (service.images_dir / stored_filename).stat().st_size == file_size
+        assert [path.name for path in service.images_dir.iterdir()] == [stored_filename]
+        expected = hashlib.sha256()
+        for _ in range(file_size // CHUNK_SIZE):
+            expected.update(stream.block[:CHUNK_SIZE])
+        assert content_hash == expected.hexdigest()
+    
+    @pytest.mark.asyncio
+    async def test_oversize_aborted_while_streaming(self, service, monkeypatch):
+        """测试大小未知的文件读取超过限制时立即停止"""
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 3 * CHUNK_SIZE + 100)
+        stream = PatternStream()
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await service._receive(self._upload(stream))
+        
+        assert exc_info.value.status_code == 400
+        assert "文件大小超过限制" in exc_info.value.detail
+        assert stream.bytes_read == 4 * CHUNK_SIZE
+        assert list(service.images_dir.iterdir()) == []
+    
+    @pytest.mark.asyncio
+    async def test_declared_size_rejected_before_reading(self, service):
+        """测试解析请求时已知大小超过限制的文件不读取内容"""
+        stream = PatternStream()
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await service.store_file(None, self._upload(stream, size=settings.MAX_UPLOAD_SIZE + 1))
+        
+        assert "文件大小超过限制" in exc_info.value.detail
+        
+        assert stream.bytes_read == 0
+    
+    @pytest.mark.asyncio
+    async def test_content_not_image_rejected(self, service, db_session):
+        """测试 Content-Type 为图片但内容不是图片时拒绝"""
+        with pytest.raises(HTTPException) as exc_info:
+            await service.store_file(db_session, self._upload(BytesIO(b"This is a text file")))
+        
+        assert exc_info.value.status_code == 400
+        assert "不是支持的图片格式" in exc_info.value.detail
+        assert list(service.images_dir.iterdir()) == []
+        
+        with pytest.raises(HTTPException):
+            await service.store_file(db_session, self._upload(BytesIO(b"\xff")))
+    
+    @pytest.mark.asyncio
+    async def test_oss_multipart_upload(self, service, db_session, monkeypatch):
+        """测试 OSS 存储时每块上传为一个分片，已有相同内容时删除临时对象"""
+        bucket = FakeOSSBucket()
+        service.use_oss = True
+        service.oss_bucket = bucket
+        file_size = 2 * CHUNK_SIZE + CHUNK_SIZE // 2
+        stream = PatternStream(file_size)
+        
+        stored_filename, _, _, _ = await service.store_file(db_session, self._upload(stream, size=file_size))
+        await db_session.commit()
+        
+        assert bucket.part_sizes == [CHUNK_SIZE, CHUNK_SIZE, CHUNK_SIZE // 2]
+        assert list(bucket.objects) == [f"images/{stored_filename}"]
+        assert bucket.objects[f"images/{stored_filename}"] == stream.block[:CHUNK_SIZE] * 2 + stream.block[:CHUNK_SIZE // 2]
+        
+        duplicate = PatternStream(file_size)
+        duplicate.block = stream.block
+        assert (await service.store_file(db_session, self._upload(duplicate, size=file_size)))[0] == stored_filename
+        await db_session.commit()
+        assert list(bucket.objects) == [f"images/{stored_filename}"]
+        
+        monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", CHUNK_SIZE)
+        with pytest.raises(HTTPException):
+            await service._receive(self._upload(PatternStream()))
+        assert bucket.aborted == 1
+        assert bucket.uploads == {}
+        assert list(bucket.objects) == [f"images/{stored_filename}"]
@@ -0,0 +1,235 @@
+"""
+图谱导出测试
+测试 NDJSON 和 Parquet 导出的内容、已删除节点的过滤、向量的二进制编码和参数校验
+"""
+
+import base64
+import io
+import json
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.models import KnowledgeTag, MemoryNode, NodeRelation, NodeTag, ReviewLog
+from app.services import graph_export_service
+from app.services.graph_export_service import PARQUET_AVAILABLE
+
+
+def embedding_vector():
+    """测试用的向量（各分量不同，便于检查字节序）"""
+    return [i / settings.EMBEDDING_DIMENSION for i in range(settings.EMBEDDING_DIMENSION)]
+
+
+@pytest.fixture
+async def export_data(db_session, test_user, test_graph):
+    """创建图谱数据：三个节点（其中一个已删除）、标签、关联和复习记录"""
+    graph_id, user_id = test_graph.id, test_user.id
+    nodes = [
+        MemoryNode(
+            graph_id=graph_id,
+            user_id=user_id,
+            node_type="CONCEPT",
+            title=f"Node {i}",
+            content_data={"index": i},
+            position_x=float(i),
+            content_embedding=embedding_vector() if i == 0 else None,
+            deleted_at=datetime.now(timezone.utc) if i == 2 else None,
+        )
+        for i in range(3)
+    ]
+    tag = KnowledgeTag(graph_id=graph_id, name="algebra")
+    db_session.add_all(nodes + [tag])
+    await db_session.flush()
+    
+    db_session.add_all([NodeTag(node_id=node.id, tag_id=tag.id) for node in nodes])
+    db_session.add_all([
+        NodeRelation(graph_id=graph_id, source_id=nodes[0].id, target_id=nodes[1].id, relation_type="PREREQUISITE"),
+        NodeRelation(graph_id=graph_id, source_id=nodes[1].id, target_id=nodes[2].id, relation_type="RELATED"),
+    ])
+    db_session.add_all([
+        ReviewLog(
+            node_id=node.id,
+            user_id=user_id,
+            review_mode="spaced",
+            mastery_feedback="remembered",
+            node_state_snapshot={"quality": 4},
+        )
+        for node in nodes
+    ])
+    await db_session.commit()
+    return {"graph_id": str(graph_id), "node_ids": [str(node.id) for node in nodes]}
+
+
+def parse_ndjson(content: bytes):
+    """解析 NDJSON 导出"""
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+class TestGraphExportNdjson:
+    """测试 NDJSON 导出"""
+    
+    @pytest.mark.asyncio
+    async def test_export_ndjson(self, client, auth_headers, export_data):
+        """测试导出的记录、行数和已删除节点的过滤"""
+        graph_id, node_ids = export_data["graph_id"], export_data["node_ids"]
+        
+        response = await client.get(f"/api/v1/graphs/{graph_id}/export", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        assert f'graph-{graph_id}.ndjson' in response.headers["content-disposition"]
+        
+        records = parse_ndjson(response.content)
+        header, end = records[0], records[-1]
+        assert header["type"] == "graph"
+        assert header["id"] == graph_id
+        assert header["embeddings"] == "exclude"
+        assert end == {
+            "type": "end",
+            "counts": {"nodes": 2, "tags": 1, "node_tags": 2, "relations": 1, "review_logs": 2},
+        }
+        
+        by_type = {}
+        for record in records[1:-1]:
+            by_type.setdefault(record["type"], []).append(record)
+        nodes = {node["id"]: node for node in by_type["node"]}
+        assert set(nodes) == set(node_ids[:2])
+        assert nodes[node_ids[1]]["content_data"] == {"index": 1}
+        assert nodes[node_ids[1]]["position_x"] == 1.0
+        assert "embedding" not in nodes[node_ids[0]]
+        datetime.fromisoformat(nodes[node_ids[0]]["created_at"])
+        
+        relation = by_type["relation"][0]
+        assert (relation["source_id"], relation["target_id"]) == (node_ids[0], node_ids[1])
+        assert {log["node_id"] for log in by_type["review_log"]} == set(node_ids[:2])
+        assert by_type["review_log"][0]["node_state_snapshot"] == {"quality": 4}
+        assert by_type["tag"][0]["name"] == "algebra"
+        assert by_type["tag"][0]["parent_id"] is None
+    
+    @pytest.mark.asyncio
+    async def test_export_binary_embeddings(self, client, auth_headers, export_data):
+        """测试向量导出为 base64 编码的 float32 小端字节"""
+        graph_id, node_ids = export_data["graph_id"], export_data["node_ids"]
+        
+        response = await client.get(
+            f"/api/v1/graphs/{graph_id}/export", params={"embeddings": "binary"}, headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        records = parse_ndjson(response.content)
+        assert records[0]["embedding_dtype"] == "float32"
+        assert records[0]["embedding_dimension"] == settings.EMBEDDING_DIMENSION
+        nodes = {record["id"]: record for record in records if record["type"] == "node"}
+        vector = np.frombuffer(base64.b64decode(nodes[node_ids[0]]["embedding"]), dtype="<f4")
+        np.testing.assert_allclose(vector, embedding_vector(), rtol=1e-6)
+        assert nodes[node_ids[1]]["embedding"] is None
+    
+    @pytest.mark.asyncio
+    async def test_export_streams_in_chunks(self, client, auth_headers, export_data, monkeypatch):
+        """测试游标分批读取时各批的输出拼接完整"""
+        monkeypatch.setattr(settings, "GRAPH_EXPORT_FETCH_SIZE", 1)
+        monkeypatch.setattr(graph_export_service, "EXPORT_FLUSH_BYTES", 1)
+        
+        response = await client.get(f"/api/v1/graphs/{export_data['graph_id']}/export", headers=auth_headers)
+        
+        records = parse_ndjson(response.content)
+        assert len(records) == 1 + 8 + 1
+        assert records[-1]["counts"]["nodes"] == 2
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow 未安装")
+class TestGraphExportParquet:
+    """测试 Parquet 导出"""
+    
+    @pytest.mark.asyncio
+    async def test_export_parquet(self, client, auth_headers, export_data, monkeypatch):
+        """测试 ZIP 中各表的 Parquet 文件、行组和图谱信息"""
+        import pyarrow.parquet as pq
+        
+        monkeypatch.setattr(settings, "GRAPH_EXPORT_ROW_GROUP_SIZE", 1)
+        graph_id, node_ids = export_data["graph_id"], export_data["node_ids"]
+        
+        response = await client.get(
+            f"/api/v1/graphs/{graph_id}/export",
+            params={"format": "parquet", "embeddings": "binary"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert sorted(archive.namelist()) == [
+            "graph.json", "node_tags.parquet", "nodes.parquet", "relations.parquet",
+            "review_logs.parquet", "tags.parquet",
+        ]
+        info = json.loads(archive.read("graph.json"))
+        assert info["id"] == graph_id
+        assert info["counts"]["nodes"] == 2
+        
+        nodes_file = pq.ParquetFile(io.BytesIO(archive.read("nodes.parquet")))
+        assert nodes_file.metadata.num_row_groups == 2
+        assert nodes_file.schema_arrow.metadata[b"graph_id"] == graph_id.encode()
+        nodes = {row["id"]: row for row in nodes_file.read().to_pylist()}
+        assert set(nodes) == set(node_ids[:2])
+        assert json.loads(nodes[node_ids[1]]["content_data"]) == {"index": 1}
+        assert nodes[node_ids[0]]["created_at"].tzinfo is not None
+        vector = np.frombuffer(nodes[node_ids[0]]["embedding"], dtype="<f4")
+        np.testing.assert_allclose(vector, embedding_vector(), rtol=1e-6)
+        
+        relations = pq.read_table(io.BytesIO(archive.read("relations.parquet"))).to_pylist()
+        assert [(row["source_id"], row["target_id"]) for row in relations] == [(node_ids[0], node_ids[1])]
+        assert pq.read_table(io.BytesIO(archive.read("review_logs.parquet"))).num_rows == 2
+    
+    @pytest.mark.asyncio
+    async def test_export_parquet_empty_graph(self, client, auth_headers, test_graph):
+        """测试空图谱的 Parquet 文件只有表结构"""
+        import pyarrow.parquet as pq
+        
+        response = await client.get(
+            f"/api/v1/graphs/{test_graph.id}/export", params={"format": "parquet"}, headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        table = pq.read_table(io.BytesIO(archive.read("nodes.parquet")))
+        assert table.num_rows == 0
+        assert "embedding" not in table.column_names
+
+
+class TestGraphExportValidation:
+    """测试参数校验"""
+    
+    @pytest.mark.asyncio
+    async def test_export_invalid_params(self, client, auth_headers, test_graph):
+        """测试不支持的格式和向量导出方式"""
+        url = f"/api/v1/graphs/{test_graph.id}/export"
+        
+        response = await client.get(url, params={"format": "csv"}, headers=auth_headers)
+        assert response.status_code == 422
+        
+        response = await client.get(url, params={"embeddings": "float"}, headers=auth_headers)
+        assert response.status_code == 422
+    
+    @pytest.mark.asyncio
+    async def test_export_graph_not_found(self, client, auth_headers):
+        """测试导出不存在的图谱"""
+        response = await client.get(f"/api/v1/graphs/{uuid.uuid4()}/export", headers=auth_headers)
+        
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_export_parquet_unavailable(self, client, auth_headers, test_graph, monkeypatch):
+        """测试未安装 pyarrow 时拒绝 Parquet 导出"""
+        from app.api.v1.endpoints import knowledge_graphs
+        
+        monkeypatch.setattr(knowledge_graphs, "PARQUET_AVAILABLE", False)
+        
+        response = await client.get(
+            f"/api/v1/graphs/{test_graph.id}/export", params={"format": "parquet"}, headers=auth_headers
+        )
+        
+        assert response.status_code == 400
@@ -0,0 +1,238 @@
+"""
+图谱布局测试
+测试网格近似斥力、力导向布局的收敛和增量布局，以及布局接口写回坐标
+"""
+
+import pytest
+import numpy as np
+from sqlalchemy import text, update
+
+from app.models import MemoryNode, NodeRelation, ViewConfig
+from app.services.graph_layout_service import (
+    GraphLayoutService,
+    _repulsion,
+    force_directed_layout,
+)
+from tests.conftest import node_positions, seed_nodes
+
+
+@pytest.fixture(scope="module", autouse=True)
+def layout_executor():
+    """模块结束时关闭布局进程池"""
+    yield
+    GraphLayoutService.shutdown()
+
+
+def two_clusters(size=30):
+    """两个各自全连接的簇，簇之间只有一条关联"""
+    sources, targets = [], []
+    for offset in (0, size):
+        for i in range(size):
+            for j in range(i + 1, size):
+                sources.append(offset + i)
+                targets.append(offset + j)
+    sources.append(0)
+    targets.append(size)
+    return np.array(sources), np.array(targets), np.full(len(sources), 50.0)
+
+
+def exact_repulsion(positions, ideal_edge_length):
+    """逐对计算的斥力（对照）"""
+    delta = positions[:, None, :] - positions[None, :, :]
+    distance2 = np.maximum((delta ** 2).sum(axis=-1), (ideal_edge_length * 0.01) ** 2)
+    np.fill_diagonal(distance2, np.inf)
+    return (delta * (ideal_edge_length ** 2 / distance2)[..., None]).sum(axis=1)
+
+
+class TestForceDirectedLayout:
+    """测试布局算法"""
+    
+    @pytest.mark.parametrize("dimensions", [2, 3])
+    def test_grid_repulsion_close_to_exact(self, dimensions):
+        """测试网格近似的斥力与逐对计算的方向基本一致"""
+        positions = np.random.default_rng(0).uniform(-300, 300, size=(1500, dimensions))
+        
+        approx = _repulsion(positions, 30.0, np.full(dimensions, 0.5))
+        exact = exact_repulsion(positions, 30.0)
+        
+        cosine = (approx * exact).sum(axis=1) / np.linalg.norm(approx, axis=1) / np.linalg.norm(exact, axis=1)
+        assert np.median(cosine) > 0.99
+    
+    @pytest.mark.parametrize("dimensions", [2, 3])
+    def test_clusters_separate(self, dimensions):
+        """测试从零坐标开始布局后两个簇分开，节点不重合"""
+        sources, targets, strengths = two_clusters()
+        positions = force_directed_layout(
+            np.zeros((60, dimensions)), np.zeros(60, dtype=bool), sources, targets, strengths,
+            iterations=100, seed=1
+        )
+        
+        assert positions.shape == (60, dimensions)
+        assert np.isfinite(positions).all()
+        first, second = positions[:30], positions[30:]
+        spread = max(np.linalg.norm(first - first.mean(axis=0), axis=1).mean(),
+                     np.linalg.norm(second - second.mean(axis=0), axis=1).mean())
+        assert np.linalg.norm(first.mean(axis=0) - second.mean(axis=0)) > 2 * spread
+        
+        distance = np.linalg.norm(positions[:, None, :] - positions[None, :, :], axis=-1)
+        np.fill_diagonal(distance, np.inf)
+        assert distance.min() > 1.0
+    
+    def test_incremental_layout(self):
+        """测试已布局的图谱继续布局时只做局部调整，新节点放在邻居附近，相同种子结果相同"""
+        sources, targets, strengths = two_clusters()
+        positions = force_directed_layout(
+            np.zeros((60, 2)), np.zeros(60, dtype=bool), sources, targets, strengths, iterations=100, seed=1
+        )
+        extent = np.ptp(positions, axis=0).max()
+        
+        # 新节点 60 只与第二个簇的节点 45 相连
+        grown = np.vstack([positions, [0.0, 0.0]])
+        placed = np.arange(61) < 60
+        new_sources, new_targets = np.append(sources, 45), np.append(targets, 60)
+        new_strengths = np.append(strengths, 50.0)
+        relaid = force_directed_layout(grown, placed, new_sources, new_targets, new_strengths, iterations=20, seed=2)
+        
+        assert np.linalg.norm(relaid[:60] - positions, axis=1).mean() < 0.1 * extent
+        second_center = relaid[30:60].mean(axis=0)
+        assert np.linalg.norm(relaid[60] - second_center) < np.linalg.norm(relaid[60] - relaid[:30].mean(axis=0))
+        
+        again = force_directed_layout(grown, placed, new_sources, new_targets, new_strengths, iterations=20, seed=2)
+        assert np.array_equal(relaid, again)
+    
+    def test_resolve_params(self):
+        """测试参数优先级：请求参数 > 视图配置 > 默认值"""
+        params = GraphLayoutService.resolve_params(
+            {"dimensions": 3, "iterations": "80", "unknown": 1}, {"iterations": 10}
+        )
+        assert params["dimensions"] == 3
+        assert params["iterations"] == 10
+        assert "unknown" not in params
+        
+        with pytest.raises(ValueError):
+            GraphLayoutService.resolve_params({"dimensions": 4})
+        with pytest.raises(ValueError):
+            GraphLayoutService.resolve_params({"iterations": "many"})
+
+
+async def seed_chain(db_session, user, graph, count=12):
+    """生成坐标 X/Y 为 0 的节点（最后一个软删除）和一条链状关联"""
+    nodes = await seed_nodes(db_session, user, graph, count, title="layout node")
+    db_session.add_all([
+        NodeRelation(graph_id=graph.id, source_id=nodes[i].id, target_id=nodes[i + 1].id,
+                     relation_type="RELATED", created_by=user.id)
+        for i in range(count - 1)
+    ])
+    nodes[-1].deleted_at = nodes[-1].created_at
+    await db_session.commit()
+    return nodes
+
+
+class TestGraphLayoutAPI:
+    """测试布局接口"""
+    
+    @pytest.mark.asyncio
+    async def test_layout_writes_positions(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试 2D 布局写回 X/Y 坐标、保留 Z 坐标，跳过软删除节点，并使快照 ETag 改变"""
+        nodes = await seed_chain(db_session, test_user, test_graph)
+        snapshot_url = f"/api/v1/graphs/{test_graph.id}/snapshot"
+        etag = (await client.get(snapshot_url, headers=auth_headers)).headers["etag"]
+        
+        response = await client.post(
+            f"/api/v1/graphs/{test_graph.id}/layout",
+            headers=auth_headers,
+            json={"iterations": 30, "seed": 3}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["layout_engine"] == "force-directed"
+        assert data["node_count"] == len(nodes) - 1
+        assert data["relation_count"] == len(nodes) - 2
+        assert data["dimensions"] == 2
+        
+        positions = await node_positions(db_session, nodes)
+        laid_out = [positions[node.id] for node in nodes[:-1]]
+        assert len({(x, y) for x, y, _ in laid_out}) == len(laid_out)
+        assert all(z == 7.0 for _, _, z in laid_out)
+        assert positions[nodes[-1].id] == (0.0, 0.0, 7.0)
+        assert (await client.get(snapshot_url, headers=auth_headers)).headers["etag"] != etag
+    
+    @pytest.mark.asyncio
+    async def test_view_config_params(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试使用视图配置的布局参数，以及不支持的布局引擎、不存在的图谱"""
+        nodes = await seed_chain(db_session, test_user, test_graph, count=6)
+        view_3d = ViewConfig(
+            user_id=test_user.id, graph_id=test_graph.id, name="3d",
+            layout_engine="force-directed", layout_params={"dimensions": 3, "iterations": 5}
+        )
+        view_tree = ViewConfig(
+            user_id=test_user.id, graph_id=test_graph.id, name="tree", layout_engine="hierarchical"
+        )
+        db_session.add_all([view_3d, view_tree])
+        await db_session.commit()
+        url = f"/api/v1/graphs/{test_graph.id}/layout"
+        
+        response = await client.post(url, headers=auth_headers, json={"view_config_id": str(view_3d.id)})
+        assert response.status_code == 200
+        assert (response.json()["dimensions"], response.json()["iterations"]) == (3, 5)
+        positions = await node_positions(db_session, nodes[:-1])
+        assert all(z != 7.0 for _, _, z in positions.values())
+        
+        response = await client.post(url, headers=auth_headers, json={"view_config_id": str(view_tree.id)})
+        assert response.status_code == 400
+        
+        response = await client.post(url, headers=auth_headers, json={"iterations": 100000})
+        assert response.status_code == 400
+        
+        response = await client.post(f"/api/v1/graphs/{nodes[0].id}/layout", headers=auth_headers, json={})
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_load_null_strength(self, db_session, test_user, test_graph):
+        """测试强度为空的关联按默认强度加载，各列不错位（数据库建表脚本中 strength 可为空）"""
+        nodes = await seed_chain(db_session, test_user, test_graph, count=4)
+        first_id, graph_id = nodes[0].id, test_graph.id
+        await db_session.execute(update(NodeRelation).where(NodeRelation.graph_id == graph_id).values(strength=80))
+        await db_session.commit()
+        
+        await db_session.execute(text("ALTER TABLE node_relations ALTER COLUMN strength DROP NOT NULL"))
+        try:
+            await db_session.execute(
+                text("UPDATE node_relations SET strength = NULL WHERE source_id = :source"), {"source": first_id}
+            )
+            layout = await GraphLayoutService.load(db_session, graph_id)
+        finally:
+            await db_session.rollback()
+        
+        assert len(layout["ids"]) == 3
+        assert sorted(layout["strengths"].tolist()) == [50.0, 80.0]
+    
+    @pytest.mark.asyncio
+    async def test_null_positions(self, db_session, test_user, test_graph):
+        """测试坐标为空的节点按 0 加载（尚未布局），2D 布局写回 X/Y、保留为空的 Z 坐标"""
+        nodes = await seed_chain(db_session, test_user, test_graph, count=4)
+        ids, graph_id = [node.id for node in nodes], test_graph.id
+        
+        for column in ("position_x", "position_y", "position_z"):
+            await db_session.execute(text(f"ALTER TABLE memory_nodes ALTER COLUMN {column} DROP NOT NULL"))
+        try:
+            await db_session.execute(
+                update(MemoryNode).where(MemoryNode.id == ids[0])
+                .values(position_x=None, position_y=None, position_z=None)
+            )
+            await db_session.execute(update(MemoryNode).where(MemoryNode.id == ids[1]).values(position_z=None))
+            layout = await GraphLayoutService.load(db_session, graph_id)
+            stats = await GraphLayoutService.compute(
+                db_session, graph_id, GraphLayoutService.resolve_params(overrides={"iterations": 10, "seed": 1})
+            )
+            positions = await node_positions(db_session, nodes)
+        finally:
+            await db_session.rollback()
+        
+        assert len(layout["ids"]) == 3
+        assert layout["positions"][layout["ids"].index(ids[0])].tolist() == [0.0, 0.0, 0.0]
+        assert stats["node_count"] == 3
+        assert positions[ids[0]][2] is None and positions[ids[1]][2] is None
+        assert positions[ids[2]][2] == 7.0
+        assert all(x is not None and y is not None for x, y, _ in (positions[i] for i in ids[:3]))
@@ -0,0 +1,199 @@
+"""
+图谱快照测试
+测试列式快照内容、ETag 条件请求、MessagePack 和压缩协商
+"""
+
+import pytest
+from datetime import datetime, timezone
+from uuid import UUID
+
+from app.models import MemoryNode, NodeRelation
+from app.services.graph_snapshot_service import (
+    BROTLI_AVAILABLE,
+    JSON_MEDIA_TYPE,
+    MSGPACK_AVAILABLE,
+    MSGPACK_MEDIA_TYPE,
+    GraphSnapshotService,
+)
+from app.services.review_service import ReviewService
+
+
+def decode(column):
+    """还原类别编码的列"""
+    return [column["categories"][code] for code in column["codes"]]
+
+
+async def seed_graph(db_session, user, graph, count=40):
+    """生成节点（最后一个软删除）和一条链状关联"""
+    nodes = [
+        MemoryNode(
+            graph_id=graph.id,
+            user_id=user.id,
+            node_type="CONCEPT" if i % 3 else "QUESTION",
+            title=f"snapshot node {i}",
+            content_data={},
+            position_x=float(i),
+            position_y=float(-i),
+            position_z=0.5,
+            mastery_level="learning" if i % 2 else "mastered",
+        )
+        for i in range(count)
+    ]
+    nodes[-1].deleted_at = datetime.now(timezone.utc)
+    db_session.add_all(nodes)
+    await db_session.commit()
+    
+    db_session.add_all([
+        NodeRelation(
+            graph_id=graph.id,
+            source_id=nodes[i].id,
+            target_id=nodes[i + 1].id,
+            relation_type="PREREQUISITE" if i % 2 else "RELATED",
+            strength=i,
+            created_by=user.id,
+        )
+        for i in range(count - 1)
+    ])
+    await db_session.commit()
+    return nodes
+
+
+class TestSnapshotNegotiation:
+    """测试格式、压缩和 ETag 协商"""
+    
+    def test_media_type(self):
+        """测试按 Accept 及其 q 值选择格式"""
+        expected_msgpack = MSGPACK_MEDIA_TYPE if MSGPACK_AVAILABLE else JSON_MEDIA_TYPE
+        
+        assert GraphSnapshotService.negotiate_media_type(None) == JSON_MEDIA_TYPE
+        assert GraphSnapshotService.negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+        assert GraphSnapshotService.negotiate_media_type("application/x-msgpack") == expected_msgpack
+        assert GraphSnapshotService.negotiate_media_type(
+            "application/json;q=0.9, application/msgpack"
+        ) == expected_msgpack
+        assert GraphSnapshotService.negotiate_media_type(
+            "application/json, application/msgpack;q=0.5"
+        ) == JSON_MEDIA_TYPE
+    
+    def test_encoding(self):
+        """测试按 Accept-Encoding 选择压缩算法"""
+        preferred = "br" if BROTLI_AVAILABLE else "gzip"
+        
+        assert GraphSnapshotService.negotiate_encoding(None) is None
+        assert GraphSnapshotService.negotiate_encoding("identity") is None
+        assert GraphSnapshotService.negotiate_encoding("gzip, deflate") == "gzip"
+        assert GraphSnapshotService.negotiate_encoding("gzip, deflate, br") == preferred
+        assert GraphSnapshotService.negotiate_encoding("br;q=0.5, gzip") == "gzip"
+        assert GraphSnapshotService.negotiate_encoding("*") == preferred
+        assert GraphSnapshotService.negotiate_encoding("gzip;q=0") is None
+    
+    def test_etag_matches(self):
+        """测试 If-None-Match 弱比较"""
+        etag = GraphSnapshotService.etag("abc", JSON_MEDIA_TYPE)
+        
+        assert etag == 'W/"abc-json"'
+        assert GraphSnapshotService.etag_matches('"abc-json"', etag)
+        assert GraphSnapshotService.etag_matches('W/"old-json", W/"abc-json"', etag)
+        assert GraphSnapshotService.etag_matches("*", etag)
+        assert not GraphSnapshotService.etag_matches(None, etag)
+        assert not GraphSnapshotService.etag_matches('W/"abc-msgpack"', etag)
+
+
+class TestGraphSnapshot:
+    """测试图谱快照接口"""
+    
+    @pytest.mark.asyncio
+    async def test_snapshot_columns(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试节点和关联列一一对应，关联两端为节点下标，跳过软删除节点的关联"""
+        nodes = await seed_graph(db_session, test_user, test_graph)
+        
+        response = await client.get(
+            f"/api/v1/graphs/{test_graph.id}/snapshot", headers={**auth_headers, "Accept-Encoding": "gzip"}
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == JSON_MEDIA_TYPE
+        assert response.headers["content-encoding"] == "gzip"
+        data = response.json()
+        assert data["node_count"] == len(nodes) - 1
+        assert data["relation_count"] == len(nodes) - 2
+        assert response.headers["etag"] == GraphSnapshotService.etag(data["version"], JSON_MEDIA_TYPE)
+        
+        columns = data["nodes"]
+        by_id = {node.id: node for node in nodes}
+        ids = columns["id"]
+        for i, (node_type, title, x, mastery_level) in enumerate(zip(
+            decode(columns["node_type"]), columns["title"], columns["position_x"], decode(columns["mastery_level"])
+        )):
+            node = by_id[UUID(ids[i])]
+            assert (node_type, title, x, mastery_level) == (
+                node.node_type, node.title, node.position_x, node.mastery_level
+            )
+        assert str(nodes[-1].id) not in ids
+        
+        relations = data["relations"]
+        edges = {
+            (ids[source], ids[target]): (relation_type, strength)
+            for source, target, relation_type, strength in zip(
+                relations["source"], relations["target"], decode(relations["relation_type"]), relations["strength"]
+            )
+        }
+        assert edges[(str(nodes[2].id), str(nodes[3].id))] == ("RELATED", 2)
+        assert edges[(str(nodes[3].id), str(nodes[4].id))] == ("PREREQUISITE", 3)
+    
+    @pytest.mark.asyncio
+    async def test_etag_not_modified(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试图谱未变化时返回 304，节点、关联或复习状态变化后 ETag 改变"""
+        nodes = await seed_graph(db_session, test_user, test_graph, count=5)
+        url = f"/api/v1/graphs/{test_graph.id}/snapshot"
+        
+        async def etag_after(change=None):
+            if change is not None:
+                await change()
+            response = await client.get(url, headers=auth_headers)
+            assert response.status_code == 200
+            etag = response.headers["etag"]
+            response = await client.get(url, headers={**auth_headers, "If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+            assert response.headers["etag"] == etag
+            return etag
+        
+        etags = [
+            await etag_after(),
+            await etag_after(lambda: client.put(
+                f"/api/v1/nodes/{nodes[0].id}", headers=auth_headers, json={"position_x": 12.5}
+            )),
+            await etag_after(lambda: client.post(
+                f"/api/v1/nodes/{nodes[0].id}/relations",
+                headers=auth_headers,
+                json={"source_node_id": str(nodes[0].id), "target_node_id": str(nodes[2].id), "relation_type": "RELATED"},
+            )),
+            await etag_after(lambda: ReviewService.update_review_stats(
+                db_session, str(nodes[0].id), quality=4, review_duration=10
+            )),
+            await etag_after(lambda: client.delete(f"/api/v1/nodes/{nodes[1].id}", headers=auth_headers)),
+        ]
+        assert len(set(etags)) == len(etags)
+        
+        response = await client.get(f"/api/v1/graphs/{nodes[0].id}/snapshot", headers=auth_headers)
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_msgpack_and_brotli(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试 MessagePack 与 JSON 内容一致、ETag 不同，以及 brotli 压缩"""
+        msgpack = pytest.importorskip("msgpack")
+        await seed_graph(db_session, test_user, test_graph)
+        url = f"/api/v1/graphs/{test_graph.id}/snapshot"
+        
+        json_response = await client.get(url, headers={**auth_headers, "Accept-Encoding": "identity"})
+        assert "content-encoding" not in json_response.headers
+        
+        response = await client.get(
+            url, headers={**auth_headers, "Accept": "application/msgpack", "Accept-Encoding": "br, gzip"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == MSGPACK_MEDIA_TYPE
+        assert response.headers["content-encoding"] == ("br" if BROTLI_AVAILABLE else "gzip")
+        assert response.headers["etag"] != json_response.headers["etag"]
+        assert msgpack.unpackb(response.content) == json_response.json()
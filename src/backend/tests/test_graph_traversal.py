@@ -0,0 +1,279 @@
+"""
+图谱遍历复习模式测试
+测试 CSR 邻接表、前置优先遍历、按版本号失效的邻接表缓存和图谱遍历队列
+"""
+
+import time
+import uuid
+import pytest
+import numpy as np
+from datetime import timedelta
+from sqlalchemy import text
+
+from app.models import MemoryNode, NodeRelation
+from app.models.memory_node import MasteryLevel
+from app.services.graph_adjacency_service import GraphAdjacency, graph_adjacency_cache
+from app.services.review_service import ReviewMode, ReviewService
+
+
+@pytest.fixture
+def adjacency_cache():
+    """清空全局邻接表缓存（计数清零），测试结束后恢复"""
+    entries, counters = graph_adjacency_cache._entries.copy(), graph_adjacency_cache._counters
+    graph_adjacency_cache.clear()
+    graph_adjacency_cache._counters = dict.fromkeys(counters, 0)
+    yield graph_adjacency_cache
+    graph_adjacency_cache._entries, graph_adjacency_cache._counters = entries, counters
+
+
+def make_adjacency(edges):
+    """由 (源, 目标, 类型, 强度) 列表构建邻接表，节点用整数表示"""
+    ids = {}
+    node_id = lambda n: ids.setdefault(n, uuid.UUID(int=n + 1))
+    sources, targets, relation_types, strengths = zip(*edges)
+    adjacency = GraphAdjacency.from_edges(
+        0, [node_id(n) for n in sources], [node_id(n) for n in targets], relation_types, strengths
+    )
+    names = {node_id: n for n, node_id in ids.items()}
+    return adjacency, (lambda indices: [names[node_id] for node_id in adjacency.ids_of(indices)]), ids
+
+
+class TestGraphAdjacency:
+    """测试邻接表和遍历"""
+    
+    def test_csr_rows(self):
+        """测试节点 ID 与下标的转换、前置邻接表的方向，以及邻居按关联强度从大到小排列"""
+        adjacency, names, ids = make_adjacency([
+            (0, 1, "PREREQUISITE", 50),
+            (2, 1, "prerequisite", 90),
+            (1, 3, "RELATED", 70),
+            (3, 0, "VARIANT", 10),
+        ])
+        
+        def row(indptr, indices, n):
+            i = adjacency.index_of([ids[n]])[0]
+            return names(indices[indptr[i]:indptr[i + 1]])
+        
+        assert adjacency.node_count == 4
+        assert adjacency.edge_count == 4
+        assert adjacency.index_of([ids[2], uuid.uuid4(), ids[0]]).tolist()[1] == -1
+        assert adjacency.ids_of(adjacency.index_of([ids[2], ids[0]])) == [ids[2], ids[0]]
+        assert row(adjacency.prerequisite_indptr, adjacency.prerequisite_indices, 1) == [2, 0]
+        assert row(adjacency.prerequisite_indptr, adjacency.prerequisite_indices, 0) == []
+        assert row(adjacency.neighbor_indptr, adjacency.neighbor_indices, 1) == [2, 3, 0]
+        assert row(adjacency.neighbor_indptr, adjacency.neighbor_indices, 3) == [1, 0]
+    
+    def test_prerequisites_first(self):
+        """测试前置节点（递归地）排在依赖它的节点之前，环和已访问节点只出现一次"""
+        # 0 → 1 → 2 → 3，4 → 2，3 → 0 构成环
+        adjacency, names, ids = make_adjacency([
+            (0, 1, "PREREQUISITE", 50),
+            (1, 2, "PREREQUISITE", 80),
+            (4, 2, "PREREQUISITE", 50),
+            (2, 3, "PREREQUISITE", 50),
+            (3, 0, "PREREQUISITE", 50),
+        ])
+        visited = adjacency.new_visited()
+        order = []
+        adjacency.walk_prerequisites_first(adjacency.index_of([ids[3]])[0], visited, order, 10)
+        assert names(order) == [0, 1, 4, 2, 3]
+        
+        adjacency.walk_prerequisites_first(adjacency.index_of([ids[1]])[0], visited, order, 10)
+        assert len(order) == 5
+        
+        order = []
+        adjacency.walk_prerequisites_first(adjacency.index_of([ids[3]])[0], adjacency.new_visited(), order, 2)
+        assert names(order) == [0, 1]
+    
+    def test_expand(self):
+        """测试广度优先逐层扩展，忽略方向和关联类型"""
+        adjacency, names, ids = make_adjacency([
+            (0, 1, "RELATED", 50),
+            (2, 0, "PREREQUISITE", 50),
+            (1, 3, "VARIANT", 50),
+            (2, 3, "RELATED", 50),
+            (3, 4, "RELATED", 50),
+        ])
+        visited = adjacency.new_visited()
+        frontier = adjacency.index_of([ids[0]])
+        visited[frontier] = True
+        
+        levels = []
+        while frontier.size:
+            frontier = adjacency.expand(frontier, visited)
+            levels.append(sorted(names(frontier)))
+        
+        assert levels == [[1, 2], [3], [4], []]
+    
+    def test_traversal_on_large_graph(self):
+        """测试 10 万条边的图谱上一次遍历在毫秒级完成"""
+        rng = np.random.default_rng(0)
+        node_ids = [uuid.UUID(int=i + 1) for i in range(50000)]
+        pairs = rng.integers(0, len(node_ids), size=(100000, 2))
+        relation_types = rng.choice(["PREREQUISITE", "RELATED", "VARIANT"], size=len(pairs)).tolist()
+        adjacency = GraphAdjacency.from_edges(
+            0,
+            [node_ids[i] for i in pairs[:, 0]],
+            [node_ids[i] for i in pairs[:, 1]],
+            relation_types,
+            rng.integers(0, 101, size=len(pairs)).tolist(),
+        )
+        
+        started = time.perf_counter()
+        visited = adjacency.new_visited()
+        order = []
+        for start in rng.integers(0, adjacency.node_count, size=20):
+            adjacency.walk_prerequisites_first(int(start), visited, order, 100)
+        frontier = np.asarray(order, dtype=np.intp)
+        while len(order) < 100 and frontier.size:
+            frontier = adjacency.expand(frontier, visited)
+            order.extend(frontier[:100 - len(order)].tolist())
+        elapsed = time.perf_counter() - started
+        
+        assert len(order) == len(set(order)) == 100
+        assert elapsed < 0.05
+
+
+async def add_nodes(db_session, user, graph, specs):
+    """按 {名称: (掌握程度, 超期小时数)} 依次创建节点，超期小时数为负表示未到期"""
+    now = ReviewService._get_utc_now()
+    nodes = {}
+    for i, (name, (mastery_level, overdue_hours)) in enumerate(specs.items()):
+        nodes[name] = MemoryNode(
+            graph_id=graph.id,
+            user_id=user.id,
+            node_type="CONCEPT",
+            title=name,
+            content_data={},
+            mastery_level=mastery_level,
+            last_review_at=now - timedelta(days=7),
+            next_review_at=now - timedelta(hours=overdue_hours),
+            review_stats={},
+            created_at=now + timedelta(seconds=i),
+        )
+    db_session.add_all(nodes.values())
+    await db_session.commit()
+    return nodes
+
+
+async def traversal_titles(db_session, user, graph=None, limit=20):
+    """获取图谱遍历队列的节点标题"""
+    queue = await ReviewService.get_review_queue(
+        db_session, str(user.id), graph_id=str(graph.id) if graph else None,
+        mode=ReviewMode.GRAPH_TRAVERSAL, limit=limit
+    )
+    return [item["title"] for item in queue]
+
+
+class TestGraphTraversalQueue:
+    """测试图谱遍历复习队列"""
+    
+    @pytest.mark.asyncio
+    async def test_prerequisites_before_due_node(self, db_session, test_user, test_graph, adjacency_cache):
+        """测试从到期节点出发，前置知识在前，再扩展到相邻节点，无关联且未到期的节点不出现"""
+        mastered = MasteryLevel.MASTERED.value
+        nodes = await add_nodes(db_session, test_user, test_graph, {
+            "limit": (mastered, -48),
+            "derivative": (mastered, -48),
+            "integral": (mastered, 30),
+            "area": (mastered, -48),
+            "isolated": (mastered, -48),
+        })
+        db_session.add_all([
+            NodeRelation(graph_id=test_graph.id, source_id=nodes[source].id, target_id=nodes[target].id,
+                         relation_type=relation_type, created_by=test_user.id)
+            for source, target, relation_type in [
+                ("limit", "derivative", "PREREQUISITE"),
+                ("derivative", "integral", "PREREQUISITE"),
+                ("integral", "area", "RELATED"),
+            ]
+        ])
+        await db_session.commit()
+        
+        expected = ["limit", "derivative", "integral", "area"]
+        assert await traversal_titles(db_session, test_user, test_graph) == expected
+        assert await traversal_titles(db_session, test_user) == expected
+        assert await traversal_titles(db_session, test_user, test_graph, limit=2) == ["limit", "derivative"]
+        assert adjacency_cache.stats()["builds"] == 1
+        assert adjacency_cache.stats()["hits"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_weak_and_fallback_seeds(self, db_session, test_user, test_graph, adjacency_cache):
+        """测试未到期的薄弱节点也作为起点，没有起点时按创建时间顺序"""
+        nodes = await add_nodes(db_session, test_user, test_graph, {
+            "weak": (MasteryLevel.LEARNING.value, -48),
+            "strong": (MasteryLevel.MASTERED.value, -48),
+        })
+        assert await traversal_titles(db_session, test_user, test_graph) == ["weak"]
+        
+        nodes["weak"].mastery_level = MasteryLevel.MASTERED.value
+        await db_session.commit()
+        assert await traversal_titles(db_session, test_user, test_graph, limit=1) == ["weak"]
+        assert await traversal_titles(db_session, test_user, test_graph) == ["weak", "strong"]
+    
+    @pytest.mark.asyncio
+    async def test_null_strength(self, db_session, test_user, test_graph, adjacency_cache):
+        """测试强度为空的关联按默认强度加载，各列不错位（数据库建表脚本中 strength 可为空）"""
+        nodes = await add_nodes(db_session, test_user, test_graph, {
+            name: (MasteryLevel.MASTERED.value, -48) for name in ("a", "b", "c")
+        })
+        db_session.add_all([
+            NodeRelation(graph_id=test_graph.id, source_id=nodes[source].id, target_id=nodes[target].id,
+                         relation_type=relation_type, strength=80, created_by=test_user.id)
+            for source, target, relation_type in [("a", "b", "RELATED"), ("b", "c", "PREREQUISITE")]
+        ])
+        await db_session.commit()
+        ids = {name: node.id for name, node in nodes.items()}
+        graph_id = test_graph.id
+        
+        await db_session.execute(text("ALTER TABLE node_relations ALTER COLUMN strength DROP NOT NULL"))
+        try:
+            await db_session.execute(
+                text("UPDATE node_relations SET strength = NULL WHERE source_id = :source"),
+                {"source": ids["a"]}
+            )
+            adjacency = await graph_adjacency_cache.load(db_session, graph_id, 0)
+        finally:
+            await db_session.rollback()
+        
+        assert adjacency.edge_count == 2
+        c = adjacency.index_of([ids["c"]])[0]
+        assert adjacency.ids_of(adjacency.prerequisite_indices[
+            adjacency.prerequisite_indptr[c]:adjacency.prerequisite_indptr[c + 1]
+        ]) == [ids["b"]]
+    
+    @pytest.mark.asyncio
+    async def test_cache_invalidated_by_relation_changes(
+        self, client, auth_headers, db_session, test_user, test_graph, adjacency_cache
+    ):
+        """测试通过接口创建、删除关联和删除节点后邻接表缓存重建"""
+        mastered = MasteryLevel.MASTERED.value
+        nodes = await add_nodes(db_session, test_user, test_graph, {
+            "base": (mastered, -48),
+            "due": (mastered, 30),
+        })
+        assert await traversal_titles(db_session, test_user, test_graph) == ["due"]
+        
+        response = await client.post(
+            f"/api/v1/nodes/{nodes['base'].id}/relations",
+            headers=auth_headers,
+            json={
+                "source_node_id": str(nodes["base"].id),
+                "target_node_id": str(nodes["due"].id),
+                "relation_type": "PREREQUISITE",
+            }
+        )
+        assert response.status_code == 201
+        assert await traversal_titles(db_session, test_user, test_graph) == ["base", "due"]
+        assert await traversal_titles(db_session, test_user, test_graph) == ["base", "due"]
+        assert adjacency_cache.stats()["builds"] == 2
+        
+        response = await client.delete(f"/api/v1/nodes/relations/{response.json()['id']}", headers=auth_headers)
+        assert response.status_code == 204
+        assert await traversal_titles(db_session, test_user, test_graph) == ["due"]
+        assert adjacency_cache.stats()["builds"] == 3
+        
+        response = await client.delete(f"/api/v1/nodes/{nodes['base'].id}", headers=auth_headers)
+        assert response.status_code == 204
+        assert await traversal_titles(db_session, test_user, test_graph) == ["due"]
+        assert adjacency_cache.stats() == {"hits": 1, "builds": 4, "evictions": 0, "graphs": 1, "edges": 0}
@@ -0,0 +1,174 @@
+"""
+外部 HTTP 客户端注册表测试
+测试客户端复用、事件循环切换、连接池指标和优雅关闭
+"""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from fastapi import FastAPI
+
+from app.api.deps import get_current_admin_user
+from app.core.http_clients import PROVIDERS, HTTPClientRegistry, http_clients
+from main import app
+
+
+def _create_stub_app() -> FastAPI:
+    """创建桩服务，/slow 用于模拟在途请求"""
+    stub = FastAPI()
+    
+    @stub.get("/ping")
+    async def ping():
+        return {"ok": True}
+    
+    @stub.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.3)
+        return {"ok": True}
+    
+    return stub
+
+
+@pytest.fixture(scope="module")
+def stub_url():
+    """在后台线程中启动本地桩服务"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    
+    server = uvicorn.Server(
+        uvicorn.Config(
+            _create_stub_app(),
+            host="127.0.0.1",
+            port=port,
+            loop="asyncio",
+            log_level="warning",
+        )
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    
+    yield f"http://127.0.0.1:{port}"
+    
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+class TestHTTPClientRegistry:
+    """测试客户端注册表"""
+    
+    @pytest.mark.asyncio
+    async def test_client_reused(self):
+        """测试同一服务商复用客户端，不同服务商相互独立"""
+        registry = HTTPClientRegistry()
+        
+        assert registry.get("openai") is registry.get("openai")
+        assert registry.get("openai") is not registry.get("baidu")
+        
+        await registry.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_unknown_provider(self):
+        """测试未知服务商"""
+        with pytest.raises(KeyError):
+            HTTPClientRegistry().get("unknown")
+    
+    @pytest.mark.asyncio
+    async def test_start_and_aclose(self):
+        """测试启动时创建所有客户端，关闭后再次获取会重建"""
+        registry = HTTPClientRegistry()
+        await registry.start()
+        clients = {provider: registry.get(provider) for provider in PROVIDERS}
+        
+        await registry.aclose()
+        
+        assert all(client.is_closed for client in clients.values())
+        assert registry.stats()["openai"]["active"] is False
+        assert registry.get("openai") is not clients["openai"]
+        await registry.aclose()
+    
+    def test_recreated_on_new_event_loop(self):
+        """测试事件循环变化时重建客户端"""
+        registry = HTTPClientRegistry()
+        
+        async def get_client():
+            return registry.get("deepseek")
+        
+        clients = []
+        for _ in range(2):
+            # 使用独立事件循环，不影响 pytest-asyncio 的当前循环
+            loop = asyncio.new_event_loop()
+            try:
+                clients.append(loop.run_until_complete(get_client()))
+            finally:
+                loop.close()
+        
+        assert clients[0] is not clients[1]
+    
+    @pytest.mark.asyncio
+    async def test_connection_reuse_metrics(self, stub_url: str):
+        """测试连续请求复用同一连接，并记录握手耗时"""
+        registry = HTTPClientRegistry()
+        client = registry.get("openai")
+        
+        for _ in range(3):
+            response = await client.get(f"{stub_url}/ping")
+            assert response.status_code == 200
+        
+        stats = registry.stats()["openai"]
+        assert stats["requests"] == 3
+        assert stats["connections_opened"] == 1
+        assert stats["connections"] == 1
+        assert stats["idle"] == 1
+        assert stats["in_use"] == 0
+        assert stats["handshake_avg_ms"] > 0
+        assert stats["handshake_max_ms"] >= stats["handshake_avg_ms"]
+        
+        await registry.aclose()
+    
+    @pytest.mark.asyncio
+    async def test_aclose_waits_for_in_flight(self, stub_url: str):
+        """测试关闭时等待在途请求完成"""
+        registry = HTTPClientRegistry()
+        client = registry.get("baidu")
+        
+        request = asyncio.create_task(client.get(f"{stub_url}/slow"))
+        while registry.stats()["baidu"]["in_use"] == 0:
+            await asyncio.sleep(0.01)
+        
+        await registry.aclose(timeout=5)
+        
+        response = await request
+        assert response.status_code == 200
+
+
+class TestHTTPClientsHealth:
+    """测试连接池指标接口"""
+    
+    @pytest.mark.asyncio
+    async def test_http_clients_stats(self, client, test_user):
+        """测试健康检查返回各服务商的连接池指标（仅管理员）"""
+        http_clients.get("openai")
+        
+        response = await client.get("/api/v1/health/http-clients")
+        assert response.status_code in (401, 403)
+        
+        app.dependency_overrides[get_current_admin_user] = lambda: test_user
+        try:
+            response = await client.get("/api/v1/health/http-clients")
+        finally:
+            app.dependency_overrides.pop(get_current_admin_user, None)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert set(data["providers"]) == set(PROVIDERS)
+        assert data["providers"]["openai"]["active"] is True
+        assert data["providers"]["baidu"]["http2"] is False
+        for key in ("in_use", "waiting", "handshake_avg_ms", "max_connections"):
+            assert key in data["providers"]["openai"]
@@ -0,0 +1,193 @@
+"""
+图片预处理测试
+测试自动旋转、OCR 用图和缩略图的生成、进程池执行，以及 OCR 使用缩小后的图片
+"""
+
+import uuid
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.models import FileUpload
+from app.services.file_storage import file_storage_service
+from app.services.image_processing_service import ImageProcessingService, preprocess_image, variant_filename
+from app.services.ocr_service import ocr_service
+
+
+def _jpeg(size, orientation=None, color=None) -> bytes:
+    """生成 JPEG 图片（可设置 EXIF 方向）"""
+    image = Image.new("RGB", size, color or tuple(uuid.uuid4().bytes[:3]))
+    for x in range(0, size[0], 40):
+        image.paste((0, 0, 0), (x, 0, x + 4, size[1]))
+    output = BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(output, format="JPEG", quality=95, exif=exif)
+    return output.getvalue()
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """启用本地模拟 OCR 并记录识别的图片"""
+    monkeypatch.setattr(settings, "OCR_FAKE_ENABLED", True)
+    monkeypatch.setattr(settings, "OCR_FAKE_LATENCY", 0.01)
+    monkeypatch.setattr(settings, "OCR_FAKE_QPS", 0)
+    original = ocr_service.ocr_fake
+    calls = []
+    
+    async def recording(image_path):
+        calls.append(image_path)
+        return await original(image_path)
+    
+    monkeypatch.setattr(ocr_service, "ocr_fake", recording)
+    return calls
+
+
+@pytest.fixture
+def preprocess_pool(monkeypatch):
+    """使用单进程的预处理进程池，测试结束后关闭"""
+    ImageProcessingService.shutdown()
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_WORKERS", 1)
+    yield
+    ImageProcessingService.shutdown()
+
+
+class TestPreprocessImage:
+    """测试预处理函数"""
+    
+    def test_orient_and_downscale(self, tmp_path):
+        """测试按 EXIF 方向旋转并缩小"""
+        source = tmp_path / "photo.jpg"
+        source.write_bytes(_jpeg((3000, 2000), orientation=6))
+        
+        result = preprocess_image(str(source), 1000, 85, [128, 512], 80)
+        
+        assert (result["width"], result["height"]) == (2000, 3000)
+        assert result["ocr"]["filename"] == "photo.ocr.jpg"
+        assert (result["ocr"]["width"], result["ocr"]["height"]) == (667, 1000)
+        assert result["ocr"]["bytes"] < source.stat().st_size
+        with Image.open(tmp_path / "photo.ocr.jpg") as ocr_image:
+            assert ocr_image.format == "JPEG"
+            assert ocr_image.mode == "L"
+            assert ocr_image.size == (667, 1000)
+        
+        assert list(result["thumbnails"]) == ["512", "128"]
+        for size, thumbnail in result["thumbnails"].items():
+            assert thumbnail["filename"] == f"photo.w{size}.webp"
+            assert thumbnail["height"] == int(size)
+            with Image.open(tmp_path / thumbnail["filename"]) as image:
+                assert image.format == "WEBP"
+                assert image.size == (thumbnail["width"], thumbnail["height"])
+        assert not list(tmp_path.glob(".*.part"))
+    
+    def test_existing_outputs_reused(self, tmp_path):
+        """测试已生成的结果不重新生成"""
+        source = tmp_path / "photo.jpg"
+        source.write_bytes(_jpeg((1200, 800)))
+        first = preprocess_image(str(source), 1000, 85, [256], 80)
+        mtimes = {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()}
+        
+        second = preprocess_image(str(source), 1000, 85, [256], 80)
+        
+        assert {key: second[key] for key in ("width", "height", "ocr", "thumbnails")} == {
+            key: first[key] for key in ("width", "height", "ocr", "thumbnails")
+        }
+        assert {path.name: path.stat().st_mtime_ns for path in tmp_path.iterdir()} == mtimes
+    
+    def test_small_transparent_png(self, tmp_path):
+        """测试小图不放大，透明背景填充白色"""
+        source = tmp_path / "screenshot.png"
+        Image.new("RGBA", (100, 50), (0, 0, 0, 0)).save(source)
+        
+        result = preprocess_image(str(source), 1000, 85, [256], 80)
+        
+        assert (result["ocr"]["width"], result["ocr"]["height"]) == (100, 50)
+        assert (result["thumbnails"]["256"]["width"], result["thumbnails"]["256"]["height"]) == (100, 50)
+        with Image.open(tmp_path / "screenshot.ocr.jpg") as ocr_image:
+            assert ocr_image.getpixel((50, 25)) > 250
+    
+    def test_variant_filename(self):
+        """测试预处理结果的文件名"""
+        assert variant_filename("abc.JPG", "w256", ".webp") == "abc.w256.webp"
+
+
+class TestImageProcessingService:
+    """测试在进程池中预处理"""
+    
+    @pytest.mark.asyncio
+    async def test_process_in_pool(self, tmp_path, preprocess_pool):
+        """测试进程池中生成结果并补充 URL，无法解码的文件返回 None"""
+        source = tmp_path / "photo.jpg"
+        source.write_bytes(_jpeg((600, 400)))
+        
+        variants = await ImageProcessingService.process(source, "/uploads/images/")
+        
+        assert variants["ocr"]["url"] == "/uploads/images/photo.ocr.jpg"
+        assert sorted(ImageProcessingService.filenames(variants)) == sorted(
+            ["photo.ocr.jpg", *(f"photo.w{size}.webp" for size in settings.IMAGE_THUMBNAIL_SIZES)]
+        )
+        assert all((tmp_path / name).exists() for name in ImageProcessingService.filenames(variants))
+        
+        broken = tmp_path / "broken.jpg"
+        broken.write_bytes(b"\xff\xd8\xff\xe0 not really a jpeg")
+        assert await ImageProcessingService.process(broken, "/uploads/images/") is None
+    
+    @pytest.mark.asyncio
+    async def test_disabled(self, tmp_path, monkeypatch):
+        """测试未启用预处理"""
+        monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+        source = tmp_path / "photo.jpg"
+        source.write_bytes(_jpeg((60, 40)))
+        
+        assert await ImageProcessingService.process(source, "/uploads/images/") is None
+        assert ImageProcessingService.filenames(None) == []
+
+
+class TestPreprocessedOCR:
+    """测试 OCR 使用预处理后的图片"""
+    
+    @pytest.mark.asyncio
+    async def test_ocr_uses_reduced_image(
+        self, client, auth_headers, db_session, test_user, fake_ocr, preprocess_pool
+    ):
+        """测试 OCR 识别缩小的灰度图，删除上传记录时一起删除"""
+        content = _jpeg((900, 1200), orientation=8)
+        upload = UploadFile(file=BytesIO(content), filename="page.jpg", headers=Headers({"content-type": "image/jpeg"}))
+        stored_filename, file_url, file_size, content_hash = await file_storage_service.store_file(db_session, upload)
+        file_upload = FileUpload(
+            user_id=test_user.id,
+            original_filename="page.jpg",
+            stored_filename=stored_filename,
+            file_url=file_url,
+            file_size=file_size,
+            mime_type="image/jpeg",
+            content_hash=content_hash,
+            status="pending",
+        )
+        db_session.add(file_upload)
+        await db_session.commit()
+        file_id = file_upload.id
+        variants = await file_storage_service.preprocess_image(stored_filename)
+        file_upload.variants = variants
+        await db_session.commit()
+        
+        assert (variants["width"], variants["height"]) == (1200, 900)
+        response = await client.post(
+            "/api/v1/ocr/ocr", headers=auth_headers, json={"file_id": str(file_id), "ocr_engine": "fake"}
+        )
+        assert response.status_code == 200
+        assert response.json()["text"].startswith(f"fake ocr: {content_hash}.ocr.jpg")
+        assert [path.name for path in fake_ocr] == [f"{content_hash}.ocr.jpg"]
+        
+        file_upload = await db_session.get(FileUpload, file_id)
+        await db_session.refresh(file_upload)
+        filenames = [stored_filename, *ImageProcessingService.filenames(variants)]
+        async with file_storage_service.release_file(db_session, file_upload):
+            await db_session.delete(file_upload)
+            await db_session.commit()
+        assert not any((file_storage_service.images_dir / name).exists() for name in filenames)
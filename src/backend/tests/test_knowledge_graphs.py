@@ -141,6 +141,62 @@ class TestGraphRetrieval:
         assert "total_tags" in data
 
 
+class TestGraphCursorPagination:
+    """知识图谱游标分页测试"""
+
+    @pytest.mark.asyncio
+    async def test_cursor_walk_with_total(self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, test_user: User):
+        """测试游标分页遍历，并返回精确和估算总数"""
+        for i in range(5):
+            db_session.add(KnowledgeGraph(user_id=test_user.id, name=f"cursor graph {i}"))
+        await db_session.commit()
+        
+        response = await client.get(
+            "/api/v1/graphs/",
+            headers=auth_headers,
+            params={"pagination": "cursor", "page_size": 2, "total": "exact"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 5
+        assert data["total_is_estimate"] is False
+        assert data["has_more"] is True
+        seen = [item["id"] for item in data["items"]]
+        
+        cursor = data["next_cursor"]
+        while cursor:
+            response = await client.get(
+                "/api/v1/graphs/",
+                headers=auth_headers,
+                params={"cursor": cursor, "page_size": 2, "total": "estimate"}
+            )
+            assert response.status_code == 200
+            data = response.json()
+            assert data["total_is_estimate"] is True
+            assert data["total"] >= 0
+            seen.extend(item["id"] for item in data["items"])
+            cursor = data["next_cursor"]
+        
+        assert len(set(seen)) == 5
+
+    @pytest.mark.asyncio
+    async def test_cursor_from_other_list_rejected(self, client: AsyncClient, auth_headers: dict, test_graph: KnowledgeGraph):
+        """测试其他列表（不同排序列）的游标被拒绝"""
+        from datetime import datetime, timezone
+        from app.core.pagination import decode_cursor, encode_cursor
+        
+        cursor = encode_cursor("created_at", datetime.now(timezone.utc), test_graph.id)
+        assert decode_cursor(cursor, "created_at")[1] == test_graph.id
+        
+        response = await client.get(
+            "/api/v1/graphs/",
+            headers=auth_headers,
+            params={"cursor": cursor}
+        )
+        
+        assert response.status_code == 400
+
+
 class TestGraphUpdate:
     """知识图谱更新测试"""
 
@@ -255,3 +311,96 @@ class TestGraphFiltering:
         data = response.json()
         assert len(data["items"]) > 0
 
+
+
+class TestGraphForgettingMap:
+    """图谱遗忘热力图测试"""
+
+    @pytest.mark.asyncio
+    async def test_forgetting_map_matches_per_node_index(self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, test_user: User, test_graph: KnowledgeGraph):
+        """测试热力图的列式数据与逐个节点计算的遗忘指数和颜色一致"""
+        import base64
+        from datetime import datetime, timedelta, timezone
+        from uuid import UUID
+        
+        import numpy as np
+        
+        from app.models import MemoryNode
+        from app.models.memory_node import MasteryLevel
+        from app.services.review_service import ReviewService
+        
+        now = datetime.now(timezone.utc)
+        cases = [
+            (now - timedelta(days=2), now + timedelta(days=2), MasteryLevel.LEARNING),
+            (now - timedelta(days=1), now + timedelta(days=9), MasteryLevel.FAMILIAR),
+            (now + timedelta(days=1), now + timedelta(days=1), MasteryLevel.LEARNING),
+            (now - timedelta(days=5), now - timedelta(days=3), MasteryLevel.MASTERED),
+            (now - timedelta(days=5), now - timedelta(hours=6), MasteryLevel.PROFICIENT),
+            (now - timedelta(days=30), now - timedelta(days=20), MasteryLevel.NOT_STARTED),
+            (None, None, MasteryLevel.NOT_STARTED),
+        ]
+        expected = {}
+        for last_review_at, next_review_at, mastery in cases:
+            node = MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title="forgetting map",
+                content_data={},
+                mastery_level=mastery.value,
+                last_review_at=last_review_at,
+                next_review_at=next_review_at,
+            )
+            db_session.add(node)
+            await db_session.flush()
+            if last_review_at is None:
+                expected[node.id] = 0.8
+            else:
+                expected[node.id] = ReviewService.calculate_forgetting_index(last_review_at, next_review_at, mastery)
+        # 已删除的节点不返回
+        db_session.add(MemoryNode(
+            graph_id=test_graph.id,
+            user_id=test_user.id,
+            node_type="CONCEPT",
+            title="deleted",
+            content_data={},
+            deleted_at=now,
+        ))
+        await db_session.commit()
+        
+        response = await client.get(
+            f"/api/v1/graphs/{test_graph.id}/forgetting-map",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == len(cases)
+        raw_ids = base64.b64decode(data["ids"])
+        ids = [UUID(bytes=raw_ids[i:i + 16]) for i in range(0, len(raw_ids), 16)]
+        indices = np.frombuffer(base64.b64decode(data["forgetting_index"]), dtype="<f2")
+        colors = np.frombuffer(base64.b64decode(data["color_index"]), dtype=np.uint8)
+        assert len(ids) == len(indices) == len(colors) == len(cases)
+        for node_id, index, color in zip(ids, indices, colors):
+            assert float(index) == pytest.approx(expected[node_id], abs=2e-3)
+            assert data["palette"][color] == ReviewService.get_forgetting_color(expected[node_id])
+
+    @pytest.mark.asyncio
+    async def test_forgetting_map_empty_and_not_found(self, client: AsyncClient, auth_headers: dict, test_graph: KnowledgeGraph):
+        """测试空图谱返回空列，不存在的图谱返回 404"""
+        import uuid
+        
+        response = await client.get(
+            f"/api/v1/graphs/{test_graph.id}/forgetting-map",
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 0
+        assert data["ids"] == data["forgetting_index"] == data["color_index"] == ""
+        
+        response = await client.get(
+            f"/api/v1/graphs/{uuid.uuid4()}/forgetting-map",
+            headers=auth_headers
+        )
+        assert response.status_code == 404
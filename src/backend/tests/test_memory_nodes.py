@@ -5,9 +5,13 @@
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import inspect, select
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import KnowledgeGraph, MemoryNode
+from app.models import KnowledgeGraph, MemoryNode, node_load_options
+from app.services.review_service import ReviewService
+from app.services.vector_search_service import vector_search_service
 from tests.conftest import TEST_NODE_DATA
 
 
@@ -298,3 +302,136 @@ class TestNodeRelations:
         
         assert delete_response.status_code == 204
 
+
+class TestNodeProjection:
+    """记忆节点列投影测试"""
+
+    @staticmethod
+    async def _create_nodes(db_session: AsyncSession, test_graph: KnowledgeGraph) -> list:
+        """创建带向量和内容的节点，并清空会话中的已加载对象"""
+        nodes = []
+        for i in range(3):
+            embedding = [0.0] * 1536
+            embedding[0] = 1.0
+            embedding[1] = i * 0.1
+            node = MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_graph.user_id,
+                node_type="CONCEPT",
+                title=f"投影节点 {i}",
+                summary="摘要",
+                content_data={"content": "F = ma " * 100},
+                content_embedding=embedding,
+            )
+            db_session.add(node)
+            nodes.append(node)
+        await db_session.commit()
+        node_ids = [node.id for node in nodes]
+        db_session.expunge_all()
+        return node_ids
+
+    @pytest.mark.asyncio
+    async def test_embedding_deferred_by_default(self, db_session: AsyncSession, test_graph: KnowledgeGraph):
+        """测试默认查询不加载向量列，访问时报错而不是隐式查询"""
+        node_ids = await self._create_nodes(db_session, test_graph)
+        
+        result = await db_session.execute(select(MemoryNode).where(MemoryNode.id == node_ids[0]))
+        node = result.scalar_one()
+        
+        assert "content_embedding" in inspect(node).unloaded
+        assert node.content_data == {"content": "F = ma " * 100}
+        with pytest.raises(InvalidRequestError):
+            _ = node.content_embedding
+
+    @pytest.mark.asyncio
+    async def test_list_projection(self, db_session: AsyncSession, test_graph: KnowledgeGraph):
+        """测试列表投影只加载摘要列"""
+        await self._create_nodes(db_session, test_graph)
+        
+        result = await db_session.execute(
+            select(MemoryNode).options(node_load_options("list")).where(MemoryNode.graph_id == test_graph.id)
+        )
+        nodes = result.scalars().all()
+        
+        assert len(nodes) == 3
+        unloaded = inspect(nodes[0]).unloaded
+        assert {"content_data", "content_embedding", "review_stats"} <= unloaded
+        assert nodes[0].title.startswith("投影节点")
+        with pytest.raises(InvalidRequestError):
+            _ = nodes[0].content_data
+
+    def test_unknown_group(self):
+        """测试未知的列分组"""
+        with pytest.raises(ValueError):
+            node_load_options("unknown")
+
+    @pytest.mark.asyncio
+    async def test_review_queue_projection(self, db_session: AsyncSession, test_graph: KnowledgeGraph):
+        """测试复习队列不加载内容和向量"""
+        await self._create_nodes(db_session, test_graph)
+        
+        queue = await ReviewService.get_review_queue(db=db_session, user_id=str(test_graph.user_id))
+        
+        assert len(queue) == 3
+        for node in db_session.identity_map.values():
+            if isinstance(node, MemoryNode):
+                assert {"content_data", "content_embedding"} <= inspect(node).unloaded
+
+    @pytest.mark.asyncio
+    async def test_similar_nodes_projection(self, db_session: AsyncSession, test_graph: KnowledgeGraph):
+        """测试相似节点搜索只查询参考向量，结果节点不加载向量"""
+        node_ids = await self._create_nodes(db_session, test_graph)
+        
+        results = await vector_search_service.recommend_related_nodes(db=db_session, node_id=node_ids[0])
+        
+        assert [node.id for node, _ in results] == node_ids[1:]
+        for node, score in results:
+            assert score > 0.9
+            assert {"content_data", "content_embedding"} <= inspect(node).unloaded
+            assert node.summary == "摘要"
+
+
+class TestNodeCursorPagination:
+    """记忆节点游标分页测试"""
+
+    @pytest.mark.asyncio
+    async def test_cursor_walk(self, client: AsyncClient, auth_headers: dict, db_session: AsyncSession, test_graph: KnowledgeGraph):
+        """测试按游标逐页遍历，同一时间戳的节点按 id 区分，不重复不遗漏"""
+        # 同一事务内插入，updated_at 完全相同
+        for i in range(7):
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_graph.user_id,
+                node_type="CONCEPT",
+                title=f"cursor node {i}",
+                content_data={"index": i},
+            ))
+        await db_session.commit()
+        
+        seen = []
+        params = {"graph_id": str(test_graph.id), "pagination": "cursor", "page_size": 3}
+        for _ in range(5):
+            response = await client.get("/api/v1/nodes/", headers=auth_headers, params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert data["total"] is None
+            seen.extend(item["id"] for item in data["items"])
+            if not data["has_more"]:
+                assert data["next_cursor"] is None
+                break
+            params["cursor"] = data["next_cursor"]
+        
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+        assert seen == sorted(seen, reverse=True)
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client: AsyncClient, auth_headers: dict, test_node: MemoryNode):
+        """测试无效游标返回 400"""
+        response = await client.get(
+            "/api/v1/nodes/",
+            headers=auth_headers,
+            params={"cursor": "not-a-cursor"}
+        )
+        
+        assert response.status_code == 400
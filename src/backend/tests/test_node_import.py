@@ -0,0 +1,284 @@
+"""
+节点批量导入测试
+测试 JSONL、CSV 和 Anki 牌组的解析、COPY 写入的节点/标签/关联、计数更新和导入进度
+"""
+
+import io
+import json
+import sqlite3
+import uuid
+import zipfile
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models import KnowledgeGraph, KnowledgeTag, MemoryNode, NodeRelation, NodeTag, UserStats
+from app.services.node_import_service import _plain_text, detect_format, iter_apkg, node_import_service
+
+
+def jsonl(*records):
+    """把记录编码为 JSONL（字符串原样作为一行）"""
+    lines = [record if isinstance(record, str) else json.dumps(record) for record in records]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def build_apkg(tmp_path, notes, collection="collection.anki2"):
+    """生成只包含 col 和 notes 表的 Anki 牌组"""
+    database = tmp_path / "collection.db"
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE col (models TEXT)")
+    connection.execute("CREATE TABLE notes (id INTEGER, guid TEXT, mid INTEGER, tags TEXT, flds TEXT)")
+    models = {"1001": {"name": "Basic", "flds": [{"name": "Back", "ord": 1}, {"name": "Front", "ord": 0}]}}
+    connection.execute("INSERT INTO col VALUES (?)", (json.dumps(models),))
+    connection.executemany(
+        "INSERT INTO notes VALUES (?, ?, 1001, ?, ?)",
+        [(i, guid, tags, "\x1f".join(fields)) for i, (guid, tags, fields) in enumerate(notes, start=1)]
+    )
+    connection.commit()
+    connection.close()
+    
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.write(database, collection)
+        archive.writestr("media", "{}")
+    return buffer.getvalue()
+
+
+async def imported_nodes(db_session, graph):
+    """按标题读取图谱内的节点"""
+    result = await db_session.execute(
+        select(MemoryNode).where(MemoryNode.graph_id == graph.id).execution_options(populate_existing=True)
+    )
+    return {node.title: node for node in result.scalars().all()}
+
+
+async def node_tag_names(db_session, node):
+    """读取节点的标签名"""
+    result = await db_session.execute(
+        select(KnowledgeTag.name).join(NodeTag, NodeTag.tag_id == KnowledgeTag.id).where(NodeTag.node_id == node.id)
+    )
+    return sorted(result.scalars().all())
+
+
+class TestImportParsing:
+    """测试解析辅助函数"""
+    
+    def test_detect_format(self):
+        """测试按扩展名推断格式"""
+        assert detect_format("deck.APKG") == "apkg"
+        assert detect_format("notes.ndjson") == "jsonl"
+        assert detect_format("notes.csv") == "csv"
+        assert detect_format("notes.txt") is None
+        assert detect_format(None) is None
+    
+    def test_plain_text(self):
+        """测试 Anki 字段转为纯文本"""
+        assert _plain_text("<b>2 + 2</b>&nbsp;=<br>{{c1::4::number}} [sound:a.mp3]") == "2 + 2 =\n4"
+        assert _plain_text("<div> </div>") == ""
+    
+    def test_apkg_collection_size_limit(self, tmp_path, monkeypatch):
+        """测试集合数据库解压后超过上限时拒绝导入"""
+        content = build_apkg(tmp_path, [("guid-1", "", ["Paris", "France"])])
+        assert len(list(iter_apkg(io.BytesIO(content)))) == 1
+        
+        monkeypatch.setattr(settings, "NODE_IMPORT_MAX_COLLECTION_SIZE", 1024)
+        with pytest.raises(ValueError, match="解压后不能超过"):
+            list(iter_apkg(io.BytesIO(content)))
+
+
+class TestNodeImportAPI:
+    """测试导入接口"""
+    
+    @pytest.mark.asyncio
+    async def test_import_jsonl(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试 JSONL 导入节点、标签和关联（可以引用后面的记录），跳过不合法的记录并一次更新计数"""
+        existing_tag = KnowledgeTag(graph_id=test_graph.id, name="algebra", node_count=3)
+        db_session.add(existing_tag)
+        await db_session.commit()
+        relation_version = test_graph.relation_version
+        
+        content = jsonl(
+            {"key": "a", "title": "Sets", "tags": ["algebra", "basics"], "content_data": {"question": "q"},
+             "relations": [{"target": "b", "type": "prerequisite", "strength": 80}, "RELATED:missing"]},
+            {"key": "b", "title": "Groups", "node_type": "concept", "tags": "algebra;algebra", "position_x": 5},
+            {"key": "a", "title": "duplicate key"},
+            {"title": ""},
+            "{not json",
+            "",
+            {"title": "Rings", "relations": ["b", "b"]},
+        )
+        response = await client.post(
+            f"/api/v1/graphs/{test_graph.id}/imports",
+            headers=auth_headers,
+            params={"import_id": "deck-1"},
+            files={"file": ("notes.jsonl", content, "application/x-ndjson")},
+        )
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert data["status"] == "completed"
+        assert data["format"] == "jsonl"
+        assert (data["records"], data["nodes"], data["skipped"]) == (6, 3, 3)
+        assert (data["tags"], data["node_tags"]) == (1, 3)
+        assert (data["relations"], data["skipped_relations"]) == (2, 1)
+        assert [error["line"] for error in data["errors"]] == [3, 4, 5, 1]
+        
+        nodes = await imported_nodes(db_session, test_graph)
+        assert set(nodes) == {"Sets", "Groups", "Rings"}
+        assert nodes["Groups"].node_type == "CONCEPT"
+        assert nodes["Sets"].node_type == "QUESTION"
+        assert nodes["Sets"].content_data == {"question": "q"}
+        assert nodes["Groups"].position_x == 5.0
+        assert nodes["Groups"].user_id == test_user.id
+        assert await node_tag_names(db_session, nodes["Sets"]) == ["algebra", "basics"]
+        assert await node_tag_names(db_session, nodes["Groups"]) == ["algebra"]
+        
+        relations = (await db_session.execute(
+            select(NodeRelation.source_id, NodeRelation.target_id, NodeRelation.relation_type, NodeRelation.strength)
+            .where(NodeRelation.graph_id == test_graph.id)
+        )).all()
+        assert sorted(relations, key=lambda row: row[2]) == [
+            (nodes["Sets"].id, nodes["Groups"].id, "PREREQUISITE", 80),
+            (nodes["Rings"].id, nodes["Groups"].id, "RELATED", 50),
+        ]
+        
+        await db_session.refresh(test_graph)
+        await db_session.refresh(existing_tag)
+        assert test_graph.node_count == 3
+        assert test_graph.relation_version == relation_version + 1
+        assert existing_tag.node_count == 5
+        stats = await db_session.get(UserStats, test_user.id, populate_existing=True)
+        assert stats.total_nodes == 3
+        
+        response = await client.get(f"/api/v1/graphs/{test_graph.id}/imports/deck-1", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["nodes"] == 3
+    
+    @pytest.mark.asyncio
+    async def test_import_csv(self, client, auth_headers, db_session, test_graph):
+        """测试 CSV 导入：其余列写入 content_data，标签和关联用分号分隔"""
+        content = (
+            "key,title,question,answer,tags,relations\r\n"
+            "k1,Derivative,What is d/dx x^2?,2x,calculus;basics,\r\n"
+            "k2,Integral,,,calculus,PREREQUISITE:k1\r\n"
+        ).encode()
+        response = await client.post(
+            f"/api/v1/graphs/{test_graph.id}/imports",
+            headers=auth_headers,
+            params={"format": "csv", "node_type": "concept"},
+            files={"file": ("export.txt", content, "text/csv")},
+        )
+        
+        assert response.status_code == 201
+        assert (response.json()["nodes"], response.json()["relations"]) == (2, 1)
+        nodes = await imported_nodes(db_session, test_graph)
+        assert nodes["Derivative"].content_data == {"question": "What is d/dx x^2?", "answer": "2x"}
+        assert nodes["Integral"].content_data == {}
+        assert nodes["Integral"].node_type == "CONCEPT"
+        assert await node_tag_names(db_session, nodes["Derivative"]) == ["basics", "calculus"]
+        relation = (await db_session.execute(
+            select(NodeRelation).where(NodeRelation.graph_id == test_graph.id)
+        )).scalar_one()
+        assert (relation.source_id, relation.target_id) == (nodes["Integral"].id, nodes["Derivative"].id)
+    
+    @pytest.mark.asyncio
+    async def test_import_apkg(self, client, auth_headers, db_session, test_graph, tmp_path):
+        """测试 Anki 牌组：每条笔记导入为问答节点，笔记标签导入为标签"""
+        content = build_apkg(tmp_path, [
+            ("guid-1", " geo capitals ", ["What is the capital of <b>France</b>?", "Paris<br>(city)"]),
+            ("guid-2", "", ["{{c1::Berlin}} is in Germany", ""]),
+            ("guid-3", "geo", ["<img src='a.png'>", "picture"]),
+        ], collection="collection.anki21")
+        response = await client.post(
+            f"/api/v1/graphs/{test_graph.id}/imports",
+            headers=auth_headers,
+            files={"file": ("deck.apkg", content, "application/octet-stream")},
+        )
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert (data["records"], data["nodes"], data["skipped"], data["tags"]) == (3, 2, 1, 2)
+        nodes = await imported_nodes(db_session, test_graph)
+        france = nodes["What is the capital of France?"]
+        assert france.content_data["answer"] == "Paris\n(city)"
+        assert france.content_data["fields"] == {
+            "Front": "What is the capital of <b>France</b>?", "Back": "Paris<br>(city)"
+        }
+        assert france.content_data["source"] == {"format": "anki", "guid": "guid-1", "note_type": "Basic"}
+        assert await node_tag_names(db_session, france) == ["capitals", "geo"]
+        assert "answer" not in nodes["Berlin is in Germany"].content_data
+    
+    @pytest.mark.asyncio
+    async def test_invalid_imports(self, client, auth_headers, db_session, test_graph, tmp_path):
+        """测试无法识别的格式、不支持的 Anki 导出、缺少 title 列和不存在的图谱，失败时不写入任何数据"""
+        # 导入失败时回滚共享的会话，test_graph 随之过期
+        graph_id = test_graph.id
+        url = f"/api/v1/graphs/{graph_id}/imports"
+        
+        response = await client.post(url, headers=auth_headers, files={"file": ("notes.txt", b"x", "text/plain")})
+        assert response.status_code == 400
+        
+        # 新版导出：collection.anki2 只是占位集合
+        buffer = io.BytesIO(build_apkg(tmp_path, [("guid-1", "", ["Please update", ""])]))
+        with zipfile.ZipFile(buffer, "a") as archive:
+            archive.writestr("collection.anki21b", b"zstd")
+        response = await client.post(
+            url, headers=auth_headers, files={"file": ("deck.apkg", buffer.getvalue(), "application/octet-stream")}
+        )
+        assert response.status_code == 400
+        
+        response = await client.post(
+            url, headers=auth_headers, files={"file": ("deck.apkg", b"not a zip", "application/octet-stream")}
+        )
+        assert response.status_code == 400
+        
+        response = await client.post(
+            url, headers=auth_headers, files={"file": ("notes.csv", b"name\r\nx\r\n", "text/csv")}
+        )
+        assert response.status_code == 400
+        
+        response = await client.post(
+            f"/api/v1/graphs/{uuid.uuid4()}/imports", headers=auth_headers,
+            files={"file": ("notes.jsonl", jsonl({"title": "x"}), "application/x-ndjson")},
+        )
+        assert response.status_code == 404
+        
+        response = await client.get(f"{url}/unknown", headers=auth_headers)
+        assert response.status_code == 404
+        
+        count = await db_session.scalar(select(func.count()).select_from(MemoryNode))
+        assert count == 0
+        graph = await db_session.get(KnowledgeGraph, graph_id, populate_existing=True)
+        assert graph.node_count == 0
+
+
+class TestNodeImportService:
+    """测试分块写入"""
+    
+    @pytest.mark.asyncio
+    async def test_chunked_import_reports_progress(self, db_session, test_user, test_graph, monkeypatch):
+        """测试按块写入时每块报告一次进度，关联可以跨块引用"""
+        monkeypatch.setattr(settings, "NODE_IMPORT_CHUNK_SIZE", 2)
+        records = [
+            {"key": str(i), "title": f"node {i}", "tags": [f"t{i % 2}"], "relations": [str(i - 1)] if i else []}
+            for i in range(5)
+        ]
+        reports = []
+        
+        result = await node_import_service.import_file(
+            db_session, test_graph.id, test_user.id, io.BytesIO(jsonl(*records)), "jsonl",
+            on_progress=reports.append
+        )
+        
+        assert [report["nodes"] for report in reports] == [2, 4, 5, 5]
+        assert reports[-1]["status"] == "completed"
+        assert (result["nodes"], result["relations"], result["tags"], result["node_tags"]) == (5, 4, 2, 5)
+        assert node_import_service.get_progress(test_graph.id, result["import_id"])["status"] == "completed"
+        
+        tag_counts = dict((await db_session.execute(
+            select(KnowledgeTag.name, KnowledgeTag.node_count).where(KnowledgeTag.graph_id == test_graph.id)
+        )).all())
+        assert tag_counts == {"t0": 3, "t1": 2}
+        graph = await db_session.get(KnowledgeGraph, test_graph.id, populate_existing=True)
+        assert graph.node_count == 5
@@ -0,0 +1,183 @@
+"""
+节点坐标批量更新测试
+测试批量更新接口的计数和校验，以及同一客户端并发请求的合并写入
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.models import KnowledgeGraph
+from app.services.node_position_service import NodePositionCoalescer
+from tests.conftest import TestSessionLocal, node_positions, seed_nodes
+
+
+class TestNodePositionsAPI:
+    """测试批量更新接口"""
+    
+    @pytest.mark.asyncio
+    async def test_update_positions(self, client, auth_headers, db_session, test_user, test_graph):
+        """测试写入坐标、未提供 Z 坐标时保留原值，其他图谱和已删除的节点计入 rejected"""
+        nodes = await seed_nodes(db_session, test_user, test_graph, count=4)
+        other_graph = KnowledgeGraph(user_id=test_user.id, name="other graph")
+        db_session.add(other_graph)
+        await db_session.commit()
+        foreign = (await seed_nodes(db_session, test_user, other_graph, count=1))[0]
+        nodes[-1].deleted_at = nodes[-1].created_at
+        await db_session.commit()
+        
+        snapshot_url = f"/api/v1/graphs/{test_graph.id}/snapshot"
+        etag = (await client.get(snapshot_url, headers=auth_headers)).headers["etag"]
+        
+        targets = nodes + [foreign]
+        response = await client.patch(
+            f"/api/v1/graphs/{test_graph.id}/positions",
+            headers=auth_headers,
+            json={
+                "node_ids": [str(node.id) for node in targets],
+                "position_x": [float(i) for i in range(len(targets))],
+                "position_y": [-float(i) for i in range(len(targets))],
+            }
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["applied"], data["rejected"], data["coalesced"]) == (3, 2, 0)
+        assert set(data["rejected_ids"]) == {str(nodes[-1].id), str(foreign.id)}
+        
+        positions = await node_positions(db_session, targets)
+        assert [positions[node.id] for node in nodes[:3]] == [(0.0, 0.0, 7.0), (1.0, -1.0, 7.0), (2.0, -2.0, 7.0)]
+        assert positions[nodes[-1].id] == (0.0, 0.0, 7.0)
+        assert positions[foreign.id] == (0.0, 0.0, 7.0)
+        assert (await client.get(snapshot_url, headers=auth_headers)).headers["etag"] != etag
+        
+        # 提供 Z 坐标（None 表示该节点不修改）；同一请求内重复的节点只写入最后一个坐标
+        response = await client.patch(
+            f"/api/v1/graphs/{test_graph.id}/positions",
+            headers=auth_headers,
+            json={
+                "node_ids": [str(nodes[0].id), str(nodes[1].id), str(nodes[0].id)],
+                "position_x": [10.0, 11.0, 12.0],
+                "position_y": [10.0, 11.0, 12.0],
+                "position_z": [1.0, None, 3.0],
+            }
+        )
+        assert response.status_code == 200
+        assert (response.json()["applied"], response.json()["coalesced"]) == (2, 1)
+        positions = await node_positions(db_session, nodes[:2])
+        assert positions[nodes[0].id] == (12.0, 12.0, 3.0)
+        assert positions[nodes[1].id] == (11.0, 11.0, 7.0)
+    
+    @pytest.mark.asyncio
+    async def test_invalid_requests(self, client, auth_headers, db_session, test_user, test_graph, monkeypatch):
+        """测试长度不一致、缺少坐标、超过批量上限和不存在的图谱"""
+        nodes = await seed_nodes(db_session, test_user, test_graph, count=3)
+        url = f"/api/v1/graphs/{test_graph.id}/positions"
+        node_ids = [str(node.id) for node in nodes]
+        
+        response = await client.patch(
+            url, headers=auth_headers,
+            json={"node_ids": node_ids, "position_x": [0.0, 1.0], "position_y": [0.0, 1.0, 2.0]}
+        )
+        assert response.status_code == 422
+        
+        response = await client.patch(
+            url, headers=auth_headers,
+            json={"node_ids": node_ids[:1], "position_x": [None], "position_y": [0.0]}
+        )
+        assert response.status_code == 422
+        
+        monkeypatch.setattr(settings, "NODE_POSITIONS_MAX_BATCH", 2)
+        response = await client.patch(
+            url, headers=auth_headers,
+            json={"node_ids": node_ids, "position_x": [0.0] * 3, "position_y": [0.0] * 3}
+        )
+        assert response.status_code == 400
+        
+        response = await client.patch(
+            f"/api/v1/graphs/{nodes[0].id}/positions", headers=auth_headers,
+            json={"node_ids": node_ids[:1], "position_x": [0.0], "position_y": [0.0]}
+        )
+        assert response.status_code == 404
+
+
+class TestNodePositionCoalescer:
+    """测试合并写入"""
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_coalesce(self, db_session, test_user, test_graph):
+        """测试第一个请求写入期间到达的请求合并为一次写入，乱序到达的旧坐标不覆盖新坐标"""
+        a, b, c = await seed_nodes(db_session, test_user, test_graph, count=3)
+        coalescer = NodePositionCoalescer()
+        
+        async def submit(node_ids, x, sequence, client_id="drag"):
+            async with TestSessionLocal() as session:
+                return await coalescer.submit(
+                    session, test_graph.id, node_ids, [x] * len(node_ids), [x] * len(node_ids),
+                    client_id=client_id, sequence=sequence
+                )
+        
+        # 第一个请求持有写锁写入时，后三个请求排队；其中 sequence=1 的坐标比正在写入的 sequence=3 旧
+        first, stale, newer, latest = await asyncio.gather(
+            submit([a.id], 3.0, 3),
+            submit([a.id], 1.0, 1),
+            submit([a.id, b.id], 4.0, 4),
+            submit([b.id, c.id], 5.0, 5),
+        )
+        
+        assert first == {"applied": 1, "rejected": 0, "coalesced": 0, "rejected_ids": []}
+        assert (stale["applied"], stale["coalesced"]) == (0, 1)
+        assert (newer["applied"], newer["coalesced"]) == (1, 1)
+        assert (latest["applied"], latest["coalesced"]) == (2, 0)
+        assert coalescer.stats() == {"requests": 4, "flushes": 2, "coalesced": 2}
+        
+        positions = await node_positions(db_session, [a, b, c])
+        assert positions[a.id][:2] == (4.0, 4.0)
+        assert positions[b.id][:2] == (5.0, 5.0)
+        assert positions[c.id][:2] == (5.0, 5.0)
+        # 请求全部返回后不再保留客户端状态
+        assert coalescer._states == {}
+    
+    @pytest.mark.asyncio
+    async def test_stale_request_after_completion(self, db_session, test_user, test_graph, monkeypatch):
+        """测试较新的请求已经返回后才到达的旧坐标不覆盖新坐标"""
+        node, other = await seed_nodes(db_session, test_user, test_graph, count=2)
+        coalescer = NodePositionCoalescer()
+        
+        async def submit(x, sequence, client_id="drag", node_ids=(node.id,)):
+            async with TestSessionLocal() as session:
+                return await coalescer.submit(
+                    session, test_graph.id, list(node_ids), [x] * len(node_ids), [x] * len(node_ids),
+                    client_id=client_id, sequence=sequence
+                )
+        
+        assert (await submit(5.0, 5))["applied"] == 1
+        assert coalescer._states == {}
+        
+        stale = await submit(4.0, 4)
+        assert (stale["applied"], stale["coalesced"]) == (0, 1)
+        assert (await node_positions(db_session, [node]))[node.id][:2] == (5.0, 5.0)
+        
+        # 其他客户端的序号互不影响
+        assert (await submit(3.0, 3, client_id="other"))["applied"] == 1
+        
+        # 超出保留数量时丢弃最久未使用的客户端
+        monkeypatch.setattr(settings, "NODE_POSITIONS_SEQUENCE_CLIENTS", 1)
+        await submit(1.0, 1, client_id="third", node_ids=(other.id,))
+        assert list(coalescer._sequences) == [(test_graph.id, "third")]
+    
+    @pytest.mark.asyncio
+    async def test_clients_do_not_coalesce(self, db_session, test_user, test_graph):
+        """测试不同客户端的请求各自写入"""
+        (node,) = await seed_nodes(db_session, test_user, test_graph, count=1)
+        coalescer = NodePositionCoalescer()
+        
+        async def submit(x, client_id):
+            async with TestSessionLocal() as session:
+                return await coalescer.submit(session, test_graph.id, [node.id], [x], [x], client_id=client_id)
+        
+        results = await asyncio.gather(submit(1.0, "left"), submit(2.0, "right"))
+        
+        assert [result["applied"] for result in results] == [1, 1]
+        assert coalescer.stats()["flushes"] == 2
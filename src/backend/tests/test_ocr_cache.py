@@ -0,0 +1,225 @@
+"""
+OCR 结果缓存测试
+测试本地 LRU 和数据库两级缓存、容量淘汰、跳过缓存，以及重复上传的图片在提交时直接完成
+"""
+
+import hashlib
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models import FileUpload, OCRCacheEntry
+from app.services.ocr_cache_service import OCRResultCache, file_sha256, ocr_result_cache
+from app.services.ocr_service import ocr_service
+
+
+def _result(text: str) -> dict:
+    """测试用的识别结果"""
+    return {"ocr_text": text, "confidence": 0.9, "engine": "fake", "processing_time": 0.5, "raw_result": {}}
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """启用本地模拟 OCR 并记录调用次数"""
+    monkeypatch.setattr(settings, "OCR_FAKE_ENABLED", True)
+    monkeypatch.setattr(settings, "OCR_FAKE_LATENCY", 0.01)
+    monkeypatch.setattr(settings, "OCR_FAKE_QPS", 0)
+    original = ocr_service.ocr_fake
+    calls = []
+    
+    async def counting(image_path):
+        calls.append(image_path)
+        return await original(image_path)
+    
+    monkeypatch.setattr(ocr_service, "ocr_fake", counting)
+    return calls
+
+
+@pytest.fixture
+def image_factory(db_session, test_user):
+    """创建内容相同的图片上传记录（每条记录各自存储一份文件）"""
+    content = b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes
+    paths = []
+    
+    async def create() -> FileUpload:
+        stored_filename = f"test_ocr_cache_{uuid.uuid4().hex[:8]}.jpg"
+        path = Path("uploads") / "images" / stored_filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        paths.append(path)
+        
+        file_upload = FileUpload(
+            user_id=test_user.id,
+            original_filename="worksheet.jpg",
+            stored_filename=stored_filename,
+            file_url=f"/uploads/images/{stored_filename}",
+            file_size=len(content),
+            mime_type="image/jpeg",
+            status="pending",
+        )
+        db_session.add(file_upload)
+        await db_session.commit()
+        await db_session.refresh(file_upload)
+        return file_upload
+    
+    yield create
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+class TestOCRResultCache:
+    """测试缓存读写和淘汰"""
+    
+    @pytest.mark.asyncio
+    async def test_database_hit_fills_local(self, db_session):
+        """测试本地未命中时从数据库读取并回填本地"""
+        cache = OCRResultCache(local_max_bytes=1024 * 1024, max_bytes=1024 * 1024)
+        await cache.set(db_session, "a" * 64, "fake", "text", _result("hello"))
+        await db_session.commit()
+        cache.clear()
+        
+        assert await cache.get(db_session, "a" * 64, "fake", "text") == _result("hello")
+        await db_session.commit()
+        assert await cache.get(db_session, "a" * 64, "fake", "text") == _result("hello")
+        assert await cache.get(db_session, "a" * 64, "fake", "math") is None
+        assert await cache.get(db_session, "a" * 64, "fake", "text", bypass=True) is None
+        
+        stats = cache.stats()
+        assert (stats["hits"], stats["db_hits"], stats["misses"], stats["bypassed"]) == (1, 1, 1, 1)
+        assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-4)
+        entry = (await db_session.execute(select(OCRCacheEntry))).scalar_one()
+        assert entry.hit_count == 1
+        assert entry.result_bytes == OCRResultCache.result_size(_result("hello"))
+    
+    @pytest.mark.asyncio
+    async def test_set_overwrites(self, db_session):
+        """测试重新识别的结果覆盖旧条目"""
+        cache = OCRResultCache()
+        await cache.set(db_session, "b" * 64, "fake", "text", _result("old"))
+        await cache.set(db_session, "b" * 64, "fake", "text", _result("new"))
+        await db_session.commit()
+        cache.clear()
+        
+        assert (await cache.get(db_session, "b" * 64, "fake", "text"))["ocr_text"] == "new"
+    
+    @pytest.mark.asyncio
+    async def test_local_lru_eviction(self, db_session):
+        """测试本地容量超出时淘汰最久未使用的条目"""
+        size = OCRResultCache.result_size(_result("x"))
+        cache = OCRResultCache(local_max_bytes=size * 2)
+        for content_hash in ("1", "2"):
+            await cache.set(db_session, content_hash * 64, "fake", "text", _result("x"))
+        await cache.get(db_session, "1" * 64, "fake", "text")
+        await cache.set(db_session, "3" * 64, "fake", "text", _result("x"))
+        
+        assert set(cache._entries) == {("1" * 64, "fake", "text"), ("3" * 64, "fake", "text")}
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == size * 2
+    
+    @pytest.mark.asyncio
+    async def test_database_eviction(self, db_session):
+        """测试数据库中结果总字节数超出容量时淘汰最久未命中的条目"""
+        size = OCRResultCache.result_size(_result("x"))
+        cache = OCRResultCache(max_bytes=size * 2, evict_interval=1000)
+        for content_hash in ("1", "2", "3"):
+            await cache.set(db_session, content_hash * 64, "fake", "text", _result("x"))
+            await db_session.commit()
+        cache.clear()
+        await cache.get(db_session, "1" * 64, "fake", "text")
+        await db_session.commit()
+        
+        assert await cache.evict(db_session) == 1
+        await db_session.commit()
+        
+        remaining = (await db_session.execute(select(OCRCacheEntry.content_hash))).scalars().all()
+        assert sorted(remaining) == ["1" * 64, "3" * 64]
+        assert cache.stats()["db_evictions"] == 1
+    
+    def test_file_sha256(self, tmp_path):
+        """测试分块计算文件哈希"""
+        path = tmp_path / "image.jpg"
+        content = b"0123456789" * 300000
+        path.write_bytes(content)
+        
+        assert file_sha256(path) == hashlib.sha256(content).hexdigest()
+
+
+class TestOCRCacheIntegration:
+    """测试重复上传的图片直接使用缓存的结果"""
+    
+    @pytest.mark.asyncio
+    async def test_reupload_uses_cached_result(self, client, auth_headers, db_session, fake_ocr, image_factory):
+        """测试内容相同的另一个文件不再调用 OCR 服务"""
+        first = await image_factory()
+        second = await image_factory()
+        second_id = second.id
+        
+        response = await client.post(
+            "/api/v1/ocr/ocr", headers=auth_headers, json={"file_id": str(first.id), "ocr_engine": "fake"}
+        )
+        assert response.status_code == 200
+        assert response.json()["cached"] is False
+        
+        response = await client.post(
+            "/api/v1/ocr/ocr", headers=auth_headers, json={"file_id": str(second_id), "ocr_engine": "fake"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["cached"] is True
+        assert data["text"].startswith("fake ocr:")
+        assert len(fake_ocr) == 1
+        
+        file_upload = (await db_session.execute(
+            select(FileUpload).where(FileUpload.id == second_id).execution_options(populate_existing=True)
+        )).scalar_one()
+        assert file_upload.status == "completed"
+        assert file_upload.processing_result["ocr_text"] == data["text"]
+        assert "raw_result" not in file_upload.processing_result
+        assert file_upload.content_hash == file_sha256(Path("uploads") / "images" / file_upload.stored_filename)
+    
+    @pytest.mark.asyncio
+    async def test_bypass_and_mode(self, client, auth_headers, fake_ocr, image_factory):
+        """测试跳过缓存时重新识别，不同识别模式分别缓存"""
+        file_id = str((await image_factory()).id)
+        
+        for payload in (
+            {"file_id": file_id, "ocr_engine": "fake"},
+            {"file_id": file_id, "ocr_engine": "fake", "bypass_cache": True},
+            {"file_id": file_id, "ocr_engine": "fake"},
+        ):
+            response = await client.post("/api/v1/ocr/ocr", headers=auth_headers, json=payload)
+            assert response.status_code == 200
+        assert len(fake_ocr) == 2
+        assert response.json()["cached"] is True
+        
+        response = await client.post(
+            "/api/v1/ocr/ocr/math", headers=auth_headers, json={"file_id": file_id, "ocr_engine": "fake"}
+        )
+        assert response.json()["cached"] is False
+        assert len(fake_ocr) == 3
+    
+    @pytest.mark.asyncio
+    async def test_job_completed_on_submit(self, client, auth_headers, fake_ocr, image_factory):
+        """测试缓存命中时提交的任务已完成"""
+        first = await image_factory()
+        response = await client.post(
+            "/api/v1/ocr/ocr", headers=auth_headers, json={"file_id": str(first.id), "ocr_engine": "fake"}
+        )
+        assert response.status_code == 200
+        hits = ocr_result_cache.stats()["hits"]
+        second = await image_factory()
+        
+        response = await client.post(
+            "/api/v1/ocr/jobs", headers=auth_headers, json={"file_id": str(second.id), "ocr_engine": "fake"}
+        )
+        
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == "completed"
+        assert job["attempts"] == 0
+        assert job["result"]["cached"] is True
+        assert job["finished_at"] is not None
+        assert ocr_result_cache.stats()["hits"] == hits + 1
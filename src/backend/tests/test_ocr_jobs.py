@@ -0,0 +1,383 @@
+"""
+OCR 任务队列测试
+使用本地模拟 OCR 测试任务提交、工作协程处理、重试、租约恢复、令牌桶限速和 SSE 事件
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.models import FileUpload, OCRJob
+from app.services.ocr_job_service import TokenBucket, ocr_job_queue, retry_delay
+from app.services.ocr_service import ocr_service
+from tests.conftest import test_engine
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """启用本地模拟 OCR（不限速、几乎不耗时、重试不等待）"""
+    monkeypatch.setattr(settings, "OCR_FAKE_ENABLED", True)
+    monkeypatch.setattr(settings, "OCR_FAKE_LATENCY", 0.01)
+    monkeypatch.setattr(settings, "OCR_FAKE_QPS", 0)
+    monkeypatch.setattr(settings, "OCR_JOB_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(settings, "OCR_JOB_POLL_INTERVAL", 0.05)
+
+
+@pytest.fixture
+async def ocr_workers(db_session, fake_ocr):
+    """启动工作协程（测试结束、清理数据库之前停止）"""
+    ocr_job_queue.start(test_engine)
+    yield ocr_job_queue
+    await ocr_job_queue.stop()
+
+
+@pytest.fixture
+async def image_upload(db_session, test_user):
+    """创建本地存储的图片文件及其上传记录（内容各不相同，不会命中其他测试的结果缓存）"""
+    stored_filename = f"test_ocr_{uuid.uuid4().hex[:8]}.jpg"
+    path = Path("uploads") / "images" / stored_filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\xff\xd8\xff\xe0" + uuid.uuid4().hex.encode() + b"0" * 68)
+    
+    file_upload = FileUpload(
+        user_id=test_user.id,
+        original_filename="worksheet.jpg",
+        stored_filename=stored_filename,
+        file_url=f"/uploads/images/{stored_filename}",
+        file_size=104,
+        mime_type="image/jpeg",
+        status="pending",
+    )
+    db_session.add(file_upload)
+    await db_session.commit()
+    await db_session.refresh(file_upload)
+    yield file_upload
+    path.unlink(missing_ok=True)
+
+
+async def wait_for_job(client, auth_headers, job_id, timeout=5.0):
+    """轮询任务直到结束"""
+    deadline = time.monotonic() + timeout
+    while True:
+        response = await client.get(f"/api/v1/ocr/jobs/{job_id}", headers=auth_headers)
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("completed", "failed") or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.02)
+
+
+async def load_file(db_session, file_id):
+    """读取文件记录的最新状态"""
+    result = await db_session.execute(
+        select(FileUpload).where(FileUpload.id == file_id).execution_options(populate_existing=True)
+    )
+    return result.scalar_one()
+
+
+class TestOCRJobQueue:
+    """测试异步 OCR 任务"""
+    
+    @pytest.mark.asyncio
+    async def test_submit_and_poll(self, client, auth_headers, db_session, ocr_workers, image_upload):
+        """测试提交后立即返回，工作协程完成后可查询结果"""
+        file_id = image_upload.id
+        
+        response = await client.post(
+            "/api/v1/ocr/jobs",
+            headers=auth_headers,
+            json={"file_id": str(file_id), "ocr_engine": "auto", "mode": "math"}
+        )
+        
+        assert response.status_code == 202
+        submitted = response.json()
+        assert submitted["status"] == "queued"
+        assert submitted["engine"] == "fake"
+        
+        job = await wait_for_job(client, auth_headers, submitted["id"])
+        assert job["status"] == "completed"
+        assert job["attempts"] == 1
+        assert job["result"]["ocr_text"] == f"fake ocr: {image_upload.stored_filename}\n104 bytes"
+        assert job["result"]["raw_result"]["words_result_num"] == 2
+        assert job["finished_at"] is not None
+        
+        file_upload = await load_file(db_session, file_id)
+        assert file_upload.status == "completed"
+        assert file_upload.processing_result["has_math"] is True
+        assert "raw_result" not in file_upload.processing_result
+        assert file_upload.processed_at is not None
+    
+    @pytest.mark.asyncio
+    async def test_sync_endpoint_without_workers(self, client, auth_headers, fake_ocr, image_upload):
+        """测试本进程没有工作协程时 /ocr 在请求中处理任务"""
+        response = await client.post(
+            "/api/v1/ocr/ocr",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "fake"}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["engine"] == "fake"
+        assert data["text"].startswith("fake ocr:")
+        assert data["confidence"] == pytest.approx(0.99)
+    
+    @pytest.mark.asyncio
+    async def test_sync_endpoint_waits_for_workers(self, client, auth_headers, ocr_workers, image_upload):
+        """测试启动了工作协程时 /ocr/math 等待任务完成"""
+        response = await client.post(
+            "/api/v1/ocr/ocr/math",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "fake"}
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["text"].startswith("fake ocr:")
+    
+    @pytest.mark.asyncio
+    async def test_retry_then_succeed(self, client, auth_headers, fake_ocr, image_upload, monkeypatch):
+        """测试失败后重新排队并在下一次尝试成功"""
+        original = ocr_service.ocr_fake
+        calls = []
+        
+        async def flaky(image_path):
+            calls.append(image_path)
+            if len(calls) == 1:
+                raise RuntimeError("temporary failure")
+            return await original(image_path)
+        
+        monkeypatch.setattr(ocr_service, "ocr_fake", flaky)
+        
+        response = await client.post(
+            "/api/v1/ocr/ocr",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "fake"}
+        )
+        
+        assert response.status_code == 200
+        assert len(calls) == 2
+    
+    @pytest.mark.asyncio
+    async def test_retries_exhausted(self, client, auth_headers, db_session, fake_ocr, image_upload, monkeypatch):
+        """测试超过最大尝试次数后任务和文件标记为失败"""
+        monkeypatch.setattr(settings, "OCR_FAKE_FAILURE_RATE", 1.0)
+        monkeypatch.setattr(settings, "OCR_JOB_MAX_ATTEMPTS", 2)
+        file_id = image_upload.id
+        
+        response = await client.post(
+            "/api/v1/ocr/ocr",
+            headers=auth_headers,
+            json={"file_id": str(file_id), "ocr_engine": "fake"}
+        )
+        
+        assert response.status_code == 500
+        assert "qps request limit" in response.json()["detail"]
+        
+        job = (await db_session.execute(
+            select(OCRJob).where(OCRJob.file_id == file_id).execution_options(populate_existing=True)
+        )).scalar_one()
+        assert job.status == "failed"
+        assert job.attempts == 2
+        file_upload = await load_file(db_session, file_id)
+        assert file_upload.status == "failed"
+        assert "qps request limit" in file_upload.error_message
+    
+    @pytest.mark.asyncio
+    async def test_missing_file_fails_without_retry(self, client, auth_headers, fake_ocr, image_upload):
+        """测试文件在排队期间被删除时不重试"""
+        response = await client.post(
+            "/api/v1/ocr/jobs",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "fake"}
+        )
+        job_id = response.json()["id"]
+        (Path("uploads") / "images" / image_upload.stored_filename).unlink()
+        
+        await ocr_job_queue.run_until_done(test_engine, job_id, timeout=5.0)
+        
+        job = await wait_for_job(client, auth_headers, job_id)
+        assert job["status"] == "failed"
+        assert job["attempts"] == 1
+        assert job["error_message"] == "文件不存在于服务器"
+    
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_reclaimed(self, client, auth_headers, db_session, fake_ocr, image_upload):
+        """测试处理中超过租约的任务被重新领取"""
+        job = OCRJob(
+            user_id=image_upload.user_id,
+            file_id=image_upload.id,
+            mode="text",
+            engine="fake",
+            status="running",
+            attempts=1,
+            max_attempts=3,
+            locked_by="crashed-worker",
+            locked_at=datetime.now(timezone.utc) - timedelta(seconds=settings.OCR_JOB_LEASE_SECONDS + 60),
+        )
+        db_session.add(job)
+        await db_session.commit()
+        job_id = job.id
+        
+        await ocr_job_queue.run_until_done(test_engine, job_id, timeout=5.0)
+        
+        job = await wait_for_job(client, auth_headers, job_id)
+        assert job["status"] == "completed"
+        assert job["attempts"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_worker_concurrency_limit(self, client, auth_headers, db_session, test_user, fake_ocr, monkeypatch):
+        """测试每个引擎同时处理的任务数不超过工作协程数"""
+        monkeypatch.setattr(settings, "OCR_FAKE_WORKERS", 2)
+        monkeypatch.setattr(settings, "OCR_FAKE_LATENCY", 0.05)
+        original = ocr_service.ocr_fake
+        active, peak = [0], [0]
+        
+        async def counting(image_path):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            try:
+                return await original(image_path)
+            finally:
+                active[0] -= 1
+        
+        monkeypatch.setattr(ocr_service, "ocr_fake", counting)
+        
+        path = Path("uploads") / "images" / f"test_ocr_{uuid.uuid4().hex[:8]}.jpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"\xff\xd8\xff\xe0" + uuid.uuid4().bytes)
+        try:
+            uploads = [
+                FileUpload(
+                    user_id=test_user.id,
+                    original_filename=f"page{i}.jpg",
+                    stored_filename=path.name,
+                    file_url=f"/uploads/images/{path.name}",
+                    file_size=20,
+                    mime_type="image/jpeg",
+                    status="pending",
+                )
+                for i in range(6)
+            ]
+            db_session.add_all(uploads)
+            await db_session.commit()
+            job_ids = []
+            for file_upload in uploads:
+                job_ids.append((await ocr_job_queue.submit(db_session, file_upload, engine="fake")).id)
+            
+            ocr_job_queue.start(test_engine)
+            try:
+                jobs = [await wait_for_job(client, auth_headers, job_id) for job_id in job_ids]
+            finally:
+                await ocr_job_queue.stop()
+        finally:
+            path.unlink(missing_ok=True)
+        
+        assert [job["status"] for job in jobs] == ["completed"] * 6
+        assert peak[0] == 2
+    
+    @pytest.mark.asyncio
+    async def test_job_events(self, client, auth_headers, ocr_workers, image_upload):
+        """测试 SSE 事件流在任务结束后关闭"""
+        response = await client.post(
+            "/api/v1/ocr/jobs",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "fake"}
+        )
+        job_id = response.json()["id"]
+        
+        response = await client.get(f"/api/v1/ocr/jobs/{job_id}/events", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+        assert events[-1][0] == "event: completed"
+        assert f'"id":"{job_id}"' in events[-1][1]
+    
+    @pytest.mark.asyncio
+    async def test_wait_does_not_hold_transaction(self, db_session, fake_ocr, image_upload, monkeypatch):
+        """测试等待任务期间没有停留在事务中的数据库连接"""
+        monkeypatch.setattr(settings, "OCR_JOB_POLL_INTERVAL", 1.0)
+        job = await ocr_job_queue.submit(db_session, image_upload, mode="text", engine="fake")
+        job_id = job.id
+        await db_session.commit()
+        
+        waiting = asyncio.create_task(ocr_job_queue.wait(test_engine, job_id, timeout=0.4))
+        await asyncio.sleep(0.2)
+        result = await db_session.execute(text(
+            "SELECT count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND state LIKE 'idle in transaction%' AND pid <> pg_backend_pid()"
+        ))
+        idle_in_transaction = result.scalar_one()
+        await db_session.commit()
+        job = await waiting
+        
+        assert idle_in_transaction == 0
+        assert job.id == job_id
+        assert job.status == "queued"
+    
+    @pytest.mark.asyncio
+    async def test_job_not_found(self, client, auth_headers):
+        """测试查询不存在的任务"""
+        response = await client.get(f"/api/v1/ocr/jobs/{uuid.uuid4()}", headers=auth_headers)
+        assert response.status_code == 404
+        
+        response = await client.get(f"/api/v1/ocr/jobs/{uuid.uuid4()}/events", headers=auth_headers)
+        assert response.status_code == 404
+    
+    @pytest.mark.asyncio
+    async def test_no_engine_available(self, client, auth_headers, image_upload, monkeypatch):
+        """测试没有可用的 OCR 引擎时拒绝提交"""
+        monkeypatch.setattr(settings, "OCR_FAKE_ENABLED", False)
+        monkeypatch.setattr(ocr_service, "baidu_configured", False)
+        
+        response = await client.post(
+            "/api/v1/ocr/jobs",
+            headers=auth_headers,
+            json={"file_id": str(image_upload.id), "ocr_engine": "auto"}
+        )
+        
+        assert response.status_code == 500
+
+
+class TestRateLimiting:
+    """测试限速和重试延迟"""
+    
+    @pytest.mark.asyncio
+    async def test_token_bucket(self):
+        """测试令牌桶在突发容量用完后按速率发放令牌"""
+        bucket = TokenBucket(rate=50, capacity=2)
+        
+        started = time.monotonic()
+        for _ in range(7):
+            await bucket.acquire()
+        elapsed = time.monotonic() - started
+        
+        # 前 2 个令牌立即取得，之后 5 个每个 20ms
+        assert elapsed >= 0.09
+        assert bucket.waited_seconds >= 0.09
+    
+    @pytest.mark.asyncio
+    async def test_token_bucket_concurrent(self):
+        """测试并发取令牌时总速率不超过限制"""
+        bucket = TokenBucket(rate=100, capacity=1)
+        
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(11)))
+        
+        assert time.monotonic() - started >= 0.09
+    
+    def test_retry_delay(self, monkeypatch):
+        """测试重试延迟带随机抖动且不超过上限"""
+        monkeypatch.setattr(settings, "OCR_JOB_RETRY_BASE_DELAY", 1.0)
+        monkeypatch.setattr(settings, "OCR_JOB_RETRY_MAX_DELAY", 5.0)
+        
+        delays = [retry_delay(3) for _ in range(200)]
+        assert all(0 <= delay <= 4.0 for delay in delays)
+        assert len(set(delays)) > 100
+        assert all(retry_delay(10) <= 5.0 for _ in range(50))
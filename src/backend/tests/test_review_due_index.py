@@ -0,0 +1,178 @@
+"""
+复习到期索引测试
+测试 Redis 有序集合索引的重建、维护，以及间隔重复队列与数据库查询结果一致
+"""
+
+import pytest
+import fakeredis.aioredis
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+from app.models import KnowledgeGraph, MemoryNode
+from app.models.memory_node import MasteryLevel
+from app.services.review_due_index import UNSCHEDULED_GROUP, ReviewDueIndex, review_due_index
+from app.services.review_service import ReviewMode, ReviewService
+
+
+@pytest.fixture
+def due_index():
+    """启用全局到期索引并使用 fakeredis（计数清零），测试结束后恢复"""
+    enabled, redis, counters = review_due_index.enabled, review_due_index._redis, review_due_index._counters
+    review_due_index.enabled = True
+    review_due_index._redis = fakeredis.aioredis.FakeRedis()
+    review_due_index._counters = dict.fromkeys(counters, 0)
+    yield review_due_index
+    review_due_index.enabled, review_due_index._redis, review_due_index._counters = enabled, redis, counters
+
+
+async def seed_nodes(db_session, user, graph):
+    """生成各掌握程度、超期时间不同的节点，以及没有复习时间的节点"""
+    now = ReviewService._get_utc_now()
+    levels = [level.value for level in MasteryLevel] + ["MASTERED"]
+    nodes = []
+    for i in range(36):
+        scheduled = i % 6 != 5
+        next_review_at = now + timedelta(hours=(i * 7) % 50 - 40) if scheduled or i % 12 == 5 else None
+        nodes.append(MemoryNode(
+            graph_id=graph.id,
+            user_id=user.id,
+            node_type="CONCEPT",
+            title=f"due {i}",
+            content_data={},
+            mastery_level=levels[i % len(levels)],
+            last_review_at=now - timedelta(days=3) if scheduled else None,
+            next_review_at=next_review_at,
+            review_stats={},
+        ))
+    db_session.add_all(nodes)
+    await db_session.commit()
+    return nodes
+
+
+class TestDueIndexKeys:
+    """测试分组和分数"""
+    
+    def test_group_and_score(self):
+        """测试节点分组与数据库候选查询的分支一致"""
+        now = ReviewService._get_utc_now()
+        
+        assert ReviewDueIndex.group_of("learning", now, now) == "learning"
+        assert ReviewDueIndex.group_of("MASTERED", now, now) == MasteryLevel.NOT_STARTED.value
+        assert ReviewDueIndex.group_of("mastered", None, now) == UNSCHEDULED_GROUP
+        assert ReviewDueIndex.group_of("mastered", now, None) == UNSCHEDULED_GROUP
+        assert ReviewDueIndex.score_of(None) == float("inf")
+        # 不带时区的时间按 UTC 处理
+        assert ReviewDueIndex.score_of(now) == ReviewDueIndex.score_of(now.replace(tzinfo=timezone.utc))
+        assert ReviewDueIndex.score_of(datetime(1970, 1, 2)) == 86400
+
+
+class TestDueIndexQueue:
+    """测试按到期索引获取复习队列"""
+    
+    @pytest.mark.asyncio
+    async def test_queue_matches_database(self, db_session, test_user, test_graph, due_index):
+        """测试按索引取候选节点的队列与数据库查询完全一致（含图谱过滤）"""
+        other_graph = KnowledgeGraph(user_id=test_user.id, name="other")
+        db_session.add(other_graph)
+        await db_session.commit()
+        await seed_nodes(db_session, test_user, test_graph)
+        await seed_nodes(db_session, test_user, other_graph)
+        
+        assert await due_index.rebuild(db_session, test_user.id) == 72
+        
+        for graph_id in (None, str(test_graph.id)):
+            for limit in (1, 5, 12, 100):
+                indexed = await ReviewService.get_review_queue(
+                    db_session, str(test_user.id), graph_id=graph_id, mode=ReviewMode.SPACED, limit=limit
+                )
+                due_index.enabled = False
+                expected = await ReviewService.get_review_queue(
+                    db_session, str(test_user.id), graph_id=graph_id, mode=ReviewMode.SPACED, limit=limit
+                )
+                due_index.enabled = True
+                
+                # 没有复习时间的节点遗忘指数相同、顺序不确定，按排序键比较
+                assert [(item["next_review_at"], item["mastery_level"]) for item in indexed] == [
+                    (item["next_review_at"], item["mastery_level"]) for item in expected
+                ]
+        assert due_index.stats()["fallbacks"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_falls_back_to_database(self, db_session, test_user, test_node, due_index):
+        """测试索引未重建或 Redis 不可用时回退到数据库查询"""
+        queue = await ReviewService.get_review_queue(db_session, str(test_user.id), mode=ReviewMode.SPACED)
+        assert [item["node_id"] for item in queue] == [str(test_node.id)]
+        
+        broken = Mock()
+        broken.pipeline.side_effect = ConnectionError("redis down")
+        due_index._redis = broken
+        queue = await ReviewService.get_review_queue(db_session, str(test_user.id), mode=ReviewMode.SPACED)
+        assert [item["node_id"] for item in queue] == [str(test_node.id)]
+        
+        stats = due_index.stats()
+        assert stats["fallbacks"] == 2
+        assert stats["errors"] == 1
+
+
+class TestDueIndexMaintenance:
+    """测试复习、创建和删除节点时维护索引"""
+    
+    @pytest.mark.asyncio
+    async def test_review_moves_node_out_of_queue(self, db_session, test_user, test_node, due_index):
+        """测试提交复习后节点移到新的分组和分数，不再出现在候选中"""
+        await due_index.rebuild(db_session, test_user.id)
+        now = ReviewService._get_utc_now()
+        assert await due_index.candidates(test_user.id, None, now, 10) == [str(test_node.id)]
+        
+        await ReviewService.update_review_stats(db_session, str(test_node.id), quality=5, review_duration=10)
+        
+        assert await due_index.candidates(test_user.id, None, now, 10) == []
+        later = now + timedelta(days=2)
+        assert await due_index.candidates(test_user.id, test_node.graph_id, later, 10) == [str(test_node.id)]
+        score = await due_index._redis.zscore(f"review_due:{test_user.id}:familiar", str(test_node.id))
+        assert score == pytest.approx(ReviewDueIndex.score_of(now + timedelta(days=1)), abs=5)
+    
+    @pytest.mark.asyncio
+    async def test_create_and_delete_nodes(self, client, auth_headers, db_session, test_user, test_graph, due_index):
+        """测试通过接口创建、删除节点和删除图谱时同步更新索引"""
+        await due_index.rebuild(db_session, test_user.id)
+        now = ReviewService._get_utc_now()
+        
+        node_ids = []
+        for i in range(2):
+            response = await client.post(
+                "/api/v1/nodes/",
+                headers=auth_headers,
+                json={"graph_id": str(test_graph.id), "node_type": "CONCEPT", "title": f"node {i}", "content_data": {}}
+            )
+            assert response.status_code == 201
+            node_ids.append(response.json()["id"])
+        assert sorted(await due_index.candidates(test_user.id, test_graph.id, now, 10)) == sorted(node_ids)
+        
+        response = await client.delete(f"/api/v1/nodes/{node_ids[0]}", headers=auth_headers)
+        assert response.status_code == 204
+        assert await due_index.candidates(test_user.id, None, now, 10) == [node_ids[1]]
+        
+        response = await client.delete(f"/api/v1/graphs/{test_graph.id}", headers=auth_headers)
+        assert response.status_code == 204
+        assert await due_index.candidates(test_user.id, None, now, 10) == []
+        assert await due_index._redis.keys(f"review_due:{test_user.id}:{test_graph.id}:*") == []
+        assert due_index.stats()["errors"] == 0
+    
+    @pytest.mark.asyncio
+    async def test_bulk_import_adds_nodes(self, client, auth_headers, db_session, test_user, test_graph, due_index):
+        """测试批量导入的节点进入未排期分组"""
+        await due_index.rebuild(db_session, test_user.id)
+        now = ReviewService._get_utc_now()
+        
+        response = await client.post(
+            f"/api/v1/graphs/{test_graph.id}/imports",
+            headers=auth_headers,
+            files={"file": ("notes.jsonl", b'{"title": "a"}\n{"title": "b"}\n', "application/x-ndjson")},
+        )
+        assert response.status_code == 201
+        
+        candidates = await due_index.candidates(test_user.id, test_graph.id, now, 10)
+        assert len(candidates) == 2
+        assert await due_index._redis.zcard(f"review_due:{test_user.id}:{UNSCHEDULED_GROUP}") == 2
+        assert due_index.stats()["errors"] == 0
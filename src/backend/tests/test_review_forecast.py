@@ -0,0 +1,158 @@
+"""
+复习负载预测测试
+测试向量化 SM-2、蒙特卡洛模拟和预测接口
+"""
+
+import itertools
+import pytest
+import numpy as np
+from datetime import timedelta
+
+from app.models import MemoryNode, ReviewLog
+from app.services.review_forecast_service import (
+    DEFAULT_QUALITY_DISTRIBUTION,
+    QUALITY_PRIOR_WEIGHT,
+    ReviewForecastService,
+)
+from app.services.review_service import ReviewService
+
+
+def make_cards(repetitions, easiness, interval, due_day):
+    """构造 simulate 使用的卡片状态"""
+    return {
+        "repetitions": np.array(repetitions, dtype=np.int32),
+        "easiness": np.array(easiness, dtype=np.float64),
+        "interval": np.array(interval, dtype=np.int32),
+        "due_day": np.array(due_day, dtype=np.int32),
+    }
+
+
+class TestBatchSM2:
+    """测试向量化 SM-2"""
+    
+    def test_batch_matches_scalar(self):
+        """测试批量计算与逐个计算结果一致"""
+        grid = list(itertools.product(range(6), range(5), (1.3, 1.5, 2.36, 2.5, 2.8), (1, 6, 15, 40)))
+        quality, repetitions, easiness, interval = (np.array(column) for column in zip(*grid))
+        
+        new_interval, new_easiness, new_repetitions = ReviewService.calculate_next_review_batch(
+            quality, repetitions.astype(np.int32), easiness, interval.astype(np.int32)
+        )
+        
+        assert new_interval.dtype == np.int32
+        assert new_repetitions.dtype == np.int32
+        for i, args in enumerate(grid):
+            expected = ReviewService.calculate_next_review(*(int(args[0]), int(args[1]), args[2], int(args[3])))
+            assert new_interval[i] == expected[0], args
+            assert new_easiness[i] == pytest.approx(expected[1]), args
+            assert new_repetitions[i] == expected[2], args
+
+
+class TestSimulate:
+    """测试蒙特卡洛模拟"""
+    
+    def test_all_perfect_matches_scalar_schedule(self):
+        """测试质量分布全为 5 分时，每轮模拟与逐卡片推进的排期一致"""
+        cards = make_cards([0, 1, 2, 5, 0], [2.5, 1.3, 2.1, 2.6, 2.5], [1, 1, 6, 20, 1], [0, 3, 0, 2, 45])
+        days = 40
+        
+        expected = np.zeros(days, dtype=np.int64)
+        for repetitions, easiness, interval, day in zip(*(cards[key].tolist() for key in cards)):
+            while day < days:
+                expected[day] += 1
+                interval, easiness, repetitions = ReviewService.calculate_next_review(
+                    5, repetitions, easiness, interval
+                )
+                day += max(interval, 1)
+        
+        counts = ReviewForecastService.simulate(cards, np.array([0, 0, 0, 0, 0, 1.0]), days, runs=4, seed=1)
+        
+        assert counts.shape == (4, days)
+        for row in counts:
+            assert row.tolist() == expected.tolist()
+    
+    def test_seed_is_reproducible(self):
+        """测试固定随机种子时结果可复现，且第 0 天的复习数不受抽样影响"""
+        rng = np.random.default_rng(0)
+        cards = make_cards(
+            rng.integers(0, 6, 500), rng.uniform(1.3, 2.8, 500), rng.integers(1, 30, 500), rng.integers(0, 10, 500)
+        )
+        distribution = np.asarray(DEFAULT_QUALITY_DISTRIBUTION)
+        
+        first = ReviewForecastService.simulate(cards, distribution, 60, runs=8, seed=7)
+        second = ReviewForecastService.simulate(cards, distribution, 60, runs=8, seed=7)
+        
+        assert np.array_equal(first, second)
+        assert (first[:, 0] == np.count_nonzero(cards["due_day"] == 0)).all()
+        assert first.std(axis=0)[1:].max() > 0
+    
+    def test_empty_cards(self):
+        """测试没有卡片时返回全 0"""
+        counts = ReviewForecastService.simulate(make_cards([], [], [], []), np.ones(6) / 6, 10, runs=3)
+        assert counts.shape == (3, 10)
+        assert counts.sum() == 0
+
+
+class TestReviewForecast:
+    """测试预测数据加载和接口"""
+    
+    @pytest.mark.asyncio
+    async def test_load_quality_distribution(self, db_session, test_user, test_node):
+        """测试质量分布按复习记录统计，并按默认分布平滑"""
+        for _ in range(QUALITY_PRIOR_WEIGHT):
+            db_session.add(ReviewLog(
+                node_id=test_node.id,
+                user_id=test_user.id,
+                review_mode="spaced",
+                mastery_feedback="remembered",
+                node_state_snapshot={"quality": 5},
+            ))
+        await db_session.commit()
+        
+        distribution = await ReviewForecastService.load_quality_distribution(db_session, test_user.id)
+        
+        expected = np.asarray(DEFAULT_QUALITY_DISTRIBUTION) / 2
+        expected[5] += 0.5
+        assert distribution == pytest.approx(expected)
+    
+    @pytest.mark.asyncio
+    async def test_forecast_endpoint(self, client, db_session, auth_headers, test_user, test_graph):
+        """测试预测接口：逾期和从未复习的卡片计入今天，区间外的卡片不计数"""
+        from app.api.deps import get_db
+        from main import app
+        
+        now = ReviewService._get_utc_now()
+        for i, next_review_at in enumerate((now - timedelta(days=3), None, now + timedelta(days=2), now + timedelta(days=60))):
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=f"forecast {i}",
+                content_data={},
+                next_review_at=next_review_at,
+                review_stats={"repetitions": 3, "easiness": 2.5, "interval": 10} if next_review_at else {},
+            ))
+        await db_session.commit()
+        
+        async def override_get_db():
+            yield db_session
+        
+        app.dependency_overrides[get_db] = override_get_db
+        response = await client.get(
+            "/api/v1/reviews/forecast", headers=auth_headers, params={"days": 14, "runs": 8, "seed": 3}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["days"] == 14
+        assert data["runs"] == 8
+        assert data["total_cards"] == 4
+        assert data["start_date"] == now.date().isoformat()
+        assert sum(data["quality_distribution"]) == pytest.approx(1, abs=1e-3)
+        assert set(data["percentiles"]) == {"p10", "p50", "p90"}
+        assert all(len(values) == 14 for values in data["percentiles"].values())
+        assert data["mean"][0] == 2
+        assert data["percentiles"]["p50"][2] >= 1
+        
+        response = await client.get("/api/v1/reviews/forecast", headers=auth_headers, params={"days": 0})
+        assert response.status_code == 422
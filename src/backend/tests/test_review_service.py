@@ -4,10 +4,10 @@
 """
 
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
-from app.services.review_service import ReviewService, ReviewMode
+from app.services.review_service import ReviewService, ReviewMode, ReviewStatisticsCache, review_statistics_cache
 from app.models.memory_node import MemoryNode, MasteryLevel
 
 
@@ -327,6 +327,127 @@ class TestReviewService:
             for item in queue
         )
     
+    @pytest.mark.asyncio
+    async def test_forgetting_index_expression_matches_python(self, db_session, test_user, test_graph):
+        """测试 SQL 遗忘指数与 Python 实现一致"""
+        from sqlalchemy import select
+        
+        now = ReviewService._get_utc_now()
+        cases = [
+            (now - timedelta(days=2), now + timedelta(days=2), MasteryLevel.LEARNING),
+            (now - timedelta(days=1), now + timedelta(days=9), MasteryLevel.FAMILIAR),
+            (now - timedelta(days=5), now - timedelta(days=3), MasteryLevel.MASTERED),
+            (now - timedelta(days=5), now - timedelta(hours=6), MasteryLevel.PROFICIENT),
+            (now - timedelta(days=30), now - timedelta(days=20), MasteryLevel.NOT_STARTED),
+            (None, None, MasteryLevel.NOT_STARTED),
+        ]
+        nodes = []
+        for last_review_at, next_review_at, mastery in cases:
+            node = MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title="forgetting",
+                content_data={},
+                mastery_level=mastery.value,
+                last_review_at=last_review_at.replace(tzinfo=timezone.utc) if last_review_at else None,
+                next_review_at=next_review_at.replace(tzinfo=timezone.utc) if next_review_at else None,
+            )
+            db_session.add(node)
+            nodes.append(node)
+        await db_session.commit()
+        
+        expression = ReviewService.forgetting_index_expression(now.replace(tzinfo=timezone.utc))
+        for node, (last_review_at, next_review_at, mastery) in zip(nodes, cases):
+            value = await db_session.scalar(select(expression).where(MemoryNode.id == node.id))
+            if last_review_at is None:
+                expected = 0.8
+            else:
+                expected = ReviewService.calculate_forgetting_index(last_review_at, next_review_at, mastery)
+            assert float(value) == pytest.approx(expected, abs=1e-3)
+    
+    @pytest.mark.asyncio
+    async def test_get_review_queue_spaced_ranks_by_forgetting_index(self, db_session, test_user, test_graph):
+        """测试间隔重复队列按遗忘指数排序，并排除已删除节点"""
+        now = datetime.now(timezone.utc)
+        specs = {
+            # 超期更久但已掌握：0.5 + 2 * 0.1 * 0.5 = 0.6
+            "mastered": (MasteryLevel.MASTERED, now - timedelta(days=2), None),
+            # 超期 1 天但未开始：0.5 + 1 * 0.1 * 1.5 = 0.65
+            "fresh": (MasteryLevel.NOT_STARTED, now - timedelta(days=1), None),
+            # 遗忘指数最高，但已删除
+            "deleted": (MasteryLevel.NOT_STARTED, now - timedelta(days=9), now),
+        }
+        for title, (mastery, next_review_at, deleted_at) in specs.items():
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=title,
+                content_data={},
+                mastery_level=mastery.value,
+                last_review_at=next_review_at - timedelta(days=3),
+                next_review_at=next_review_at,
+                deleted_at=deleted_at,
+            ))
+        await db_session.commit()
+        
+        queue = await ReviewService.get_review_queue(
+            db=db_session,
+            user_id=str(test_user.id),
+            mode=ReviewMode.SPACED,
+            limit=10
+        )
+        
+        assert [item["title"] for item in queue] == ["fresh", "mastered"]
+        assert queue[0]["forgetting_index"] == pytest.approx(0.65, abs=1e-3)
+        assert queue[1]["forgetting_index"] == pytest.approx(0.6, abs=1e-3)
+    
+    @pytest.mark.asyncio
+    async def test_get_review_queue_spaced_top_k_across_branches(self, db_session, test_user, test_graph):
+        """测试按掌握程度分支取候选后，top-k 与对全部到期节点排序的结果一致"""
+        from sqlalchemy import select
+        
+        now = datetime.now(timezone.utc)
+        # 每种掌握程度（含无法识别的写法）若干到期节点，另有没有复习时间的节点
+        levels = [level.value for level in MasteryLevel] + ["MASTERED"]
+        for i in range(24):
+            next_review_at = now - timedelta(hours=7 * i + 1)
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=f"scheduled {i}",
+                content_data={},
+                mastery_level=levels[i % len(levels)],
+                last_review_at=next_review_at - timedelta(days=2),
+                next_review_at=next_review_at,
+            ))
+        for i in range(3):
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=f"unscheduled {i}",
+                content_data={},
+            ))
+        await db_session.commit()
+        
+        queue = await ReviewService.get_review_queue(
+            db=db_session,
+            user_id=str(test_user.id),
+            mode=ReviewMode.SPACED,
+            limit=4
+        )
+        
+        result = await db_session.execute(
+            select(MemoryNode.title, ReviewService.forgetting_index_expression(now))
+            .where(MemoryNode.user_id == test_user.id)
+        )
+        expected = sorted(float(index) for _, index in result.all())[::-1][:4]
+        assert [item["forgetting_index"] for item in queue] == pytest.approx(expected, abs=1e-3)
+        assert any(item["mastery_level"] == "MASTERED" for item in queue)
+    
     @pytest.mark.asyncio
     async def test_get_review_statistics(self, db_session, test_user, test_graph):
         """测试复习统计"""
@@ -358,7 +479,201 @@ class TestReviewService:
         assert stats["mastery_distribution"]["mastered"] >= 1
         assert stats["total_reviews"] == 15  # 3 nodes * 5 reviews
         assert 0 <= stats["mastery_rate"] <= 100
+    
+    @pytest.mark.asyncio
+    async def test_get_review_statistics_due_counts(self, db_session, test_user, test_graph):
+        """测试今日到期、逾期计数和缺少复习次数的节点"""
+        now = datetime.now(timezone.utc)
+        today_start = datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
+        schedule = [
+            (today_start + timedelta(minutes=1), {"total_reviews": 2}),  # 今日到期
+            (today_start - timedelta(days=2), {"total_reviews": 3}),  # 逾期
+            (today_start + timedelta(days=3), {}),  # 未到期
+            (None, {}),  # 未安排
+        ]
+        for i, (next_review_at, review_stats) in enumerate(schedule):
+            db_session.add(MemoryNode(
+                graph_id=test_graph.id,
+                user_id=test_user.id,
+                node_type="CONCEPT",
+                title=f"节点 {i}",
+                content_data={},
+                mastery_level=MasteryLevel.PROFICIENT.value if i == 0 else MasteryLevel.LEARNING.value,
+                next_review_at=next_review_at,
+                review_stats=review_stats
+            ))
+        await db_session.commit()
+        
+        stats = await ReviewService.get_review_statistics(
+            db=db_session,
+            user_id=str(test_user.id),
+            use_cache=False
+        )
+        
+        assert stats == {
+            "total_nodes": 4,
+            "mastery_distribution": {
+                "not_started": 0,
+                "learning": 3,
+                "familiar": 0,
+                "proficient": 1,
+                "mastered": 0
+            },
+            "mastery_rate": 25.0,
+            "due_today": 1,
+            "overdue": 1,
+            "total_reviews": 5
+        }
+    
+    @pytest.mark.asyncio
+    async def test_get_review_statistics_cache_invalidated(
+        self, db_session, test_user, test_graph, test_node, monkeypatch
+    ):
+        """测试统计结果缓存（启用时），提交复习后失效"""
+        monkeypatch.setattr(review_statistics_cache, "ttl_seconds", 10.0)
+        first = await ReviewService.get_review_statistics(db=db_session, user_id=str(test_user.id))
+        
+        db_session.add(MemoryNode(
+            graph_id=test_graph.id,
+            user_id=test_user.id,
+            node_type="CONCEPT",
+            title="新节点",
+            content_data={}
+        ))
+        await db_session.commit()
+        
+        # 缓存有效期内返回上次结果
+        cached = await ReviewService.get_review_statistics(db=db_session, user_id=str(test_user.id))
+        assert cached == first
+        
+        await ReviewService.update_review_stats(
+            db=db_session,
+            node_id=str(test_node.id),
+            quality=4,
+            review_duration=30
+        )
+        
+        refreshed = await ReviewService.get_review_statistics(db=db_session, user_id=str(test_user.id))
+        assert refreshed["total_nodes"] == first["total_nodes"] + 1
+        assert refreshed["total_reviews"] == first["total_reviews"] + 1
+        review_statistics_cache.invalidate(str(test_user.id))
+    
+    def test_statistics_cache_bounded(self, monkeypatch):
+        """测试过期结果在读取时删除，用户数超过上限时淘汰最久未使用的用户"""
+        now = [1000.0]
+        monkeypatch.setattr("app.services.review_service.time.monotonic", lambda: now[0])
+        cache = ReviewStatisticsCache(ttl_seconds=10.0, max_users=2)
+        assert ReviewStatisticsCache().ttl_seconds == 0
+        
+        cache.set("a", None, {"total_nodes": 1})
+        cache.set("a", "graph", {"total_nodes": 2})
+        now[0] += 11
+        assert cache.get("a") is None
+        assert cache.get("a", "graph") is None
+        assert cache._entries == {}
+        
+        cache.set("a", None, {"total_nodes": 1})
+        cache.set("b", None, {"total_nodes": 2})
+        assert cache.get("a") == {"total_nodes": 1}
+        cache.set("c", None, {"total_nodes": 3})
+        assert list(cache._entries) == ["a", "c"]
+        assert cache.get("b") is None
+
 
+class TestReviewBatch:
+    """测试批量提交复习"""
+    
+    @staticmethod
+    async def _create_node(db_session, test_user, test_graph, title):
+        node = MemoryNode(
+            graph_id=test_graph.id,
+            user_id=test_user.id,
+            node_type="CONCEPT",
+            title=title,
+            content_data={}
+        )
+        db_session.add(node)
+        await db_session.commit()
+        return node
+    
+    @pytest.mark.asyncio
+    async def test_batch_matches_sequential(self, db_session, test_user, test_graph):
+        """测试同一节点多次复习按顺序累积，与逐条提交结果一致"""
+        single = await self._create_node(db_session, test_user, test_graph, "single")
+        batched = await self._create_node(db_session, test_user, test_graph, "batched")
+        qualities = [5, 4, 2, 5, 5]
+        
+        for quality in qualities:
+            expected = await ReviewService.update_review_stats(
+                db=db_session, node_id=str(single.id), quality=quality, review_duration=30
+            )
+        
+        result = await ReviewService.submit_review_batch(
+            db=db_session,
+            user_id=str(test_user.id),
+            items=[
+                {"client_review_id": f"r{i}", "node_id": batched.id, "quality": quality, "review_duration": 30}
+                for i, quality in enumerate(qualities)
+            ]
+        )
+        
+        assert result["applied"] == 5
+        last = result["results"][-1]
+        for key in ("mastery_level", "interval_days", "easiness", "repetitions"):
+            assert last[key] == expected[key]
+        await db_session.refresh(batched)
+        assert batched.review_stats["total_reviews"] == 5
+    
+    @pytest.mark.asyncio
+    async def test_batch_idempotent(self, db_session, test_user, test_graph, test_node):
+        """测试重放同一批复习不会重复计算，并报告不存在的节点"""
+        reviewed_at = datetime.now(timezone.utc) - timedelta(days=1)
+        items = [
+            {"client_review_id": "a", "node_id": test_node.id, "quality": 4, "review_duration": 10, "reviewed_at": reviewed_at},
+            {"client_review_id": "b", "node_id": uuid4(), "quality": 4, "review_duration": 10, "reviewed_at": None},
+            {"client_review_id": "a", "node_id": test_node.id, "quality": 1, "review_duration": 10, "reviewed_at": None},
+        ]
+        
+        first = await ReviewService.submit_review_batch(db=db_session, user_id=str(test_user.id), items=items)
+        second = await ReviewService.submit_review_batch(db=db_session, user_id=str(test_user.id), items=items)
+        
+        assert [entry["status"] for entry in first["results"]] == ["applied", "not_found", "duplicate"]
+        assert (first["applied"], first["duplicates"], first["failed"]) == (1, 1, 1)
+        assert [entry["status"] for entry in second["results"]] == ["duplicate", "not_found", "duplicate"]
+        
+        await db_session.refresh(test_node)
+        assert test_node.review_stats["total_reviews"] == 1
+        assert ReviewService._normalize_datetime(test_node.last_review_at) == ReviewService._normalize_datetime(reviewed_at)
+        
+        from sqlalchemy import func, select
+        from app.models import ReviewLog, UserStats
+        log_count = await db_session.scalar(select(func.count(ReviewLog.id)).where(ReviewLog.user_id == test_user.id))
+        assert log_count == 1
+        snapshot = await db_session.get(UserStats, test_user.id, populate_existing=True)
+        assert snapshot.total_reviews == 1
+        assert snapshot.last_review_date == reviewed_at.date()
+    
+    @pytest.mark.asyncio
+    async def test_batch_endpoint(self, client, db_session, auth_headers, test_node):
+        """测试批量复习接口（路由不会被 /{node_id} 匹配）"""
+        from app.api.deps import get_db
+        from main import app
+        
+        async def override_get_db():
+            yield db_session
+        
+        app.dependency_overrides[get_db] = override_get_db
+        response = await client.post(
+            "/api/v1/reviews/batch",
+            headers=auth_headers,
+            json={"items": [{"client_review_id": "x1", "node_id": str(test_node.id), "quality": 5}]}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["applied"] == 1
+        assert data["results"][0]["status"] == "applied"
+        assert data["results"][0]["repetitions"] == 1
 
 class TestHelperMethods:
     """测试辅助方法"""
@@ -0,0 +1,171 @@
+"""
+用户学习统计快照测试
+测试快照的增量维护、重建和成就接口读取
+"""
+
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app.models import KnowledgeGraph, MemoryNode, ReviewLog, User, UserStats
+from app.services.achievement_service import AchievementService
+from app.services.review_service import ReviewService
+from app.services.user_stats_service import UserStatsService, user_stats_service
+
+
+class TestStreaks:
+    """测试连续天数计算"""
+    
+    def test_streaks(self):
+        """测试截至最后复习日的连续天数和最长连续天数"""
+        days = [date(2026, 1, d) for d in (1, 2, 3, 4, 7, 8, 10)]
+        assert UserStatsService._streaks(days) == (1, 4)
+        assert UserStatsService._streaks(days[:-1]) == (2, 4)
+        assert UserStatsService._streaks([]) == (0, 0)
+    
+    def test_streak_broken_on_read(self):
+        """测试最后复习日早于昨天时连续天数按 0 计算"""
+        snapshot = UserStats(
+            total_nodes=0, mastered_nodes=0, total_reviews=7, total_graphs=0,
+            current_streak=7, longest_streak=7, last_review_date=date(2026, 1, 10),
+            review_hours=[0] * 24,
+        )
+        
+        assert user_stats_service.to_achievement_stats(snapshot, date(2026, 1, 10))["perfect_week"] is True
+        assert user_stats_service.to_achievement_stats(snapshot, date(2026, 1, 11))["current_streak"] == 7
+        assert user_stats_service.to_achievement_stats(snapshot, date(2026, 1, 11))["perfect_week"] is False
+        assert user_stats_service.to_achievement_stats(snapshot, date(2026, 1, 12))["current_streak"] == 0
+
+
+class TestUserStatsService:
+    """测试统计快照的维护"""
+    
+    @pytest.mark.asyncio
+    async def test_rebuild_from_source_tables(self, db_session, test_user, test_graph, test_node):
+        """测试首次读取时从业务表重建快照"""
+        test_node.mastery_level = "MASTERED"
+        now = datetime.now(timezone.utc).replace(hour=23, minute=30)
+        for days_ago in (0, 1, 1, 3):
+            db_session.add(ReviewLog(
+                node_id=test_node.id,
+                user_id=test_user.id,
+                review_mode="manual",
+                mastery_feedback="remembered",
+                created_at=now - timedelta(days=days_ago),
+            ))
+        await db_session.commit()
+        
+        snapshot = await user_stats_service.get(db_session, test_user.id)
+        
+        assert snapshot.total_nodes == 1
+        assert snapshot.mastered_nodes == 1
+        assert snapshot.total_graphs == 1
+        assert snapshot.total_reviews == 4
+        assert snapshot.review_hours[23] == 4
+        assert snapshot.current_streak == 2
+        assert snapshot.longest_streak == 2
+        assert snapshot.last_review_date == now.date()
+    
+    @pytest.mark.asyncio
+    async def test_record_review_updates_streak_and_hours(self, db_session, test_user):
+        """测试复习时在一条 UPDATE 中更新次数、时段和连续天数"""
+        # 先建立空快照（这里不写复习记录，重建时统计不到）
+        await user_stats_service.get(db_session, test_user.id)
+        day = datetime(2026, 3, 1, 6, 15, tzinfo=timezone.utc)
+        for reviewed_at in (day, day + timedelta(hours=17), day + timedelta(days=1), day + timedelta(days=3)):
+            await user_stats_service.record_review(db_session, test_user.id, reviewed_at=reviewed_at)
+        await db_session.commit()
+        
+        snapshot = await user_stats_service.get(db_session, test_user.id)
+        
+        assert snapshot.total_reviews == 4
+        assert snapshot.review_hours[6] == 3
+        assert snapshot.review_hours[23] == 1
+        assert snapshot.current_streak == 1
+        assert snapshot.longest_streak == 2
+        assert snapshot.last_review_date == date(2026, 3, 4)
+    
+    @pytest.mark.asyncio
+    async def test_update_review_stats_maintains_snapshot(self, db_session, test_user, test_node):
+        """测试提交复习后快照与重建结果一致"""
+        await user_stats_service.get(db_session, test_user.id)
+        await db_session.commit()
+        
+        for _ in range(5):
+            await ReviewService.update_review_stats(
+                db=db_session,
+                node_id=str(test_node.id),
+                quality=5,
+                review_duration=10
+            )
+        
+        snapshot = await user_stats_service.get(db_session, test_user.id)
+        assert snapshot.total_reviews == 5
+        assert snapshot.mastered_nodes == 1
+        assert snapshot.current_streak == 1
+        maintained = user_stats_service.to_achievement_stats(snapshot)
+        
+        await db_session.delete(snapshot)
+        await db_session.commit()
+        rebuilt = await user_stats_service.get(db_session, test_user.id)
+        assert user_stats_service.to_achievement_stats(rebuilt) == maintained
+
+
+class TestAchievementEndpoints:
+    """测试成就接口读取统计快照"""
+    
+    @pytest.mark.asyncio
+    async def test_profile_tracks_nodes_and_graphs(
+        self, client: AsyncClient, auth_headers: dict, db_session, test_user: User, test_graph: KnowledgeGraph
+    ):
+        """测试通过接口创建和删除节点、图谱后档案统计同步更新"""
+        response = await client.get("/api/v1/achievements/profile", headers=auth_headers)
+        assert response.status_code == 200
+        stats = response.json()["data"]["stats"]
+        assert stats["total_graphs"] == 1
+        assert stats["total_nodes"] == 0
+        
+        graph_response = await client.post(
+            "/api/v1/graphs/", headers=auth_headers, json={"name": "stats graph"}
+        )
+        assert graph_response.status_code == 201
+        graph_id = graph_response.json()["id"]
+        for i in range(2):
+            node_response = await client.post(
+                "/api/v1/nodes/",
+                headers=auth_headers,
+                json={"graph_id": graph_id, "node_type": "CONCEPT", "title": f"node {i}", "content_data": {}}
+            )
+            assert node_response.status_code == 201
+        
+        response = await client.get("/api/v1/achievements/stats", headers=auth_headers)
+        stats = response.json()["data"]
+        assert stats["total_graphs"] == 2
+        assert stats["total_nodes"] == 2
+        
+        response = await client.delete(f"/api/v1/nodes/{node_response.json()['id']}", headers=auth_headers)
+        assert response.status_code == 204
+        response = await client.delete(f"/api/v1/graphs/{graph_id}", headers=auth_headers)
+        assert response.status_code == 204
+        
+        response = await client.get("/api/v1/achievements/profile", headers=auth_headers)
+        data = response.json()["data"]
+        assert data["stats"]["total_graphs"] == 1
+        assert data["stats"]["total_nodes"] == 0
+        assert data["level"]["total_exp"] == 30
+        
+        result = await db_session.execute(select(UserStats).where(UserStats.user_id == test_user.id))
+        assert result.scalar_one().total_nodes == 0
+    
+    @pytest.mark.asyncio
+    async def test_achievements_unlocked(self, db_session, test_user, test_node: MemoryNode):
+        """测试成就按快照解锁"""
+        await user_stats_service.record_review(db_session, test_user.id)
+        await db_session.commit()
+        
+        achievements = await AchievementService(db_session).get_achievements(test_user.id)
+        unlocked = {achievement["id"] for achievement in achievements["unlocked"]}
+        
+        assert "first_node" in unlocked
+        assert "review_10" not in unlocked
@@ -0,0 +1,134 @@
+"""
+向量索引与 ANN 搜索测试
+测试 HNSW 索引管理、ANN 查询参数和召回率评估
+"""
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import KnowledgeGraph, MemoryNode, User
+from app.services.vector_index_service import VectorIndexService
+from app.services.vector_search_service import VectorSearchService
+
+
+def _random_embedding(rng: np.random.Generator) -> list:
+    """生成随机单位向量"""
+    vector = rng.standard_normal(1536).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@pytest.fixture
+async def embedded_nodes(db_session: AsyncSession, test_user: User, test_graph: KnowledgeGraph) -> list:
+    """创建带向量嵌入的测试节点"""
+    rng = np.random.default_rng(42)
+    nodes = []
+    for i in range(20):
+        node = MemoryNode(
+            graph_id=test_graph.id,
+            user_id=test_user.id,
+            node_type="CONCEPT",
+            title=f"向量节点 {i}",
+            content_data={},
+            content_embedding=_random_embedding(rng),
+        )
+        db_session.add(node)
+        nodes.append(node)
+    await db_session.commit()
+    return nodes
+
+
+class TestIndexDDL:
+    """测试索引 DDL 生成"""
+    
+    def test_build_hnsw_ddl(self):
+        """测试 HNSW 索引 DDL"""
+        ddl = VectorIndexService().build_index_ddl("hnsw")
+        
+        assert "CONCURRENTLY" in ddl
+        assert "USING hnsw (content_embedding vector_cosine_ops)" in ddl
+        assert "ef_construction" in ddl
+    
+    def test_build_ivfflat_ddl(self):
+        """测试 IVFFlat 索引 DDL"""
+        ddl = VectorIndexService().build_index_ddl("ivfflat", concurrently=False)
+        
+        assert "CONCURRENTLY" not in ddl
+        assert "USING ivfflat" in ddl
+        assert "lists" in ddl
+    
+    def test_invalid_index_type(self):
+        """测试不支持的索引类型"""
+        with pytest.raises(HTTPException) as exc_info:
+            VectorIndexService().build_index_ddl("btree")
+        
+        assert exc_info.value.status_code == 400
+
+
+class TestANNSearch:
+    """测试 ANN 搜索"""
+    
+    @pytest.mark.asyncio
+    async def test_search_by_embedding_ordered(self, db_session: AsyncSession, embedded_nodes: list):
+        """测试按相似度降序返回，并排除参考节点"""
+        reference = embedded_nodes[0]
+        
+        results = await VectorSearchService()._search_by_embedding(
+            db=db_session,
+            embedding=reference.content_embedding,
+            limit=5,
+            similarity_threshold=-1.0,
+            exclude_id=reference.id,
+            ef_search=100,
+        )
+        
+        scores = [score for _, score in results]
+        assert len(results) == 5
+        assert scores == sorted(scores, reverse=True)
+        assert reference.id not in [node.id for node, _ in results]
+    
+    @pytest.mark.asyncio
+    async def test_search_similarity_threshold(self, db_session: AsyncSession, embedded_nodes: list):
+        """测试相似度阈值过滤"""
+        reference = embedded_nodes[0]
+        
+        results = await VectorSearchService()._search_by_embedding(
+            db=db_session,
+            embedding=reference.content_embedding,
+            limit=10,
+            similarity_threshold=0.99,
+        )
+        
+        # 随机向量之间几乎正交，只有自身满足阈值
+        assert [node.id for node, _ in results] == [reference.id]
+
+
+class TestIndexManagement:
+    """测试索引状态和召回率评估"""
+    
+    @pytest.mark.asyncio
+    async def test_index_status(self, db_session: AsyncSession, embedded_nodes: list):
+        """测试索引状态包含 HNSW 索引"""
+        status = await VectorIndexService().get_index_status(db_session)
+        
+        index_names = [index["name"] for index in status["indexes"]]
+        assert "idx_memory_nodes_embedding_hnsw" in index_names
+        assert status["embedded_nodes"] == len(embedded_nodes)
+    
+    @pytest.mark.asyncio
+    async def test_measure_recall(self, db_session: AsyncSession, test_user: User, embedded_nodes: list):
+        """测试召回率评估"""
+        report = await VectorIndexService().measure_recall(
+            db=db_session,
+            user_id=test_user.id,
+            sample_size=5,
+            k=5,
+            ef_search=100,
+        )
+        
+        assert report["sample_size"] == 5
+        assert report["ef_search"] == 100
+        assert 0.0 <= report["recall"] <= 1.0
+        assert report["recall"] >= 0.8
+